@@ -0,0 +1,298 @@
+"""
+Control de admisión: límites de tasa y prioridad antes de ejecutar cada ruta.
+
+Cada petición entra con una clase de prioridad:
+- critical: llamadas de voz (canal ivr/voice de un token de integración): el
+  agente está en línea con el cliente y la latencia manda.
+- normal: /agent/decision de otros canales, búsqueda y CRUD.
+- bulk: lotes, precálculo, importación/exportación, conciliación.
+
+Orden de las verificaciones (la más barata primero):
+1. Token bucket por bearer token y por canal (`channel`): sin fichas la
+   petición se rechaza al instante con 429 y Retry-After (segundos hasta la
+   siguiente ficha). Es lo que frena una ráfaga de WhatsApp tras un envío.
+   El bucket `*` (ANY_CHANNEL) cuenta las peticiones sin canal o de un canal
+   sin límite propio, para que omitir o inventar el canal no lo esquive.
+2. Límite de concurrencia: como mucho `max_concurrency` peticiones ejecutándose;
+   `reserved` lugares sólo los usa critical y bulk no pasa de `bulk_limit`.
+   Las que no caben esperan en una cola por clase (critical primero, FIFO
+   dentro de cada clase) hasta el plazo de su clase; vencido el plazo, o con
+   la cola llena (`max_queue`), 503 con Retry-After.
+
+Con un solo proceso el trabajo de Flask compite por el GIL: más peticiones en
+paralelo no dan más throughput, sólo reparten la CPU entre más peticiones y
+alargan todas. Un límite bajo (del orden de los núcleos) hace que la
+prioridad decida quién usa la CPU.
+
+El canal que declara el cliente (header, query o cuerpo) no es una frontera de
+seguridad: quien classify() confíe decide la clase critical. El límite que no
+se puede esquivar es el del token.
+
+AdmissionMiddleware decide a nivel WSGI, antes de que Flask arme el contexto
+de la petición y haga el routing: un rechazo cuesta una fracción de atender la
+petición, que es lo que permite rechazar una ráfaga sin que se coma la CPU.
+
+    app.wsgi_app = AdmissionMiddleware(app.wsgi_app, controller, classify)
+"""
+import json
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+
+CLASSES = ("critical", "normal", "bulk")
+ANY_CHANNEL = "*"
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, status: int, reason: str, retry_after: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def parse_rate(spec: str | None) -> tuple[float, float] | None:
+    """"50/100" -> 50 peticiones/s con ráfaga de 100; "50" -> ráfaga = tasa; vacío o 0 -> sin límite."""
+    spec = (spec or "").strip()
+    if not spec:
+        return None
+    rate, _, burst = spec.partition("/")
+    rate = float(rate)
+    if rate <= 0:
+        return None
+    burst = float(burst) if burst else rate
+    if burst < 1:
+        raise ValueError(f"La ráfaga debe ser >= 1 en '{spec}'")
+    return rate, burst
+
+
+def parse_rates(spec: str | None) -> dict[str, tuple[float, float]]:
+    """"whatsapp=100/200,sms=50" -> {canal: (tasa, ráfaga)}."""
+    rates = {}
+    for item in (spec or "").split(","):
+        name, _, value = item.partition("=")
+        rate = parse_rate(value)
+        if name.strip() and rate:
+            rates[name.strip().lower()] = rate
+    return rates
+
+
+class RateLimiter:
+    """Token buckets por llave (LRU acotado): `rate` fichas/s hasta `burst`."""
+
+    def __init__(self, rate: float, burst: float, max_keys: int = 100_000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()   # llave -> [fichas, actualizado_en]
+        self._lock = threading.Lock()
+
+    def take(self, key, now: float | None = None) -> float:
+        """Toma una ficha; 0 si la hubo, si no los segundos hasta la siguiente."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [self.burst, now]
+                if len(self._buckets) > self.max_keys:
+                    # La llave más vieja vuelve a empezar con la ráfaga completa
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return 0.0
+            return (1 - bucket[0]) / self.rate
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class _Waiter:
+    __slots__ = ("event", "granted")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.granted = False
+
+
+class ConcurrencyLimiter:
+    def __init__(self, max_concurrency: int = 4, reserved: int = 1, bulk_limit: int = 1, max_queue: int = 256):
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency debe ser >= 1")
+        if not 0 <= reserved < max_concurrency:
+            raise ValueError("reserved debe estar entre 0 y max_concurrency - 1")
+        self.max_concurrency = max_concurrency
+        self.reserved = reserved
+        self.bulk_limit = max(1, min(bulk_limit, max_concurrency - reserved))
+        self.max_queue = max_queue
+        self._lock = threading.Lock()
+        self._running = dict.fromkeys(CLASSES, 0)
+        self._total = 0
+        self._queues = {cls: deque() for cls in CLASSES}
+        self._queued = 0
+
+    def _fits(self, cls: str) -> bool:
+        if self._total >= self.max_concurrency:
+            return False
+        if cls == "critical":
+            return True
+        if self._total >= self.max_concurrency - self.reserved:
+            return False
+        return cls != "bulk" or self._running["bulk"] < self.bulk_limit
+
+    def _grant(self, cls: str):
+        self._running[cls] += 1
+        self._total += 1
+
+    def acquire(self, cls: str, timeout: float) -> str | None:
+        """None si entró; si no el motivo: "queue_full" o "timeout"."""
+        with self._lock:
+            # Sólo se adelanta a la cola si nadie de su clase o de una más prioritaria espera
+            ahead = any(self._queues[c] for c in CLASSES[:CLASSES.index(cls) + 1])
+            if not ahead and self._fits(cls):
+                self._grant(cls)
+                return None
+            if self._queued >= self.max_queue or timeout <= 0:
+                return "queue_full"
+            waiter = _Waiter()
+            self._queues[cls].append(waiter)
+            self._queued += 1
+        waiter.event.wait(timeout)
+        with self._lock:
+            if waiter.granted:
+                return None
+            self._queues[cls].remove(waiter)
+            self._queued -= 1
+            # Otro de una clase menos prioritaria pudo quedar bloqueado detrás de éste
+            self._dispatch()
+        return "timeout"
+
+    def release(self, cls: str):
+        with self._lock:
+            self._running[cls] -= 1
+            self._total -= 1
+            self._dispatch()
+
+    def _dispatch(self):
+        for cls in CLASSES:
+            queue = self._queues[cls]
+            while queue and self._fits(cls):
+                waiter = queue.popleft()
+                self._queued -= 1
+                waiter.granted = True
+                self._grant(cls)
+                waiter.event.set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "max_concurrency": self.max_concurrency,
+                "reserved": self.reserved,
+                "bulk_limit": self.bulk_limit,
+                "max_queue": self.max_queue,
+                "in_flight": self._total,
+                "running": dict(self._running),
+                "queued": {cls: len(q) for cls, q in self._queues.items()},
+            }
+
+
+class AdmissionController:
+    def __init__(self, limiter: ConcurrencyLimiter, queue_timeouts: dict[str, float],
+                 token_rate: tuple[float, float] | None = None,
+                 channel_rates: dict[str, tuple[float, float]] | None = None,
+                 max_keys: int = 100_000, on_result=None, on_wait=None):
+        self.limiter = limiter
+        self.queue_timeouts = {cls: queue_timeouts.get(cls, 0.0) for cls in CLASSES}
+        self.token_limiter = RateLimiter(*token_rate, max_keys=max_keys) if token_rate else None
+        self.channel_limiters = {name: RateLimiter(*rate, max_keys=1) for name, rate in (channel_rates or {}).items()}
+        self.on_result = on_result      # on_result(clase, resultado) -> métricas
+        self.on_wait = on_wait          # on_wait(clase, segundos en cola)
+        self._lock = threading.Lock()
+        self.counts = {cls: {} for cls in CLASSES}
+
+    def _count(self, cls: str, result: str):
+        with self._lock:
+            self.counts[cls][result] = self.counts[cls].get(result, 0) + 1
+        if self.on_result is not None:
+            self.on_result(cls, result)
+
+    def _shed(self, cls: str, reason: str, status: int, retry_after: float, message: str):
+        self._count(cls, reason)
+        raise AdmissionRejected(status, reason, max(1, math.ceil(retry_after)), message)
+
+    def admit(self, cls: str, token: str | None = None, channel: str | None = None) -> str:
+        """Devuelve la clase admitida (para release) o lanza AdmissionRejected."""
+        if self.token_limiter is not None and token:
+            wait = self.token_limiter.take(token)
+            if wait:
+                self._shed(cls, "rate_limited_token", 429, wait,
+                           "Demasiadas peticiones para este token; reintente más tarde")
+        if channel not in self.channel_limiters:
+            channel = ANY_CHANNEL
+        channel_limiter = self.channel_limiters.get(channel)
+        if channel_limiter is not None:
+            wait = channel_limiter.take(channel)
+            if wait:
+                self._shed(cls, "rate_limited_channel", 429, wait,
+                           f"Demasiadas peticiones del canal {channel}; reintente más tarde")
+
+        started = time.perf_counter()
+        reason = self.limiter.acquire(cls, self.queue_timeouts[cls])
+        if reason is not None:
+            self._shed(cls, reason, 503, 1, "Servidor saturado; reintente más tarde")
+        if self.on_wait is not None:
+            self.on_wait(cls, time.perf_counter() - started)
+        self._count(cls, "admitted")
+        return cls
+
+    def release(self, cls: str):
+        self.limiter.release(cls)
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = {cls: dict(c) for cls, c in self.counts.items()}
+        return {
+            **self.limiter.stats(),
+            "queue_timeouts": self.queue_timeouts,
+            "token_rate": [self.token_limiter.rate, self.token_limiter.burst] if self.token_limiter else None,
+            "tracked_tokens": len(self.token_limiter) if self.token_limiter else 0,
+            "channel_rates": {name: [lim.rate, lim.burst] for name, lim in self.channel_limiters.items()},
+            "counts": counts,
+        }
+
+
+class AdmissionMiddleware:
+    def __init__(self, wsgi_app, controller: AdmissionController, classify, reject_headers=None):
+        self.wsgi_app = wsgi_app
+        self.controller = controller
+        self.classify = classify                  # classify(environ) -> (clase, token, canal) o None (exenta)
+        self.reject_headers = reject_headers      # reject_headers(environ) -> [(nombre, valor)], p. ej. CORS
+
+    def __call__(self, environ, start_response):
+        decision = self.classify(environ)
+        if decision is None:
+            return self.wsgi_app(environ, start_response)
+        try:
+            cls = self.controller.admit(*decision)
+        except AdmissionRejected as e:
+            return self._reject(e, environ, start_response)
+        # El lugar cubre el handler; el cuerpo en streaming (exportaciones) se envía ya fuera del límite
+        try:
+            return self.wsgi_app(environ, start_response)
+        finally:
+            self.controller.release(cls)
+
+    def _reject(self, e: AdmissionRejected, environ, start_response):
+        body = json.dumps({"codigo": f"ERROR_{e.status}", "mensaje": str(e), "motivo": e.reason},
+                          ensure_ascii=False).encode("utf-8")
+        headers = [("Content-Type", "application/json"), ("Content-Length", str(len(body))),
+                   ("Retry-After", str(e.retry_after))]
+        if self.reject_headers is not None:
+            headers.extend(self.reject_headers(environ))
+        reason = "Too Many Requests" if e.status == 429 else "Service Unavailable"
+        start_response(f"{e.status} {reason}", headers)
+        return [body]
@@ -0,0 +1,378 @@
+"""
+Envejecimiento incremental de dpd y foto diaria de cartera.
+
+`dpd_snapshot` guarda una fila compacta por cliente con deuda abierta (saldo,
+deudas abiertas, vencimiento abierto más antiguo y tramo). El agente la lee
+directamente con snapshot_context(): el dpd se calcula al leer desde
+oldest_due_date, así que el paso de los días no obliga a reescribir la foto.
+
+run_aging() corre una pasada diaria que sólo toca las cuentas cuyo estado
+cambió:
+
+    full       primera pasada (o --full): toda la foto se reconstruye por rangos
+               de customer_id con un INSERT ... SELECT agrupado
+    dirty      clientes en `aging_dirty`, que llenan los triggers de debts
+               (alta, pago, cambio de vencimiento/estado, borrado)
+    crossings  cuentas cuyo vencimiento más antiguo cruzó un tramo (0, 30, 60,
+               90 días) entre la pasada anterior y la fecha de corte
+    summary    conteo y saldo por tramo en `dpd_bucket_daily`
+
+Cada fase avanza por bloques de `chunk_size` clientes con paginación keyset;
+cada bloque se aplica en su propia transacción junto con el checkpoint
+(phase/cursor en `aging_runs`). La memoria queda acotada por el bloque y una
+pasada interrumpida (o limitada con max_chunks) se reanuda donde quedó.
+
+Uso como CLI (desde Agente_Cobranza/), p. ej. desde cron una vez al día:
+    python aging.py run [--db agente_cobranza.db] [--as-of AAAA-MM-DD] [--chunk-size 5000] [--full]
+    python aging.py status [--db agente_cobranza.db]
+"""
+import argparse
+import json
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+import ledger
+
+PHASES = ("full", "dirty", "crossings", "summary", "done")
+DEFAULT_CHUNK_SIZE = 5000
+BUCKET_LABELS = [label for label, _, _ in ledger.DPD_BUCKETS] + ["current"]
+# Días de atraso donde una cuenta cambia de tramo
+BUCKET_THRESHOLDS = [low for _, low, _ in ledger.DPD_BUCKETS]
+
+RUN_COLUMNS = ["run_date", "previous_date", "phase", "cursor", "processed", "changed",
+               "started_at", "updated_at", "finished_at"]
+
+
+def _now() -> str:
+    return datetime.utcnow().isoformat()
+
+
+def _begin(conn):
+    if conn.in_transaction:
+        conn.commit()
+    conn.execute("BEGIN IMMEDIATE")
+
+
+# ---------------------------------------------------------------------
+# Lectura (agente)
+# ---------------------------------------------------------------------
+def _snapshot_context(row, today: date) -> dict:
+    open_debts, amount_due, oldest, snapshot_date = row
+    context = ledger.make_context("snapshot", open_debts, amount_due, oldest, today)
+    context["snapshot_date"] = snapshot_date
+    return context
+
+
+def snapshot_context(conn, customer_id: str, today: date | None = None) -> dict | None:
+    """
+    Contexto de deuda del cliente desde la foto (dos búsquedas por llave
+    primaria). Si el cliente tiene cambios aún no procesados se calcula en vivo
+    desde debts, así la respuesta nunca queda atrás de un pago.
+    """
+    today = today or date.today()
+    row = conn.execute("""
+        SELECT open_debts, amount_due, oldest_due_date, snapshot_date,
+               EXISTS (SELECT 1 FROM aging_dirty WHERE customer_id = ?1)
+        FROM dpd_snapshot WHERE customer_id = ?1
+    """, (customer_id,)).fetchone()
+    if row is None:
+        # Sin foto: o no tiene deuda abierta, o es nueva y aún no se procesa
+        if not conn.execute("SELECT 1 FROM aging_dirty WHERE customer_id = ?", (customer_id,)).fetchone():
+            return None
+    elif not row[4]:
+        return _snapshot_context(row[:4], today)
+    return ledger.debt_context(conn, customer_id, today)
+
+
+def snapshot_contexts(conn, customer_ids, today: date | None = None) -> dict:
+    """Versión por lotes de snapshot_context: {customer_id: contexto}."""
+    today = today or date.today()
+    ids = list(dict.fromkeys(customer_ids))
+    result, dirty = {}, []
+    for start in range(0, len(ids), ledger.SQL_CHUNK):
+        chunk = ids[start:start + ledger.SQL_CHUNK]
+        marks = ",".join("?" * len(chunk))
+        dirty.extend(cid for (cid,) in conn.execute(
+            f"SELECT customer_id FROM aging_dirty WHERE customer_id IN ({marks})", chunk))
+        for customer_id, *row in conn.execute(f"""
+            SELECT customer_id, open_debts, amount_due, oldest_due_date, snapshot_date
+            FROM dpd_snapshot WHERE customer_id IN ({marks})
+        """, chunk):
+            result[customer_id] = _snapshot_context(row, today)
+    if dirty:
+        for customer_id in dirty:
+            result.pop(customer_id, None)
+        result.update(ledger.debt_contexts(conn, dirty, today))
+    return result
+
+
+# ---------------------------------------------------------------------
+# Pasada diaria
+# ---------------------------------------------------------------------
+def refresh_customers(conn, customer_ids: list[str], as_of: date) -> int:
+    """
+    Recalcula la foto de `customer_ids` desde debts dentro de la transacción del
+    llamador: inserta/actualiza los que tienen deuda abierta y borra el resto.
+    Devuelve cuántas filas cambiaron.
+    """
+    contexts = ledger.debt_contexts(conn, customer_ids, as_of)
+    stamp = as_of.isoformat()
+    changed = 0
+    if contexts:
+        cur = conn.executemany("""
+            INSERT INTO dpd_snapshot (customer_id, amount_due, open_debts, oldest_due_date, bucket, snapshot_date)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (customer_id) DO UPDATE SET
+                amount_due = excluded.amount_due,
+                open_debts = excluded.open_debts,
+                oldest_due_date = excluded.oldest_due_date,
+                bucket = excluded.bucket,
+                snapshot_date = excluded.snapshot_date
+            WHERE amount_due != excluded.amount_due OR open_debts != excluded.open_debts
+               OR oldest_due_date != excluded.oldest_due_date OR bucket != excluded.bucket
+        """, [(cid, c["amount_due"], c["open_debts"], c["oldest_due_date"], c["bucket"], stamp)
+              for cid, c in contexts.items()])
+        changed += max(cur.rowcount, 0)
+    gone = [(cid,) for cid in customer_ids if cid not in contexts]
+    if gone:
+        cur = conn.executemany("DELETE FROM dpd_snapshot WHERE customer_id = ?", gone)
+        changed += max(cur.rowcount, 0)
+    return changed
+
+
+def _checkpoint(conn, run_date: str, phase: str, cursor, processed: int, changed: int):
+    conn.execute("""
+        UPDATE aging_runs
+        SET phase = ?, cursor = ?, processed = processed + ?, changed = changed + ?, updated_at = ?,
+            finished_at = CASE WHEN ? = 'done' THEN ? ELSE NULL END
+        WHERE run_date = ?
+    """, (phase, json.dumps(cursor) if cursor is not None else None, processed, changed, _now(),
+          phase, _now(), run_date))
+
+
+def _full_chunk(conn, run: dict, as_of: date, chunk_size: int):
+    """
+    Reconstruye la foto del rango de clientes que cubren las siguientes
+    `chunk_size` deudas con un INSERT ... SELECT agrupado (todo dentro de SQLite).
+    INDEXED BY evita que el planificador elija el índice por status, que
+    recorrería todas las deudas abiertas en cada bloque.
+    """
+    after = run["cursor"] or ""
+    row = conn.execute(
+        "SELECT customer_id FROM debts WHERE customer_id > ? ORDER BY customer_id LIMIT 1 OFFSET ?",
+        (after, chunk_size - 1)).fetchone()
+    where, params = "customer_id > ?", [after]
+    if row:
+        where += " AND customer_id <= ?"
+        params.append(row[0])
+    removed = conn.execute(f"DELETE FROM dpd_snapshot WHERE {where}", params).rowcount
+    conn.execute(f"DELETE FROM aging_dirty WHERE {where}", params)
+    case, case_params = ledger.bucket_case_sql("MIN(due_date)", as_of)
+    inserted = conn.execute(f"""
+        INSERT INTO dpd_snapshot (customer_id, amount_due, open_debts, oldest_due_date, bucket, snapshot_date)
+        SELECT customer_id, ROUND(SUM(balance), 2), COUNT(*), MIN(due_date), {case}, ?
+        FROM debts INDEXED BY idx_debts_customer_status
+        WHERE {where} AND status = 'open'
+        GROUP BY customer_id
+    """, [*case_params, as_of.isoformat(), *params]).rowcount
+    if not row:
+        return inserted, inserted + removed, "dirty", None
+    return inserted, inserted + removed, "full", row[0]
+
+
+def _dirty_chunk(conn, run: dict, as_of: date, chunk_size: int):
+    after = run["cursor"] or ""
+    ids = [cid for (cid,) in conn.execute(
+        "SELECT customer_id FROM aging_dirty WHERE customer_id > ? ORDER BY customer_id LIMIT ?",
+        (after, chunk_size))]
+    changed = refresh_customers(conn, ids, as_of) if ids else 0
+    conn.executemany("DELETE FROM aging_dirty WHERE customer_id = ?", [(cid,) for cid in ids])
+    if len(ids) < chunk_size:
+        return len(ids), changed, "crossings" if run["previous_date"] else "summary", None
+    return len(ids), changed, "dirty", ids[-1]
+
+
+def _crossings_chunk(conn, run: dict, as_of: date, chunk_size: int):
+    """
+    Una cuenta cambia de tramo el día en que as_of - oldest_due_date llega a un
+    umbral; entre la pasada anterior y la de hoy eso pasa exactamente para
+    oldest_due_date en (previous - umbral, as_of - umbral].
+    """
+    index, last_date, last_id = run["cursor"] or (0, "", "")
+    previous = date.fromisoformat(run["previous_date"])
+    threshold = BUCKET_THRESHOLDS[index]
+    low = (previous - timedelta(days=threshold)).isoformat()
+    high = (as_of - timedelta(days=threshold)).isoformat()
+    rows = conn.execute("""
+        SELECT customer_id, oldest_due_date FROM dpd_snapshot
+        WHERE oldest_due_date > ? AND oldest_due_date <= ? AND (oldest_due_date, customer_id) > (?, ?)
+        ORDER BY oldest_due_date, customer_id
+        LIMIT ?
+    """, (low, high, last_date, last_id, chunk_size)).fetchall()
+    changed = 0
+    if rows:
+        cur = conn.executemany(
+            "UPDATE dpd_snapshot SET bucket = ?, snapshot_date = ? WHERE customer_id = ? AND bucket != ?",
+            [(bucket, as_of.isoformat(), cid, bucket)
+             for cid, oldest in rows for bucket in (ledger.bucket_for(oldest, as_of),)])
+        changed = max(cur.rowcount, 0)
+    if len(rows) == chunk_size:
+        return len(rows), changed, "crossings", [index, rows[-1][1], rows[-1][0]]
+    if index + 1 < len(BUCKET_THRESHOLDS):
+        return len(rows), changed, "crossings", [index + 1, "", ""]
+    return len(rows), changed, "summary", None
+
+
+def _summary(conn, run: dict, as_of: date, chunk_size: int):
+    stamp = as_of.isoformat()
+    rows = []
+    for label in BUCKET_LABELS:
+        accounts, amount = conn.execute(
+            "SELECT COUNT(*), SUM(amount_due) FROM dpd_snapshot WHERE bucket = ?", (label,)).fetchone()
+        rows.append((stamp, label, accounts, round(amount or 0, 2)))
+    conn.executemany("""
+        INSERT OR REPLACE INTO dpd_bucket_daily (snapshot_date, bucket, accounts, amount_due)
+        VALUES (?, ?, ?, ?)
+    """, rows)
+    return 0, 0, "done", None
+
+
+PHASE_STEPS = {"full": _full_chunk, "dirty": _dirty_chunk, "crossings": _crossings_chunk, "summary": _summary}
+
+
+def _load_run(conn, row) -> dict:
+    run = dict(zip(RUN_COLUMNS, row))
+    run["cursor"] = json.loads(run["cursor"]) if run["cursor"] else None
+    return run
+
+
+def _start_run(conn, as_of: date | None, full: bool) -> tuple[dict, bool]:
+    """Devuelve (pasada, reanudada): la pasada sin terminar si existe, o una nueva."""
+    columns = ", ".join(RUN_COLUMNS)
+    pending = conn.execute(
+        f"SELECT {columns} FROM aging_runs WHERE finished_at IS NULL ORDER BY run_date DESC LIMIT 1").fetchone()
+    if pending and not full:
+        return _load_run(conn, pending), True
+
+    as_of = as_of or date.today()
+    last = conn.execute(
+        "SELECT run_date FROM aging_runs WHERE finished_at IS NOT NULL ORDER BY run_date DESC LIMIT 1").fetchone()
+    if last and as_of.isoformat() < last[0]:
+        raise ValueError(f"La fecha de corte {as_of} es anterior a la última pasada ({last[0]})")
+    previous = None if full or not last else last[0]
+    now = _now()
+    _begin(conn)
+    conn.execute("DELETE FROM aging_runs WHERE finished_at IS NULL")
+    conn.execute(f"""
+        INSERT OR REPLACE INTO aging_runs ({columns})
+        VALUES (?, ?, ?, NULL, 0, 0, ?, ?, NULL)
+    """, (as_of.isoformat(), previous, "dirty" if previous else "full", now, now))
+    conn.commit()
+    row = conn.execute(f"SELECT {columns} FROM aging_runs WHERE run_date = ?", (as_of.isoformat(),)).fetchone()
+    return _load_run(conn, row), False
+
+
+def run_aging(conn, as_of: date | None = None, chunk_size: int = DEFAULT_CHUNK_SIZE,
+              max_chunks: int | None = None, full: bool = False) -> dict:
+    """
+    Corre (o reanuda) la pasada del día `as_of` (hoy por defecto). Con
+    `max_chunks` se detiene tras ese número de bloques; la siguiente llamada
+    continúa desde el checkpoint. Devuelve el reporte de lo procesado.
+    """
+    started = time.perf_counter()
+    run, resumed = _start_run(conn, as_of, full)
+    as_of = date.fromisoformat(run["run_date"])
+    phases = {}
+    chunks = 0
+    while run["phase"] != "done" and (max_chunks is None or chunks < max_chunks):
+        phase = run["phase"]
+        try:
+            _begin(conn)
+            processed, changed, next_phase, cursor = PHASE_STEPS[phase](conn, run, as_of, chunk_size)
+            _checkpoint(conn, run["run_date"], next_phase, cursor, processed, changed)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        stats = phases.setdefault(phase, {"processed": 0, "changed": 0, "chunks": 0})
+        stats["processed"] += processed
+        stats["changed"] += changed
+        stats["chunks"] += 1
+        chunks += 1
+        run["phase"], run["cursor"] = next_phase, cursor
+
+    report = {
+        "run_date": run["run_date"],
+        "previous_date": run["previous_date"],
+        "resumed": resumed,
+        "finished": run["phase"] == "done",
+        "phase": run["phase"],
+        "chunks": chunks,
+        "phases": phases,
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+    if report["finished"]:
+        report["buckets"] = bucket_summary(conn, as_of)
+    return report
+
+
+def bucket_summary(conn, as_of: date | None = None) -> list[dict]:
+    """Resumen por tramo de la última pasada terminada (o de `as_of`)."""
+    if as_of is None:
+        row = conn.execute("SELECT MAX(snapshot_date) FROM dpd_bucket_daily").fetchone()
+        if not row or not row[0]:
+            return []
+        stamp = row[0]
+    else:
+        stamp = as_of.isoformat()
+    rows = conn.execute("""
+        SELECT bucket, accounts, amount_due FROM dpd_bucket_daily WHERE snapshot_date = ?
+    """, (stamp,)).fetchall()
+    totals = {bucket: (accounts, amount) for bucket, accounts, amount in rows}
+    return [{"bucket": label, "accounts": totals.get(label, (0, 0))[0],
+             "amount_due": totals.get(label, (0, 0))[1], "snapshot_date": stamp}
+            for label in BUCKET_LABELS if label in totals]
+
+
+def aging_status(conn) -> dict:
+    columns = ", ".join(RUN_COLUMNS)
+    row = conn.execute(f"SELECT {columns} FROM aging_runs ORDER BY run_date DESC LIMIT 1").fetchone()
+    return {
+        "last_run": _load_run(conn, row) if row else None,
+        "pending_customers": conn.execute("SELECT COUNT(*) FROM aging_dirty").fetchone()[0],
+        "buckets": bucket_summary(conn),
+    }
+
+
+def main(argv=None) -> int:
+    from db_pool import ConnectionPool
+    from migrations import migrate
+
+    parser = argparse.ArgumentParser(description="Envejecimiento incremental de dpd y foto de cartera")
+    parser.add_argument("command", choices=["run", "status"])
+    parser.add_argument("--db", default="agente_cobranza.db")
+    parser.add_argument("--as-of", type=date.fromisoformat, help="Fecha de corte AAAA-MM-DD (default: hoy)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--max-chunks", type=int, help="Detenerse tras N bloques (se reanuda después)")
+    parser.add_argument("--full", action="store_true", help="Reconstruir la foto completa")
+    args = parser.parse_args(argv)
+
+    pool = ConnectionPool(args.db, size=1)
+    conn = pool.acquire()
+    try:
+        migrate(conn)
+        if args.command == "status":
+            report = aging_status(conn)
+        else:
+            report = run_aging(conn, args.as_of, args.chunk_size, args.max_chunks, args.full)
+        json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+        sys.stdout.write("\n")
+        return 0
+    finally:
+        conn.close()
+        pool.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
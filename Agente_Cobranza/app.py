@@ -1,9 +1,41 @@
-from flask import Flask, request, jsonify, abort
+from flask import Flask, request, jsonify, abort, Response, g
 import sqlite3
 from uuid import uuid4
-from datetime import datetime
+from datetime import datetime, date
 import json
+import io
 from abc import ABC, abstractmethod
+import os
+import threading
+import time
+import hashlib
+import functools
+import atexit
+from urllib.parse import parse_qs
+
+from werkzeug.exceptions import HTTPException
+
+from db_pool import ConnectionPool
+from migrations import PAYMENT_METHOD_CHANGES_KEPT, migrate, prune_payment_method_changes
+import bulk
+import reconciliation
+import ledger
+import aging
+import offer_cache
+import customer_search
+import decision_log
+from compression import ResponseCompressor
+from fast_json import FastJSONProvider, dumps_row, parse_raw_json
+from auth import AuthError, KeyRing, TokenVerifier, token_scopes
+from admission import AdmissionController, AdmissionMiddleware, ConcurrencyLimiter, parse_rate, parse_rates
+from method_cache import PaymentMethodCache
+from singleflight import SingleFlight
+import metrics
+from metrics import stage
+from rules_engine import RuleRegistry
+from speech_templates import SpeechRegistry
+from portfolio_store import PortfolioStore
+from payment_pipeline import PaymentPipeline, PipelineRunner, SimulatedGateway, IdempotencyConflict
 
 
 # ---------------------------------------------------------------------
@@ -27,11 +59,120 @@ def before_request_func():
 # Configuración de la conexión a SQLite
 DB_PATH = "agente_cobranza.db"
 
+# Serialización JSON (ver fast_json.py): "auto" usa orjson si está instalado
+JSON_ENCODER = os.environ.get("AGENTE_JSON_ENCODER", "auto")
+app.json = FastJSONProvider(app, encoder=JSON_ENCODER)
+
+# Compresión gzip/br negociada por Accept-Encoding (ver compression.py)
+COMPRESS_ENABLED = os.environ.get("AGENTE_COMPRESS_ENABLED", "1") == "1"
+COMPRESS_MIN_BYTES = int(os.environ.get("AGENTE_COMPRESS_MIN_BYTES", "1024"))
+COMPRESS_GZIP_LEVEL = int(os.environ.get("AGENTE_COMPRESS_GZIP_LEVEL", "6"))
+COMPRESS_BROTLI_QUALITY = int(os.environ.get("AGENTE_COMPRESS_BROTLI_QUALITY", "4"))
+
+response_compressor = ResponseCompressor(min_size=COMPRESS_MIN_BYTES, gzip_level=COMPRESS_GZIP_LEVEL,
+                                         brotli_quality=COMPRESS_BROTLI_QUALITY)
+
+# Instrumentación (ver metrics.py): GET /metrics en formato Prometheus.
+# AGENTE_PROFILE_SLOW_MS activa el perfilador por muestreo para peticiones lentas.
+METRICS_ENABLED = os.environ.get("AGENTE_METRICS_ENABLED", "1") == "1"
+PROFILE_SLOW_MS = float(os.environ.get("AGENTE_PROFILE_SLOW_MS", "0"))
+
+metrics.registry.enabled = METRICS_ENABLED
+slow_sampler = None
+if METRICS_ENABLED and PROFILE_SLOW_MS > 0:
+    slow_sampler = metrics.SlowRequestSampler(threshold=PROFILE_SLOW_MS / 1000)
+    slow_sampler.start()
+
+# Pool de conexiones (ver db_pool.py); configurable por variables de entorno
+DB_POOL_SIZE = int(os.environ.get("AGENTE_DB_POOL_SIZE", "8"))
+DB_POOL_TIMEOUT = float(os.environ.get("AGENTE_DB_POOL_TIMEOUT", "30"))
+DB_BUSY_TIMEOUT_MS = int(os.environ.get("AGENTE_DB_BUSY_TIMEOUT_MS", "5000"))
+DB_MMAP_SIZE = int(os.environ.get("AGENTE_DB_MMAP_SIZE", str(256 * 1024 * 1024)))
+# Conexiones de sólo lectura (workers de campaign.py)
+DB_READ_ONLY = os.environ.get("AGENTE_DB_READ_ONLY", "0") == "1"
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool() -> ConnectionPool:
+    """Devuelve el pool de DB_PATH (lo recrea si cambió DB_PATH o DB_READ_ONLY)."""
+    global _pool
+    pool = _pool
+    if pool is None or pool.db_path != DB_PATH or pool.read_only != DB_READ_ONLY:
+        with _pool_lock:
+            if _pool is None or _pool.db_path != DB_PATH or _pool.read_only != DB_READ_ONLY:
+                if _pool is not None:
+                    _pool.close()
+                _pool = ConnectionPool(
+                    DB_PATH, size=DB_POOL_SIZE, timeout=DB_POOL_TIMEOUT,
+                    busy_timeout_ms=DB_BUSY_TIMEOUT_MS, mmap_size=DB_MMAP_SIZE,
+                    query_observer=metrics.observe_sql if METRICS_ENABLED else None,
+                    read_only=DB_READ_ONLY
+                )
+            pool = _pool
+    return pool
+
 def get_connection():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = None  # usamos cursor.description para mapear
-    conn.execute("PRAGMA foreign_keys = ON;")
-    return conn
+    """Presta una conexión del pool; `conn.close()` la devuelve al pool."""
+    with stage("db.acquire"):
+        return get_pool().acquire()
+
+# Caché de métodos de pago por cliente (ver method_cache.py); desactivada por defecto
+PM_CACHE_ENABLED = os.environ.get("AGENTE_PM_CACHE_ENABLED", "0") == "1"
+PM_CACHE_SIZE = int(os.environ.get("AGENTE_PM_CACHE_SIZE", "100000"))
+PM_CACHE_TTL = float(os.environ.get("AGENTE_PM_CACHE_TTL", "300"))
+# Cada cuánto se leen los cambios de otros workers / CLI (payment_method_changes)
+PM_CACHE_CHECK_INTERVAL = float(os.environ.get("AGENTE_PM_CACHE_CHECK_INTERVAL", "1"))
+
+def payment_method_changes(cursor):
+    """
+    Clientes con métodos cambiados desde `cursor` (ver PaymentMethodCache.changes).
+    El cursor es (epoch de la BD, último seq); None en la lista = vaciar todo.
+    """
+    conn = get_connection()
+    try:
+        row = conn.execute("""
+            SELECT (SELECT epoch FROM table_versions WHERE name = 'payment_methods'),
+                   (SELECT seq FROM sqlite_sequence WHERE name = 'payment_method_changes')
+        """).fetchone()
+        current = (row[0], row[1] or 0)
+        if cursor is None or cursor[0] != current[0] or current[1] < cursor[1] \
+                or current[1] - cursor[1] > PAYMENT_METHOD_CHANGES_KEPT:
+            return None, current
+        if current[1] == cursor[1]:
+            return [], current
+        rows = conn.execute(
+            "SELECT DISTINCT customer_id FROM payment_method_changes WHERE seq > ? AND seq <= ?",
+            (cursor[1], current[1])).fetchall()
+        return [r[0] for r in rows], current
+    finally:
+        conn.close()
+
+payment_method_cache = PaymentMethodCache(max_entries=PM_CACHE_SIZE, ttl_seconds=PM_CACHE_TTL,
+                                          changes=payment_method_changes,
+                                          check_interval=PM_CACHE_CHECK_INTERVAL,
+                                          dumps=app.json.dumps, loads=app.json.loads)
+
+# Autenticación (ver auth.py). AGENTE_AUTH_MODE: "jwt" valida firma y claims,
+# "demo" sólo exige el prefijo Bearer, "auto" usa jwt si hay llaves configuradas.
+AUTH_MODE = os.environ.get("AGENTE_AUTH_MODE", "auto")
+AUTH_KEYS_FILE = os.environ.get("AGENTE_AUTH_KEYS_FILE")
+AUTH_SECRET = os.environ.get("AGENTE_AUTH_SECRET")
+AUTH_ALGORITHM = os.environ.get("AGENTE_AUTH_ALGORITHM", "HS256")
+AUTH_ISSUER = os.environ.get("AGENTE_AUTH_ISSUER")
+AUTH_AUDIENCE = os.environ.get("AGENTE_AUTH_AUDIENCE")
+AUTH_LEEWAY = float(os.environ.get("AGENTE_AUTH_LEEWAY", "30"))
+AUTH_CACHE_SIZE = int(os.environ.get("AGENTE_AUTH_CACHE_SIZE", "100000"))
+AUTH_CACHE_TTL = float(os.environ.get("AGENTE_AUTH_CACHE_TTL", "300"))
+AUTH_CHECK_INTERVAL = float(os.environ.get("AGENTE_AUTH_CHECK_INTERVAL", "5"))
+
+auth_keyring = KeyRing(AUTH_KEYS_FILE, AUTH_SECRET, algorithm=AUTH_ALGORITHM,
+                       check_interval=AUTH_CHECK_INTERVAL)
+token_verifier = TokenVerifier(auth_keyring, max_entries=AUTH_CACHE_SIZE, max_ttl=AUTH_CACHE_TTL,
+                               leeway=AUTH_LEEWAY, issuer=AUTH_ISSUER, audience=AUTH_AUDIENCE)
+
+def jwt_auth_enabled() -> bool:
+    return AUTH_MODE == "jwt" or (AUTH_MODE == "auto" and auth_keyring.configured)
 
 # ---------------------------------------------------------------------
 # UTILIDADES
@@ -43,18 +184,236 @@ def dict_from_row(row, cursor):
     columns = [col[0] for col in cursor.description]
     return dict(zip(columns, row))
 
+def row_response(row: dict, status: int = 200):
+    """
+    Fila como JSON con `metadata` incrustado tal cual (ver fast_json.dumps_row).
+    En GET agrega un ETag débil del contenido y responde 304 si coincide con If-None-Match.
+    """
+    response = Response(dumps_row(row, app.json.dumps) + "\n", status=status, mimetype="application/json")
+    if request.method == "GET":
+        response.add_etag(weak=True)
+        response.headers["Cache-Control"] = "no-cache"
+        response.make_conditional(request)
+    return response
+
 def generate_error_response(code, message):
     return jsonify({
         "codigo": f"ERROR_{code}",
         "mensaje": message
     })
 
-def require_auth():
-    auth_header = request.headers.get('Authorization')
-    if not auth_header or not auth_header.startswith('Bearer '):
-        # 401: UnauthorizedError
-        abort(401, description="Acceso no autorizado. Falta el token de autenticación o es inválido.")
-    # Nota: En producción, validar el token JWT aquí
+def require_auth(scope: str | None = None):
+    """Valida el Bearer token; los claims verificados quedan en g.auth_claims."""
+    with stage("auth"):
+        auth_header = request.headers.get('Authorization')
+        if not auth_header or not auth_header.startswith('Bearer '):
+            # 401: UnauthorizedError
+            abort(401, description="Acceso no autorizado. Falta el token de autenticación o es inválido.")
+        if not jwt_auth_enabled():
+            g.auth_claims = None
+            return
+        try:
+            claims = token_verifier.verify(auth_header[7:].strip())
+        except AuthError as e:
+            metrics.auth_failures_total.inc(e.reason)
+            abort(401, description=f"Acceso no autorizado. {e}")
+        if scope and scope not in token_scopes(claims):
+            abort(403, description=f"El token no tiene el scope '{scope}'.")
+        g.auth_claims = claims
+
+def auth_required(scope=None):
+    """Decorador de rutas: @auth_required o @auth_required("admin")."""
+    if callable(scope):
+        return auth_required()(scope)
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            require_auth(scope)
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+# ---------------------------------------------------------------------
+# Listados: paginación keyset, filtros y streaming
+# ---------------------------------------------------------------------
+LIST_DEFAULT_LIMIT = 50
+LIST_MAX_LIMIT = 200
+
+def _parse_bool_param(value: str) -> int:
+    return 1 if value.lower() in ("1", "true", "yes", "si", "sí") else 0
+
+# parámetro de query -> (condición SQL, conversión del valor)
+CUSTOMER_LIST_FILTERS = {
+    "email": ("email = ?", str),
+    "created_from": ("created_at >= ?", str),
+    "created_to": ("created_at < ?", str),
+}
+PAYMENT_METHOD_LIST_FILTERS = {
+    "customer_id": ("customer_id = ?", str),
+    "type": ("type = ?", str),
+    "provider": ("provider = ?", str),
+    "is_default": ("is_default = ?", _parse_bool_param),
+    "created_from": ("created_at >= ?", str),
+    "created_to": ("created_at < ?", str),
+}
+DEBT_LIST_FILTERS = {
+    "customer_id": ("customer_id = ?", str),
+    "status": ("status = ?", str),
+    "due_from": ("due_date >= ?", str),
+    "due_to": ("due_date < ?", str),
+}
+PROMISE_LIST_FILTERS = {
+    "customer_id": ("customer_id = ?", str),
+    "debt_id": ("debt_id = ?", str),
+    "status": ("status = ?", str),
+    "promised_date": ("promised_date = ?", str),
+}
+PAYMENT_LIST_FILTERS = {
+    "customer_id": ("customer_id = ?", str),
+    "debt_id": ("debt_id = ?", str),
+    "status": ("status = ?", str),
+    "created_from": ("created_at >= ?", str),
+    "created_to": ("created_at < ?", str),
+}
+AUTO_DEBIT_LIST_FILTERS = {
+    "customer_id": ("customer_id = ?", str),
+    "debt_id": ("debt_id = ?", str),
+    "status": ("status = ?", str),
+    "next_run_to": ("next_run_date <= ?", str),
+}
+
+def build_list_query(table: str, filters: dict, args) -> tuple[str, list, int | None]:
+    """
+    Arma el SELECT de un listado a partir de los query params.
+    Ordena por id (PK) para paginar por keyset con `after=<último id>`;
+    `offset` se acepta por compatibilidad con la especificación.
+    Devuelve (sql, params, limit); limit es None si no se pidió paginación.
+    """
+    where, params = [], []
+    for key, (clause, convert) in filters.items():
+        value = args.get(key)
+        if value is not None and value != "":
+            where.append(clause)
+            params.append(convert(value))
+    after = args.get("after")
+    if after:
+        where.append("id > ?")
+        params.append(after)
+
+    sql = f"SELECT * FROM {table}"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY id"
+
+    limit = None
+    if "limit" in args or "offset" in args:
+        try:
+            limit = int(args.get("limit", LIST_DEFAULT_LIMIT))
+            offset = int(args.get("offset", 0))
+        except ValueError:
+            abort(400, description="limit y offset deben ser enteros")
+        if not 1 <= limit <= LIST_MAX_LIMIT or offset < 0:
+            abort(400, description=f"limit debe estar entre 1 y {LIST_MAX_LIMIT}; offset >= 0")
+        sql += " LIMIT ? OFFSET ?"
+        params.extend([limit, offset])
+    return sql, params, limit
+
+def iter_dict_rows(cursor, batch_size: int = 500):
+    """Genera dicts fila por fila sin materializar el resultado completo."""
+    columns = [col[0] for col in cursor.description]
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        for row in rows:
+            yield dict(zip(columns, row))
+
+def wants_ndjson() -> bool:
+    if request.args.get("format") == "ndjson":
+        return True
+    return request.accept_mimetypes.best == "application/x-ndjson"
+
+def table_version(table: str) -> tuple | None:
+    """(epoch, version) del contador de cambios de la tabla (migración 8)."""
+    conn = get_connection()
+    try:
+        return conn.execute("SELECT epoch, version FROM table_versions WHERE name = ?", (table,)).fetchone()
+    finally:
+        conn.close()
+
+def list_etag(table: str) -> str | None:
+    """
+    ETag débil del listado: contador de cambios de la tabla (migración 8) más
+    el query string y el formato. No corre el listado.
+    """
+    row = table_version(table)
+    if row is None:
+        return None
+    variant = hashlib.blake2b(request.query_string + (b"|ndjson" if wants_ndjson() else b""),
+                              digest_size=6).hexdigest()
+    return f"{table}-{row[0]}-{row[1]}-{variant}"
+
+def with_list_etag(response, etag: str | None):
+    if etag is not None:
+        response.set_etag(etag, weak=True)
+        response.headers["Cache-Control"] = "no-cache"
+    return response
+
+def list_response(table: str, filters: dict):
+    """
+    Respuesta de listado:
+      - con limit/offset: una página (arreglo JSON) y el cursor siguiente en el
+        header `X-Next-After` cuando la página viene llena;
+      - sin paginación: arreglo JSON o NDJSON (`format=ndjson`) transmitido
+        directamente desde el cursor, con memoria constante.
+    Lleva ETag; un If-None-Match vigente responde 304 sin tocar la tabla.
+    """
+    sql, params, limit = build_list_query(table, filters, request.args)
+    dumps = app.json.dumps
+    etag = list_etag(table)
+    if etag is not None and request.if_none_match.contains_weak(etag):
+        return with_list_etag(Response(status=304), etag)
+
+    if limit is not None:
+        conn = get_connection()
+        try:
+            cursor = conn.execute(sql, params)
+            data = list(iter_dict_rows(cursor))
+        finally:
+            conn.close()
+        if wants_ndjson():
+            response = Response("".join(dumps_row(r, dumps) + "\n" for r in data),
+                                mimetype="application/x-ndjson")
+        else:
+            response = Response("[" + ",".join(dumps_row(r, dumps) for r in data) + "]\n",
+                                mimetype="application/json")
+        if len(data) == limit:
+            response.headers["X-Next-After"] = data[-1]["id"]
+        return with_list_etag(response, etag), 200
+
+    ndjson = wants_ndjson()
+
+    def generate():
+        # La conexión se devuelve al pool al terminar (o al abortar) el stream
+        conn = get_connection()
+        try:
+            cursor = conn.execute(sql, params)
+            if ndjson:
+                for row in iter_dict_rows(cursor):
+                    yield dumps_row(row, dumps) + "\n"
+                return
+            yield "["
+            first = True
+            for row in iter_dict_rows(cursor):
+                yield dumps_row(row, dumps) if first else "," + dumps_row(row, dumps)
+                first = False
+            yield "]"
+        finally:
+            conn.close()
+
+    mimetype = "application/x-ndjson" if ndjson else "application/json"
+    return with_list_etag(Response(generate(), mimetype=mimetype), etag), 200
 
 # ---------------------------------------------------------------------
 # CORS y Manejo de errores JSON
@@ -64,61 +423,194 @@ def add_cors_headers(response):
     origin = request.headers.get("Origin", "*")
     # Permitir desde localhost por defecto
     response.headers["Access-Control-Allow-Origin"] = origin if origin else "*"
-    response.headers["Vary"] = "Origin"
+    response.vary.add("Origin")
     response.headers["Access-Control-Allow-Credentials"] = "true"
     response.headers["Access-Control-Allow-Headers"] = "Authorization, Content-Type"
     response.headers["Access-Control-Allow-Methods"] = "GET, POST, PUT, PATCH, DELETE, OPTIONS"
     return response
 
+@app.before_request
+def start_request_timer():
+    if METRICS_ENABLED:
+        g.request_start = time.perf_counter()
+        if slow_sampler is not None:
+            slow_sampler.begin(request.url_rule.rule if request.url_rule else "unmatched")
+
+@app.after_request
+def record_request_metrics(response):
+    start = g.get("request_start")
+    if start is not None:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        metrics.http_request_seconds.observe(time.perf_counter() - start, route, request.method)
+        metrics.http_requests_total.inc(route, request.method, str(response.status_code))
+        if slow_sampler is not None:
+            slow_sampler.end()
+    return response
+
+@app.after_request
+def compress_response(response):
+    if COMPRESS_ENABLED:
+        return response_compressor.compress(response, request)
+    return response
+
+# ---------------------------------------------------------------------
+# Control de admisión (ver admission.py): límites por token y por canal,
+# prioridad critical (IVR) > normal > bulk y rechazo rápido con 429/503
+# ---------------------------------------------------------------------
+ADMISSION_ENABLED = os.environ.get("AGENTE_ADMISSION_ENABLED", "1") == "1"
+ADMISSION_MAX_CONCURRENCY = int(os.environ.get("AGENTE_ADMISSION_MAX_CONCURRENCY", "4"))
+ADMISSION_RESERVED = int(os.environ.get("AGENTE_ADMISSION_RESERVED", "1"))
+ADMISSION_BULK_CONCURRENCY = int(os.environ.get("AGENTE_ADMISSION_BULK_CONCURRENCY", "1"))
+ADMISSION_MAX_QUEUE = int(os.environ.get("AGENTE_ADMISSION_MAX_QUEUE", "256"))
+ADMISSION_QUEUE_TIMEOUTS_MS = {
+    "critical": 2000, "normal": 1000, "bulk": 30000,
+    **{cls: float(ms) for cls, _, ms in (
+        item.partition("=") for item in os.environ.get("AGENTE_ADMISSION_QUEUE_TIMEOUTS_MS", "").split(",")
+    ) if cls.strip() and ms}
+}
+ADMISSION_CRITICAL_CHANNELS = {
+    c.strip().lower() for c in os.environ.get("AGENTE_ADMISSION_CRITICAL_CHANNELS", "ivr,voice").split(",") if c.strip()
+}
+# "ivr=<token>,voice=<token>": tokens de integración cuyo canal se da por bueno
+# (se guarda el sha256 del token, no el token)
+ADMISSION_CHANNEL_TOKENS = {
+    hashlib.sha256(token.strip().encode("utf-8")).digest(): channel.strip().lower()
+    for channel, _, token in (
+        item.partition("=") for item in os.environ.get("AGENTE_ADMISSION_CHANNEL_TOKENS", "").split(",")
+    ) if channel.strip() and token.strip()
+}
+# "50/100" = 50 peticiones/s por token con ráfaga de 100; "whatsapp=100/200,sms=50" por canal
+RATE_LIMIT_TOKEN = parse_rate(os.environ.get("AGENTE_RATE_LIMIT_TOKEN"))
+RATE_LIMIT_CHANNELS = parse_rates(os.environ.get("AGENTE_RATE_LIMIT_CHANNELS"))
+RATE_LIMIT_MAX_KEYS = int(os.environ.get("AGENTE_RATE_LIMIT_MAX_KEYS", "100000"))
+
+# Rutas de lotes y archivos: esperan su turno detrás de las interactivas
+BULK_ROUTES = {
+    "/agent/decisions:batch", "/agent/decisions:precompute", "/speech:render",
+    "/customers:import", "/payment_methods:import", "/customers:export", "/payment_methods:export",
+    "/references:reconcile", "/admin/aging/run", "/decision_events",
+}
+# Siempre admitidas: el monitoreo debe responder justo cuando hay saturación
+ADMISSION_EXEMPT_ROUTES = {"/metrics", "/admin/admission"}
+CHANNEL_BODY_MAX_BYTES = 64 * 1024
+
+admission_controller = AdmissionController(
+    ConcurrencyLimiter(ADMISSION_MAX_CONCURRENCY, reserved=ADMISSION_RESERVED,
+                       bulk_limit=ADMISSION_BULK_CONCURRENCY, max_queue=ADMISSION_MAX_QUEUE),
+    {cls: ms / 1000 for cls, ms in ADMISSION_QUEUE_TIMEOUTS_MS.items()},
+    token_rate=RATE_LIMIT_TOKEN, channel_rates=RATE_LIMIT_CHANNELS, max_keys=RATE_LIMIT_MAX_KEYS,
+    on_result=metrics.admission_total.inc, on_wait=lambda cls, s: metrics.admission_wait_seconds.observe(s, cls)
+)
+
+def request_channel(environ, path: str) -> str | None:
+    """Canal de la petición: header X-Channel, ?channel= o `channel` del cuerpo JSON (si es chico)."""
+    channel = environ.get("HTTP_X_CHANNEL")
+    if not channel and "channel=" in environ.get("QUERY_STRING", ""):
+        channel = parse_qs(environ["QUERY_STRING"]).get("channel", [None])[0]
+    if not channel and path not in BULK_ROUTES and environ["REQUEST_METHOD"] in ("POST", "PUT", "PATCH") \
+            and environ.get("CONTENT_TYPE", "").startswith("application/json"):
+        try:
+            length = int(environ.get("CONTENT_LENGTH") or 0)
+        except ValueError:
+            length = 0
+        if 0 < length <= CHANNEL_BODY_MAX_BYTES:
+            # Se lee el cuerpo una vez y se le devuelve a Flask intacto
+            data = environ["wsgi.input"].read(length)
+            environ["wsgi.input"] = io.BytesIO(data)
+            try:
+                body = app.json.loads(data)
+            except ValueError:
+                body = None
+            channel = body.get("channel") if isinstance(body, dict) else None
+    return channel.strip().lower() if isinstance(channel, str) and channel.strip() else None
+
+def token_channel(auth_header: str | None) -> str | None:
+    """
+    Canal atado al token: el de AGENTE_ADMISSION_CHANNEL_TOKENS o el claim
+    `channel` de un JWT válido. None si el token no declara canal.
+    """
+    if not auth_header or not auth_header.startswith("Bearer "):
+        return None
+    bearer = auth_header[7:].strip()
+    if ADMISSION_CHANNEL_TOKENS:
+        channel = ADMISSION_CHANNEL_TOKENS.get(hashlib.sha256(bearer.encode("utf-8", "surrogatepass")).digest())
+        if channel is not None:
+            return channel
+    if bearer.count(".") == 2 and jwt_auth_enabled():
+        try:
+            channel = token_verifier.verify(bearer).get("channel")
+        except AuthError:
+            return None  # require_auth responde el 401
+        if isinstance(channel, str) and channel.strip():
+            return channel.strip().lower()
+    return None
+
+def classify_request(environ) -> tuple | None:
+    """
+    (clase, llave del token, canal) para AdmissionMiddleware; None si la ruta no pasa por admisión.
+    Sólo un canal atado al token (token_channel) da la clase critical; el que
+    declara el cliente cuenta para los límites por canal, nada más.
+    """
+    path = environ.get("PATH_INFO", "")
+    if environ["REQUEST_METHOD"] == "OPTIONS" or path in ADMISSION_EXEMPT_ROUTES:
+        return None
+    auth_header = environ.get("HTTP_AUTHORIZATION")
+    channel = token_channel(auth_header)
+    trusted = channel is not None
+    if not trusted:
+        channel = request_channel(environ, path)
+    if path in BULK_ROUTES:
+        cls = "bulk"
+    elif trusted and channel in ADMISSION_CRITICAL_CHANNELS:
+        cls = "critical"
+    else:
+        cls = "normal"
+    token = hashlib.sha256(auth_header.encode("utf-8", "surrogatepass")).digest() \
+        if auth_header and RATE_LIMIT_TOKEN else None
+    return cls, token, channel
+
+def admission_reject_headers(environ) -> list[tuple[str, str]]:
+    # Mismos headers CORS que add_cors_headers: el frontend debe poder leer el 429/503
+    return [("Access-Control-Allow-Origin", environ.get("HTTP_ORIGIN") or "*"), ("Vary", "Origin"),
+            ("Access-Control-Allow-Credentials", "true")]
+
+if ADMISSION_ENABLED:
+    app.wsgi_app = AdmissionMiddleware(app.wsgi_app, admission_controller, classify_request,
+                                       reject_headers=admission_reject_headers)
+
 @app.errorhandler(400)
 def handle_400(e):
+    metrics.http_errors_total.inc("400")
     return jsonify({"codigo": "ERROR_400", "mensaje": str(e)}), 400
 
 @app.errorhandler(401)
 def handle_401(e):
+    metrics.http_errors_total.inc("401")
     return jsonify({"codigo": "ERROR_401", "mensaje": str(e)}), 401
 
+@app.errorhandler(403)
+def handle_403(e):
+    metrics.http_errors_total.inc("403")
+    return jsonify({"codigo": "ERROR_403", "mensaje": str(e)}), 403
+
 @app.errorhandler(404)
 def handle_404(e):
+    metrics.http_errors_total.inc("404")
     return jsonify({"codigo": "ERROR_404", "mensaje": str(e)}), 404
 
 @app.errorhandler(500)
 def handle_500(e):
+    metrics.http_errors_total.inc("500")
     return jsonify({"codigo": "ERROR_500", "mensaje": "Error interno del servidor"}), 500
 
 # ---------------------------------------------------------------------
 # Inicialización de esquema (SQLite)
 # ---------------------------------------------------------------------
 def init_db():
-    schema = """
-    CREATE TABLE IF NOT EXISTS customers (
-        id TEXT PRIMARY KEY,
-        name TEXT NOT NULL,
-        email TEXT NOT NULL,
-        phone TEXT,
-        created_at TEXT DEFAULT (datetime('now')),
-        metadata TEXT
-    );
-
-    CREATE TABLE IF NOT EXISTS payment_methods (
-        id TEXT PRIMARY KEY,
-        customer_id TEXT NOT NULL,
-        type TEXT NOT NULL,
-        provider TEXT,
-        token TEXT NOT NULL,
-        last4 TEXT,
-        expiry_month INTEGER,
-        expiry_year INTEGER,
-        is_default INTEGER DEFAULT 0,
-        created_at TEXT DEFAULT (datetime('now')),
-        metadata TEXT,
-        FOREIGN KEY(customer_id) REFERENCES customers(id) ON DELETE CASCADE
-    );
-    """
+    """Crea o actualiza el esquema aplicando las migraciones pendientes (migrations.py)."""
     conn = get_connection()
     try:
-        conn.executescript(schema)
-        conn.commit()
+        migrate(conn)
     finally:
         conn.close()
 # ---------- Payment Strategy ----------
@@ -187,6 +679,121 @@ def select_payment_strategy(method: str) -> PaymentStrategy:
         raise ValueError(f"Método de pago no soportado: {method}")
     return strategy
 
+# Ejecución de rutas (ver payment_pipeline.py): los pasos corren contra el gateway
+# simulado, con latencia y fallos configurables, y un límite de concurrencia por
+# proveedor (AGENTE_GATEWAY_PROVIDER_LIMITS="stripe=16,oxxo_pay=8").
+GATEWAY_LATENCY_MS = float(os.environ.get("AGENTE_GATEWAY_LATENCY_MS", "20"))
+GATEWAY_FAILURE_RATE = float(os.environ.get("AGENTE_GATEWAY_FAILURE_RATE", "0"))
+GATEWAY_DECLINE_RATE = float(os.environ.get("AGENTE_GATEWAY_DECLINE_RATE", "0"))
+GATEWAY_CONCURRENCY = int(os.environ.get("AGENTE_GATEWAY_CONCURRENCY", "32"))
+GATEWAY_PROVIDER_LIMITS = {
+    provider.strip(): int(limit)
+    for provider, _, limit in (
+        item.partition("=") for item in os.environ.get("AGENTE_GATEWAY_PROVIDER_LIMITS", "").split(",")
+    )
+    if provider.strip() and limit
+}
+GATEWAY_MAX_ATTEMPTS = int(os.environ.get("AGENTE_GATEWAY_MAX_ATTEMPTS", "3"))
+PAYMENT_EXECUTION_TIMEOUT = float(os.environ.get("AGENTE_PAYMENT_EXECUTION_TIMEOUT", "30"))
+# Una llave "in_progress" más vieja que esto se considera abandonada y se puede reclamar
+PAYMENT_CLAIM_TTL = int(os.environ.get("AGENTE_PAYMENT_CLAIM_TTL", "300"))
+
+payment_gateway = SimulatedGateway(
+    latency_ms=GATEWAY_LATENCY_MS,
+    failure_rate=GATEWAY_FAILURE_RATE,
+    decline_rate=GATEWAY_DECLINE_RATE
+)
+payment_pipeline = PaymentPipeline(
+    payment_gateway,
+    default_limit=GATEWAY_CONCURRENCY,
+    provider_limits=GATEWAY_PROVIDER_LIMITS,
+    max_attempts=GATEWAY_MAX_ATTEMPTS
+)
+payment_runner = PipelineRunner(payment_pipeline)
+
+def payment_fingerprint(data: dict) -> str:
+    return ledger.request_fingerprint(data)
+
+def claim_idempotency_key(key: str, fingerprint: str) -> dict | None:
+    """
+    Reclama la llave en payment_executions. Devuelve None si hay que ejecutar
+    o el resultado guardado si la llave ya terminó; lanza IdempotencyConflict
+    si la llave se usó con otro payload o sigue en curso.
+    """
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT OR IGNORE INTO payment_executions (idempotency_key, fingerprint, status)
+            VALUES (?, ?, 'in_progress')
+        """, (key, fingerprint))
+        if cursor.rowcount == 0:
+            cursor.execute("""
+                UPDATE payment_executions SET updated_at = datetime('now')
+                WHERE idempotency_key = ? AND fingerprint = ? AND status = 'in_progress'
+                  AND updated_at < datetime('now', ?)
+            """, (key, fingerprint, f"-{PAYMENT_CLAIM_TTL} seconds"))
+        if cursor.rowcount == 1:
+            conn.commit()
+            return None
+
+        cursor.execute("""
+            SELECT fingerprint, status, result, updated_at FROM payment_executions WHERE idempotency_key = ?
+        """, (key,))
+        row = cursor.fetchone()
+        if row is None or row[1] == "in_progress":
+            raise IdempotencyConflict("Ya hay una ejecución en curso con esta Idempotency-Key")
+        if row[0] != fingerprint:
+            raise IdempotencyConflict("La Idempotency-Key ya se usó con otro payload")
+        return json.loads(row[2])
+    finally:
+        conn.close()
+
+def issue_cash_reference(route: dict, data: dict, idempotency_key: str | None = None) -> dict:
+    customer_id = data.get("customer_id") or (data.get("metadata") or {}).get("customer_id")
+    conn = get_connection()
+    try:
+        return reconciliation.issue_reference(
+            conn, customer_id, route["amount"],
+            currency=route.get("currency") or "MXN",
+            provider=route.get("routed_to") or "oxxo_pay",
+            hours=route.get("reference_expires_in_hours", reconciliation.REFERENCE_HOURS),
+            idempotency_key=idempotency_key
+        )
+    finally:
+        conn.close()
+
+def execute_payment_route(route: dict, data: dict, idempotency_key: str) -> tuple[dict, bool]:
+    """Ejecuta la ruta una sola vez por llave; devuelve (ejecución, es_repetición)."""
+    stored = claim_idempotency_key(idempotency_key, payment_fingerprint(data))
+    if stored is not None:
+        return stored, True
+
+    execution = None
+    try:
+        with stage("payment_pipeline"):
+            execution = payment_runner.execute(route, idempotency_key, timeout=PAYMENT_EXECUTION_TIMEOUT)
+        metrics.payment_executions_total.inc(execution["provider"], execution["status"])
+        if route["method"] == "corresponsal" and execution["status"] == "pending":
+            # La referencia queda abierta hasta que la concilie el archivo de liquidación
+            execution["reference"] = issue_cash_reference(route, data, idempotency_key)
+    finally:
+        conn = get_connection()
+        try:
+            if execution is not None and execution["status"] != "failed":
+                conn.execute("""
+                    UPDATE payment_executions SET status = ?, result = ?, updated_at = datetime('now')
+                    WHERE idempotency_key = ?
+                """, (execution["status"], json.dumps(execution), idempotency_key))
+            else:
+                # Fallo transitorio o timeout: se libera la llave para que el cliente
+                # reintente; el gateway repite las mismas llaves por paso, no cobra dos veces.
+                conn.execute("DELETE FROM payment_executions WHERE idempotency_key = ?", (idempotency_key,))
+            conn.commit()
+        finally:
+            conn.close()
+    return execution, False
+
 
 # ---------- Negotiation Strategy ----------
 class NegotiationStrategy(ABC):
@@ -249,11 +856,42 @@ NEGOTIATION_STRATEGIES = {
     "hybrid": HybridStrategy(),
 }
 
+# Rule sets por campaña / brazo A/B (ver rules_engine.py); se recargan en caliente
+RULES_DIR = os.environ.get(
+    "AGENTE_RULES_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "rules"))
+RULES_CHECK_INTERVAL = float(os.environ.get("AGENTE_RULES_CHECK_INTERVAL", "5"))
+
+rules_registry = RuleRegistry(RULES_DIR, check_interval=RULES_CHECK_INTERVAL)
+rules_registry.reload()
+
+# Plantillas de speech por táctica / canal / locale (ver speech_templates.py)
+SPEECH_DIR = os.environ.get(
+    "AGENTE_SPEECH_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "speech"))
+SPEECH_CHECK_INTERVAL = float(os.environ.get("AGENTE_SPEECH_CHECK_INTERVAL", "5"))
+
+speech_registry = SpeechRegistry(SPEECH_DIR, check_interval=SPEECH_CHECK_INTERVAL)
+speech_registry.reload()
+
+def evaluate_ruleset(name: str, segmento: str, contexto: dict) -> tuple[str, str]:
+    """Táctica y brazo A/B del rule set `name` para el contexto dado."""
+    rules_registry.maybe_reload()
+    return rules_registry.get(name).evaluate(
+        segmento,
+        int(contexto.get("dpd", 0)),
+        float(contexto.get("propension_pago", 0.5)),
+        contexto.get("customer_id")
+    )
+
 def select_negotiation_strategy(segmento: str, contexto: dict) -> NegotiationStrategy:
     """
     Selector simple por segmento/campaña.
-    Puedes sofisticarlo con reglas, AB testing o tabla de configuración.
+    Si el contexto trae `ruleset`, la táctica sale de ese rule set compilado
+    (rules_engine.py); si no, se usan las reglas fijas de abajo.
     """
+    if contexto.get("ruleset"):
+        tactic, _ = evaluate_ruleset(contexto["ruleset"], segmento, contexto)
+        return NEGOTIATION_STRATEGIES[tactic]
+
     seg = (segmento or "").lower()
     dpd = int(contexto.get("dpd", 0))
     score = float(contexto.get("propension_pago", 0.5))
@@ -279,27 +917,19 @@ def select_negotiation_strategy(segmento: str, contexto: dict) -> NegotiationStr
 
 # ✅ GET -> Retribuir todos los metodos de pago existentes 
 @app.route("/payment_methods", methods=["GET"])
+@auth_required
 def get_payment_methods():
-    require_auth()
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM payment_methods;")
-        rows = cursor.fetchall()
-        data = [dict_from_row(r, cursor) for r in rows]
-        return jsonify(data), 200
+        return list_response("payment_methods", PAYMENT_METHOD_LIST_FILTERS)
+    except HTTPException:
+        raise
     except Exception as e:
         return jsonify({"error": str(e)}), 500
-    finally:
-        try:
-            cursor.close()
-        finally:
-            conn.close()
 
 # ✅ GET -> Retribuir un metodo de pago en especifico 
 @app.route("/payment_methods/<string:method_id>", methods=["GET"])
+@auth_required
 def get_payment_method(method_id):
-    require_auth()
     try:
         conn = get_connection()
         cursor = conn.cursor()
@@ -307,7 +937,7 @@ def get_payment_method(method_id):
         row = cursor.fetchone()
         if not row:
             return generate_error_response(404, f"No se encontro el registro {method_id}")
-        return jsonify(dict_from_row(row, cursor)), 200
+        return row_response(dict_from_row(row, cursor))
     except Exception as e:
         return jsonify({"error": str(e)}), 500
     finally:
@@ -318,8 +948,8 @@ def get_payment_method(method_id):
 
 # ✅ POST -> Crear un nuevo metodo de pago
 @app.route("/payment_methods", methods=["POST"])
+@auth_required
 def create_payment_method():
-    require_auth()
     data = request.get_json()
 
     required_fields = ["customer_id", "type", "token"]
@@ -350,11 +980,16 @@ def create_payment_method():
             datetime.utcnow().isoformat(),
             metadata
         ))
+        prune_payment_method_changes(conn)
         conn.commit()
+        # En la misma conexión y después del commit: la hora de la invalidación
+        # queda después de la escritura, como exige store_many()
+        offer_cache.invalidate(conn, data["customer_id"])
+        payment_method_cache.invalidate(data["customer_id"])
 
         cursor.execute("SELECT * FROM payment_methods WHERE id = ?;", (new_id,))
         row = cursor.fetchone()
-        return jsonify(dict_from_row(row, cursor)), 201
+        return row_response(dict_from_row(row, cursor), 201)
     except Exception as e:
         conn.rollback()
         return jsonify({"error": str(e)}), 500
@@ -366,8 +1001,8 @@ def create_payment_method():
 
 # ✅ PUT -> Actualizar un metodo de pago
 @app.route("/payment_methods/<string:method_id>", methods=["PUT"])
+@auth_required
 def update_payment_method(method_id):
-    require_auth()
     data = request.get_json()
 
     try:
@@ -375,8 +1010,9 @@ def update_payment_method(method_id):
         cursor = conn.cursor()
 
         # Comprobar si existe
-        cursor.execute("SELECT id FROM payment_methods WHERE id = ?;", (method_id,))
-        if not cursor.fetchone():
+        cursor.execute("SELECT customer_id FROM payment_methods WHERE id = ?;", (method_id,))
+        existing = cursor.fetchone()
+        if not existing:
             return generate_error_response(404, f"No se encontro el método de pago con ID {method_id}")
 
         fields = []
@@ -400,11 +1036,15 @@ def update_payment_method(method_id):
         query = f"UPDATE payment_methods SET {', '.join(fields)} WHERE id = ?"
         values.append(method_id)
         cursor.execute(query, tuple(values))
+        prune_payment_method_changes(conn)
         conn.commit()
+        # Si cambió de cliente, ambas listas quedan desactualizadas
+        offer_cache.invalidate(conn, existing[0], data.get("customer_id"))
+        payment_method_cache.invalidate(existing[0], data.get("customer_id"))
 
         cursor.execute("SELECT * FROM payment_methods WHERE id = ?;", (method_id,))
         row = cursor.fetchone()
-        return jsonify(dict_from_row(row, cursor)), 200
+        return row_response(dict_from_row(row, cursor))
     except Exception as e:
         conn.rollback()
         return jsonify({"error": str(e)}), 500
@@ -416,17 +1056,21 @@ def update_payment_method(method_id):
 
 # ✅ DELETE -> Eliminar un metodo de pago 
 @app.route("/payment_methods/<string:method_id>", methods=["DELETE"])
+@auth_required
 def delete_payment_method(method_id):
-    require_auth()
     try:
         conn = get_connection()
         cursor = conn.cursor()
-        cursor.execute("SELECT id FROM payment_methods WHERE id = ?;", (method_id,))
-        if not cursor.fetchone():
+        cursor.execute("SELECT customer_id FROM payment_methods WHERE id = ?;", (method_id,))
+        existing = cursor.fetchone()
+        if not existing:
             return generate_error_response(404, f"No se encontro el método de pago con ID {method_id}")
 
         cursor.execute("DELETE FROM payment_methods WHERE id = ?;", (method_id,))
+        prune_payment_method_changes(conn)
         conn.commit()
+        offer_cache.invalidate(conn, existing[0])
+        payment_method_cache.invalidate(existing[0])
         return jsonify({"message": "Metodo de pago eliminado"}), 200
     except Exception as e:
         conn.rollback()
@@ -444,30 +1088,58 @@ def delete_payment_method(method_id):
 
 # ✅ GET -> Obtener todos los clientes
 @app.route("/customers", methods=["GET"])
+@auth_required
 def get_customers():
-    require_auth()
-    conn = None
-    cursor = None
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM customers;")
-        rows = cursor.fetchall()
-        data = [dict_from_row(r, cursor) for r in rows]
-        return jsonify(data), 200
+        return list_response("customers", CUSTOMER_LIST_FILTERS)
+    except HTTPException:
+        raise
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# Búsqueda de clientes (customer_search.py). Con muchas coincidencias sólo se
+# ordenan las primeras SEARCH_MAX_CANDIDATES y la respuesta trae truncated: true.
+SEARCH_DEFAULT_LIMIT = 20
+SEARCH_MAX_LIMIT = 100
+SEARCH_MAX_CANDIDATES = int(os.environ.get("AGENTE_SEARCH_MAX_CANDIDATES", "200"))
+
+# GET /customers:search?q=...&mode=auto|text|email|phone&limit=&offset= -> Clientes por nombre, email o teléfono
+# (también ?email=... o ?phone=... para la búsqueda exacta)
+@app.route("/customers:search", methods=["GET"])
+@auth_required
+def search_customers():
+    args = request.args
+    mode = args.get("mode", "auto")
+    q = args.get("q")
+    for key in ("email", "phone"):
+        if args.get(key):
+            q, mode = args[key], key
+    try:
+        limit = int(args.get("limit", SEARCH_DEFAULT_LIMIT))
+        offset = int(args.get("offset", 0))
+    except ValueError:
+        return generate_error_response(400, "limit y offset deben ser enteros")
+    if not 1 <= limit <= SEARCH_MAX_LIMIT or offset < 0:
+        return generate_error_response(400, f"limit debe estar entre 1 y {SEARCH_MAX_LIMIT}; offset >= 0")
+
+    conn = get_connection()
+    try:
+        result = customer_search.search(conn, q, mode, limit, offset, SEARCH_MAX_CANDIDATES)
+    except customer_search.SearchError as se:
+        return generate_error_response(400, str(se))
     except Exception as e:
         return jsonify({"error": str(e)}), 500
     finally:
-        try:
-            if cursor: cursor.close()
-        finally:
-            if conn:
-                conn.close()
+        conn.close()
+    dumps = app.json.dumps
+    rows = result.pop("results")
+    body = dumps(result)[:-1] + ',"results":[' + ",".join(dumps_row(r, dumps) for r in rows) + "]}"
+    return Response(body, mimetype="application/json"), 200
 
 # ✅ GET -> Obtener un cliente específico
 @app.route("/customers/<string:customer_id>", methods=["GET"])
+@auth_required
 def get_customer(customer_id):
-    require_auth()
     try:
         conn = get_connection()
         cursor = conn.cursor()
@@ -475,7 +1147,7 @@ def get_customer(customer_id):
         row = cursor.fetchone()
         if not row:
             return generate_error_response(404, f"No se encontró el cliente {customer_id}")
-        return jsonify(dict_from_row(row, cursor)), 200
+        return row_response(dict_from_row(row, cursor))
     except Exception as e:
         return jsonify({"error": str(e)}), 500
     finally:
@@ -487,8 +1159,8 @@ def get_customer(customer_id):
 
 # ✅ POST -> Crear un cliente
 @app.route("/customers", methods=["POST"])
+@auth_required
 def create_customer():
-    require_auth()
     data = request.get_json()
     required_fields = ["name", "email"]
     if not all(field in data for field in required_fields):
@@ -513,7 +1185,7 @@ def create_customer():
 
         cursor.execute("SELECT * FROM customers WHERE id = ?;", (new_id,))
         row = cursor.fetchone()
-        return jsonify(dict_from_row(row, cursor)), 201
+        return row_response(dict_from_row(row, cursor), 201)
     except Exception as e:
         if conn: conn.rollback()
         return jsonify({"error": str(e)}), 500
@@ -526,8 +1198,8 @@ def create_customer():
 
 # ✅ PUT -> Actualizar un cliente
 @app.route("/customers/<string:customer_id>", methods=["PUT"])
+@auth_required
 def update_customer(customer_id):
-    require_auth()
     data = request.get_json()
 
     try:
@@ -556,7 +1228,7 @@ def update_customer(customer_id):
 
         cursor.execute("SELECT * FROM customers WHERE id = ?;", (customer_id,))
         row = cursor.fetchone()
-        return jsonify(dict_from_row(row, cursor)), 200
+        return row_response(dict_from_row(row, cursor))
     except Exception as e:
         conn.rollback()
         return jsonify({"error": str(e)}), 500
@@ -569,8 +1241,8 @@ def update_customer(customer_id):
 
 # ✅ DELETE -> Eliminar un cliente
 @app.route("/customers/<string:customer_id>", methods=["DELETE"])
+@auth_required
 def delete_customer(customer_id):
-    require_auth()
     try:
         conn = get_connection()
         cursor = conn.cursor()
@@ -579,7 +1251,10 @@ def delete_customer(customer_id):
             return generate_error_response(404, f"No se encontró el cliente {customer_id}")
 
         cursor.execute("DELETE FROM customers WHERE id = ?;", (customer_id,))
+        prune_payment_method_changes(conn)
         conn.commit()
+        offer_cache.invalidate(conn, customer_id)
+        payment_method_cache.invalidate(customer_id)  # ON DELETE CASCADE
         return jsonify({"message": "Cliente eliminado correctamente"}), 200
     except Exception as e:
         conn.rollback()
@@ -589,22 +1264,377 @@ def delete_customer(customer_id):
             cursor.close()
         finally:
             conn.close()
+# ---------------------------------------------------------------------
+# CRUD: Deudas, promesas de pago, pagos y débitos automáticos (ver ledger.py)
+# ---------------------------------------------------------------------
+RESOURCE_NAMES = {"debts": "la deuda", "promises": "la promesa",
+                  "payments": "el pago", "auto_debits": "el débito automático"}
+
+def resource_list(table: str, filters: dict):
+    try:
+        return list_response(table, filters)
+    except HTTPException:
+        raise
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+def resource_get(table: str, row_id: str):
+    conn = get_connection()
+    try:
+        row = ledger.get(conn, table, row_id)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    finally:
+        conn.close()
+    if not row:
+        return generate_error_response(404, f"No se encontró {RESOURCE_NAMES[table]} {row_id}")
+    return row_response(row)
+
+def resource_create(table: str, event: str | None = None):
+    data = request.get_json() or {}
+    conn = get_connection()
+    try:
+        row = ledger.create(conn, table, data)
+        if event:
+            log_event(event, row.get("customer_id"), event, row)
+        return row_response(row, 201)
+    except (ValueError, TypeError) as ve:
+        return generate_error_response(400, str(ve))
+    except Exception as e:
+        conn.rollback()
+        return jsonify({"error": str(e)}), 500
+    finally:
+        conn.close()
+
+def resource_update(table: str, row_id: str):
+    data = request.get_json() or {}
+    conn = get_connection()
+    try:
+        row = ledger.update(conn, table, row_id, data)
+    except (ValueError, TypeError) as ve:
+        return generate_error_response(400, str(ve))
+    except Exception as e:
+        conn.rollback()
+        return jsonify({"error": str(e)}), 500
+    finally:
+        conn.close()
+    if not row:
+        return generate_error_response(404, f"No existe {RESOURCE_NAMES[table]} {row_id}")
+    return row_response(row)
+
+def resource_delete(table: str, row_id: str, message: str):
+    conn = get_connection()
+    try:
+        deleted = ledger.delete(conn, table, row_id)
+    except Exception as e:
+        conn.rollback()
+        return jsonify({"error": str(e)}), 500
+    finally:
+        conn.close()
+    if not deleted:
+        return generate_error_response(404, f"No se encontró {RESOURCE_NAMES[table]} {row_id}")
+    return jsonify({"message": message}), 200
+
+# ✅ GET -> Listar deudas (filtros: customer_id, status, due_from, due_to)
+@app.route("/debts", methods=["GET"])
+@auth_required
+def get_debts():
+    return resource_list("debts", DEBT_LIST_FILTERS)
+
+# ✅ GET -> Obtener una deuda
+@app.route("/debts/<string:debt_id>", methods=["GET"])
+@auth_required
+def get_debt(debt_id):
+    return resource_get("debts", debt_id)
+
+# ✅ POST -> Registrar una deuda (balance = principal si no se envía)
+@app.route("/debts", methods=["POST"])
+@auth_required
+def create_debt():
+    return resource_create("debts")
+
+# ✅ PUT/PATCH -> Actualizar una deuda
+@app.route("/debts/<string:debt_id>", methods=["PUT", "PATCH"])
+@auth_required
+def update_debt(debt_id):
+    return resource_update("debts", debt_id)
+
+# ✅ DELETE -> Eliminar una deuda (y sus promesas)
+@app.route("/debts/<string:debt_id>", methods=["DELETE"])
+@auth_required
+def delete_debt(debt_id):
+    return resource_delete("debts", debt_id, "Deuda eliminada correctamente")
+
+# GET /debts:buckets?as_of=AAAA-MM-DD -> Deudas abiertas y saldo por tramo de dpd
+@app.route("/debts:buckets", methods=["GET"])
+@auth_required
+def get_debt_buckets():
+    try:
+        as_of = date.fromisoformat(request.args["as_of"]) if request.args.get("as_of") else None
+    except ValueError:
+        return generate_error_response(400, "as_of debe tener formato AAAA-MM-DD")
+    conn = get_connection()
+    try:
+        return jsonify(ledger.dpd_buckets(conn, as_of)), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    finally:
+        conn.close()
+
+# ✅ GET -> Listar promesas de pago (filtros: customer_id, debt_id, status, promised_date)
+@app.route("/promises", methods=["GET"])
+@auth_required
+def get_promises():
+    return resource_list("promises", PROMISE_LIST_FILTERS)
+
+# GET /promises:due?date=AAAA-MM-DD -> Promesas pendientes que vencen ese día (hoy por defecto)
+@app.route("/promises:due", methods=["GET"])
+@auth_required
+def get_promises_due():
+    try:
+        on = date.fromisoformat(request.args["date"]) if request.args.get("date") else None
+    except ValueError:
+        return generate_error_response(400, "date debe tener formato AAAA-MM-DD")
+    conn = get_connection()
+    try:
+        return jsonify(ledger.promises_due(conn, on)), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    finally:
+        conn.close()
+
+# ✅ GET -> Obtener una promesa
+@app.route("/promises/<string:promise_id>", methods=["GET"])
+@auth_required
+def get_promise(promise_id):
+    return resource_get("promises", promise_id)
+
+# ✅ POST -> Registrar una promesa de pago sobre una deuda
+@app.route("/promises", methods=["POST"])
+@auth_required
+def create_promise():
+    return resource_create("promises", event="promise")
+
+# ✅ PUT/PATCH -> Actualizar una promesa (p. ej. status=broken)
+@app.route("/promises/<string:promise_id>", methods=["PUT", "PATCH"])
+@auth_required
+def update_promise(promise_id):
+    return resource_update("promises", promise_id)
+
+# ✅ DELETE -> Eliminar una promesa
+@app.route("/promises/<string:promise_id>", methods=["DELETE"])
+@auth_required
+def delete_promise(promise_id):
+    return resource_delete("promises", promise_id, "Promesa eliminada correctamente")
+
+# ✅ GET -> Listar pagos
+@app.route("/payments", methods=["GET"])
+@auth_required
+def get_payments():
+    return resource_list("payments", PAYMENT_LIST_FILTERS)
+
+# ✅ GET -> Obtener un pago
+@app.route("/payments/<string:payment_id>", methods=["GET"])
+@auth_required
+def get_payment(payment_id):
+    return resource_get("payments", payment_id)
+
+# ✅ POST -> Registrar un pago: baja el saldo de la deuda y cumple la promesa pendiente
+# en la misma transacción. Con Idempotency-Key un reintento devuelve el pago original.
+@app.route("/payments", methods=["POST"])
+@auth_required
+def create_payment():
+    data = request.get_json() or {}
+    conn = get_connection()
+    try:
+        payment, created = ledger.record_payment(conn, data, request.headers.get("Idempotency-Key"))
+        if created:
+            log_event("payment", payment.get("customer_id"), "payment", payment)
+        return row_response(payment, 201 if created else 200)
+    except IdempotencyConflict as ic:
+        return generate_error_response(409, str(ic)), 409
+    except (ValueError, TypeError) as ve:
+        return generate_error_response(400, str(ve))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    finally:
+        conn.close()
+
+# ✅ GET -> Listar débitos automáticos (next_run_to=AAAA-MM-DD: los que deben correr)
+@app.route("/auto_debits", methods=["GET"])
+@auth_required
+def get_auto_debits():
+    return resource_list("auto_debits", AUTO_DEBIT_LIST_FILTERS)
+
+# ✅ GET -> Obtener un débito automático
+@app.route("/auto_debits/<string:auto_debit_id>", methods=["GET"])
+@auth_required
+def get_auto_debit(auto_debit_id):
+    return resource_get("auto_debits", auto_debit_id)
+
+# ✅ POST -> Programar un débito automático
+@app.route("/auto_debits", methods=["POST"])
+@auth_required
+def create_auto_debit():
+    return resource_create("auto_debits")
+
+# ✅ PUT/PATCH -> Actualizar un débito automático (p. ej. status=paused)
+@app.route("/auto_debits/<string:auto_debit_id>", methods=["PUT", "PATCH"])
+@auth_required
+def update_auto_debit(auto_debit_id):
+    return resource_update("auto_debits", auto_debit_id)
+
+# ✅ DELETE -> Cancelar y eliminar un débito automático
+@app.route("/auto_debits/<string:auto_debit_id>", methods=["DELETE"])
+@auth_required
+def delete_auto_debit(auto_debit_id):
+    return resource_delete("auto_debits", auto_debit_id, "Débito automático eliminado correctamente")
+
+# ---------------------------------------------------------------------
+# Importación / exportación masiva (ver bulk.py)
+# ---------------------------------------------------------------------
+def bulk_import(table: str):
+    fmt = bulk.detect_format(request.args.get("format") or request.mimetype, default="")
+    if not fmt:
+        return generate_error_response(400, "Formato no soportado: use text/csv o application/x-ndjson")
+    try:
+        chunk_size = int(request.args.get("chunk_size", bulk.DEFAULT_CHUNK_SIZE))
+    except ValueError:
+        return generate_error_response(400, "chunk_size debe ser entero")
+
+    conn = get_connection()
+    try:
+        stream = io.TextIOWrapper(request.stream, encoding="utf-8", newline="")
+        report = bulk.import_records(conn, table, bulk.iter_records(stream, fmt), chunk_size)
+        return jsonify(report), 200
+    except Exception as e:
+        conn.rollback()
+        return jsonify({"error": str(e)}), 500
+    finally:
+        conn.close()
+        if table == "payment_methods":
+            # Pueden haberse confirmado bloques aunque el lote falle después
+            payment_method_cache.clear()
+            invalidate_all_offers()
+
+def bulk_export(table: str):
+    fmt = request.args.get("format", "ndjson")
+    if fmt not in ("csv", "ndjson"):
+        return generate_error_response(400, "format debe ser csv o ndjson")
+
+    def generate():
+        conn = get_connection()
+        try:
+            yield from bulk.export_rows(conn, table, fmt)
+        finally:
+            conn.close()
+
+    mimetype = "text/csv" if fmt == "csv" else "application/x-ndjson"
+    response = Response(generate(), mimetype=mimetype)
+    response.headers["Content-Disposition"] = f"attachment; filename={table}.{fmt}"
+    return response, 200
+
+# POST /customers:import -> Alta masiva de clientes (CSV/NDJSON)
+@app.route("/customers:import", methods=["POST"])
+@auth_required
+def import_customers():
+    return bulk_import("customers")
+
+# POST /payment_methods:import -> Alta masiva de métodos de pago (CSV/NDJSON)
+@app.route("/payment_methods:import", methods=["POST"])
+@auth_required
+def import_payment_methods():
+    return bulk_import("payment_methods")
+
+# GET /customers:export -> Exportación en streaming
+@app.route("/customers:export", methods=["GET"])
+@auth_required
+def export_customers():
+    return bulk_export("customers")
+
+# GET /payment_methods:export -> Exportación en streaming
+@app.route("/payment_methods:export", methods=["GET"])
+@auth_required
+def export_payment_methods():
+    return bulk_export("payment_methods")
+
+# ---------------------------------------------------------------------
+# Referencias de corresponsal (efectivo) y conciliación
+# ---------------------------------------------------------------------
+# POST /references -> Emite una referencia de pago en efectivo
+@app.route("/references", methods=["POST"])
+@auth_required
+def create_reference():
+    data = request.get_json() or {}
+    if "amount" not in data:
+        return generate_error_response(400, "Falta campo: amount")
+    try:
+        route = CorresponsalStrategy().execute(data)
+        if "hours" in data:
+            route["reference_expires_in_hours"] = float(data["hours"])
+        return jsonify(issue_cash_reference(route, data)), 201
+    except (ValueError, TypeError) as ve:
+        return generate_error_response(400, str(ve))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# GET /references/<reference> -> Estado de una referencia
+@app.route("/references/<string:reference>", methods=["GET"])
+@auth_required
+def get_reference(reference):
+    conn = get_connection()
+    try:
+        ref = reconciliation.get_reference(conn, reference)
+    finally:
+        conn.close()
+    if not ref:
+        return generate_error_response(404, f"No se encontró la referencia {reference}")
+    return jsonify(ref), 200
+
+# POST /references:reconcile -> Concilia un archivo de liquidación (CSV en el cuerpo)
+@app.route("/references:reconcile", methods=["POST"])
+@auth_required
+def reconcile_references():
+    source = request.args.get("source")
+    apply = request.args.get("dry_run", "0").lower() not in ("1", "true", "yes")
+    conn = get_connection()
+    try:
+        report = reconciliation.reconcile_stream(conn, request.stream, source=source, apply=apply)
+        return jsonify(report), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    finally:
+        conn.close()
+
 # POST /strategy/payment_route  -> Selecciona y ejecuta estrategia de pago
+# Con header Idempotency-Key (o campo idempotency_key) los pasos se ejecutan en el
+# pipeline de pago; sin llave sólo se devuelve la ruta planeada.
 @app.route("/strategy/payment_route", methods=["POST"])
+@auth_required
 def strategy_payment_route():
-    require_auth()
     data = request.get_json() or {}
     required = ["payment_method", "amount"]
     if not all(k in data for k in required):
         return generate_error_response(400, "Faltan campos: payment_method, amount")
+    idempotency_key = request.headers.get("Idempotency-Key") or data.get("idempotency_key")
 
     try:
         strategy = select_payment_strategy(data["payment_method"])
         result = strategy.execute(data)
-        return jsonify({
+        response = {
             "status": "ok",
             "route": result
-        }), 200
+        }
+        if idempotency_key:
+            execution, replayed = execute_payment_route(result, data, str(idempotency_key))
+            response["execution"] = execution
+            response["replayed"] = replayed
+        return jsonify(response), 200
+    except IdempotencyConflict as ic:
+        # Status real, no 200: un reintento automático no debe leer un conflicto como cobro aceptado
+        return generate_error_response(409, str(ic)), 409
+    except TimeoutError:
+        return generate_error_response(504, "El gateway no respondió a tiempo; reintenta con la misma Idempotency-Key"), 504
     except ValueError as ve:
         return generate_error_response(400, str(ve))
     except Exception as e:
@@ -613,8 +1643,8 @@ def strategy_payment_route():
 
 # POST /strategy/negotiation_offer -> Elige táctica de negociación y propone oferta
 @app.route("/strategy/negotiation_offer", methods=["POST"])
+@auth_required
 def strategy_negotiation_offer():
-    require_auth()
     data = request.get_json() or {}
     # Campos de contexto (puedes ampliarlos sin romper compat.)
     required = ["segmento", "amount_due", "dpd", "propension_pago"]
@@ -624,16 +1654,25 @@ def strategy_negotiation_offer():
     try:
         strategy = select_negotiation_strategy(data.get("segmento"), data)
         proposal = strategy.propose(data)
+        metrics.negotiation_tactics_total.inc(proposal["tactic"])
         return jsonify({
             "status": "ok",
             "proposal": proposal
         }), 200
+    except ValueError as ve:
+        return generate_error_response(400, str(ve))
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 # =========================
 # Helpers Agente
 # =========================
 def get_payment_methods_for_customer(customer_id: str):
+    with stage("payment_methods"):
+        if PM_CACHE_ENABLED:
+            return payment_method_cache.get(customer_id, load_payment_methods_for_customer)
+        return load_payment_methods_for_customer(customer_id)
+
+def load_payment_methods_for_customer(customer_id: str):
     conn = get_connection()
     try:
         cur = conn.cursor()
@@ -645,7 +1684,11 @@ def get_payment_methods_for_customer(customer_id: str):
         """, (customer_id,))
         rows = cur.fetchall()
         cols = [c[0] for c in cur.description]
-        return [dict(zip(cols, r)) for r in rows]
+        methods = [dict(zip(cols, r)) for r in rows]
+        # `metadata` sale como objeto en best_payment_method, igual que en el CRUD
+        for m in methods:
+            m["metadata"] = parse_raw_json(m["metadata"], app.json.loads)
+        return methods
     finally:
         conn.close()
 
@@ -664,47 +1707,111 @@ def infer_fallback_method(channel: str | None, currency: str | None) -> dict:
         return {"type": "corresponsal", "provider": "oxxo_pay"}
     return {"type": "card", "provider": "stripe"}
 
-def build_speech(route: dict, proposal: dict, currency: str | None):
-    cur = (currency or route.get("currency") or "MXN").upper()
-    method = route.get("method")
-    routed = route.get("routed_to")
-    steps = " → ".join(route.get("steps", []))
-
-    parts = []
-    if proposal:
-        t = proposal.get("tactic")
-        if t == "discount":
-            parts.append(f"Puedo ofrecerte un descuento de {int(round(proposal.get('discount_pct',0)*100))}% si liquidamos en 10 días.")
-        elif t == "installments":
-            parts.append(f"Puedo ofrecerte {proposal.get('installments',3)} mensualidades sin intereses.")
-        elif t == "hybrid":
-            parts.append(f"Puedo ofrecerte un descuento de {int(round(proposal.get('discount_pct',0)*100))}% y pagar en {proposal.get('installments',3)} mensualidades sin intereses.")
-    parts.append(f"Para cobrar {route.get('amount')} {cur}, la mejor ruta es {method} vía {routed} ({steps}).")
-    parts.append("¿Deseas proceder?")
-    return " ".join(parts)
+def render_speech(route: dict, proposal: dict, currency: str | None, channel: str | None = None,
+                  locale: str | None = None, customer_id: str | None = None) -> tuple[str, str | None]:
+    """Speech con la plantilla del canal/locale y el brazo A/B asignado (None si el set no tiene brazos)."""
+    speech_registry.maybe_reload()
+    return speech_registry.render(route, proposal, currency, channel, locale, customer_id)
 
-# =========================
-# Endpoint principal del Agente
-# =========================
-@app.route("/agent/decision", methods=["POST"])
-def agent_decision():
-    require_auth()
-    data = request.get_json() or {}
+def build_speech(route: dict, proposal: dict, currency: str | None,
+                 channel: str | None = None, locale: str | None = None):
+    return render_speech(route, proposal, currency, channel, locale)[0]
 
-    required = ["customer_id", "segmento", "amount_due", "dpd", "propension_pago"]
-    missing = [k for k in required if k not in data]
-    if missing:
-        return generate_error_response(400, f"Faltan campos: {', '.join(missing)}")
+# Máximo de parámetros por consulta IN (...) (SQLite limita variables por sentencia)
+BATCH_SQL_CHUNK = 900
+# Máximo de contextos aceptados por petición en /agent/decisions:batch
+BATCH_MAX_CONTEXTS = 10000
 
+def get_payment_methods_for_customers(customer_ids) -> dict:
+    """
+    Versión por lotes de get_payment_methods_for_customer: una sola conexión y
+    consultas IN (...) por bloques. Devuelve {customer_id: [métodos]} con el mismo
+    orden (is_default DESC, created_at ASC) que la consulta individual.
+    """
+    ids = list(dict.fromkeys(customer_ids))
+    result = {cid: [] for cid in ids}
+    if not ids:
+        return result
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        for start in range(0, len(ids), BATCH_SQL_CHUNK):
+            chunk = ids[start:start + BATCH_SQL_CHUNK]
+            marks = ",".join("?" * len(chunk))
+            cur.execute(f"""
+                SELECT id, customer_id, type, provider, last4, expiry_month, expiry_year, is_default, created_at, metadata
+                FROM payment_methods
+                WHERE customer_id IN ({marks})
+                ORDER BY customer_id, is_default DESC, created_at ASC
+            """, chunk)
+            cols = [c[0] for c in cur.description]
+            for r in cur.fetchall():
+                row = dict(zip(cols, r))
+                row["metadata"] = parse_raw_json(row["metadata"], app.json.loads)
+                result[row["customer_id"]].append(row)
+        return result
+    finally:
+        conn.close()
+
+AGENT_REQUIRED_FIELDS = ["customer_id", "segmento", "amount_due", "dpd", "propension_pago"]
+# Campos que el agente calcula desde `debts` cuando el cliente tiene deudas abiertas
+DEBT_DERIVED_FIELDS = ("amount_due", "dpd")
+AGENT_DERIVE_DEBTS = os.environ.get("AGENTE_AGENT_DERIVE_DEBTS", "1") == "1"
+# snapshot: foto diaria de aging.py (con cálculo en vivo para clientes aún no procesados)
+# debts: agregado en vivo sobre la tabla debts
+AGENT_DEBT_SOURCE = os.environ.get("AGENTE_AGENT_DEBT_SOURCE", "snapshot")
+
+def get_debt_context(customer_id: str) -> dict | None:
+    """amount_due y dpd del cliente desde la foto de cartera o sus deudas abiertas."""
+    if not AGENT_DERIVE_DEBTS:
+        return None
+    conn = get_connection()
+    try:
+        if AGENT_DEBT_SOURCE == "snapshot":
+            return aging.snapshot_context(conn, customer_id)
+        return ledger.debt_context(conn, customer_id)
+    finally:
+        conn.close()
+
+def get_debt_contexts(customer_ids) -> dict:
+    """Versión por lotes de get_debt_context: {customer_id: contexto}."""
+    if not AGENT_DERIVE_DEBTS:
+        return {}
+    conn = get_connection()
+    try:
+        if AGENT_DEBT_SOURCE == "snapshot":
+            return aging.snapshot_contexts(conn, customer_ids)
+        return ledger.debt_contexts(conn, customer_ids)
+    finally:
+        conn.close()
+
+def missing_agent_fields(data: dict, debt_context: dict | None = None) -> list[str]:
+    return [k for k in AGENT_REQUIRED_FIELDS
+            if k not in data and not (debt_context and k in DEBT_DERIVED_FIELDS)]
+
+def build_decision(data: dict, methods: list[dict], debt_context: dict | None = None) -> dict:
+    """
+    Lógica del agente para un contexto ya validado y sus métodos de pago.
+    Con `debt_context` (deudas abiertas guardadas) amount_due y dpd salen de
+    ahí en lugar de lo que envió el cliente.
+    Devuelve el objeto `decision` que expone /agent/decision.
+    """
     customer_id = data["customer_id"]
-    amount_due = float(data["amount_due"])
-    dpd = int(data["dpd"])
+    if debt_context:
+        amount_due = float(debt_context["amount_due"])
+        dpd = int(debt_context["dpd"])
+    else:
+        amount_due = float(data["amount_due"])
+        dpd = int(data["dpd"])
     prop = float(data["propension_pago"])
     segmento = data["segmento"]
     currency = (data.get("currency") or "MXN").upper()
     channel = data.get("channel")
+    for field in ("channel", "locale"):
+        # Se usan como llaves (plantillas de speech, métricas): sólo texto
+        if data.get(field) is not None and not isinstance(data[field], str):
+            raise ValueError(f"{field} debe ser texto")
 
-    methods = get_payment_methods_for_customer(customer_id)
     best = choose_best_method(methods)
     if not best:
         best = infer_fallback_method(channel, currency)
@@ -715,8 +1822,17 @@ def agent_decision():
         "dpd": dpd,
         "propension_pago": prop
     }
-    neg_strategy = select_negotiation_strategy(segmento, neg_ctx)
-    proposal = neg_strategy.propose(neg_ctx)
+    rule_info = None
+    with stage("negotiation"):
+        if data.get("ruleset"):
+            neg_ctx["customer_id"] = customer_id
+            tactic, arm = evaluate_ruleset(data["ruleset"], segmento, neg_ctx)
+            neg_strategy = NEGOTIATION_STRATEGIES[tactic]
+            rule_info = {"ruleset": data["ruleset"], "arm": arm}
+        else:
+            neg_strategy = select_negotiation_strategy(segmento, neg_ctx)
+        proposal = neg_strategy.propose(neg_ctx)
+    metrics.negotiation_tactics_total.inc(proposal["tactic"])
 
     pay_payload = {
         "amount": amount_due,
@@ -724,22 +1840,605 @@ def agent_decision():
         "provider": best.get("provider"),
         "metadata": {"customer_id": customer_id, "channel": channel}
     }
-    pay_strategy = select_payment_strategy(best["type"])
-    route = pay_strategy.execute(pay_payload)
+    with stage("payment_route"):
+        pay_strategy = select_payment_strategy(best["type"])
+        route = pay_strategy.execute(pay_payload)
+    metrics.payment_routes_total.inc(route["method"], route["routed_to"])
+
+    with stage("speech"):
+        speech, speech_variant = render_speech(route, proposal, currency, channel, data.get("locale"), customer_id)
+
+    decision = {
+        "customer_id": customer_id,
+        "best_payment_method": best,
+        "payment_route": route,
+        "negotiation_proposal": proposal,
+        "speech": speech
+    }
+    if rule_info:
+        decision["negotiation_rules"] = rule_info
+    if speech_variant:
+        decision["speech_variant"] = speech_variant
+    if debt_context:
+        decision["debt_context"] = debt_context
+    return decision
+
+def load_portfolio_store() -> PortfolioStore:
+    """Carga todos los clientes y métodos de pago en un PortfolioStore (portfolio_store.py)."""
+    conn = get_connection()
+    try:
+        return PortfolioStore.load_from_db(conn)
+    finally:
+        conn.close()
+
+def agent_decisions_batch(contexts: list[dict], store: PortfolioStore | None = None) -> list[dict]:
+    """
+    API Python para campañas: decide para muchos clientes cargando todos los
+    métodos de pago con una sola pasada a la BD, o desde `store` si se da una
+    cartera ya cargada en memoria (scoring offline). Sin `store`, amount_due y
+    dpd salen de las deudas abiertas de cada cliente (una consulta por bloque):
+
+        store = load_portfolio_store()
+        store.load_contexts(contextos)
+        agent_decisions_batch(list(store.iter_contexts()), store=store)
+
+    Cada elemento del resultado es {"status": "ok", "decision": {...}} o
+    {"status": "error", "index": i, "codigo": ..., "mensaje": ...}, en el mismo
+    orden que `contexts`.
+    """
+    valid = []
+    results = [None] * len(contexts)
+    debt_by_customer = {}
+    if store is None:
+        debt_by_customer = get_debt_contexts(
+            ctx["customer_id"] for ctx in contexts if isinstance(ctx, dict) and "customer_id" in ctx)
+    for i, ctx in enumerate(contexts):
+        if not isinstance(ctx, dict):
+            results[i] = {"status": "error", "index": i, "codigo": "ERROR_400",
+                          "mensaje": "Cada contexto debe ser un objeto"}
+            continue
+        missing = missing_agent_fields(ctx, debt_by_customer.get(ctx.get("customer_id")))
+        if missing:
+            results[i] = {"status": "error", "index": i, "codigo": "ERROR_400",
+                          "mensaje": f"Faltan campos: {', '.join(missing)}"}
+            continue
+        valid.append(i)
+
+    customer_ids = (contexts[i]["customer_id"] for i in valid)
+    if store is not None:
+        methods_by_customer = store.methods_by_customer(customer_ids)
+    else:
+        methods_by_customer = get_payment_methods_for_customers(customer_ids)
+    for i in valid:
+        ctx = contexts[i]
+        try:
+            decision = build_decision(ctx, methods_by_customer.get(ctx["customer_id"], []),
+                                      debt_by_customer.get(ctx["customer_id"]))
+            results[i] = {"status": "ok", "decision": decision}
+        except (ValueError, TypeError) as e:
+            results[i] = {"status": "error", "index": i, "codigo": "ERROR_400", "mensaje": str(e)}
+    return results
+
+# ---------------------------------------------------------------------
+# Bitácora de decisiones para analítica (ver decision_log.py)
+# ---------------------------------------------------------------------
+# AGENTE_DECISION_LOG: "sqlite" (BD propia junto a DB_PATH), "ndjson" (segmentos
+# gzip rotativos) u "off". La petición sólo encola; un hilo escribe por lotes.
+DECISION_LOG_SINK = os.environ.get("AGENTE_DECISION_LOG", "sqlite")
+DECISION_LOG_DB = os.environ.get("AGENTE_DECISION_LOG_DB")
+DECISION_LOG_DIR = os.environ.get("AGENTE_DECISION_LOG_DIR")
+DECISION_LOG_QUEUE = int(os.environ.get("AGENTE_DECISION_LOG_QUEUE", "100000"))
+DECISION_LOG_BATCH = int(os.environ.get("AGENTE_DECISION_LOG_BATCH", "1000"))
+DECISION_LOG_FLUSH_MS = float(os.environ.get("AGENTE_DECISION_LOG_FLUSH_MS", "500"))
+DECISION_LOG_POLICY = os.environ.get("AGENTE_DECISION_LOG_POLICY", "drop_newest")
+DECISION_LOG_BLOCK_MS = float(os.environ.get("AGENTE_DECISION_LOG_BLOCK_MS", "50"))
+DECISION_LOG_SEGMENT_MB = float(os.environ.get("AGENTE_DECISION_LOG_SEGMENT_MB", "64"))
+DECISION_LOG_SEGMENT_SECONDS = float(os.environ.get("AGENTE_DECISION_LOG_SEGMENT_SECONDS", "3600"))
+DECISION_LOG_KEEP_SEGMENTS = int(os.environ.get("AGENTE_DECISION_LOG_KEEP_SEGMENTS", "0"))
+# Campos del contexto que se guardan junto a cada decisión
+DECISION_LOG_CONTEXT_FIELDS = ("segmento", "amount_due", "dpd", "propension_pago", "channel",
+                               "currency", "locale", "ruleset")
+
+if DECISION_LOG_SINK not in ("sqlite", "ndjson", "off"):
+    raise ValueError(f"AGENTE_DECISION_LOG desconocido: {DECISION_LOG_SINK} (use sqlite, ndjson u off)")
+
+_decision_log = None
+_decision_log_target = None
+_decision_log_lock = threading.Lock()
+
+def decision_log_target() -> str | None:
+    if DECISION_LOG_SINK == "sqlite":
+        return DECISION_LOG_DB or os.path.join(os.path.dirname(os.path.abspath(DB_PATH)), "decision_log.db")
+    if DECISION_LOG_SINK == "ndjson":
+        return DECISION_LOG_DIR or os.path.join(os.path.dirname(os.path.abspath(DB_PATH)), "decision_log")
+    return None
+
+def _count_decision_log_drop(reason: str, n: int):
+    metrics.decision_log_events_total.inc(reason, amount=n)
+
+def _count_decision_log_write(n: int):
+    metrics.decision_log_events_total.inc("written", amount=n)
+
+def get_decision_log() -> decision_log.DecisionLog | None:
+    """Bitácora de DB_PATH (la recrea, vaciando la anterior, si cambió DB_PATH); None si está apagada."""
+    global _decision_log, _decision_log_target
+    target = decision_log_target()
+    if target is None:
+        return None
+    log = _decision_log
+    if log is None or _decision_log_target != target:
+        with _decision_log_lock:
+            if _decision_log is None or _decision_log_target != target:
+                if _decision_log is not None:
+                    _decision_log.close()
+                if DECISION_LOG_SINK == "sqlite":
+                    sink = decision_log.SQLiteSink(target)
+                else:
+                    sink = decision_log.NDJSONSink(target, max_bytes=int(DECISION_LOG_SEGMENT_MB * 2**20),
+                                                   max_seconds=DECISION_LOG_SEGMENT_SECONDS,
+                                                   keep_segments=DECISION_LOG_KEEP_SEGMENTS,
+                                                   loads=app.json.loads)
+                _decision_log = decision_log.DecisionLog(
+                    sink, max_queue=DECISION_LOG_QUEUE, batch_size=DECISION_LOG_BATCH,
+                    flush_interval=DECISION_LOG_FLUSH_MS / 1000, policy=DECISION_LOG_POLICY,
+                    block_timeout=DECISION_LOG_BLOCK_MS / 1000, dumps=app.json.dumps, loads=app.json.loads,
+                    on_drop=_count_decision_log_drop, on_write=_count_decision_log_write)
+                _decision_log_target = target
+            log = _decision_log
+    return log
+
+def close_decision_log():
+    """Escribe lo pendiente de la bitácora (shutdown del servidor / salida del proceso)."""
+    if _decision_log is not None:
+        _decision_log.close()
+
+# El servidor de desarrollo no tiene hook de shutdown: sin esto se perdería la cola
+atexit.register(close_decision_log)
+
+def log_event(event: str, customer_id: str | None, source: str, payload) -> bool:
+    log = get_decision_log()
+    return log.record(event, customer_id, source, payload) if log is not None else False
+
+def log_decision(data: dict, decision, source: str) -> bool:
+    """`decision` es el dict de build_decision o el texto JSON de una decisión precalculada."""
+    context = {k: data[k] for k in DECISION_LOG_CONTEXT_FIELDS if k in data}
+    return log_event("decision", data.get("customer_id"), source, {"context": context, "decision": decision})
+
+# ---------------------------------------------------------------------
+# Decisiones precalculadas por campaña (ver offer_cache.py)
+# ---------------------------------------------------------------------
+OFFER_CACHE_ENABLED = os.environ.get("AGENTE_OFFER_CACHE_ENABLED", "1") == "1"
+OFFER_CACHE_TTL_HOURS = float(os.environ.get("AGENTE_OFFER_CACHE_TTL_HOURS", str(offer_cache.DEFAULT_TTL_HOURS)))
+
+def offer_cache_key(data: dict, debt_context: dict | None) -> str:
+    rules_version = rules_registry.version if data.get("ruleset") else None
+    return offer_cache.context_hash(data, debt_context, rules_version, speech_registry.version)
+
+def get_precomputed_decision(data: dict, debt_context: dict | None) -> str | None:
+    """
+    Decisión guardada para estas entradas como texto JSON, con el debt_context
+    del momento agregado; None en un miss, si venció o si el contexto es inválido.
+    """
+    try:
+        key = offer_cache_key(data, debt_context)
+    except (KeyError, ValueError, TypeError):
+        return None
+    conn = get_connection()
+    try:
+        decision = offer_cache.lookup(conn, data["customer_id"], key)
+    finally:
+        conn.close()
+    metrics.offer_cache_lookups_total.inc("hit" if decision else "miss")
+    if decision and debt_context:
+        # Mismo monto/dpd que al precalcular; el resto del contexto se reporta al día
+        decision = decision[:-1] + ',"debt_context":' + app.json.dumps(debt_context) + "}"
+    return decision
+
+def invalidate_all_offers():
+    conn = get_connection()
+    try:
+        offer_cache.invalidate_all(conn)
+    finally:
+        conn.close()
+
+def precompute_decisions(contexts, campaign: str | None = None, ttl_hours: float | None = None,
+                         chunk_size: int = 1000) -> dict:
+    """
+    Decide la lista objetivo de una campaña (cualquier iterable de contextos,
+    procesado por bloques) y guarda cada decisión en offer_cache para que
+    /agent/decision la sirva con una sola búsqueda.
+    """
+    ttl_hours = OFFER_CACHE_TTL_HOURS if ttl_hours is None else ttl_hours
+    report = {"campaign": campaign, "total": 0, "stored": 0, "skipped_invalidated": 0,
+              "errors": 0, "error_samples": []}
+    started = time.perf_counter()
+    chunk = []
+
+    def flush():
+        # La marca se toma antes de leer métodos: una invalidación posterior gana
+        started_at = offer_cache.stamp()
+        rows = []
+        for ctx, result in zip(chunk, agent_decisions_batch(chunk)):
+            if result["status"] != "ok":
+                report["errors"] += 1
+                if len(report["error_samples"]) < 20:
+                    report["error_samples"].append(
+                        {"customer_id": ctx.get("customer_id") if isinstance(ctx, dict) else None,
+                         "mensaje": result["mensaje"]})
+                continue
+            decision = result["decision"]
+            rows.append((ctx["customer_id"], offer_cache_key(ctx, decision.get("debt_context")), decision))
+        conn = get_connection()
+        try:
+            stored = offer_cache.store_many(conn, rows, started_at, campaign, ttl_hours)
+        finally:
+            conn.close()
+        report["stored"] += stored
+        report["skipped_invalidated"] += len(rows) - stored
+        report["total"] += len(chunk)
+        chunk.clear()
+
+    for ctx in contexts:
+        chunk.append(ctx)
+        if len(chunk) >= chunk_size:
+            flush()
+    if chunk:
+        flush()
+    report["seconds"] = round(time.perf_counter() - started, 3)
+    return report
+
+# ---------------------------------------------------------------------
+# Coalescencia de /agent/decision concurrentes (ver singleflight.py)
+# ---------------------------------------------------------------------
+# Peticiones idénticas en vuelo (mismo cliente y contexto de negociación)
+# comparten una sola lectura de deudas/métodos, build_decision y serialización.
+DECISION_COALESCE_ENABLED = os.environ.get("AGENTE_DECISION_COALESCE_ENABLED", "1") == "1"
+decision_flight = SingleFlight(on_result=metrics.decision_coalesce_total.inc)
+
+def decision_flight_key(data: dict) -> str:
+    """customer_id + hash de los campos del contexto que usa build_decision."""
+    context = json.dumps([data.get(k) for k in DECISION_LOG_CONTEXT_FIELDS],
+                         separators=(",", ":"), ensure_ascii=False, default=str)
+    return f"{data['customer_id']}:{hashlib.sha256(context.encode('utf-8')).hexdigest()[:32]}"
+
+def compute_agent_decision(data: dict) -> tuple:
+    """
+    Trabajo de /agent/decision sin depender de la petición en curso, para que
+    su resultado sirva a todas las peticiones coalescidas:
+    ("error", mensaje, None) o (origen, cuerpo JSON, decisión) con origen
+    "precomputed" o "live". Nadie debe modificar lo que devuelve.
+    """
+    debt_context = None
+    if "customer_id" in data:
+        with stage("debts"):
+            debt_context = get_debt_context(data["customer_id"])
+    missing = missing_agent_fields(data, debt_context)
+    if missing:
+        return "error", f"Faltan campos: {', '.join(missing)}", None
 
-    speech = build_speech(route, proposal, currency)
+    if OFFER_CACHE_ENABLED:
+        with stage("offer_cache"):
+            decision = get_precomputed_decision(data, debt_context)
+        if decision is not None:
+            return "precomputed", '{"status":"ok","precomputed":true,"decision":' + decision + "}", decision
+
+    methods = get_payment_methods_for_customer(data["customer_id"])
+    try:
+        decision = build_decision(data, methods, debt_context)
+    except ValueError as ve:
+        return "error", str(ve), None
+    with stage("jsonify"):
+        body = jsonify({"status": "ok", "decision": decision}).get_data()
+    return "live", body, decision
+
+# POST /agent/decisions:precompute -> Precalcula las decisiones de una campaña
+@app.route("/agent/decisions:precompute", methods=["POST"])
+@auth_required
+def agent_decisions_precompute():
+    data = request.get_json() or {}
+    contexts = data.get("contexts")
+    if not isinstance(contexts, list):
+        return generate_error_response(400, "Falta campo: contexts (lista)")
+    if len(contexts) > BATCH_MAX_CONTEXTS:
+        return generate_error_response(400, f"Máximo {BATCH_MAX_CONTEXTS} contextos por petición")
+    try:
+        ttl_hours = float(data["ttl_hours"]) if "ttl_hours" in data else None
+        return jsonify(precompute_decisions(contexts, data.get("campaign"), ttl_hours)), 200
+    except (ValueError, TypeError) as ve:
+        return generate_error_response(400, str(ve))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
+# GET /admin/offer_cache -> Decisiones precalculadas por campaña
+@app.route("/admin/offer_cache", methods=["GET"])
+@auth_required("admin")
+def offer_cache_stats():
+    conn = get_connection()
+    try:
+        return jsonify({"enabled": OFFER_CACHE_ENABLED, "ttl_hours": OFFER_CACHE_TTL_HOURS,
+                        **offer_cache.stats(conn)}), 200
+    finally:
+        conn.close()
+
+# DELETE /admin/offer_cache?campaign= -> Descarta decisiones precalculadas (todas o de una campaña)
+@app.route("/admin/offer_cache", methods=["DELETE"])
+@auth_required("admin")
+def offer_cache_clear():
+    conn = get_connection()
+    try:
+        removed = offer_cache.clear(conn, request.args.get("campaign"))
+        purged = offer_cache.purge(conn)
+    finally:
+        conn.close()
+    return jsonify({"removed": removed, **purged}), 200
+
+# GET /admin/db_pool -> Estadísticas del pool de conexiones
+@app.route("/admin/db_pool", methods=["GET"])
+@auth_required("admin")
+def db_pool_stats():
+    return jsonify(get_pool().stats()), 200
+
+# GET /admin/payment_method_cache -> Contadores de la caché de métodos de pago
+@app.route("/admin/payment_method_cache", methods=["GET"])
+@auth_required("admin")
+def payment_method_cache_stats():
+    return jsonify({"enabled": PM_CACHE_ENABLED, **payment_method_cache.stats()}), 200
+
+# GET /admin/payment_pipeline -> Concurrencia, reintentos y resultados del pipeline de pago
+@app.route("/admin/payment_pipeline", methods=["GET"])
+@auth_required("admin")
+def payment_pipeline_stats():
+    return jsonify({**payment_pipeline.stats(), "gateway": payment_gateway.stats()}), 200
+
+# GET /admin/rules -> Rule sets cargados y errores de la última recarga
+@app.route("/admin/rules", methods=["GET"])
+@auth_required("admin")
+def rules_status():
+    return jsonify({
+        "directory": rules_registry.directory,
+        "rulesets": {
+            name: [arm.name for arm in rs.arms] for name, rs in rules_registry.rulesets.items()
+        },
+        "errors": rules_registry.errors,
+        "loaded_at": rules_registry.loaded_at
+    }), 200
+
+# POST /admin/rules/reload -> Recompila los rule sets sin reiniciar
+@app.route("/admin/rules/reload", methods=["POST"])
+@auth_required("admin")
+def rules_reload():
+    return jsonify(rules_registry.reload()), 200
+
+# GET /admin/speech -> Sets de plantillas de speech, errores y textos recortados por canal
+@app.route("/admin/speech", methods=["GET"])
+@auth_required("admin")
+def speech_status():
+    return jsonify(speech_registry.describe()), 200
+
+# POST /admin/speech/reload -> Recompila las plantillas sin reiniciar
+@app.route("/admin/speech/reload", methods=["POST"])
+@auth_required("admin")
+def speech_reload():
+    return jsonify(speech_registry.reload()), 200
+
+# GET /admin/auth -> Modo de autenticación, llaves cargadas y caché de tokens verificados
+@app.route("/admin/auth", methods=["GET"])
+@auth_required("admin")
+def auth_status():
+    return jsonify({"mode": "jwt" if jwt_auth_enabled() else "demo", "keyring": auth_keyring.describe(),
+                    "cache": token_verifier.stats()}), 200
+
+# POST /admin/auth/reload -> Relee el archivo de llaves (rotación) y vacía la caché de tokens
+@app.route("/admin/auth/reload", methods=["POST"])
+@auth_required("admin")
+def auth_reload():
+    report = auth_keyring.reload()
+    token_verifier.clear()
+    return jsonify(report), 200
+
+# GET /admin/compression -> Respuestas comprimidas por codificación y tasa de compresión
+@app.route("/admin/compression", methods=["GET"])
+@auth_required("admin")
+def compression_stats():
+    return jsonify({"enabled": COMPRESS_ENABLED, "json_encoder": app.json.encoder,
+                    **response_compressor.stats()}), 200
+
+# GET /admin/aging -> Última pasada de envejecimiento, clientes pendientes y resumen por tramo
+@app.route("/admin/aging", methods=["GET"])
+@auth_required("admin")
+def aging_status():
+    conn = get_connection()
+    try:
+        return jsonify(aging.aging_status(conn)), 200
+    finally:
+        conn.close()
+
+# POST /admin/aging/run?as_of=&max_chunks=&full= -> Corre o reanuda la pasada diaria
+@app.route("/admin/aging/run", methods=["POST"])
+@auth_required("admin")
+def aging_run():
+    try:
+        as_of = date.fromisoformat(request.args["as_of"]) if request.args.get("as_of") else None
+        max_chunks = int(request.args["max_chunks"]) if request.args.get("max_chunks") else None
+    except ValueError:
+        return generate_error_response(400, "as_of debe ser AAAA-MM-DD y max_chunks entero")
+    full = request.args.get("full", "0").lower() in ("1", "true", "yes")
+    conn = get_connection()
+    try:
+        return jsonify(aging.run_aging(conn, as_of, max_chunks=max_chunks, full=full)), 200
+    except ValueError as ve:
+        return generate_error_response(400, str(ve))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    finally:
+        conn.close()
+
+# GET /metrics -> Métricas en formato de texto de Prometheus
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    lines = [metrics.registry.render()]
+    pool = _pool
+    if pool is not None:
+        for key, value in pool.stats().items():
+            lines.append(f"# TYPE agente_db_pool_{key} gauge\nagente_db_pool_{key} {value}\n")
+    for key, value in payment_method_cache.stats().items():
+        lines.append(f"# TYPE agente_pm_cache_{key} gauge\nagente_pm_cache_{key} {value}\n")
+    for key, value in token_verifier.stats().items():
+        if key != "failures":
+            lines.append(f"# TYPE agente_auth_cache_{key} gauge\nagente_auth_cache_{key} {value}\n")
+    admission = admission_controller.limiter.stats()
+    lines.append(f"# TYPE agente_admission_in_flight gauge\nagente_admission_in_flight {admission['in_flight']}\n")
+    lines.append("# TYPE agente_admission_queued gauge\n" + "".join(
+        f'agente_admission_queued{{class="{cls}"}} {n}\n' for cls, n in admission["queued"].items()))
+    flights = decision_flight.stats()
+    for key in ("in_flight", "waiting"):
+        lines.append(f"# TYPE agente_decision_coalesce_{key} gauge\nagente_decision_coalesce_{key} {flights[key]}\n")
+    log = _decision_log
+    if log is not None:
+        stats = log.stats()
+        for key in ("queued", "max_queue", "recorded", "written", "batches", "write_errors"):
+            lines.append(f"# TYPE agente_decision_log_{key} gauge\nagente_decision_log_{key} {stats[key]}\n")
+    return Response("".join(lines), mimetype="text/plain; version=0.0.4"), 200
+
+# GET /admin/admission -> Peticiones en curso y en cola por clase, límites y conteos de admitidas/rechazadas
+@app.route("/admin/admission", methods=["GET"])
+@auth_required("admin")
+def admission_stats():
+    return jsonify({"enabled": ADMISSION_ENABLED, **admission_controller.stats()}), 200
+
+# GET /admin/decision_coalescing -> Decisiones en vuelo y cuántas peticiones compartieron resultado
+@app.route("/admin/decision_coalescing", methods=["GET"])
+@auth_required("admin")
+def decision_coalescing_stats():
+    return jsonify({"enabled": DECISION_COALESCE_ENABLED, **decision_flight.stats()}), 200
+
+# GET /admin/decision_log -> Cola, lotes escritos y descartes de la bitácora de decisiones
+@app.route("/admin/decision_log", methods=["GET"])
+@auth_required("admin")
+def decision_log_stats():
+    log = get_decision_log()
+    if log is None:
+        return jsonify({"enabled": False}), 200
+    return jsonify({"enabled": True, **log.stats()}), 200
+
+# POST /admin/decision_log/flush -> Escribe ya lo encolado (antes de un scan o un deploy)
+@app.route("/admin/decision_log/flush", methods=["POST"])
+@auth_required("admin")
+def decision_log_flush():
+    log = get_decision_log()
+    if log is None:
+        return jsonify({"enabled": False}), 200
+    flushed = log.flush()
+    return jsonify({"enabled": True, "flushed": flushed, **log.stats()}), 200
+
+# GET /decision_events?from=&to=&event=&customer_id=&limit= -> Eventos de la bitácora por rango
+# de tiempo (UTC, [from, to)), como JSON o NDJSON en streaming (format=ndjson o Accept)
+@app.route("/decision_events", methods=["GET"])
+@auth_required
+def get_decision_events():
+    log = get_decision_log()
+    if log is None:
+        return generate_error_response(404, "La bitácora de decisiones está apagada (AGENTE_DECISION_LOG=off)")
+    start, end = request.args.get("from"), request.args.get("to")
+    if not start or not end:
+        return generate_error_response(400, "Faltan parámetros: from y to (AAAA-MM-DD o AAAA-MM-DDTHH:MM:SS)")
+    try:
+        limit = int(request.args.get("limit", "1000"))
+    except ValueError:
+        return generate_error_response(400, "limit debe ser entero")
+    if not 1 <= limit <= 100000:
+        return generate_error_response(400, "limit debe estar entre 1 y 100000")
+    rows = log.scan(start, end, request.args.get("event"), request.args.get("customer_id"), limit)
+    dumps = app.json.dumps
+
+    if wants_ndjson():
+        def generate_ndjson():
+            for row in rows:
+                yield dumps_row(row, dumps, raw_fields=("payload",)) + "\n"
+        return Response(generate_ndjson(), mimetype="application/x-ndjson"), 200
+
+    def generate_json():
+        yield "["
+        for i, row in enumerate(rows):
+            yield ("," if i else "") + dumps_row(row, dumps, raw_fields=("payload",))
+        yield "]\n"
+    return Response(generate_json(), mimetype="application/json"), 200
+
+# GET /admin/slow_requests -> Muestras del perfilador de peticiones lentas
+@app.route("/admin/slow_requests", methods=["GET"])
+@auth_required("admin")
+def slow_request_profiles():
+    if slow_sampler is None:
+        return jsonify({"enabled": False, "reports": []}), 200
+    return jsonify({
+        "enabled": True,
+        "threshold_ms": PROFILE_SLOW_MS,
+        "reports": list(slow_sampler.reports)
+    }), 200
+
+# =========================
+# Endpoint principal del Agente
+# =========================
+@app.route("/agent/decision", methods=["POST"])
+@auth_required
+def agent_decision():
+    data = request.get_json() or {}
+
+    if DECISION_COALESCE_ENABLED and "customer_id" in data:
+        (source, body, decision), shared = decision_flight.do(
+            decision_flight_key(data), functools.partial(compute_agent_decision, data))
+    else:
+        (source, body, decision), shared = compute_agent_decision(data), False
+    if source == "error":
+        return generate_error_response(400, body)
+    # Cada petición queda en la bitácora; las que compartieron resultado, como "coalesced"
+    log_decision(data, decision, "coalesced" if shared else source)
+    return Response(body, mimetype="application/json"), 200
+
+# POST /agent/decisions:batch -> Decisiones para campañas nocturnas
+@app.route("/agent/decisions:batch", methods=["POST"])
+@auth_required
+def agent_decisions_batch_endpoint():
+    data = request.get_json() or {}
+    contexts = data.get("contexts")
+    if not isinstance(contexts, list):
+        return generate_error_response(400, "Falta campo: contexts (lista)")
+    if len(contexts) > BATCH_MAX_CONTEXTS:
+        return generate_error_response(400, f"Máximo {BATCH_MAX_CONTEXTS} contextos por petición")
+
+    try:
+        results = agent_decisions_batch(contexts)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    for ctx, result in zip(contexts, results):
+        if result["status"] == "ok":
+            log_decision(ctx, result["decision"], "batch")
+
+    errors = sum(1 for r in results if r["status"] != "ok")
     return jsonify({
         "status": "ok",
-        "decision": {
-            "customer_id": customer_id,
-            "best_payment_method": best,
-            "payment_route": route,
-            "negotiation_proposal": proposal,
-            "speech": speech
-        }
+        "total": len(results),
+        "errors": errors,
+        "results": results
     }), 200
 
+# POST /speech:render -> Speech por lotes para un envío de campaña (SMS, IVR…)
+@app.route("/speech:render", methods=["POST"])
+@auth_required
+def speech_render():
+    data = request.get_json() or {}
+    decisions = data.get("decisions")
+    if not isinstance(decisions, list) or not all(isinstance(d, dict) for d in decisions):
+        return generate_error_response(400, "Falta campo: decisions (lista de objetos decision)")
+    if len(decisions) > BATCH_MAX_CONTEXTS:
+        return generate_error_response(400, f"Máximo {BATCH_MAX_CONTEXTS} decisiones por petición")
+    speech_registry.maybe_reload()
+    try:
+        results = speech_registry.render_many(decisions, data.get("channel"), data.get("locale"))
+    except (ValueError, TypeError, AttributeError) as e:
+        return generate_error_response(400, str(e))
+    return jsonify({"status": "ok", "total": len(results), "results": results}), 200
+
 # ---------------------------------------------------------------------
 # MAIN
 # ---------------------------------------------------------------------
@@ -0,0 +1,192 @@
+"""
+Adaptador ASGI para servir la app Flask en producción.
+
+Cada petición se ejecuta (handler de Flask + SQLite) en un ThreadPoolExecutor
+acotado, fuera del event loop. Un semáforo limita las peticiones en curso; las
+que esperan más de `queue_timeout` reciben 503 con Retry-After. Las respuestas en
+streaming (listados, exportaciones) se envían bloque por bloque con
+contrapresión. En el shutdown del lifespan se espera a las peticiones en curso y
+se cierra el pool de SQLite.
+
+    from asgi import WSGIToASGI
+    asgi_app = WSGIToASGI(app, max_workers=16)
+
+Ver serve.py para levantarlo con uvicorn.
+"""
+import asyncio
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+BODY_SPOOL_BYTES = 1024 * 1024
+
+
+class WSGIToASGI:
+    def __init__(self, wsgi_app, max_workers: int = 16, max_concurrency: int | None = None,
+                 queue_timeout: float = 5.0, on_shutdown=None):
+        self.wsgi_app = wsgi_app
+        self.max_workers = max_workers
+        self.max_concurrency = max_concurrency or max_workers * 4
+        self.queue_timeout = queue_timeout
+        self.on_shutdown = on_shutdown
+        self._executor = None
+        self._semaphore = None
+        self._in_flight = 0
+        self._idle = None
+        self.rejected = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+        elif scope["type"] == "http":
+            await self._http(scope, receive, send)
+        else:
+            raise RuntimeError(f"Tipo de scope no soportado: {scope['type']}")
+
+    # -----------------------------------------------------------------
+    # Ciclo de vida
+    # -----------------------------------------------------------------
+    def _ensure_started(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                thread_name_prefix="agente-wsgi")
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._idle = asyncio.Event()
+            self._idle.set()
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                self._ensure_started()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.shutdown()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def shutdown(self):
+        """Espera a que terminen las peticiones en curso y libera recursos."""
+        if self._idle is not None:
+            await self._idle.wait()
+        if self._executor is not None:
+            executor, self._executor = self._executor, None
+            await asyncio.get_running_loop().run_in_executor(None, executor.shutdown, True)
+        if self.on_shutdown is not None:
+            self.on_shutdown()
+
+    def stats(self) -> dict:
+        return {
+            "max_workers": self.max_workers,
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self._in_flight,
+            "rejected": self.rejected,
+        }
+
+    # -----------------------------------------------------------------
+    # HTTP
+    # -----------------------------------------------------------------
+    async def _http(self, scope, receive, send):
+        self._ensure_started()
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            await _send_simple(send, 503, b'{"codigo": "ERROR_503", "mensaje": "Servidor saturado"}',
+                               [(b"retry-after", b"1")])
+            return
+
+        self._in_flight += 1
+        self._idle.clear()
+        body = tempfile.SpooledTemporaryFile(max_size=BODY_SPOOL_BYTES)
+        try:
+            more = True
+            while more:
+                message = await receive()
+                if message["type"] == "http.disconnect":
+                    return
+                body.write(message.get("body", b""))
+                more = message.get("more_body", False)
+            body.seek(0)
+
+            loop = asyncio.get_running_loop()
+            environ = build_environ(scope, body)
+            await loop.run_in_executor(self._executor, self._run_wsgi, environ, send, loop)
+        finally:
+            body.close()
+            self._semaphore.release()
+            self._in_flight -= 1
+            if self._in_flight == 0:
+                self._idle.set()
+
+    def _run_wsgi(self, environ, send, loop):
+        """Corre en un hilo del executor; envía la respuesta al loop con contrapresión."""
+        state = {"started": False, "status": 500, "headers": []}
+
+        def call(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info and state["started"]:
+                raise exc_info[1].with_traceback(exc_info[2])
+            state["status"] = int(status.split(" ", 1)[0])
+            state["headers"] = [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers]
+
+        def ensure_started():
+            if not state["started"]:
+                state["started"] = True
+                call({"type": "http.response.start", "status": state["status"],
+                      "headers": state["headers"]})
+
+        result = self.wsgi_app(environ, start_response)
+        try:
+            for chunk in result:
+                if chunk:
+                    ensure_started()
+                    call({"type": "http.response.body", "body": chunk, "more_body": True})
+            ensure_started()
+            call({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            if hasattr(result, "close"):
+                result.close()
+
+
+def build_environ(scope, body) -> dict:
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0],
+        "REMOTE_PORT": str(client[1]),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": body,
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for raw_name, raw_value in scope.get("headers", []):
+        name = raw_name.decode("latin-1").upper().replace("-", "_")
+        value = raw_value.decode("latin-1")
+        if name == "CONTENT_TYPE":
+            environ["CONTENT_TYPE"] = value
+        elif name == "CONTENT_LENGTH":
+            environ["CONTENT_LENGTH"] = value
+        else:
+            key = f"HTTP_{name}"
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+async def _send_simple(send, status: int, body: bytes, extra_headers=()):
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", b"application/json"),
+                            (b"content-length", str(len(body)).encode()), *extra_headers]})
+    await send({"type": "http.response.body", "body": body})
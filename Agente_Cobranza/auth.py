@@ -0,0 +1,337 @@
+"""
+Autenticación Bearer con JWT firmados con HMAC (HS256 / HS384 / HS512).
+
+Las llaves son locales (sin llamadas de red) y se identifican por `kid`:
+
+    {"active": "2026-10", "keys": [
+        {"kid": "2026-10", "alg": "HS256", "secret": "..."},
+        {"kid": "2026-07", "alg": "HS256", "secret": "..."}]}
+
+KeyRing lee ese archivo y lo recarga cuando cambia su mtime (como RuleRegistry),
+así que rotar llaves es agregar la nueva, moverla a `active` y retirar la vieja
+cuando expiren sus tokens, sin reiniciar. Un archivo inválido conserva las
+llaves anteriores y deja el error en `errors`. AGENTE_AUTH_SECRET agrega una
+llave `default` para despliegues con un solo secreto.
+
+TokenVerifier guarda los claims ya verificados en un LRU acotado cuya llave es
+el sha256 del token; cada entrada vale hasta min(exp + leeway, ahora + ttl), los
+rechazos nunca se guardan y la caché se vacía cuando cambia el juego de llaves.
+Un acierto cuesta un hash y un dict lookup en lugar de decodificar, verificar
+el HMAC y validar los claims.
+
+Uso (emitir un token de prueba con las llaves configuradas):
+    python auth.py issue --sub cobranza-web --scope admin --ttl 3600
+"""
+import argparse
+import base64
+import hashlib
+import hmac
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+ALGORITHMS = {"HS256": hashlib.sha256, "HS384": hashlib.sha384, "HS512": hashlib.sha512}
+ENV_KEY_ID = "default"
+
+
+class AuthError(Exception):
+    """Token rechazado; `reason` es una etiqueta corta para métricas."""
+
+    def __init__(self, reason: str, message: str):
+        super().__init__(message)
+        self.reason = reason
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(segment: str) -> bytes:
+    return base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4))
+
+
+def _json_segment(segment: str) -> dict:
+    try:
+        value = json.loads(_b64decode(segment))
+    except (ValueError, UnicodeDecodeError) as e:
+        raise AuthError("malformed", "Token mal formado") from e
+    if not isinstance(value, dict):
+        raise AuthError("malformed", "Token mal formado")
+    return value
+
+
+def token_scopes(claims: dict) -> set:
+    """Scopes del token: `scope` separado por espacios (RFC 8693) o lista `scopes`."""
+    scopes = claims.get("scope") or claims.get("scopes") or ()
+    if isinstance(scopes, str):
+        scopes = scopes.split()
+    return set(scopes)
+
+
+class KeyRing:
+    """Llaves HMAC por kid desde un archivo JSON recargable y/o un secreto fijo."""
+
+    def __init__(self, path: str | None = None, secret: str | None = None,
+                 algorithm: str = "HS256", check_interval: float = 5.0):
+        if algorithm not in ALGORITHMS:
+            raise ValueError(f"Algoritmo no soportado: {algorithm}")
+        self.path = path
+        self.secret = secret
+        self.algorithm = algorithm
+        self.check_interval = check_interval
+        self.keys = {}           # kid -> (alg, secreto en bytes)
+        self.active = None
+        self.errors = {}
+        self.loaded_at = None
+        self.generation = 0      # sube en cada recarga que cambia las llaves
+        self._file_keys = {}
+        self._file_active = None
+        self._mtime = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+        self.reload()
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.path or self.secret)
+
+    def _stat(self):
+        try:
+            return os.stat(self.path).st_mtime if self.path else None
+        except OSError:
+            return None
+
+    def _load_file(self) -> tuple[dict, str | None]:
+        with open(self.path, encoding="utf-8") as f:
+            spec = json.load(f)
+        keys = {}
+        for entry in spec.get("keys", []):
+            kid, alg, secret = entry.get("kid"), entry.get("alg", "HS256"), entry.get("secret")
+            if not kid or not secret:
+                raise ValueError(f"Llave sin kid o secret: {entry.get('kid')!r}")
+            if alg not in ALGORITHMS:
+                raise ValueError(f"Algoritmo no soportado en '{kid}': {alg}")
+            keys[str(kid)] = (alg, secret.encode("utf-8"))
+        active = spec.get("active")
+        if active is not None and active not in keys:
+            raise ValueError(f"La llave activa '{active}' no está en 'keys'")
+        return keys, active
+
+    def reload(self) -> dict:
+        with self._lock:
+            mtime = self._stat()
+            errors = {}
+            file_keys, file_active = self._file_keys, self._file_active
+            if self.path:
+                try:
+                    file_keys, file_active = self._load_file()
+                except (OSError, ValueError, AttributeError, TypeError) as e:
+                    # Conserva las últimas llaves válidas del archivo
+                    errors[os.path.basename(self.path)] = str(e)
+            keys = dict(file_keys)
+            if self.secret:
+                keys.setdefault(ENV_KEY_ID, (self.algorithm, self.secret.encode("utf-8")))
+            active = file_active or (ENV_KEY_ID if ENV_KEY_ID in keys else next(iter(keys), None))
+            if keys != self.keys or active != self.active:
+                self.generation += 1
+            self.keys = keys
+            self.active = active
+            self._file_keys, self._file_active = file_keys, file_active
+            self.errors = errors
+            self._mtime = mtime
+            self.loaded_at = time.time()
+            return {"kids": sorted(keys), "active": active, "errors": errors, "generation": self.generation}
+
+    def maybe_reload(self):
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        self._next_check = now + self.check_interval
+        if self.path and self._stat() != self._mtime:
+            self.reload()
+
+    def describe(self) -> dict:
+        return {"path": self.path, "kids": sorted(self.keys), "active": self.active,
+                "errors": self.errors, "generation": self.generation, "loaded_at": self.loaded_at}
+
+
+def sign(header: dict, claims: dict, alg: str, secret: bytes) -> str:
+    signing_input = (_b64encode(json.dumps(header, separators=(",", ":")).encode()) + "."
+                     + _b64encode(json.dumps(claims, separators=(",", ":")).encode()))
+    signature = hmac.new(secret, signing_input.encode("ascii"), ALGORITHMS[alg]).digest()
+    return signing_input + "." + _b64encode(signature)
+
+
+def issue_token(keyring: KeyRing, claims: dict, ttl: float = 3600, kid: str | None = None) -> str:
+    """Firma `claims` con la llave activa (o `kid`); agrega iat/exp si faltan."""
+    kid = kid or keyring.active
+    if kid not in keyring.keys:
+        raise ValueError(f"Llave no encontrada: {kid}")
+    alg, secret = keyring.keys[kid]
+    now = int(time.time())
+    claims = {"iat": now, "exp": now + int(ttl), **claims}
+    return sign({"alg": alg, "typ": "JWT", "kid": kid}, claims, alg, secret)
+
+
+class TokenVerifier:
+    def __init__(self, keyring: KeyRing, max_entries: int = 100_000, max_ttl: float = 300.0,
+                 leeway: float = 30.0, issuer: str | None = None, audience: str | None = None):
+        if max_entries < 1:
+            raise ValueError("max_entries debe ser >= 1")
+        self.keyring = keyring
+        self.max_entries = max_entries
+        self.max_ttl = max_ttl
+        self.leeway = leeway
+        self.issuer = issuer
+        self.audience = audience
+        self._entries = OrderedDict()   # sha256(token) -> (válido_hasta, claims)
+        self._generation = keyring.generation
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.failures = {}
+
+    def verify(self, token: str, now: float | None = None) -> dict:
+        """Claims del token; lanza AuthError si no es válido. No modificar el dict devuelto."""
+        self.keyring.maybe_reload()
+        now = time.time() if now is None else now
+        digest = hashlib.sha256(token.encode("utf-8", "surrogatepass")).digest()
+        with self._lock:
+            if self._generation != self.keyring.generation:
+                # Rotación de llaves: lo verificado con el juego anterior ya no cuenta
+                self._entries.clear()
+                self._generation = self.keyring.generation
+            entry = self._entries.get(digest)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(digest)
+                    self.hits += 1
+                    return entry[1]
+                del self._entries[digest]
+                self.expirations += 1
+            self.misses += 1
+            generation = self._generation
+
+        try:
+            claims = self._verify_uncached(token, now)
+        except AuthError as e:
+            with self._lock:
+                self.failures[e.reason] = self.failures.get(e.reason, 0) + 1
+            raise
+
+        valid_until = now + self.max_ttl
+        if "exp" in claims:
+            valid_until = min(valid_until, claims["exp"] + self.leeway)
+        with self._lock:
+            if generation == self._generation:
+                self._entries[digest] = (valid_until, claims)
+                self._entries.move_to_end(digest)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return claims
+
+    def _verify_uncached(self, token: str, now: float) -> dict:
+        parts = token.split(".")
+        if len(parts) != 3:
+            raise AuthError("malformed", "Token mal formado")
+        header = _json_segment(parts[0])
+        alg = header.get("alg")
+        if alg not in ALGORITHMS:
+            # Incluye "none": sólo se aceptan algoritmos HMAC conocidos
+            raise AuthError("algorithm", f"Algoritmo no permitido: {alg}")
+        keys = self.keyring.keys
+        kid = header.get("kid")
+        if kid is None and len(keys) == 1:
+            kid = next(iter(keys))
+        key = keys.get(kid)
+        if key is None:
+            raise AuthError("unknown_key", f"Llave desconocida: {kid}")
+        key_alg, secret = key
+        if alg != key_alg:
+            raise AuthError("algorithm", f"La llave '{kid}' no firma con {alg}")
+        try:
+            signature = _b64decode(parts[2])
+        except ValueError as e:
+            raise AuthError("malformed", "Firma mal formada") from e
+        expected = hmac.new(secret, (parts[0] + "." + parts[1]).encode("ascii", "replace"),
+                            ALGORITHMS[alg]).digest()
+        if not hmac.compare_digest(signature, expected):
+            raise AuthError("signature", "Firma inválida")
+
+        claims = _json_segment(parts[1])
+        exp = claims.get("exp")
+        if not isinstance(exp, (int, float)):
+            raise AuthError("claims", "El token necesita 'exp'")
+        if now > exp + self.leeway:
+            raise AuthError("expired", "Token expirado")
+        nbf = claims.get("nbf")
+        if isinstance(nbf, (int, float)) and now + self.leeway < nbf:
+            raise AuthError("not_yet_valid", "Token todavía no válido")
+        if self.issuer and claims.get("iss") != self.issuer:
+            raise AuthError("claims", "Emisor inválido")
+        if self.audience:
+            aud = claims.get("aud")
+            if self.audience not in (aud if isinstance(aud, list) else [aud]):
+                raise AuthError("claims", "Audiencia inválida")
+        return claims
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "failures": dict(self.failures),
+            }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    issue = sub.add_parser("issue", help="Emite un token firmado")
+    issue.add_argument("--keys", default=os.environ.get("AGENTE_AUTH_KEYS_FILE"))
+    issue.add_argument("--secret", default=os.environ.get("AGENTE_AUTH_SECRET"))
+    issue.add_argument("--kid", help="Llave a usar (por defecto la activa)")
+    issue.add_argument("--sub", required=True)
+    issue.add_argument("--scope", action="append", default=[], help="Repetible: --scope admin")
+    issue.add_argument("--iss", default=os.environ.get("AGENTE_AUTH_ISSUER"))
+    issue.add_argument("--aud", default=os.environ.get("AGENTE_AUTH_AUDIENCE"))
+    issue.add_argument("--ttl", type=int, default=3600)
+    args = parser.parse_args(argv)
+
+    keyring = KeyRing(args.keys, args.secret)
+    if keyring.errors or not keyring.keys:
+        print(f"Sin llaves utilizables: {keyring.errors or 'configure --keys o --secret'}", file=sys.stderr)
+        return 1
+    claims = {"sub": args.sub}
+    if args.scope:
+        claims["scope"] = " ".join(args.scope)
+    if args.iss:
+        claims["iss"] = args.iss
+    if args.aud:
+        claims["aud"] = args.aud
+    try:
+        print(issue_token(keyring, claims, ttl=args.ttl, kid=args.kid))
+    except ValueError as e:
+        print(str(e), file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
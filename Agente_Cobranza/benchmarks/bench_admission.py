@@ -0,0 +1,199 @@
+"""
+Prueba de carga del control de admisión (admission.py): IVR contra una ráfaga de WhatsApp.
+
+Levanta el servidor (`--mode dev` o `asgi`, como load_test.py) tres veces sobre
+la misma BD sembrada y dispara contra POST /agent/decision:
+- base: sólo el tráfico IVR, a ritmo constante (`--ivr-rate` peticiones/s
+  repartidas en `--ivr-clients` hilos);
+- ráfaga sin admisión (AGENTE_ADMISSION_ENABLED=0): el mismo IVR más
+  `--flood-rate` peticiones/s de WhatsApp en `--flood-clients` hilos (más de lo
+  que el proceso puede atender, como tras un envío masivo), desde otro proceso;
+- ráfaga con admisión: igual, con WhatsApp limitado a `--whatsapp-limit` y el
+  IVR como clase critical.
+
+El IVR usa un token de integración atado a su canal
+(AGENTE_ADMISSION_CHANNEL_TOKENS); WhatsApp otro token y declara su canal en
+el cuerpo.
+
+Reporta p50/p99 del IVR, errores y cuántas peticiones de WhatsApp se
+atendieron o se rechazaron (429/503). Termina con código 1 si con admisión
+algún IVR falla o su p99 pasa de `--max-p99-ratio` veces el de la base.
+
+Uso (desde Agente_Cobranza/):
+    python benchmarks/bench_admission.py --duration 15 --flood-rate 400
+"""
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlparse
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+from load_test import free_port, seed_db, spawn  # noqa: E402
+
+TOKENS = {"ivr": "bench-ivr", "whatsapp": "bench-whatsapp"}
+
+
+def decision_body(rnd: random.Random, ids: list[str], channel: str) -> str:
+    return json.dumps({
+        "customer_id": rnd.choice(ids),
+        "segmento": rnd.choice(["vip", "consumo", "pyme", "otro"]),
+        "amount_due": rnd.uniform(100, 20000),
+        "dpd": rnd.randint(0, 180),
+        "propension_pago": rnd.random(),
+        "channel": channel,
+    })
+
+
+def client(url: str, ids: list[str], channel: str, stop_at: float, interval: float, seed: int, out: dict):
+    """Un hilo cliente; interval > 0 fija el ritmo (peticiones cada `interval` s), 0 = sin pausa."""
+    target = urlparse(url)
+    rnd = random.Random(seed)
+    headers = {"Authorization": f"Bearer {TOKENS[channel]}", "Content-Type": "application/json"}
+    conn = http.client.HTTPConnection(target.hostname, target.port, timeout=30)
+    latencies, statuses = [], {}
+    next_at = time.perf_counter() + rnd.uniform(0, interval)
+    while True:
+        if interval:
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            next_at += interval
+        if time.perf_counter() >= stop_at:
+            break
+        body = decision_body(rnd, ids, channel)
+        t0 = time.perf_counter()
+        try:
+            conn.request("POST", "/agent/decision", body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            status = "error"
+            conn.close()
+            conn = http.client.HTTPConnection(target.hostname, target.port, timeout=30)
+        statuses[status] = statuses.get(status, 0) + 1
+        if status == 200:
+            latencies.append(time.perf_counter() - t0)
+    conn.close()
+    with out["lock"]:
+        out["latencies"].extend(latencies)
+        for status, n in statuses.items():
+            out["statuses"][status] = out["statuses"].get(status, 0) + n
+
+
+def client_group(url: str, ids: list[str], channel: str, duration: float, clients: int, interval: float,
+                 seed: int, results=None, niceness: int = 0) -> dict:
+    if niceness:
+        os.nice(niceness)
+    stop_at = time.perf_counter() + duration
+    out = {"lock": threading.Lock(), "latencies": [], "statuses": {}}
+    threads = [threading.Thread(target=client, args=(url, ids, channel, stop_at, interval, seed + i, out))
+               for i in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    out = {"latencies": sorted(out["latencies"]), "statuses": out["statuses"]}
+    if results is not None:
+        results.put(out)
+    return out
+
+
+def run(url: str, ids: list[str], args, flood: bool) -> dict:
+    # La ráfaga corre en otro proceso (sus hilos no compiten por el GIL con los clientes IVR que miden)
+    # y con menor prioridad: en producción quien la genera no comparte los núcleos del servidor
+    results = multiprocessing.Queue()
+    flooder = None
+    if flood:
+        flooder = multiprocessing.Process(target=client_group, args=(
+            url, ids, "whatsapp", args.duration, args.flood_clients, args.flood_clients / args.flood_rate, 1000,
+            results, args.flood_nice))
+        flooder.start()
+    ivr = client_group(url, ids, "ivr", args.duration, args.ivr_clients, args.ivr_clients / args.ivr_rate, 0)
+    whatsapp = {"latencies": [], "statuses": {}}
+    if flooder is not None:
+        whatsapp = results.get()
+        flooder.join()
+    return {"ivr": ivr, "whatsapp": whatsapp}
+
+
+def pct(latencies: list[float], p: float) -> float | None:
+    return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 2) if latencies else None
+
+
+def scenario(name: str, env: dict, ids: list[str], workdir: str, args, flood: bool) -> dict:
+    saved = {k: os.environ.get(k) for k in env}
+    os.environ.update(env)
+    port = free_port()
+    proc = spawn(args.mode, workdir, port, args)
+    try:
+        groups = run(f"http://127.0.0.1:{port}", ids, args, flood)
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+        for k, v in saved.items():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
+    ivr, wa = groups["ivr"], groups["whatsapp"]
+    result = {
+        "ivr_ok": len(ivr["latencies"]),
+        "ivr_failed": sum(n for s, n in ivr["statuses"].items() if s != 200),
+        "ivr_p50_ms": pct(ivr["latencies"], 0.50),
+        "ivr_p99_ms": pct(ivr["latencies"], 0.99),
+        "whatsapp": {str(s): n for s, n in sorted(wa["statuses"].items(), key=str)},
+        "whatsapp_ok_rps": round(len(wa["latencies"]) / args.duration, 1),
+    }
+    print(f"{name:<22} IVR p50 {result['ivr_p50_ms']} ms  p99 {result['ivr_p99_ms']} ms  "
+          f"({result['ivr_ok']:,} ok, {result['ivr_failed']:,} fallidas)  "
+          f"WhatsApp atendidas {result['whatsapp_ok_rps']}/s, por status {result['whatsapp']}")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=["dev", "asgi"], default="dev",
+                        help="servidor de desarrollo o serve.py (uvicorn)")
+    parser.add_argument("--threads", type=int, default=16, help="hilos del executor en modo asgi")
+    parser.add_argument("--customers", type=int, default=10_000)
+    parser.add_argument("--duration", type=float, default=15)
+    parser.add_argument("--ivr-clients", type=int, default=4)
+    parser.add_argument("--ivr-rate", type=float, default=20, help="peticiones IVR por segundo (total)")
+    parser.add_argument("--flood-clients", type=int, default=8)
+    parser.add_argument("--flood-nice", type=int, default=10, help="niceness del proceso que genera la ráfaga")
+    parser.add_argument("--flood-rate", type=float, default=400,
+                        help="peticiones WhatsApp por segundo ofrecidas (por encima de la capacidad del proceso)")
+    parser.add_argument("--whatsapp-limit", default="50/50", help="AGENTE_RATE_LIMIT_CHANNELS para whatsapp")
+    parser.add_argument("--max-p99-ratio", type=float, default=3.0)
+    args = parser.parse_args()
+    args.workers = 1
+
+    common = {"AGENTE_METRICS_ENABLED": "1", "AGENTE_DECISION_LOG": "off", "AGENTE_OFFER_CACHE_ENABLED": "0",
+              "AGENTE_ADMISSION_CHANNEL_TOKENS": f"ivr={TOKENS['ivr']}"}
+    with tempfile.TemporaryDirectory() as workdir:
+        ids = seed_db(workdir, args.customers)
+        base = scenario("base (sólo IVR)", {**common, "AGENTE_ADMISSION_ENABLED": "1"}, ids, workdir, args, False)
+        scenario("ráfaga sin admisión", {**common, "AGENTE_ADMISSION_ENABLED": "0"}, ids, workdir, args, True)
+        shed = scenario("ráfaga con admisión", {
+            **common, "AGENTE_ADMISSION_ENABLED": "1",
+            "AGENTE_RATE_LIMIT_CHANNELS": f"whatsapp={args.whatsapp_limit}",
+        }, ids, workdir, args, True)
+
+    ratio = shed["ivr_p99_ms"] / base["ivr_p99_ms"] if shed["ivr_p99_ms"] and base["ivr_p99_ms"] else None
+    print(f"p99 IVR con admisión / base: {ratio:.2f}x" if ratio else "p99 IVR sin datos")
+    if shed["ivr_failed"] or ratio is None or ratio > args.max_p99_ratio:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""
+Benchmark: pasada de envejecimiento (aging.py) sobre una cartera sintética.
+
+Siembra cuentas con 1-3 deudas y corre la primera pasada completa cortándola
+tras unos bloques para verificar que se reanuda desde el checkpoint. Después
+simula varios días: cada día cambia un porcentaje de cuentas (pagos, nuevas
+deudas) y corre la pasada incremental, que sólo debe tocar esas cuentas y las
+que cruzan un tramo. Tras cada pasada compara la foto completa contra el
+agregado en vivo de debts, reporta cuentas procesadas, tiempo y el pico de
+memoria de Python, y al final mide una reconstrucción completa y la latencia
+de lectura del agente (foto contra agregado en vivo).
+
+Uso (desde Agente_Cobranza/):
+    python benchmarks/bench_aging.py --accounts 1000000 --days 3
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import aging  # noqa: E402
+import app as agente  # noqa: E402
+import ledger  # noqa: E402
+
+
+def seed(conn, accounts: int, today: date, rnd: random.Random) -> int:
+    customers, debts, n_debts = [], [], 0
+    for i in range(accounts):
+        cid = f"c{i:010d}"
+        customers.append((cid, f"Cliente {i}", f"{cid}@bench.mx"))
+        for j in range(rnd.randint(1, 3)):
+            due = (today - timedelta(days=rnd.randint(-20, 150))).isoformat()
+            balance = round(rnd.uniform(100, 20_000), 2)
+            status = "open" if rnd.random() < 0.75 else "paid"
+            debts.append((f"d{i:010d}-{j}", cid, balance, balance if status == "open" else 0.0, due, status))
+            n_debts += 1
+        if len(customers) >= 20_000:
+            flush(conn, customers, debts)
+            customers, debts = [], []
+    flush(conn, customers, debts)
+    return n_debts
+
+
+def flush(conn, customers, debts):
+    conn.executemany("INSERT INTO customers (id, name, email) VALUES (?, ?, ?)", customers)
+    conn.executemany("""
+        INSERT INTO debts (id, customer_id, principal, balance, due_date, status)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, debts)
+    conn.commit()
+
+
+def verify(conn, as_of: date):
+    """Compara la foto completa (en orden de customer_id) contra el agregado en vivo de debts."""
+    live = conn.execute("""
+        SELECT customer_id, COUNT(*), ROUND(SUM(balance), 2), MIN(due_date)
+        FROM debts WHERE status = 'open'
+        GROUP BY customer_id ORDER BY customer_id
+    """)
+    snap = conn.cursor()
+    snap.execute("""
+        SELECT customer_id, open_debts, amount_due, oldest_due_date, bucket
+        FROM dpd_snapshot ORDER BY customer_id
+    """)
+    checked = 0
+    for expected, got in zip(live, snap):
+        cid, count, balance, oldest = expected
+        bucket = ledger.bucket_for(oldest, as_of)
+        if got[0] != cid or got[1] != count or abs(got[2] - balance) > 0.01 or got[3] != oldest or got[4] != bucket:
+            raise SystemExit(f"Foto distinta: {got} vs {(cid, count, balance, oldest, bucket)}")
+        checked += 1
+    if snap.fetchone() is not None or live.fetchone() is not None:
+        raise SystemExit("La foto y debts tienen distinto número de cuentas")
+    return checked
+
+
+def timed_run(conn, **kwargs):
+    tracemalloc.start()
+    report = aging.run_aging(conn, **kwargs)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return report, peak
+
+
+def processed(report) -> int:
+    return sum(p["processed"] for p in report["phases"].values())
+
+
+def per_lookup_us(fn, ids) -> float:
+    t0 = time.perf_counter()
+    for cid in ids:
+        fn(cid)
+    return (time.perf_counter() - t0) / len(ids) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--accounts", type=int, default=1_000_000)
+    parser.add_argument("--days", type=int, default=3)
+    parser.add_argument("--change-rate", type=float, default=0.01, help="fracción de cuentas que cambia por día")
+    parser.add_argument("--chunk-size", type=int, default=aging.DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--seed", type=int, default=15)
+    args = parser.parse_args()
+
+    rnd = random.Random(args.seed)
+    day0 = date.today()
+    agente.DB_PATH = os.path.join(tempfile.mkdtemp(), "bench_aging.db")
+    agente.init_db()
+    conn = agente.get_connection()
+
+    t0 = time.perf_counter()
+    n_debts = seed(conn, args.accounts, day0, rnd)
+    print(f"siembra: {args.accounts:,} cuentas / {n_debts:,} deudas en {time.perf_counter() - t0:.1f} s")
+
+    # Primera pasada, cortada a propósito y reanudada desde el checkpoint
+    cut, _ = timed_run(conn, as_of=day0, chunk_size=args.chunk_size, max_chunks=5)
+    if cut["finished"]:
+        raise SystemExit("La pasada terminó antes del corte; use más cuentas o menor --chunk-size")
+    first, peak = timed_run(conn, as_of=day0, chunk_size=args.chunk_size)
+    if not first["resumed"] or not first["finished"]:
+        raise SystemExit(f"No se reanudó desde el checkpoint: {first}")
+    seconds = cut["seconds"] + first["seconds"]
+    accounts = verify(conn, day0)
+    print(f"día 0 (completa, cortada y reanudada): {processed(cut) + processed(first):,} cuentas en "
+          f"{seconds:.1f} s ({args.accounts / seconds:,.0f} cuentas/s), pico Python {peak / 2**20:.1f} MiB; "
+          f"foto OK ({accounts:,} con deuda abierta)")
+
+    open_debts = [r for r in conn.execute(
+        "SELECT id, customer_id, balance FROM debts WHERE status = 'open'")]
+    for day in range(1, args.days + 1):
+        as_of = day0 + timedelta(days=day)
+        changes = int(args.accounts * args.change_rate)
+        payments, new_debts = [], []
+        for _ in range(changes):
+            if rnd.random() < 0.8 and open_debts:
+                debt_id, _, balance = open_debts[rnd.randrange(len(open_debts))]
+                paid = rnd.random() < 0.3
+                payments.append((0.0 if paid else round(balance / 2, 2), "paid" if paid else "open", debt_id))
+            else:
+                cid = f"c{rnd.randrange(args.accounts):010d}"
+                balance = round(rnd.uniform(100, 5_000), 2)
+                new_debts.append((f"n{day}-{len(new_debts)}", cid, balance, balance,
+                                  (as_of - timedelta(days=rnd.randint(0, 40))).isoformat(), "open"))
+        conn.executemany("UPDATE debts SET balance = ?, status = ? WHERE id = ?", payments)
+        conn.executemany("""
+            INSERT INTO debts (id, customer_id, principal, balance, due_date, status)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, new_debts)
+        conn.commit()
+
+        report, peak = timed_run(conn, as_of=as_of, chunk_size=args.chunk_size)
+        verify(conn, as_of)
+        dirty = report["phases"].get("dirty", {})
+        crossings = report["phases"].get("crossings", {})
+        print(f"día {day} (incremental): {changes:,} cambios -> {dirty.get('processed', 0):,} cuentas sucias, "
+              f"{crossings.get('processed', 0):,} candidatas a cruce ({crossings.get('changed', 0):,} cambiaron "
+              f"de tramo) en {report['seconds']:.2f} s, pico Python {peak / 2**20:.1f} MiB; foto OK")
+
+    full, peak = timed_run(conn, as_of=day0 + timedelta(days=args.days), chunk_size=args.chunk_size, full=True)
+    verify(conn, day0 + timedelta(days=args.days))
+    print(f"reconstrucción completa: {full['seconds']:.1f} s, pico Python {peak / 2**20:.1f} MiB")
+    print("tramos: " + ", ".join(f"{b['bucket']}={b['accounts']:,}" for b in full["buckets"]))
+
+    sample = [f"c{rnd.randrange(args.accounts):010d}" for _ in range(20_000)]
+    us_snap = per_lookup_us(lambda cid: aging.snapshot_context(conn, cid), sample)
+    us_live = per_lookup_us(lambda cid: ledger.debt_context(conn, cid), sample)
+    print(f"lectura del agente: foto {us_snap:.1f} us/cliente, agregado en vivo {us_live:.1f} us/cliente")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Benchmark: costo de autenticación por petición (auth.py) con caché fría y caliente.
+
+Configura un archivo de llaves HS256 con dos kid y emite --tokens tokens
+distintos. Mide:
+- TokenVerifier.verify por llamada: caché fría (cada token es nuevo: decodificar,
+  HMAC y claims) contra caché caliente (sha256 + dict lookup);
+- peticiones completas por el test client de Flask a una ruta /admin en modo
+  demo (sólo prefijo Bearer), jwt en frío y jwt en caliente; el sobrecosto de
+  la autenticación es la diferencia contra demo.
+Antes verifica los rechazos (firma, expiración, alg none, scope faltante) y que
+retirar una llave del archivo invalide sus tokens sin reiniciar.
+
+Uso (desde Agente_Cobranza/):
+    python benchmarks/bench_auth.py --tokens 20000 --requests 3000
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as agente  # noqa: E402
+import auth  # noqa: E402
+
+
+def write_keys(path: str, keys: list, active: str, version: int):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"active": active, "keys": keys}, f)
+    # mtime distinto aunque se reescriba dentro de la resolución del sistema de archivos
+    stamp = time.time() + version
+    os.utime(path, (stamp, stamp))
+
+
+def per_call_us(verifier, tokens) -> float:
+    t0 = time.perf_counter()
+    for token in tokens:
+        verifier.verify(token)
+    return (time.perf_counter() - t0) / len(tokens) * 1e6
+
+
+def per_request_us(client, tokens, path="/admin/db_pool") -> float:
+    t0 = time.perf_counter()
+    for token in tokens:
+        resp = client.get(path, headers={"Authorization": f"Bearer {token}"})
+        if resp.status_code != 200:
+            raise SystemExit(f"{path}: {resp.status_code} {resp.get_data(as_text=True)}")
+    return (time.perf_counter() - t0) / len(tokens) * 1e6
+
+
+def expect_status(client, token, status, label):
+    resp = client.get("/admin/db_pool", headers={"Authorization": f"Bearer {token}"})
+    if resp.status_code != status:
+        raise SystemExit(f"{label}: se esperaba {status}, llegó {resp.status_code}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tokens", type=int, default=20_000)
+    parser.add_argument("--requests", type=int, default=3_000)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    agente.DB_PATH = os.path.join(tmp, "bench_auth.db")
+    agente.init_db()
+    keys_path = os.path.join(tmp, "auth_keys.json")
+    old_key = {"kid": "2026-07", "alg": "HS256", "secret": "s" * 32}
+    new_key = {"kid": "2026-10", "alg": "HS256", "secret": "n" * 32}
+    write_keys(keys_path, [new_key, old_key], "2026-10", 0)
+
+    keyring = auth.KeyRing(keys_path, check_interval=0)
+    verifier = auth.TokenVerifier(keyring, max_entries=max(args.tokens, args.requests) * 2)
+    agente.AUTH_MODE = "auto"
+    agente.auth_keyring = keyring
+    agente.token_verifier = verifier
+    client = agente.app.test_client()
+
+    def issue(n, **claims):
+        return [auth.issue_token(keyring, {"sub": f"u{i}", "scope": "admin", **claims}) for i in range(n)]
+
+    # Rechazos
+    good = issue(1)[0]
+    header, payload, signature = good.split(".")
+    expect_status(client, good, 200, "token válido")
+    expect_status(client, f"{header}.{payload}.{signature[:-2]}AA", 401, "firma alterada")
+    expect_status(client, auth.issue_token(keyring, {"sub": "x", "scope": "admin"}, ttl=-3600), 401, "expirado")
+    none_header = auth._b64encode(json.dumps({"alg": "none", "kid": "2026-10"}).encode())
+    expect_status(client, f"{none_header}.{payload}.", 401, "alg none")
+    expect_status(client, auth.issue_token(keyring, {"sub": "x"}), 403, "sin scope admin")
+    legacy = auth.issue_token(keyring, {"sub": "legado", "scope": "admin"}, kid="2026-07")
+    expect_status(client, legacy, 200, "llave anterior")
+    write_keys(keys_path, [new_key], "2026-10", 1)
+    expect_status(client, legacy, 401, "llave retirada")
+    expect_status(client, good, 200, "llave activa tras la rotación")
+    print(f"rechazos y rotación sin reinicio: OK; fallas {verifier.stats()['failures']}")
+    keyring.check_interval = 5.0  # el valor de producción: un stat cada 5 s, no en cada token
+
+    tokens = issue(args.tokens)
+    verifier.clear()
+    cold = per_call_us(verifier, tokens)
+    warm = per_call_us(verifier, tokens)
+    print(f"verify por llamada: fría {cold:7.2f} us   caliente {warm:6.2f} us   ({cold / warm:.1f}x)")
+
+    # El test client tiene mucho ruido: rondas intercaladas y el mejor tiempo de cada modo
+    best = {"demo": float("inf"), "cold": float("inf"), "warm": float("inf")}
+    for _ in range(args.rounds):
+        req_tokens = issue(args.requests)
+        agente.AUTH_MODE = "demo"
+        best["demo"] = min(best["demo"], per_request_us(client, req_tokens))
+        agente.AUTH_MODE = "auto"
+        best["cold"] = min(best["cold"], per_request_us(client, req_tokens))
+        best["warm"] = min(best["warm"], per_request_us(client, req_tokens))
+    demo = best["demo"]
+    print(f"petición completa:  demo {demo:7.1f} us   jwt fría {best['cold']:7.1f} us ({best['cold'] - demo:+6.1f})   "
+          f"jwt caliente {best['warm']:7.1f} us ({best['warm'] - demo:+6.1f})")
+    stats = verifier.stats()
+    print(f"caché: {stats['entries']:,} entradas, hit ratio {stats['hit_ratio']:.2%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Benchmark: decisiones/seg de agent_decisions_batch vs N llamadas individuales.
+
+Uso (desde Agente_Cobranza/):
+    python benchmarks/bench_batch_decisions.py --customers 20000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from uuid import uuid4
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as agente  # noqa: E402
+
+
+def seed(n_customers: int, rnd: random.Random) -> list[str]:
+    conn = agente.get_connection()
+    try:
+        ids = [str(uuid4()) for _ in range(n_customers)]
+        conn.executemany(
+            "INSERT INTO customers (id, name, email, phone, metadata) VALUES (?,?,?,?,?)",
+            [(cid, f"Cliente {i}", f"c{i}@example.com", None, "{}") for i, cid in enumerate(ids)],
+        )
+        methods = []
+        for cid in ids:
+            for j in range(rnd.randint(0, 3)):
+                methods.append((
+                    str(uuid4()), cid, rnd.choice(["card", "wallet", "pse", "corresponsal"]),
+                    None, "tok", "4242", 12, 2030, 1 if j == 0 else 0, "{}",
+                ))
+        conn.executemany(
+            """INSERT INTO payment_methods
+               (id, customer_id, type, provider, token, last4, expiry_month, expiry_year, is_default, metadata)
+               VALUES (?,?,?,?,?,?,?,?,?,?)""",
+            methods,
+        )
+        conn.commit()
+        return ids
+    finally:
+        conn.close()
+
+
+def make_contexts(ids: list[str], rnd: random.Random) -> list[dict]:
+    return [{
+        "customer_id": cid,
+        "segmento": rnd.choice(["vip", "consumo", "pyme", "consumo_alto", "otro"]),
+        "amount_due": round(rnd.uniform(100, 50000), 2),
+        "dpd": rnd.randint(0, 180),
+        "propension_pago": round(rnd.random(), 3),
+        "channel": rnd.choice(["whatsapp", "ivr", "app"]),
+        "currency": "MXN",
+    } for cid in ids]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--customers", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rnd = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        agente.DB_PATH = os.path.join(tmp, "bench.db")
+        agente.init_db()
+        ids = seed(args.customers, rnd)
+        contexts = make_contexts(ids, rnd)
+
+        t0 = time.perf_counter()
+        single = [
+            agente.build_decision(ctx, agente.get_payment_methods_for_customer(ctx["customer_id"]))
+            for ctx in contexts
+        ]
+        t_single = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        batch = agente.agent_decisions_batch(contexts)
+        t_batch = time.perf_counter() - t0
+
+        assert [r["decision"] for r in batch] == single, "batch y llamadas individuales difieren"
+
+        n = len(contexts)
+        print(f"contextos:            {n}")
+        print(f"individual:           {n / t_single:,.0f} decisiones/s ({t_single:.2f}s)")
+        print(f"batch:                {n / t_batch:,.0f} decisiones/s ({t_batch:.2f}s)")
+        print(f"speedup:              {t_single / t_batch:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
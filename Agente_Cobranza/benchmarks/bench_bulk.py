@@ -0,0 +1,93 @@
+"""
+Benchmark: filas/seg de importación y exportación masiva (bulk.py).
+
+Como referencia mide también el alta uno a uno vía POST /customers con el
+cliente de pruebas de Flask sobre una muestra pequeña.
+
+Uso (desde Agente_Cobranza/):
+    python benchmarks/bench_bulk.py --customers 200000
+"""
+import argparse
+import csv
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as agente  # noqa: E402
+import bulk  # noqa: E402
+
+
+def write_inputs(tmp: str, n: int, rnd: random.Random) -> tuple[str, str]:
+    customers_path = os.path.join(tmp, "customers.csv")
+    methods_path = os.path.join(tmp, "payment_methods.ndjson")
+    with open(customers_path, "w", newline="", encoding="utf-8") as fc, \
+            open(methods_path, "w", encoding="utf-8") as fm:
+        writer = csv.writer(fc)
+        writer.writerow(["id", "name", "email", "phone"])
+        for i in range(n):
+            cid = f"cust-{i:09d}"
+            writer.writerow([cid, f"Cliente {i}", f"c{i}@example.com", f"55{i:08d}"])
+            for j in range(rnd.randint(0, 3)):
+                fm.write(json.dumps({
+                    "customer_id": cid,
+                    "type": rnd.choice(["card", "wallet", "pse", "corresponsal"]),
+                    "token": f"tok_{i}_{j}", "last4": "4242",
+                    "expiry_month": rnd.randint(1, 12), "expiry_year": rnd.randint(2025, 2032),
+                    "is_default": j == 0,
+                }) + "\n")
+    return customers_path, methods_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--customers", type=int, default=200_000)
+    parser.add_argument("--single-sample", type=int, default=2_000)
+    parser.add_argument("--chunk-size", type=int, default=bulk.DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--seed", type=int, default=3)
+    args = parser.parse_args()
+
+    rnd = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        agente.DB_PATH = os.path.join(tmp, "bench.db")
+        agente.init_db()
+        customers_path, methods_path = write_inputs(tmp, args.customers, rnd)
+
+        conn = agente.get_connection()
+        try:
+            for table, path, fmt in (("customers", customers_path, "csv"),
+                                     ("payment_methods", methods_path, "ndjson")):
+                with open(path, newline="", encoding="utf-8") as f:
+                    report = bulk.import_records(conn, table, bulk.iter_records(f, fmt), args.chunk_size)
+                print(f"import {table:<16} {report['inserted']:>10,} filas  "
+                      f"{report['rows_per_sec']:>10,} filas/s  (fallidas: {report['failed']})")
+
+            for table in ("customers", "payment_methods"):
+                for fmt in ("csv", "ndjson"):
+                    t0 = time.perf_counter()
+                    size = rows = 0
+                    for block in bulk.export_rows(conn, table, fmt):
+                        size += len(block)
+                        rows += block.count("\n")
+                    elapsed = time.perf_counter() - t0
+                    print(f"export {table:<16} {fmt:<6} {rows:>10,} líneas  "
+                          f"{rows / elapsed:>10,.0f} líneas/s  ({size / 1e6:.1f} MB)")
+        finally:
+            conn.close()
+
+        client = agente.app.test_client()
+        headers = {"Authorization": "Bearer bench"}
+        t0 = time.perf_counter()
+        for i in range(args.single_sample):
+            client.post("/customers", json={"name": f"S {i}", "email": f"s{i}@example.com"}, headers=headers)
+        elapsed = time.perf_counter() - t0
+        print(f"POST /customers uno a uno   {args.single_sample:>10,} filas  "
+              f"{args.single_sample / elapsed:>10,.0f} filas/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Benchmark: corrida de campaña multiproceso (campaign.py).
+
+Siembra clientes con métodos de pago, escribe la lista de contextos en NDJSON
+(con algunas líneas inválidas) y:
+- corre la campaña con 1, 2, 4… workers (hasta los núcleos disponibles o
+  --workers) y reporta decisiones/seg, aceleración y eficiencia contra 1 worker;
+- verifica que cada cliente aparezca exactamente una vez en las particiones y
+  que una muestra de decisiones sea idéntica a agent_decisions_batch en proceso;
+- lanza la corrida por CLI, la mata con SIGKILL a media corrida (coordinador y
+  workers) y la reanuda sobre el mismo directorio, verificando de nuevo.
+
+La aceleración depende de los núcleos libres: en una máquina de un solo núcleo
+todas las corridas miden lo mismo (más el arranque de cada worker).
+
+Uso (desde Agente_Cobranza/):
+    python benchmarks/bench_campaign.py --customers 200000 --workers 1,2,4,8
+"""
+import argparse
+import json
+import os
+import random
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.dirname(HERE))
+
+import app as agente  # noqa: E402
+import campaign  # noqa: E402
+from bench_batch_decisions import make_contexts, seed  # noqa: E402
+
+
+def read_parts(summary: dict) -> dict:
+    """{customer_id: resultado} de todas las particiones; falla si un cliente aparece dos veces."""
+    seen = {}
+    for path in summary["parts"]:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                result = json.loads(line)
+                cid = (result.get("decision") or {}).get("customer_id") or result.get("customer_id")
+                key = cid if cid is not None else f"offset:{result.get('offset')}"
+                if key in seen:
+                    raise SystemExit(f"Cliente duplicado en las particiones: {key}")
+                seen[key] = result
+    return seen
+
+
+def verify(summary: dict, expected: dict, total_lines: int, invalid: int):
+    results = read_parts(summary)
+    if len(results) != total_lines or summary["processed"] != total_lines:
+        raise SystemExit(f"Faltan resultados: {len(results):,} / {summary['processed']:,} de {total_lines:,}")
+    if summary["errors"] != invalid:
+        raise SystemExit(f"Errores inesperados: {summary['errors']} (esperados {invalid})")
+    for cid, decision in expected.items():
+        if results[cid]["decision"] != decision:
+            raise SystemExit(f"Decisión distinta para {cid}")
+
+
+def default_workers() -> list[int]:
+    cores = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 1)
+    counts = [1]
+    while counts[-1] * 2 <= cores:
+        counts.append(counts[-1] * 2)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--customers", type=int, default=200_000)
+    parser.add_argument("--workers", help="Lista separada por comas (por defecto 1, 2, 4… hasta los núcleos)")
+    parser.add_argument("--chunk-size", type=int, default=campaign.DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--sample", type=int, default=5_000, help="decisiones comparadas contra el cálculo en proceso")
+    parser.add_argument("--seed", type=int, default=18)
+    args = parser.parse_args()
+
+    rnd = random.Random(args.seed)
+    tmp = tempfile.mkdtemp()
+    agente.DB_PATH = os.path.join(tmp, "bench_campaign.db")
+    agente.init_db()
+    ids = seed(args.customers, rnd)
+    contexts = make_contexts(ids, rnd)
+    input_path = os.path.join(tmp, "contextos.ndjson")
+    invalid = 3
+    with open(input_path, "w", encoding="utf-8") as f:
+        for i, ctx in enumerate(contexts):
+            f.write(json.dumps(ctx, ensure_ascii=False) + "\n")
+            if i % (len(contexts) // invalid + 1) == 7:
+                f.write("{no es json\n")
+    total_lines = len(contexts) + invalid
+    print(f"entrada: {len(contexts):,} contextos ({os.path.getsize(input_path) / 2**20:.1f} MiB), "
+          f"{invalid} líneas inválidas")
+
+    sample = rnd.sample(contexts, min(args.sample, len(contexts)))
+    expected = {r["decision"]["customer_id"]: r["decision"] for r in agente.agent_decisions_batch(sample)}
+    # Los workers abren la BD en sólo lectura: que no quede nada pendiente en el WAL
+    conn = agente.get_connection()
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.close()
+
+    counts = [int(w) for w in args.workers.split(",")] if args.workers else default_workers()
+    base = None
+    for workers in counts:
+        out_dir = os.path.join(tmp, f"run-{workers}")
+        summary = campaign.run_campaign(input_path, out_dir, agente.DB_PATH, workers=workers,
+                                        chunk_size=args.chunk_size)
+        verify(summary, expected, total_lines, invalid)
+        base = base or summary["rate"]
+        speedup = summary["rate"] / base
+        print(f"{workers:3d} workers: {summary['processed']:,} decisiones en {summary['seconds']:6.1f} s "
+              f"({summary['rate']:9,.0f}/s)  aceleración {speedup:4.2f}x  eficiencia {speedup / workers:4.0%}; "
+              f"particiones OK")
+
+    # Caída real: SIGKILL al grupo de procesos a media corrida y reanudación
+    workers = counts[-1]
+    out_dir = os.path.join(tmp, "crash")
+    cmd = [sys.executable, os.path.join(os.path.dirname(HERE), "campaign.py"), "run", input_path,
+           "--out", out_dir, "--db", agente.DB_PATH, "--workers", str(workers),
+           "--chunk-size", str(args.chunk_size), "--progress-interval", "3600"]
+    proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+    killed_at = 0
+    while proc.poll() is None:
+        time.sleep(0.2)
+        try:
+            killed_at = campaign.campaign_status(out_dir)["processed"]
+        except (campaign.CampaignError, ValueError):
+            continue  # manifiesto o checkpoint a medio escribir
+        if killed_at >= total_lines * 0.3:
+            os.killpg(proc.pid, signal.SIGKILL)
+            break
+    proc.wait()
+    if not killed_at or killed_at >= total_lines:
+        raise SystemExit("La corrida terminó antes de poder matarla; use más clientes")
+    summary = campaign.run_campaign(input_path, out_dir, agente.DB_PATH, workers=workers,
+                                    chunk_size=args.chunk_size)
+    if not summary["resumed"]:
+        raise SystemExit("La segunda corrida no reanudó desde los checkpoints")
+    verify(summary, expected, total_lines, invalid)
+    print(f"caída con SIGKILL tras {killed_at:,} decisiones confirmadas; reanudada en {summary['seconds']:.1f} s, "
+          f"sin duplicados ni faltantes")
+
+    csv_summary = campaign.run_campaign(input_path, os.path.join(tmp, "csv"), agente.DB_PATH,
+                                        workers=workers, fmt="csv", chunk_size=args.chunk_size)
+    rows = sum(sum(1 for _ in open(p, encoding="utf-8")) - 1 for p in csv_summary["parts"])
+    print(f"CSV: {rows:,} filas en {len(csv_summary['parts'])} particiones ({csv_summary['rate']:,.0f}/s)")
+
+
+if __name__ == "__main__":
+    main()
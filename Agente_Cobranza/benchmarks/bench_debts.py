@@ -0,0 +1,176 @@
+"""
+Benchmark: caminos calientes de deudas, promesas y pagos (ledger.py) con 1M de
+deudas.
+
+Siembra clientes, deudas (1-7 por cliente, ~70% abiertas) y promesas con
+executemany, revisa que las consultas calientes no hagan SCAN y mide:
+- contexto del agente (amount_due, dpd) por cliente con la consulta indexada,
+  contra la misma consulta forzando la tabla completa (NOT INDEXED);
+- la versión por lotes usada por /agent/decisions:batch;
+- promesas que vencen hoy y tramos de dpd de toda la cartera;
+- pagos/seg de record_payment (transacción con saldo y promesa).
+Los resultados se comparan contra lo calculado en Python al generar los datos.
+
+Uso (desde Agente_Cobranza/):
+    python benchmarks/bench_debts.py --debts 1000000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from uuid import uuid4
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as agente  # noqa: E402
+import ledger  # noqa: E402
+from migrations import check_query_plans  # noqa: E402
+
+
+def per_call_us(fn, args_list) -> float:
+    t0 = time.perf_counter()
+    for args in args_list:
+        fn(*args)
+    return (time.perf_counter() - t0) / len(args_list) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--debts", type=int, default=1_000_000)
+    parser.add_argument("--lookups", type=int, default=20_000)
+    parser.add_argument("--payments", type=int, default=5_000)
+    parser.add_argument("--seed", type=int, default=14)
+    args = parser.parse_args()
+
+    rnd = random.Random(args.seed)
+    today = date.today()
+    agente.DB_PATH = os.path.join(tempfile.mkdtemp(), "bench_debts.db")
+    agente.init_db()
+    conn = agente.get_connection()
+
+    # customer_id -> [saldo abierto, vencimiento abierto más antiguo, deudas abiertas]
+    expected = {}
+    open_debts = []
+    promises_today = 0
+    t0 = time.perf_counter()
+    customers, debts, promises = [], [], []
+    total = 0
+    while total < args.debts:
+        cid = str(uuid4())
+        customers.append((cid, f"Cliente {len(expected)}", f"c{len(expected)}@bench.mx"))
+        state = expected[cid] = [0.0, None, 0]
+        for _ in range(min(rnd.randint(1, 7), args.debts - total)):
+            did = str(uuid4())
+            principal = round(rnd.uniform(200, 50_000), 2)
+            due = (today - timedelta(days=rnd.randint(-30, 400))).isoformat()
+            is_open = rnd.random() < 0.7
+            balance = round(principal * rnd.uniform(0.1, 1.0), 2) if is_open else 0.0
+            debts.append((did, cid, "tarjeta", principal, balance, due, "open" if is_open else "paid"))
+            if is_open:
+                state[0] += balance
+                state[1] = due if state[1] is None else min(state[1], due)
+                state[2] += 1
+                open_debts.append((did, balance, due))
+                if rnd.random() < 0.15:
+                    promised = today + timedelta(days=rnd.randint(-10, 20))
+                    promises.append((str(uuid4()), cid, did, round(balance / 2, 2), promised.isoformat()))
+                    promises_today += promised == today
+            total += 1
+        if len(debts) >= 50_000:
+            conn.executemany("INSERT INTO customers (id, name, email) VALUES (?, ?, ?)", customers)
+            conn.executemany("""
+                INSERT INTO debts (id, customer_id, product, principal, balance, due_date, status)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, debts)
+            conn.executemany("""
+                INSERT INTO promises (id, customer_id, debt_id, amount, promised_date)
+                VALUES (?, ?, ?, ?, ?)
+            """, promises)
+            conn.commit()
+            customers, debts, promises = [], [], []
+    if debts:
+        conn.executemany("INSERT INTO customers (id, name, email) VALUES (?, ?, ?)", customers)
+        conn.executemany("""
+            INSERT INTO debts (id, customer_id, product, principal, balance, due_date, status)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, debts)
+        conn.executemany("""
+            INSERT INTO promises (id, customer_id, debt_id, amount, promised_date)
+            VALUES (?, ?, ?, ?, ?)
+        """, promises)
+        conn.commit()
+    conn.execute("ANALYZE")
+    print(f"siembra: {total:,} deudas / {len(expected):,} clientes en {time.perf_counter() - t0:.1f} s")
+
+    regressions = check_query_plans(conn)
+    if regressions:
+        raise SystemExit(f"Consultas con SCAN: {regressions}")
+    print("planes: OK (sin SCAN en HOT_QUERIES)")
+
+    ids = list(expected)
+    sample = [rnd.choice(ids) for _ in range(args.lookups)]
+    for cid in sample[:2000]:
+        ctx = ledger.debt_context(conn, cid, today)
+        balance, oldest, count = expected[cid]
+        if count == 0:
+            if ctx is not None:
+                raise SystemExit(f"Contexto inesperado para {cid}: {ctx}")
+            continue
+        if (ctx["open_debts"], ctx["oldest_due_date"]) != (count, oldest) or abs(ctx["amount_due"] - balance) > 0.01:
+            raise SystemExit(f"Contexto distinto para {cid}: {ctx} vs {expected[cid]}")
+    print("contexto del agente: OK")
+
+    us = per_call_us(lambda cid: ledger.debt_context(conn, cid, today), [(cid,) for cid in sample])
+    print(f"debt_context (índice cubriente): {us:9.1f} us/cliente")
+    scan_sql = """
+        SELECT COUNT(*), SUM(balance), MIN(due_date)
+        FROM debts NOT INDEXED
+        WHERE customer_id = ? AND status = 'open'
+    """
+    scan_sample = [(cid,) for cid in sample[:20]]
+    us_scan = per_call_us(lambda cid: conn.execute(scan_sql, (cid,)).fetchone(), scan_sample)
+    print(f"misma consulta sin índice:       {us_scan:9.1f} us/cliente ({us_scan / us:,.0f}x)")
+
+    batch = sample[:10_000]
+    t0 = time.perf_counter()
+    contexts = ledger.debt_contexts(conn, batch, today)
+    t_batch = time.perf_counter() - t0
+    if any(contexts.get(cid) != ledger.debt_context(conn, cid, today) for cid in batch[:500]):
+        raise SystemExit("debt_contexts difiere de debt_context")
+    print(f"debt_contexts (lote de {len(batch):,}): {len(batch) / t_batch:,.0f} clientes/s")
+
+    t0 = time.perf_counter()
+    due = ledger.promises_due(conn, today)
+    t_due = time.perf_counter() - t0
+    if len(due) != promises_today:
+        raise SystemExit(f"Promesas de hoy: {len(due)} vs {promises_today}")
+    print(f"promesas que vencen hoy: {len(due):,} en {t_due * 1000:.1f} ms")
+
+    t0 = time.perf_counter()
+    buckets = ledger.dpd_buckets(conn, today)
+    t_buckets = time.perf_counter() - t0
+    expected_buckets = dict.fromkeys([b[0] for b in ledger.DPD_BUCKETS] + ["current"], 0)
+    for _, _, due_date in open_debts:
+        dpd = (today - date.fromisoformat(due_date)).days
+        label = "current" if dpd < 0 else next(
+            name for name, low, high in ledger.DPD_BUCKETS if dpd >= low and (high is None or dpd < high))
+        expected_buckets[label] += 1
+    if {b["bucket"]: b["debts"] for b in buckets} != expected_buckets:
+        raise SystemExit(f"Tramos distintos: {buckets} vs {expected_buckets}")
+    print(f"tramos de dpd ({len(open_debts):,} abiertas): {t_buckets * 1000:.0f} ms "
+          + ", ".join(f"{b['bucket']}={b['debts']:,}" for b in buckets))
+
+    targets = rnd.sample(open_debts, min(args.payments, len(open_debts)))
+    t0 = time.perf_counter()
+    for debt_id, balance, _ in targets:
+        ledger.record_payment(conn, {"debt_id": debt_id, "amount": max(round(balance / 3, 2), 0.01)})
+    t_pay = time.perf_counter() - t0
+    print(f"record_payment: {len(targets) / t_pay:,.0f} pagos/s")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
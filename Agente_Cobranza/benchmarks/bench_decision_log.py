@@ -0,0 +1,188 @@
+"""
+Benchmark: bitácora de decisiones (decision_log.py).
+
+Mide con decisiones reales de build_decision (las de /agent/decision):
+- costo en el camino de la petición de DecisionLog.record() contra un INSERT
+  síncrono con commit por evento (lo que haría la ruta sin la cola);
+- eventos/seg sostenidos por el escritor de fondo para cada sink (SQLite en
+  lotes por transacción, NDJSON gzip rotativo) y la relación de compresión;
+- sobrecarga: una ráfaga mayor que la cola con cada política (drop_newest,
+  drop_oldest, block) — descartes contados y latencia de record();
+- correctitud: lo escrito es exactamente lo encolado menos lo descartado y el
+  scan por rango de tiempo devuelve cada evento una vez;
+- velocidad del scan por rango (una ventana de ~10% del total) en cada sink.
+
+Uso (desde Agente_Cobranza/):
+    python benchmarks/bench_decision_log.py --events 200000
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.dirname(HERE))
+
+import app as agente  # noqa: E402
+import decision_log  # noqa: E402
+from synthetic import iter_portfolio  # noqa: E402
+
+METHOD_FIELDS = ("id", "customer_id", "type", "provider", "token", "last4", "expiry_month", "expiry_year",
+                 "is_default", "created_at", "metadata")
+
+
+def sample_decisions(n: int, seed: int) -> list[tuple]:
+    """(customer_id, payload) de n decisiones reales, para repetirlas en la carga."""
+    out = []
+    for customer, methods, _, context in iter_portfolio(n, seed):
+        methods = [dict(zip(METHOD_FIELDS, m)) for m in methods]
+        decision = agente.build_decision(context, methods)
+        ctx = {k: context[k] for k in agente.DECISION_LOG_CONTEXT_FIELDS if k in context}
+        out.append((customer[0], {"context": ctx, "decision": decision}))
+    return out
+
+
+def percentiles(samples: list[float]) -> str:
+    samples = sorted(samples)
+    pick = lambda q: samples[min(len(samples) - 1, int(len(samples) * q))] * 1e6  # noqa: E731
+    return f"p50 {pick(0.5):6.1f} us  p99 {pick(0.99):7.1f} us  max {samples[-1] * 1e6:9.1f} us"
+
+
+def synchronous_insert(path: str, items: list[tuple], n: int) -> list[float]:
+    """Línea base: armar la fila e insertarla con commit dentro de la petición."""
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(decision_log.SCHEMA)
+    sink = decision_log.DecisionLog(decision_log.SQLiteSink(path), dumps=agente.app.json.dumps)
+    sql = (f"INSERT INTO decision_events ({', '.join(decision_log.COLUMNS)}) "
+           f"VALUES ({','.join('?' * len(decision_log.COLUMNS))})")
+    samples = []
+    for i in range(n):
+        customer_id, payload = items[i % len(items)]
+        t0 = time.perf_counter()
+        row = sink._rows([(time.time(), "decision", customer_id, "live", payload)])[0]
+        conn.execute(sql, tuple(row.get(c) for c in decision_log.COLUMNS))
+        conn.commit()
+        samples.append(time.perf_counter() - t0)
+    conn.close()
+    return samples
+
+
+def run_sink(name: str, sink, items: list[tuple], n: int, batch: int) -> dict:
+    log = decision_log.DecisionLog(sink, max_queue=n + 1, batch_size=batch, flush_interval=0.2,
+                                   dumps=agente.app.json.dumps, loads=agente.app.json.loads)
+    samples = []
+    t_start = time.perf_counter()
+    for i in range(n):
+        customer_id, payload = items[i % len(items)]
+        t0 = time.perf_counter()
+        log.record("decision", customer_id, "live", payload)
+        samples.append(time.perf_counter() - t0)
+    enqueue = time.perf_counter() - t_start
+    if not log.flush(timeout=600):
+        raise SystemExit(f"{name}: el escritor no terminó")
+    total = time.perf_counter() - t_start
+    stats = log.stats()
+    if stats["written"] != n or stats["dropped"]:
+        raise SystemExit(f"{name}: escritos {stats['written']} de {n}, descartes {stats['dropped']}")
+    print(f"record() con sink {name:6}: {percentiles(samples)}")
+    print(f"  {n:,} eventos encolados en {enqueue:.2f} s; escritos en {total:.2f} s "
+          f"({n / total:,.0f} eventos/s, {stats['batches']} lotes, último {stats['last_batch_ms']} ms)")
+    return {"log": log, "total": total}
+
+
+def check_scan(name: str, log, n: int):
+    rows = list(log.scan("2000-01-01", "2100-01-01"))
+    if len(rows) != n:
+        raise SystemExit(f"{name}: scan devolvió {len(rows)} de {n} eventos")
+    if any(r["event"] != "decision" or r["tactic"] is None for r in rows[:1000]):
+        raise SystemExit(f"{name}: columnas de analítica vacías")
+    if any(rows[i]["ts"] > rows[i + 1]["ts"] for i in range(n - 1)):
+        raise SystemExit(f"{name}: scan fuera de orden de tiempo")
+    # Ventana de ~10%: sólo se leen las filas / segmentos que la cubren
+    start, end = rows[int(n * 0.45)]["ts"], rows[int(n * 0.55)]["ts"]
+    t0 = time.perf_counter()
+    window = sum(1 for _ in log.scan(start, end))
+    elapsed = time.perf_counter() - t0
+    if window != sum(1 for r in rows if start <= r["ts"] < end):
+        raise SystemExit(f"{name}: el scan de la ventana no coincide con el filtro sobre todo el log")
+    t0 = time.perf_counter()
+    full = sum(1 for _ in log.scan("2000-01-01", "2100-01-01"))
+    full_elapsed = time.perf_counter() - t0
+    print(f"  scan {name}: ventana de {window:,} eventos en {elapsed * 1000:.0f} ms "
+          f"({window / elapsed:,.0f}/s); todo ({full:,}) en {full_elapsed:.2f} s")
+
+
+def overload(policy: str, items: list[tuple], n: int, queue: int, tmp: str):
+    """Ráfaga de n eventos contra una cola de `queue` y un sink lento (lotes pequeños)."""
+    sink = decision_log.SQLiteSink(os.path.join(tmp, f"overload_{policy}.db"))
+    log = decision_log.DecisionLog(sink, max_queue=queue, batch_size=max(1, queue // 10), flush_interval=0.05,
+                                   policy=policy, block_timeout=0.002, dumps=agente.app.json.dumps,
+                                   loads=agente.app.json.loads)
+    samples, accepted = [], 0
+    for i in range(n):
+        customer_id, payload = items[i % len(items)]
+        t0 = time.perf_counter()
+        accepted += log.record("decision", customer_id, "live", payload)
+        samples.append(time.perf_counter() - t0)
+    log.flush(timeout=600)
+    stats = log.stats()
+    dropped = sum(stats["dropped"].values())
+    if stats["written"] != stats["recorded"] - stats["dropped"].get("evicted", 0) or \
+            stats["recorded"] + dropped - stats["dropped"].get("evicted", 0) != n:
+        raise SystemExit(f"{policy}: la contabilidad no cuadra: {stats}")
+    written = sum(1 for _ in log.scan("2000-01-01", "2100-01-01"))
+    if written != stats["written"]:
+        raise SystemExit(f"{policy}: scan devolvió {written}, escritos {stats['written']}")
+    log.close()
+    print(f"  {policy:11}: aceptados {accepted:,}, escritos {stats['written']:,}, descartes {stats['dropped']}; "
+          f"record() {percentiles(samples)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=200_000)
+    parser.add_argument("--batch", type=int, default=1000)
+    parser.add_argument("--sync-events", type=int, default=5_000, help="eventos de la línea base síncrona")
+    parser.add_argument("--burst", type=int, default=50_000, help="eventos de la ráfaga de sobrecarga")
+    parser.add_argument("--queue", type=int, default=2_000, help="tamaño de cola en la prueba de sobrecarga")
+    parser.add_argument("--seed", type=int, default=23)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    agente.DB_PATH = os.path.join(tmp, "bench_decision_log.db")
+    agente.init_db()
+    items = sample_decisions(2_000, args.seed)
+    print(f"payload medio: {sum(len(json.dumps(p, default=str)) for _, p in items) / len(items):,.0f} bytes")
+
+    sync = synchronous_insert(os.path.join(tmp, "sync.db"), items, args.sync_events)
+    print(f"INSERT síncrono + commit por evento: {percentiles(sync)}")
+
+    sqlite_run = run_sink("sqlite", decision_log.SQLiteSink(os.path.join(tmp, "decision_log.db")),
+                          items, args.events, args.batch)
+    check_scan("sqlite", sqlite_run["log"], args.events)
+    sqlite_run["log"].close()
+
+    segments = os.path.join(tmp, "segments")
+    ndjson = decision_log.NDJSONSink(segments, max_bytes=4 * 2**20, loads=agente.app.json.loads)
+    ndjson_run = run_sink("ndjson", ndjson, items, args.events, args.batch)
+    check_scan("ndjson", ndjson_run["log"], args.events)
+    ndjson_run["log"].close()
+    compressed = sum(os.path.getsize(os.path.join(segments, name)) for name in ndjson.segments())
+    raw = sum(len(decision_log.dumps_row(row, agente.app.json.dumps, raw_fields=("payload",))) + 1
+              for row in ndjson.scan("2000-01-01", "2100-01-01"))
+    print(f"  ndjson: {len(ndjson.segments())} segmentos, {compressed / 2**20:.1f} MiB comprimidos "
+          f"({raw / compressed:.1f}x), {compressed / args.events:.0f} bytes/evento")
+
+    print(f"sobrecarga: ráfaga de {args.burst:,} eventos, cola de {args.queue:,}")
+    for policy in decision_log.POLICIES:
+        overload(policy, items, args.burst, args.queue, tmp)
+
+
+if __name__ == "__main__":
+    main()
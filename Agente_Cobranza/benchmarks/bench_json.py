@@ -0,0 +1,137 @@
+"""
+Benchmark: serialización de listados (fast_json.py), compresión (compression.py)
+y ETag / If-None-Match.
+
+Siembra clientes y métodos de pago con `metadata` y mide:
+- filas/seg serializando los listados como antes (json estándar, metadata como
+  string escapado) contra dumps_row con el json estándar y con orjson; verifica
+  que los objetos sean los mismos salvo `metadata`, que ahora llega decodificado;
+- GET /customers completo por el test client: tiempo y bytes sin comprimir,
+  con gzip (y br si está instalado) y el sondeo repetido con If-None-Match (304);
+- GET /customers/<id> con y sin If-None-Match.
+
+Uso (desde Agente_Cobranza/):
+    python benchmarks/bench_json.py --customers 20000
+"""
+import argparse
+import gzip
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as agente  # noqa: E402
+import fast_json  # noqa: E402
+
+AUTH = {"Authorization": "Bearer bench"}
+
+
+def seed(n: int, rnd: random.Random) -> list[str]:
+    conn = agente.get_connection()
+    ids = [f"c{i:08d}" for i in range(n)]
+    conn.executemany(
+        "INSERT INTO customers (id, name, email, phone, created_at, metadata) VALUES (?, ?, ?, ?, ?, ?)",
+        [(cid, f"Cliente {i}", f"{cid}@example.com", f"55{i:08d}", "2026-01-01T00:00:00",
+          json.dumps({"segmento": rnd.choice(["vip", "consumo", "pyme"]), "score": round(rnd.random(), 3),
+                      "tags": ["campaña-otoño", f"lote-{i % 50}"], "notas": "Cliente con \"comillas\""}))
+         for i, cid in enumerate(ids)])
+    conn.commit()
+    conn.close()
+    return ids
+
+
+def load_rows(table: str) -> list[dict]:
+    conn = agente.get_connection()
+    try:
+        return list(agente.iter_dict_rows(conn.execute(f"SELECT * FROM {table} ORDER BY id")))
+    finally:
+        conn.close()
+
+
+def rows_per_s(fn, rows, repeat=3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for row in rows:
+            fn(row)
+        best = min(best, time.perf_counter() - t0)
+    return len(rows) / best
+
+
+def timed_get(client, path, headers, repeat=5):
+    best, resp = float("inf"), None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        resp = client.get(path, headers=headers)
+        data = resp.get_data()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000, resp, data
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--customers", type=int, default=20_000)
+    parser.add_argument("--seed", type=int, default=20)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    agente.DB_PATH = os.path.join(tmp, "bench_json.db")
+    agente.init_db()
+    ids = seed(args.customers, random.Random(args.seed))
+    rows = load_rows("customers")
+
+    stdlib = fast_json.FastJSONProvider(agente.app, encoder="stdlib")
+    providers = {"stdlib": stdlib}
+    if fast_json.orjson is not None:
+        providers["orjson"] = fast_json.FastJSONProvider(agente.app, encoder="orjson")
+
+    for row in rows[:2_000]:
+        before = json.loads(stdlib.dumps(row))
+        before["metadata"] = json.loads(before["metadata"])
+        for provider in providers.values():
+            if json.loads(fast_json.dumps_row(row, provider.dumps)) != before:
+                raise SystemExit(f"Fila distinta para {row['id']}")
+    print(f"equivalencia: OK ({', '.join(providers)}); metadata llega como objeto")
+
+    legacy = rows_per_s(stdlib.dumps, rows)
+    print(f"antes (json, metadata string): {legacy:12,.0f} filas/s")
+    for name, provider in providers.items():
+        speed = rows_per_s(lambda r: fast_json.dumps_row(r, provider.dumps), rows)
+        print(f"dumps_row + {name:18}: {speed:12,.0f} filas/s ({speed / legacy:.2f}x)")
+
+    client = agente.app.test_client()
+    for name, provider in providers.items():
+        agente.app.json = provider
+        ms, resp, data = timed_get(client, "/customers", AUTH)
+        print(f"GET /customers ({name:6}) sin comprimir: {ms:8.1f} ms  {len(data) / 2**20:6.2f} MiB")
+    for encoding in agente.response_compressor.encodings:
+        ms, resp, data = timed_get(client, "/customers", {**AUTH, "Accept-Encoding": encoding})
+        if resp.headers.get("Content-Encoding") != encoding:
+            raise SystemExit(f"No se negoció {encoding}")
+        if encoding == "gzip" and len(json.loads(gzip.decompress(data))) != len(ids):
+            raise SystemExit("El cuerpo gzip no contiene el listado completo")
+        print(f"GET /customers ({encoding:6}) comprimido:   {ms:8.1f} ms  {len(data) / 2**20:6.2f} MiB")
+
+    etag = client.get("/customers", headers=AUTH).headers["ETag"]
+    ms, resp, _ = timed_get(client, "/customers", {**AUTH, "If-None-Match": etag}, repeat=50)
+    if resp.status_code != 304:
+        raise SystemExit(f"If-None-Match vigente respondió {resp.status_code}")
+    print(f"GET /customers con If-None-Match: {ms:8.3f} ms (304)")
+    client.put(f"/customers/{ids[0]}", json={"name": "Renombrado"}, headers=AUTH)
+    if client.get("/customers", headers={**AUTH, "If-None-Match": etag}).status_code != 200:
+        raise SystemExit("El ETag no cambió tras una escritura")
+
+    path = f"/customers/{ids[1]}"
+    ms_full, resp, _ = timed_get(client, path, AUTH, repeat=200)
+    ms_304, resp304, _ = timed_get(client, path, {**AUTH, "If-None-Match": resp.headers["ETag"]}, repeat=200)
+    if resp304.status_code != 304:
+        raise SystemExit("El detalle no respondió 304")
+    print(f"GET {path}: {ms_full * 1000:6.0f} us, con If-None-Match {ms_304 * 1000:6.0f} us (304)")
+
+
+if __name__ == "__main__":
+    main()
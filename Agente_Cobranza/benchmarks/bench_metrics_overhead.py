@@ -0,0 +1,78 @@
+"""
+Benchmark: overhead de la instrumentación (metrics.py) en POST /agent/decision.
+
+Alterna bloques de peticiones con la instrumentación apagada y encendida en el
+mismo proceso (el ruido de la máquina afecta a ambos modos por igual) y compara
+el mejor bloque de cada uno. Reporta el costo añadido en µs por petición y en %
+sobre el cliente de pruebas de Flask; como éste no incluye el parseo HTTP ni la
+red, el % es una cota superior del overhead en un servidor real.
+
+Uso (desde Agente_Cobranza/):
+    python benchmarks/bench_metrics_overhead.py --requests 2000 --blocks 10
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from uuid import uuid4
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as agente  # noqa: E402
+import metrics  # noqa: E402
+
+
+def set_metrics(enabled: bool):
+    agente.METRICS_ENABLED = enabled
+    metrics.registry.enabled = enabled
+    # El observador de SQL se fija al crear el pool
+    agente.get_pool().close()
+    agente._pool = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=2_000, help="peticiones por bloque")
+    parser.add_argument("--blocks", type=int, default=10, help="bloques por modo")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        agente.DB_PATH = os.path.join(tmp, "bench.db")
+        agente.init_db()
+        ids = [str(uuid4()) for _ in range(1000)]
+        conn = agente.get_connection()
+        conn.executemany("INSERT INTO customers (id, name, email) VALUES (?,?,?)", [(i, "c", "e") for i in ids])
+        conn.executemany(
+            "INSERT INTO payment_methods (id, customer_id, type, token, is_default) VALUES (?,?,'card','t',1)",
+            [(str(uuid4()), i) for i in ids])
+        conn.commit()
+        conn.close()
+
+        client = agente.app.test_client()
+        headers = {"Authorization": "Bearer bench"}
+        rnd = random.Random(1)
+        bodies = [{"customer_id": rnd.choice(ids), "segmento": rnd.choice(["vip", "consumo", "pyme"]),
+                   "amount_due": rnd.uniform(100, 9000), "dpd": rnd.randint(0, 120),
+                   "propension_pago": rnd.random(), "channel": "ivr"} for _ in range(args.requests)]
+
+        best = {False: float("inf"), True: float("inf")}
+        for _ in range(args.blocks):
+            for enabled in (False, True):
+                set_metrics(enabled)
+                t0 = time.perf_counter()
+                for body in bodies:
+                    client.post("/agent/decision", json=body, headers=headers)
+                best[enabled] = min(best[enabled], time.perf_counter() - t0)
+        set_metrics(True)
+
+    off, on = best[False], best[True]
+    print(f"sin métricas:   {args.requests / off:,.0f} req/s")
+    print(f"con métricas:   {args.requests / on:,.0f} req/s")
+    print(f"costo añadido:  {(on - off) / args.requests * 1e6:.1f} µs/petición "
+          f"({(on - off) / off * 100:+.2f}% sobre el cliente de pruebas)")
+
+
+if __name__ == "__main__":
+    main()
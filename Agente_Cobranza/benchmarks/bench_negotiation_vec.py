@@ -0,0 +1,81 @@
+"""
+Benchmark: motor columnar (negotiation_vec) vs clases escalares de app.py.
+
+Antes de medir, verifica que ambos caminos producen exactamente las mismas
+propuestas sobre una cartera aleatoria (incluye casos borde: montos <= 0,
+dpd en fronteras de 30 días, scores en 0.4/0.5/0.7 y segmento nulo).
+
+Uso (desde Agente_Cobranza/):
+    python benchmarks/bench_negotiation_vec.py --rows 1000000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as agente  # noqa: E402
+import negotiation_vec  # noqa: E402
+
+SEGMENTS = np.array(["vip", "VIP", "consumo_alto", "consumo", "pyme", "otro", "", None], dtype=object)
+
+
+def make_portfolio(rows: int, seed: int):
+    rng = np.random.default_rng(seed)
+    segmento = SEGMENTS[rng.integers(0, len(SEGMENTS), rows)]
+    dpd = np.where(rng.random(rows) < 0.2, rng.integers(0, 7, rows) * 30, rng.integers(-5, 400, rows))
+    score = np.where(rng.random(rows) < 0.2,
+                     rng.choice([0.0, 0.4, 0.5, 0.7, 1.0], rows),
+                     np.round(rng.random(rows), 3))
+    amount = np.where(rng.random(rows) < 0.05,
+                      rng.choice([0.0, -10.0, 299.99, 300.0, 900.0, 3600.0], rows),
+                      np.round(rng.uniform(1, 20000, rows), 2))
+    return segmento, dpd, score, amount
+
+
+def scalar(segmento, dpd, score, amount):
+    out = []
+    for seg, d, p, a in zip(segmento, dpd.tolist(), score.tolist(), amount.tolist()):
+        ctx = {"segmento": seg, "amount_due": a, "dpd": d, "propension_pago": p}
+        out.append(agente.select_negotiation_strategy(seg, ctx).propose(ctx))
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--check-rows", type=int, default=200_000)
+    parser.add_argument("--seed", type=int, default=11)
+    args = parser.parse_args()
+
+    # Equivalencia exacta entre caminos
+    cols = make_portfolio(args.check_rows, args.seed)
+    expected = scalar(*cols)
+    res = negotiation_vec.propose_batch(*cols)
+    mismatches = [i for i, exp in enumerate(expected) if negotiation_vec.to_proposal(res, i) != exp]
+    if mismatches:
+        i = mismatches[0]
+        raise SystemExit(f"{len(mismatches)} diferencias; primera fila {i}: "
+                         f"{negotiation_vec.to_proposal(res, i)} != {expected[i]}")
+    print(f"equivalencia:   OK en {args.check_rows:,} filas")
+
+    cols = make_portfolio(args.rows, args.seed + 1)
+    t0 = time.perf_counter()
+    scalar(*cols)
+    t_scalar = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    negotiation_vec.propose_batch(*cols)
+    t_vec = time.perf_counter() - t0
+
+    print(f"filas:          {args.rows:,}")
+    print(f"escalar:        {args.rows / t_scalar:,.0f} filas/s ({t_scalar:.2f}s)")
+    print(f"vectorizado:    {args.rows / t_vec:,.0f} filas/s ({t_vec:.3f}s)")
+    print(f"speedup:        {t_scalar / t_vec:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Benchmark: /agent/decision servido desde decisiones precalculadas (offer_cache)
+contra el cálculo en vivo.
+
+Siembra clientes y métodos, precalcula la lista objetivo de la campaña y
+verifica que cada decisión servida desde la caché sea idéntica a la calculada
+en vivo. Mide decisiones/seg del precálculo, latencia p50/p99 de /agent/decision
+(cliente de prueba de Flask) en vivo y con acierto en la caché, el costo por
+decisión de cada camino sin el cliente de prueba, y que tras
+invalidar un porcentaje de clientes (alta de un método de pago) esos clientes
+vuelvan a calcularse en vivo (iguales al cálculo sin caché).
+
+Uso (desde Agente_Cobranza/):
+    python benchmarks/bench_offer_cache.py --customers 20000 --requests 5000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as agente  # noqa: E402
+from bench_batch_decisions import make_contexts, seed  # noqa: E402
+
+HEADERS = {"Authorization": "Bearer bench"}
+
+
+def timed_requests(client, contexts) -> tuple[list[float], list[dict]]:
+    latencies, bodies = [], []
+    for ctx in contexts:
+        t0 = time.perf_counter()
+        response = client.post("/agent/decision", json=ctx, headers=HEADERS)
+        latencies.append(time.perf_counter() - t0)
+        bodies.append(response.get_json())
+    return latencies, bodies
+
+
+def describe(latencies: list[float]) -> str:
+    ordered = sorted(latencies)
+    p99 = ordered[int(len(ordered) * 0.99) - 1]
+    return (f"{len(latencies) / sum(latencies):8,.0f} req/s  p50 {statistics.median(ordered) * 1e6:6.0f} us"
+            f"  p99 {p99 * 1e6:6.0f} us")
+
+
+def serve_us(contexts) -> tuple[float, float]:
+    """
+    Costo por decisión sin el cliente de prueba (que domina la latencia de
+    arriba): lectura de la caché + respuesta cruda contra build_decision + jsonify.
+    """
+    with agente.app.app_context():
+        t0 = time.perf_counter()
+        for ctx in contexts:
+            decision = agente.get_precomputed_decision(ctx, None)
+            agente.Response('{"status":"ok","precomputed":true,"decision":' + decision + "}",
+                            mimetype="application/json")
+        t1 = time.perf_counter()
+        for ctx in contexts:
+            methods = agente.get_payment_methods_for_customer(ctx["customer_id"])
+            agente.jsonify({"status": "ok", "decision": agente.build_decision(ctx, methods)})
+        t2 = time.perf_counter()
+    return (t1 - t0) / len(contexts) * 1e6, (t2 - t1) / len(contexts) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--customers", type=int, default=20_000)
+    parser.add_argument("--requests", type=int, default=5_000)
+    parser.add_argument("--invalidate", type=float, default=0.05, help="fracción de clientes a invalidar")
+    parser.add_argument("--seed", type=int, default=16)
+    args = parser.parse_args()
+
+    rnd = random.Random(args.seed)
+    agente.DB_PATH = os.path.join(tempfile.mkdtemp(), "bench_offer_cache.db")
+    agente.init_db()
+    ids = seed(args.customers, rnd)
+    contexts = make_contexts(ids, rnd)
+    client = agente.app.test_client()
+    sample = [rnd.choice(contexts) for _ in range(args.requests)]
+
+    agente.OFFER_CACHE_ENABLED = False
+    live_lat, live = timed_requests(client, sample)
+
+    report = agente.precompute_decisions(contexts, campaign="bench")
+    print(f"precálculo: {report['stored']:,} decisiones en {report['seconds']:.1f} s "
+          f"({report['stored'] / report['seconds']:,.0f}/s)")
+
+    agente.OFFER_CACHE_ENABLED = True
+    hit_lat, hits = timed_requests(client, sample)
+    for expected, got in zip(live, hits):
+        if not got.get("precomputed") or got["decision"] != expected["decision"]:
+            raise SystemExit(f"Decisión precalculada distinta: {got} vs {expected}")
+    print(f"equivalencia: OK en {len(sample):,} peticiones")
+    print(f"en vivo:        {describe(live_lat)}")
+    print(f"precalculada:   {describe(hit_lat)}")
+    us_hit, us_live = serve_us(sample)
+    print(f"por decisión: precalculada {us_hit:.0f} us, en vivo {us_live:.0f} us ({us_live / us_hit:.1f}x)")
+
+    invalidated = rnd.sample(ids, int(len(ids) * args.invalidate))
+    for cid in invalidated:
+        client.post("/payment_methods", headers=HEADERS, json={
+            "customer_id": cid, "type": "corresponsal", "token": "tok", "provider": "oxxo_pay", "is_default": True})
+    touched = set(invalidated)
+    _, after = timed_requests(client, sample)
+    agente.OFFER_CACHE_ENABLED = False
+    _, fresh = timed_requests(client, sample)
+    agente.OFFER_CACHE_ENABLED = True
+    stale = [ctx["customer_id"] for ctx, got, expected in zip(sample, after, fresh)
+             if got["decision"] != expected["decision"]
+             or (ctx["customer_id"] in touched and got.get("precomputed"))]
+    if stale:
+        raise SystemExit(f"{len(stale)} decisiones no reflejan el método nuevo tras invalidar")
+    hit_ratio = sum(1 for b in after if b.get("precomputed")) / len(after)
+    print(f"tras invalidar {len(invalidated):,} clientes: aciertos {hit_ratio:.1%}, sin decisiones obsoletas")
+
+
+if __name__ == "__main__":
+    main()
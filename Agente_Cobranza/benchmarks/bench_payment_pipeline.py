@@ -0,0 +1,97 @@
+"""
+Benchmark: pagos/seg del pipeline de rutas de pago contra el gateway simulado.
+
+Compara ejecutar los pagos uno tras otro contra el pipeline concurrente (límite
+por proveedor) y verifica que, con errores transitorios y respuestas perdidas,
+ningún pago se cobre dos veces: los cobros del simulador deben coincidir con los
+pagos que llegaron a su paso de cobro, y re-ejecutar todas las llaves no debe
+generar cobros nuevos.
+
+Uso (desde Agente_Cobranza/):
+    python benchmarks/bench_payment_pipeline.py --payments 5000 --latency-ms 20
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import select_payment_strategy  # noqa: E402
+from payment_pipeline import CHARGE_STEPS, PaymentPipeline, SimulatedGateway  # noqa: E402
+
+
+def make_routes(n: int, rnd: random.Random) -> list[tuple[dict, str]]:
+    items = []
+    for i in range(n):
+        method = rnd.choice(["card", "card", "wallet", "pse", "corresponsal"])
+        route = select_payment_strategy(method).execute({"amount": round(rnd.uniform(100, 5000), 2)})
+        items.append((route, f"bench-{i}"))
+    return items
+
+
+def charged(result: dict) -> bool:
+    return any(s["step"] in CHARGE_STEPS and s["status"] == "ok" for s in result["steps"])
+
+
+async def run_sequential(pipeline: PaymentPipeline, items) -> list[dict]:
+    return [await pipeline.execute(route, key) for route, key in items]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--payments", type=int, default=5000)
+    parser.add_argument("--sequential", type=int, default=200, help="pagos para la corrida secuencial")
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--jitter-ms", type=float, default=5.0)
+    parser.add_argument("--failure-rate", type=float, default=0.02)
+    parser.add_argument("--lost-rate", type=float, default=0.02, help="pasos aplicados con respuesta perdida")
+    parser.add_argument("--decline-rate", type=float, default=0.05)
+    parser.add_argument("--limit", type=int, default=64, help="concurrencia por proveedor")
+    parser.add_argument("--seed", type=int, default=11)
+    args = parser.parse_args()
+
+    rnd = random.Random(args.seed)
+    items = make_routes(args.payments, rnd)
+    total_steps = sum(len(route["steps"]) for route, _ in items)
+
+    def new_pipeline(limit: int) -> PaymentPipeline:
+        gateway = SimulatedGateway(
+            latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, failure_rate=args.failure_rate,
+            lost_response_rate=args.lost_rate, decline_rate=args.decline_rate, seed=args.seed)
+        return PaymentPipeline(gateway, default_limit=limit, max_attempts=5, retry_backoff=0.01)
+
+    seq_items = items[: args.sequential]
+    pipeline = new_pipeline(1)
+    t0 = time.perf_counter()
+    asyncio.run(run_sequential(pipeline, seq_items))
+    t_seq = time.perf_counter() - t0
+
+    pipeline = new_pipeline(args.limit)
+    t0 = time.perf_counter()
+    results = asyncio.run(pipeline.execute_many(items))
+    t_pipe = time.perf_counter() - t0
+
+    gateway = pipeline.gateway
+    expected = sum(1 for r in results if charged(r))
+    if gateway.charges != expected:
+        raise SystemExit(f"Cobros duplicados: gateway={gateway.charges} pagos cobrados={expected}")
+    charges_before = gateway.charges
+    asyncio.run(pipeline.execute_many(items))
+    if gateway.charges != charges_before:
+        raise SystemExit(f"Re-ejecutar las llaves generó {gateway.charges - charges_before} cobros nuevos")
+
+    by_status = {}
+    for r in results:
+        by_status[r["status"]] = by_status.get(r["status"], 0) + 1
+    print(f"pagos: {args.payments:,} ({total_steps:,} pasos), latencia {args.latency_ms} ms/paso")
+    print(f"secuencial:  {len(seq_items) / t_seq:,.1f} pagos/s ({len(seq_items)} pagos)")
+    print(f"pipeline:    {args.payments / t_pipe:,.1f} pagos/s (límite {args.limit} por proveedor)")
+    print(f"resultados:  {by_status}, reintentos {pipeline.retries:,}")
+    print(f"idempotencia: OK ({gateway.charges:,} cobros, {gateway.replays:,} respuestas repetidas por el gateway)")
+
+
+if __name__ == "__main__":
+    main()
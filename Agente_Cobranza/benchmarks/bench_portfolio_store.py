@@ -0,0 +1,95 @@
+"""
+Benchmark: memoria por registro y latencia de búsqueda de PortfolioStore contra
+la representación actual en dicts ({customer_id: [dict por método]}).
+
+Verifica primero que methods_for() devuelve exactamente lo mismo que
+get_payment_methods_for_customers para todos los clientes. Después mide bytes
+por método con tracemalloc, latencia de búsqueda (dict, store.methods_for,
+store.best_method y la consulta individual a SQLite del camino del agente) y
+decisiones/seg del lote con y sin la cartera en memoria.
+
+Uso (desde Agente_Cobranza/):
+    python benchmarks/bench_portfolio_store.py --customers 100000
+"""
+import argparse
+import gc
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as agente  # noqa: E402
+from bench_batch_decisions import make_contexts, seed  # noqa: E402
+
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    obj = build()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return obj, size
+
+
+def per_lookup_us(fn, ids, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for cid in ids:
+            fn(cid)
+        best = min(best, time.perf_counter() - t0)
+    return best / len(ids) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--customers", type=int, default=100_000)
+    parser.add_argument("--lookups", type=int, default=50_000)
+    parser.add_argument("--seed", type=int, default=3)
+    args = parser.parse_args()
+
+    rnd = random.Random(args.seed)
+    agente.DB_PATH = os.path.join(tempfile.mkdtemp(), "bench_portfolio.db")
+    agente.init_db()
+    ids = seed(args.customers, rnd)
+
+    as_dicts, dict_bytes = measure(lambda: agente.get_payment_methods_for_customers(ids))
+    store, store_bytes = measure(agente.load_portfolio_store)
+    n_methods = store.method_count()
+
+    for cid in ids:
+        if store.methods_for(cid) != as_dicts[cid]:
+            raise SystemExit(f"Diferencia en los métodos del cliente {cid}")
+    print(f"equivalencia: OK en {len(ids):,} clientes / {n_methods:,} métodos")
+
+    print(f"dicts:  {dict_bytes / 2**20:8.1f} MiB ({dict_bytes / max(n_methods, 1):6.0f} B/método)")
+    print(f"store:  {store_bytes / 2**20:8.1f} MiB ({store_bytes / max(n_methods, 1):6.0f} B/método)"
+          f"  -> {dict_bytes / max(store_bytes, 1):.1f}x menos memoria")
+
+    sample = [rnd.choice(ids) for _ in range(args.lookups)]
+    print(f"dict[customer_id]:          {per_lookup_us(as_dicts.__getitem__, sample):7.3f} us/búsqueda")
+    print(f"store.methods_for:          {per_lookup_us(store.methods_for, sample):7.3f} us/búsqueda")
+    print(f"store.best_method:          {per_lookup_us(store.best_method, sample):7.3f} us/búsqueda")
+    db_sample = sample[: min(len(sample), 5000)]
+    print(f"SQLite (camino del agente): {per_lookup_us(agente.load_payment_methods_for_customer, db_sample, 1):7.3f} us/búsqueda")
+
+    contexts = make_contexts(ids, rnd)
+    store.load_contexts(contexts)
+    t0 = time.perf_counter()
+    agente.agent_decisions_batch(contexts)
+    t_db = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    agente.agent_decisions_batch(list(store.iter_contexts()), store=store)
+    t_store = time.perf_counter() - t0
+    print(f"lote desde SQLite:  {len(contexts) / t_db:,.0f} decisiones/s")
+    print(f"lote desde store:   {len(contexts) / t_store:,.0f} decisiones/s")
+
+
+if __name__ == "__main__":
+    main()
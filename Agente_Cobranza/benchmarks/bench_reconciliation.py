@@ -0,0 +1,116 @@
+"""
+Benchmark: conciliación de un archivo de liquidación sintético de corresponsal.
+
+Crea las referencias en `cash_references`, escribe un CSV con la mezcla de
+casos (conciliadas, monto distinto, pagadas tarde, desconocidas, repetidas),
+corre reconcile_stream en un solo hilo y verifica que los conteos del reporte
+coincidan con los generados. Reporta el tiempo de carga del lado de
+construcción del hash join, líneas/seg totales y tiempo de aplicación.
+
+Uso (desde Agente_Cobranza/):
+    python benchmarks/bench_reconciliation.py --lines 5000000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as agente  # noqa: E402
+import reconciliation  # noqa: E402
+
+CODE_BASE = 93_000_000_000_000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", type=int, default=5_000_000)
+    parser.add_argument("--dry-run", action="store_true", help="no marcar referencias (sólo hash join)")
+    parser.add_argument("--seed", type=int, default=13)
+    args = parser.parse_args()
+
+    rnd = random.Random(args.seed)
+    workdir = tempfile.mkdtemp()
+    agente.DB_PATH = os.path.join(workdir, "bench_reconciliation.db")
+    agente.init_db()
+
+    now = datetime.utcnow()
+    fmt = "%Y-%m-%d %H:%M:%S"
+    created = (now - timedelta(hours=30)).strftime(fmt)
+    expires_ok = (now + timedelta(hours=18)).strftime(fmt)
+    expires_past = (now - timedelta(hours=6)).strftime(fmt)
+    paid_at = (now - timedelta(hours=2)).strftime(fmt)
+
+    expected = dict.fromkeys(reconciliation.OUTCOMES, 0)
+    csv_path = os.path.join(workdir, "liquidacion.csv")
+    refs = []
+    matched_codes = []
+    t0 = time.perf_counter()
+    conn = agente.get_connection()
+    insert = """
+        INSERT INTO cash_references (reference, customer_id, amount_cents, currency, provider,
+                                     status, created_at, expires_at)
+        VALUES (?, NULL, ?, 'MXN', 'oxxo_pay', 'open', ?, ?)
+    """
+    try:
+        with open(csv_path, "w", encoding="utf-8") as out:
+            out.write("referencia,monto,fecha_pago,tienda\n")
+            for i in range(args.lines):
+                code = str(CODE_BASE + i)
+                cents = rnd.randint(5_000, 2_000_000)
+                roll = rnd.random()
+                if roll < 0.02 and matched_codes:
+                    # repetida: una referencia ya pagada en este archivo
+                    dup_code, dup_cents = matched_codes[rnd.randrange(len(matched_codes))]
+                    out.write(f"{dup_code},{dup_cents / 100:.2f},{paid_at},T{i % 9000}\n")
+                    expected["duplicate"] += 1
+                    continue
+                if roll < 0.05:
+                    out.write(f"{code},{cents / 100:.2f},{paid_at},T{i % 9000}\n")
+                    expected["unmatched"] += 1
+                    continue
+                if roll < 0.07:
+                    refs.append((code, cents, created, expires_past))
+                    expected["expired"] += 1
+                    out.write(f"{code},{cents / 100:.2f},{paid_at},T{i % 9000}\n")
+                elif roll < 0.10:
+                    refs.append((code, cents, created, expires_ok))
+                    expected["amount_mismatch"] += 1
+                    out.write(f"{code},{(cents + 100) / 100:.2f},{paid_at},T{i % 9000}\n")
+                else:
+                    refs.append((code, cents, created, expires_ok))
+                    expected["matched"] += 1
+                    if len(matched_codes) < 100_000:
+                        matched_codes.append((code, cents))
+                    out.write(f"{code},{cents / 100:.2f},{paid_at},T{i % 9000}\n")
+                if len(refs) >= 50_000:
+                    conn.executemany(insert, refs)
+                    conn.commit()
+                    refs = []
+        if refs:
+            conn.executemany(insert, refs)
+            conn.commit()
+        setup = time.perf_counter() - t0
+        size_mb = os.path.getsize(csv_path) / 2**20
+        print(f"preparación: {setup:.1f} s ({args.lines:,} líneas, {size_mb:,.0f} MiB)")
+
+        with open(csv_path, "rb") as f:
+            report = reconciliation.reconcile_stream(conn, f, source="bench", apply=not args.dry_run, now=now)
+    finally:
+        conn.close()
+
+    for outcome, count in expected.items():
+        if report[outcome] != count:
+            raise SystemExit(f"Conteo distinto en {outcome}: reporte={report[outcome]} esperado={count}")
+    print("conteos: OK " + ", ".join(f"{k}={report[k]:,}" for k in reconciliation.OUTCOMES))
+    print(f"carga del hash (referencias): {report['references_loaded']:,} en {report['load_seconds']:.2f} s")
+    print(f"conciliación total: {report['seconds']:.2f} s -> {report['lines_per_sec']:,} líneas/s"
+          f"{' (dry-run)' if args.dry_run else ''}")
+
+
+if __name__ == "__main__":
+    main()
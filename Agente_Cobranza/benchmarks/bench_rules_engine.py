@@ -0,0 +1,155 @@
+"""
+Benchmark: tabla compilada del motor de reglas vs el if-chain de
+select_negotiation_strategy.
+
+Primero verifica que el rule set "default" elige la misma táctica que el
+if-chain en todos los contextos de prueba (incluye fronteras de dpd y score).
+Sin `ruleset` la app usa el if-chain; la tabla sólo corre cuando la petición
+elige un set. Los tiempos son el mejor de 3 pasadas. La segunda parte compara un
+rule set grande (--rules reglas) evaluado regla por regla contra su tabla
+compilada, que es donde el costo del if-chain crece linealmente.
+
+Uso (desde Agente_Cobranza/):
+    python benchmarks/bench_rules_engine.py --contexts 500000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as agente  # noqa: E402
+from rules_engine import CompiledRuleSet, DEFAULT_RULESET, _parse_rule  # noqa: E402
+
+SEGMENTS = ["vip", "VIP", "consumo_alto", "consumo", "pyme", "otro", "", None]
+
+
+def make_contexts(n: int, seed: int) -> list[dict]:
+    rnd = random.Random(seed)
+    return [{
+        "customer_id": f"c{i}",
+        "segmento": rnd.choice(SEGMENTS),
+        "dpd": rnd.choice([0, 29, 30, 59, 60, 61, 90, rnd.randint(-5, 400)]),
+        "propension_pago": rnd.choice([0.0, 0.4, 0.49, 0.5, 0.7, 1.0, rnd.random()]),
+    } for i in range(n)]
+
+
+def best_time(fn, passes: int = 3) -> float:
+    """Mejor de `passes` corridas: con una CPU compartida una sola pasada varía mucho."""
+    best = float("inf")
+    for _ in range(passes):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def large_ruleset(n_rules: int, seed: int) -> dict:
+    rnd = random.Random(seed)
+    segments = ["vip", "consumo_alto", "consumo", "pyme", "nomina", "auto", "hipoteca", "tarjeta"]
+    rules = []
+    for _ in range(n_rules):
+        when = {}
+        if rnd.random() < 0.6:
+            when["segmento"] = rnd.sample(segments, rnd.randint(1, 3))
+        lo = rnd.choice([0, 15, 30, 45, 60, 90, 120, 180])
+        when["dpd_min"] = lo
+        when["dpd_max"] = lo + rnd.choice([15, 30, 60, 90])
+        when["score_min"] = round(rnd.random() * 0.5, 2)
+        when["score_max"] = round(when["score_min"] + rnd.random() * 0.5, 2)
+        rules.append({"when": when, "tactic": rnd.choice(["discount", "installments", "hybrid"])})
+    return {"name": "grande", "default": "discount", "rules": rules}
+
+
+def interpret(parsed: list, default: str, segmento, dpd: int, score: float) -> str:
+    """Evaluación regla por regla (lo que haría un if-chain generado)."""
+    seg = (segmento or "").lower()
+    for r in parsed:
+        if r["segmento"] is not None and seg not in r["segmento"]:
+            continue
+        if r["dpd_min"] is not None and not dpd >= r["dpd_min"]:
+            continue
+        if r["dpd_max"] is not None and not dpd < r["dpd_max"]:
+            continue
+        if r["score_min"] is not None and not score >= r["score_min"]:
+            continue
+        if r["score_max"] is not None and not score < r["score_max"]:
+            continue
+        return r["tactic"]
+    return default
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--contexts", type=int, default=500_000)
+    parser.add_argument("--rules", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=5)
+    args = parser.parse_args()
+
+    contexts = make_contexts(args.contexts, args.seed)
+    compiled = CompiledRuleSet(DEFAULT_RULESET)
+    by_strategy = {type(s): name for name, s in agente.NEGOTIATION_STRATEGIES.items()}
+
+    for ctx in contexts:
+        expected = by_strategy[type(agente.select_negotiation_strategy(ctx["segmento"], ctx))]
+        got, _ = compiled.evaluate(ctx["segmento"], int(ctx["dpd"]), float(ctx["propension_pago"]))
+        if got != expected:
+            raise SystemExit(f"Diferencia en {ctx}: tabla={got} if-chain={expected}")
+    print(f"equivalencia:      OK en {len(contexts):,} contextos")
+
+    def chain():
+        for ctx in contexts:
+            agente.select_negotiation_strategy(ctx["segmento"], ctx)
+
+    def table():
+        for ctx in contexts:
+            compiled.evaluate(ctx["segmento"], int(ctx["dpd"]), float(ctx["propension_pago"]))
+
+    t_chain = best_time(chain)
+    t_table = best_time(table)
+
+    ab = agente.rules_registry.rulesets.get("ejemplo_ab")
+    t_ab = None
+    if ab is not None:
+        def table_ab():
+            for ctx in contexts:
+                ab.evaluate(ctx["segmento"], int(ctx["dpd"]), float(ctx["propension_pago"]), ctx["customer_id"])
+        t_ab = best_time(table_ab)
+
+    n = len(contexts)
+    print(f"if-chain:          {n / t_chain:,.0f} evaluaciones/s (camino sin ruleset)")
+    print(f"tabla compilada:   {n / t_table:,.0f} evaluaciones/s")
+    if t_ab is not None:
+        print(f"tabla + brazo A/B: {n / t_ab:,.0f} evaluaciones/s (ejemplo_ab, hash de customer_id)")
+
+    spec = large_ruleset(args.rules, args.seed)
+    parsed = [_parse_rule(rule, "grande") for rule in spec["rules"]]
+    big = CompiledRuleSet(spec)
+    sample = contexts[: min(n, 100_000)]
+    for ctx in sample:
+        dpd, score = int(ctx["dpd"]), float(ctx["propension_pago"])
+        if interpret(parsed, "discount", ctx["segmento"], dpd, score) != big.evaluate(ctx["segmento"], dpd, score)[0]:
+            raise SystemExit(f"Diferencia en el rule set grande: {ctx}")
+
+    def rule_by_rule():
+        for ctx in sample:
+            interpret(parsed, "discount", ctx["segmento"], int(ctx["dpd"]), float(ctx["propension_pago"]))
+
+    def big_table():
+        for ctx in sample:
+            big.evaluate(ctx["segmento"], int(ctx["dpd"]), float(ctx["propension_pago"]))
+
+    t_interp = best_time(rule_by_rule)
+    t_big = best_time(big_table)
+    m = len(sample)
+    arm = big.arms[0]
+    cells = sum(len(row) for table in (arm.other, *arm.rows.values()) for row in table)
+    print(f"{args.rules} reglas, regla por regla: {m / t_interp:,.0f} evaluaciones/s")
+    print(f"{args.rules} reglas, tabla compilada: {m / t_big:,.0f} evaluaciones/s "
+          f"({cells:,} celdas)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""
+Benchmark: búsqueda de clientes (customer_search.py, GET /customers:search).
+
+Siembra clientes con nombres de synthetic.py (nombre y dos apellidos con
+acentos), email y teléfono con formatos mezclados, con los triggers de FTS
+activos, y mide:
+- filas/seg de alta con el índice FTS contra la misma carga sin los triggers;
+- que la búsqueda sin acentos encuentre los nombres con acentos, que email y
+  teléfono normalizados encuentren al cliente exacto y que el índice siga
+  íntegro tras ediciones y bajas (integrity-check de FTS5);
+- latencia p50/p99 de search() por tipo de consulta (apellido completo,
+  prefijo corto, prefijo parcial, nombre + apellido, email, teléfono) y de la
+  ruta HTTP por el test client.
+
+Uso (desde Agente_Cobranza/):
+    python benchmarks/bench_search.py --customers 5000000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.dirname(HERE))
+
+import app as agente  # noqa: E402
+import customer_search  # noqa: E402
+from synthetic import FIRST_NAMES, LAST_NAMES  # noqa: E402
+
+AUTH = {"Authorization": "Bearer bench"}
+FTS_TRIGGERS = ("trg_customers_fts_insert", "trg_customers_fts_update", "trg_customers_fts_delete")
+PHONE_FORMATS = ("+52 {a} {b} {c}", "({a}) {b}-{c}", "{a}{b}{c}", "+52{a}{b}{c}")
+
+
+def customer_row(i: int, rnd: random.Random) -> tuple:
+    first, last1, last2 = rnd.choice(FIRST_NAMES), rnd.choice(LAST_NAMES), rnd.choice(LAST_NAMES)
+    digits = f"{rnd.randint(10**9, 10**10 - 1)}"
+    phone = rnd.choice(PHONE_FORMATS).format(a=digits[:2], b=digits[2:6], c=digits[6:])
+    email = f"{customer_search.fold(first)}.{customer_search.fold(last1)}{i}@example.com"
+    return (f"c{i:09d}", f"{first} {last1} {last2}", email, phone, "2026-01-01T00:00:00", "{}")
+
+
+def seed(conn, n: int, seed_value: int, chunk: int = 50_000) -> float:
+    rnd = random.Random(seed_value)
+    t0 = time.perf_counter()
+    for start in range(0, n, chunk):
+        conn.executemany("INSERT INTO customers (id, name, email, phone, created_at, metadata) VALUES (?,?,?,?,?,?)",
+                         [customer_row(i, rnd) for i in range(start, min(n, start + chunk))])
+        conn.commit()
+    return n / (time.perf_counter() - t0)
+
+
+def without_fts_triggers(conn):
+    """Quita los triggers de FTS (para medir la carga sin índice); devuelve su SQL para restaurarlos."""
+    saved = [row[0] for row in conn.execute(
+        f"SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name IN ({','.join('?' * len(FTS_TRIGGERS))})",
+        FTS_TRIGGERS)]
+    for name in FTS_TRIGGERS:
+        conn.execute(f"DROP TRIGGER {name}")
+    return saved
+
+
+def percentiles(samples: list[float]) -> tuple[float, float]:
+    samples = sorted(samples)
+    return samples[len(samples) // 2] * 1000, samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--customers", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=300, help="consultas por tipo")
+    parser.add_argument("--seed", type=int, default=22)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    sample_n = min(args.customers, 100_000)
+
+    # Alta sin triggers de FTS (línea base) sobre una BD aparte
+    agente.DB_PATH = os.path.join(tmp, "base.db")
+    agente.init_db()
+    conn = sqlite3.connect(agente.DB_PATH)
+    without_fts_triggers(conn)
+    conn.commit()
+    base_rate = seed(conn, sample_n, args.seed)
+    conn.close()
+
+    agente.DB_PATH = os.path.join(tmp, "bench_search.db")
+    agente.init_db()
+    conn = sqlite3.connect(agente.DB_PATH)
+    fts_rate = seed(conn, sample_n, args.seed)
+    print(f"alta de {sample_n:,} clientes: {base_rate:,.0f} filas/s sin FTS, {fts_rate:,.0f} con FTS "
+          f"({fts_rate / base_rate:.2f}x)")
+    if args.customers > sample_n:
+        # El resto se carga sin triggers y se indexa con 'rebuild' (como una importación inicial)
+        saved = without_fts_triggers(conn)
+        t0 = time.perf_counter()
+        rnd = random.Random(args.seed + 1)
+        for start in range(sample_n, args.customers, 100_000):
+            conn.executemany("INSERT INTO customers (id, name, email, phone, created_at, metadata) "
+                             "VALUES (?,?,?,?,?,?)",
+                             [customer_row(i, rnd) for i in range(start, min(args.customers, start + 100_000))])
+            conn.commit()
+        load = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        customer_search.rebuild(conn)
+        print(f"carga de {args.customers - sample_n:,} más: {load:.1f} s; rebuild del índice: "
+              f"{time.perf_counter() - t0:.1f} s")
+        for sql in saved:
+            conn.execute(sql)
+        conn.commit()
+
+    # Correctitud
+    rnd = random.Random(args.seed)
+    sample = [conn.execute("SELECT id, name, email, phone FROM customers WHERE id = ?",
+                           (f"c{rnd.randrange(args.customers):09d}",)).fetchone() for _ in range(200)]
+    for cid, name, email, phone in sample:
+        # nombre sin acentos + la parte del email con el número: una sola coincidencia
+        q = f"{customer_search.fold(name)} {email.split('@')[0].split('.')[1]}"
+        if [r["id"] for r in customer_search.search(conn, q)["results"]] != [cid]:
+            raise SystemExit(f"'{q}' no encontró a {name}")
+        if cid not in {r["id"] for r in customer_search.search(conn, f" {email.upper()} ", limit=100)["results"]}:
+            raise SystemExit(f"El email {email} no encontró a {cid}")
+        digits = customer_search.phone_key(phone)
+        if cid not in {r["id"] for r in customer_search.search(conn, f"+52 {digits}", limit=100)["results"]}:
+            raise SystemExit(f"El teléfono {phone} no encontró a {cid}")
+    target = sample[0][0]
+    conn.execute("UPDATE customers SET name = 'Xochitl Quiñónez Ybarra' WHERE id = ?", (target,))
+    conn.execute("DELETE FROM customers WHERE id = ?", (sample[1][0],))
+    conn.commit()
+    found = customer_search.search(conn, "quinonez xoch")["results"]
+    if [r["id"] for r in found] != [target] or not customer_search.check(conn):
+        raise SystemExit("El índice no siguió la edición / baja")
+    print("correctitud: OK (sin acentos, email y teléfono normalizados, edición y baja sincronizadas)")
+
+    # Latencias
+    names = [customer_search.fold(n).split() for _, n, _, _ in sample]
+    emails = [e for _, _, e, _ in sample]
+    phones = [p for _, _, _, p in sample]
+    kinds = {
+        "apellido completo": lambda i: names[i % len(names)][1],
+        "prefijo de 3": lambda i: names[i % len(names)][1][:3],
+        "prefijo parcial": lambda i: names[i % len(names)][1][:6],
+        "nombre + apellidos": lambda i: " ".join(names[i % len(names)]),
+        "nombre + prefijo": lambda i: f"{names[i % len(names)][0]} {names[i % len(names)][2][:4]}",
+        "email": lambda i: emails[i % len(emails)],
+        "teléfono": lambda i: phones[i % len(phones)],
+    }
+    print(f"search() con {args.customers:,} clientes (max_candidates={agente.SEARCH_MAX_CANDIDATES}):")
+    for kind, make in kinds.items():
+        samples, truncated = [], 0
+        for i in range(args.queries):
+            q = make(i)
+            t0 = time.perf_counter()
+            result = customer_search.search(conn, q, max_candidates=agente.SEARCH_MAX_CANDIDATES)
+            samples.append(time.perf_counter() - t0)
+            truncated += result["truncated"]
+        p50, p99 = percentiles(samples)
+        print(f"  {kind:20} p50 {p50:7.2f} ms  p99 {p99:7.2f} ms  truncadas {truncated / args.queries:4.0%}")
+    conn.close()
+
+    client = agente.app.test_client()
+    for kind in ("nombre + apellidos", "teléfono"):
+        samples = []
+        for i in range(args.queries):
+            t0 = time.perf_counter()
+            resp = client.get("/customers:search", query_string={"q": kinds[kind](i)}, headers=AUTH)
+            resp.get_data()
+            samples.append(time.perf_counter() - t0)
+            if resp.status_code != 200 or "results" not in resp.get_json():
+                raise SystemExit(f"GET /customers:search falló: {resp.get_data(as_text=True)[:200]}")
+        p50, p99 = percentiles(samples)
+        print(f"GET /customers:search ({kind}): p50 {p50:.2f} ms  p99 {p99:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""
+Prueba de carga de la coalescencia de /agent/decision (singleflight.py).
+
+Simula el contacto omnicanal: en cada ráfaga `--fanout` clientes (app,
+webhook de WhatsApp, reintentos) piden a la vez la misma decisión para el
+mismo cliente, con una barrera para que lleguen en el mismo milisegundo.
+Levanta el servidor con y sin AGENTE_DECISION_COALESCE_ENABLED, con hilos
+(`dev`) y bajo el servidor async (`asgi`, serve.py), y reporta:
+- latencia p50/p99 y peticiones/s;
+- decisiones calculadas (líderes) y compartidas, de /admin/decision_coalescing;
+- lecturas de métodos de pago (cuenta de la etapa payment_methods en /metrics).
+
+Termina con código 1 si alguna petición falla, si dentro de una ráfaga las
+respuestas no son idénticas o si con coalescencia líderes + compartidas no
+suman las peticiones atendidas.
+
+Uso (desde Agente_Cobranza/):
+    python benchmarks/bench_singleflight.py --bursts 500 --fanout 4 --modes dev,asgi
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+from load_test import free_port, seed_db, spawn  # noqa: E402
+
+HEADERS = {"Authorization": "Bearer bench-singleflight", "Content-Type": "application/json"}
+STAGE_COUNT = re.compile(r'^agente_stage_duration_seconds_count\{stage="payment_methods"\} (\S+)$', re.M)
+
+
+def get_json(port: int, path: str):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    try:
+        conn.request("GET", path, headers=HEADERS)
+        body = conn.getresponse().read()
+    finally:
+        conn.close()
+    return body.decode("utf-8")
+
+
+def run_bursts(port: int, ids: list[str], args) -> dict:
+    """`fanout` hilos con conexión propia; en cada ráfaga todos mandan el mismo cuerpo."""
+    rnd = random.Random(args.seed)
+    bodies = [json.dumps({
+        "customer_id": rnd.choice(ids),
+        "segmento": rnd.choice(["vip", "consumo", "pyme", "otro"]),
+        "amount_due": round(rnd.uniform(100, 20000), 2),
+        "dpd": rnd.randint(0, 180),
+        "propension_pago": round(rnd.random(), 3),
+        "channel": rnd.choice(["app", "whatsapp", "sms"]),
+    }) for _ in range(args.bursts)]
+    barrier = threading.Barrier(args.fanout)
+    responses = [[None] * args.fanout for _ in range(args.bursts)]
+    latencies, failures = [], [0]
+    lock = threading.Lock()
+
+    def client(slot: int):
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        own = []
+        for i, body in enumerate(bodies):
+            barrier.wait()
+            t0 = time.perf_counter()
+            try:
+                conn.request("POST", "/agent/decision", body=body, headers=HEADERS)
+                response = conn.getresponse()
+                data = response.read()
+                status = response.status
+            except (OSError, http.client.HTTPException):
+                status, data = "error", b""
+                conn.close()
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+            own.append(time.perf_counter() - t0)
+            responses[i][slot] = data
+            if status != 200 or json.loads(data).get("status") != "ok":
+                with lock:
+                    failures[0] += 1
+        conn.close()
+        with lock:
+            latencies.extend(own)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(slot,)) for slot in range(args.fanout)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "failures": failures[0],
+        "mismatched_bursts": sum(1 for burst in responses if len(set(burst)) > 1),
+        "rps": len(latencies) / elapsed,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+    }
+
+
+def scenario(mode: str, coalesce: bool, ids: list[str], workdir: str, args) -> dict:
+    env = {
+        "AGENTE_DECISION_COALESCE_ENABLED": "1" if coalesce else "0",
+        "AGENTE_METRICS_ENABLED": "1",
+        "AGENTE_DECISION_LOG": "off",
+        "AGENTE_OFFER_CACHE_ENABLED": "0",
+        # Que la ráfaga entera llegue al handler: la admisión no debe serializarla
+        "AGENTE_ADMISSION_MAX_CONCURRENCY": str(args.fanout + 1),
+    }
+    saved = {k: os.environ.get(k) for k in env}
+    os.environ.update(env)
+    port = free_port()
+    proc = spawn(mode, workdir, port, args)
+    try:
+        result = run_bursts(port, ids, args)
+        flights = json.loads(get_json(port, "/admin/decision_coalescing"))
+        match = STAGE_COUNT.search(get_json(port, "/metrics"))
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+        for k, v in saved.items():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
+    result["leader"] = flights["leader"]
+    result["coalesced"] = flights["coalesced"]
+    result["method_reads"] = int(float(match.group(1))) if match else None
+    label = f"{mode} {'con' if coalesce else 'sin'} coalescencia"
+    print(f"{label:<24} {result['rps']:7.0f} req/s  p50 {result['p50_ms']:6.2f} ms  p99 {result['p99_ms']:7.2f} ms  "
+          f"calculadas {result['leader']:,} compartidas {result['coalesced']:,}  "
+          f"lecturas de métodos {result['method_reads']}/{result['requests']:,}  "
+          f"fallidas {result['failures']}  ráfagas distintas {result['mismatched_bursts']}")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", default="dev,asgi", help="servidores a probar: dev (hilos) y/o asgi (serve.py)")
+    parser.add_argument("--threads", type=int, default=16, help="hilos del executor en modo asgi")
+    parser.add_argument("--customers", type=int, default=10_000)
+    parser.add_argument("--bursts", type=int, default=500)
+    parser.add_argument("--fanout", type=int, default=4, help="peticiones idénticas simultáneas por ráfaga")
+    parser.add_argument("--seed", type=int, default=25)
+    args = parser.parse_args()
+    args.workers = 1
+
+    failed = False
+    with tempfile.TemporaryDirectory() as workdir:
+        ids = seed_db(workdir, args.customers)
+        for mode in [m.strip() for m in args.modes.split(",") if m.strip()]:
+            for coalesce in (False, True):
+                r = scenario(mode, coalesce, ids, workdir, args)
+                failed |= bool(r["failures"] or r["mismatched_bursts"])
+                if coalesce and r["leader"] + r["coalesced"] != r["requests"]:
+                    print(f"  {mode}: calculadas + compartidas = {r['leader'] + r['coalesced']:,}, "
+                          f"atendidas {r['requests']:,}")
+                    failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Micro-benchmark: plantillas de speech compiladas (speech_templates.py) contra
+el build_speech original con f-strings.
+
+Genera rutas y propuestas como las de /agent/decision, verifica que el set por
+defecto produzca exactamente el texto del build_speech original y mide
+textos/seg de:
+- build_speech original (copiado abajo tal cual era);
+- SpeechRegistry.render con el set por defecto y con los sets de canal
+  (sms, ivr) del directorio speech/, incluida la resolución del set;
+- render_many para un envío de campaña por SMS.
+Al final revisa que ningún SMS exceda su presupuesto de longitud.
+
+Uso (desde Agente_Cobranza/):
+    python benchmarks/bench_speech.py --items 200000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import speech_templates  # noqa: E402
+
+SPEECH_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "speech")
+ROUTES = {
+    "card": ("stripe", ["token-verify", "3ds-check", "auth", "capture"]),
+    "pse": ("pse_gateway", ["bank-redirect", "notify-webhook"]),
+    "wallet": ("mercado_pago", ["wallet-charge"]),
+    "corresponsal": ("oxxo_pay", ["generate-reference", "await-cash-payment", "reconcile"]),
+}
+
+
+def legacy_build_speech(route: dict, proposal: dict, currency: str | None):
+    cur = (currency or route.get("currency") or "MXN").upper()
+    method = route.get("method")
+    routed = route.get("routed_to")
+    steps = " → ".join(route.get("steps", []))
+
+    parts = []
+    if proposal:
+        t = proposal.get("tactic")
+        if t == "discount":
+            parts.append(f"Puedo ofrecerte un descuento de {int(round(proposal.get('discount_pct',0)*100))}% si liquidamos en 10 días.")
+        elif t == "installments":
+            parts.append(f"Puedo ofrecerte {proposal.get('installments',3)} mensualidades sin intereses.")
+        elif t == "hybrid":
+            parts.append(f"Puedo ofrecerte un descuento de {int(round(proposal.get('discount_pct',0)*100))}% y pagar en {proposal.get('installments',3)} mensualidades sin intereses.")
+    parts.append(f"Para cobrar {route.get('amount')} {cur}, la mejor ruta es {method} vía {routed} ({steps}).")
+    parts.append("¿Deseas proceder?")
+    return " ".join(parts)
+
+
+def make_items(n: int, rnd: random.Random) -> list[tuple]:
+    items = []
+    for i in range(n):
+        method = rnd.choice(list(ROUTES))
+        routed_to, steps = ROUTES[method]
+        route = {"method": method, "routed_to": routed_to, "steps": steps,
+                 "amount": round(rnd.uniform(300, 80_000), 2), "currency": "MXN"}
+        tactic = rnd.choice(["discount", "installments", "hybrid", None])
+        proposal = None
+        if tactic == "discount":
+            proposal = {"tactic": tactic, "discount_pct": rnd.choice([0.05, 0.1, 0.15, 0.2, 0.25, 0.3])}
+        elif tactic == "installments":
+            proposal = {"tactic": tactic, "installments": rnd.randint(1, 12)}
+        elif tactic == "hybrid":
+            proposal = {"tactic": tactic, "discount_pct": rnd.choice([0.1, 0.2]), "installments": rnd.randint(3, 12)}
+        items.append((route, proposal, "MXN", f"c{i:08d}"))
+    return items
+
+
+def rate(fn, items, repeat: int = 3) -> float:
+    """Mejor de `repeat` pasadas: en una máquina compartida una sola pasada varía ±20%."""
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for route, proposal, currency, customer_id in items:
+            fn(route, proposal, currency, customer_id)
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return len(items) / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=200_000)
+    parser.add_argument("--seed", type=int, default=17)
+    args = parser.parse_args()
+
+    rnd = random.Random(args.seed)
+    items = make_items(args.items, rnd)
+    registry = speech_templates.SpeechRegistry(SPEECH_DIR)
+    report = registry.reload()
+    if report["errors"]:
+        raise SystemExit(f"Plantillas con errores: {report['errors']}")
+
+    for route, proposal, currency, customer_id in items[:20_000]:
+        expected = legacy_build_speech(route, proposal, currency)
+        got, _ = registry.render(route, proposal, currency, customer_id=customer_id)
+        if got != expected:
+            raise SystemExit(f"Texto distinto:\n  {got}\n  {expected}")
+    print(f"equivalencia con build_speech: OK en {min(len(items), 20_000):,} textos")
+
+    legacy = rate(lambda r, p, c, cid: legacy_build_speech(r, p, c), items)
+    print(f"build_speech original:     {legacy:12,.0f} textos/s")
+    for channel in (None, "sms", "ivr"):
+        speed = rate(lambda r, p, c, cid: registry.render(r, p, c, channel, None, cid), items)
+        print(f"plantillas ({channel or 'default':8}):    {speed:12,.0f} textos/s ({speed / legacy:.2f}x)")
+
+    decisions = [{"customer_id": cid, "payment_route": r, "negotiation_proposal": p} for r, p, _, cid in items]
+    seconds = None
+    for _ in range(3):
+        t0 = time.perf_counter()
+        results = registry.render_many(decisions, channel="sms")
+        elapsed = time.perf_counter() - t0
+        seconds = elapsed if seconds is None else min(seconds, elapsed)
+    budget = speech_templates.CHANNEL_BUDGETS["sms"]
+    longest = max(r["length"] for r in results)
+    if longest > budget:
+        raise SystemExit(f"SMS de {longest} caracteres excede el presupuesto de {budget}")
+    print(f"render_many (sms):         {len(results) / seconds:12,.0f} textos/s ({len(results) / seconds / legacy:.2f}x); "
+          f"más largo {longest}/{budget}, recortados {registry.truncated.get('sms', 0):,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,641 @@
+"""
+Suite de benchmarks de punta a punta sobre una cartera sintética (synthetic.py).
+
+Genera la cartera a la escala pedida (10k a 10M clientes) y mide:
+- la generación (filas/seg);
+- las funciones del núcleo llamadas directamente: get_payment_methods_for_customer,
+  select_negotiation_strategy, build_speech y build_decision;
+- cada ruta del API (todas las de app.url_map salvo /static) por el test client
+  de Flask, con escenarios que crean, leen, actualizan y borran sus propios
+  datos. Si aparece una ruta sin escenario la suite termina con código 1.
+Por escenario reporta operaciones, errores, ops/seg, latencias (media, p50, p90,
+p99, máx.) y el RSS pico del proceso al terminarlo. El resultado completo va a
+un JSON (`--out`); `--compare base.json` imprime la razón de ops/seg y p99
+contra una corrida anterior.
+
+El test client corre en proceso: mide Flask/Werkzeug y la app, no la red ni el
+servidor (para eso, load_test.py). Las rutas pesadas (exportaciones,
+importaciones, conciliación, lotes, pasada de aging) corren `--heavy-requests`
+veces; a 10M clientes cada exportación recorre la tabla completa.
+
+Uso (desde Agente_Cobranza/):
+    python benchmarks/bench_suite.py --scale 100k --out resultados/100k.json
+    python benchmarks/bench_suite.py --scale 100k --compare resultados/100k.json
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.dirname(HERE))
+
+import app as agente  # noqa: E402
+import synthetic  # noqa: E402
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+AUTH = {"Authorization": "Bearer bench"}
+RESULTS_VERSION = 1
+
+
+# ---------------------------------------------------------------------
+# Medición
+# ---------------------------------------------------------------------
+def peak_rss_mb() -> float | None:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (2**20 if sys.platform == "darwin" else 2**10), 1)  # macOS: bytes; Linux: KiB
+
+
+def summarize(latencies: list[float], errors: int, seconds: float) -> dict:
+    lat = sorted(latencies)
+    n = len(lat)
+
+    def pct(p):
+        return round(lat[max(0, math.ceil(p / 100 * n) - 1)] * 1e6, 1) if n else None
+
+    return {
+        "ops": n,
+        "errors": errors,
+        "seconds": round(seconds, 4),
+        "ops_per_s": round(n / seconds, 1) if seconds else None,
+        "latency_us": {"mean": round(sum(lat) / n * 1e6, 1) if n else None,
+                       "p50": pct(50), "p90": pct(90), "p99": pct(99), "max": pct(100)},
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def time_calls(fn, args_list) -> dict:
+    perf = time.perf_counter
+    latencies = []
+    t0 = perf()
+    for args in args_list:
+        start = perf()
+        fn(*args)
+        latencies.append(perf() - start)
+    return summarize(latencies, 0, perf() - t0)
+
+
+def failed(resp) -> bool:
+    """Los errores de negocio vienen con HTTP 200 y `codigo: ERROR_xxx` (generate_error_response)."""
+    if resp.status_code >= 400:
+        return True
+    if resp.mimetype != "application/json" or resp.status_code == 304:
+        return False
+    body = resp.get_json(silent=True)
+    return isinstance(body, dict) and (str(body.get("codigo", "")).startswith("ERROR_") or "error" in body)
+
+
+# ---------------------------------------------------------------------
+# Escenarios por ruta: (método, regla) -> builder(state, i) -> (path, kwargs, capture)
+# ---------------------------------------------------------------------
+SCENARIOS = []
+
+
+def scenario(method: str, rule: str, heavy: bool = False, consumes: str | None = None):
+    """Registra un escenario; `consumes` = lista de state.created de la que toma (y borra) ids."""
+    def register(builder):
+        SCENARIOS.append({"method": method, "rule": rule, "heavy": heavy, "consumes": consumes,
+                          "builder": builder})
+        return builder
+    return register
+
+
+class State:
+    def __init__(self, contexts: list[dict], methods: dict):
+        self.contexts = contexts
+        self.customer_ids = [c["customer_id"] for c in contexts]
+        self.sorted_ids = sorted(self.customer_ids)
+        self.methods = methods                      # customer_id -> [métodos]
+        self.created = {name: [] for name in ("customers", "payment_methods", "debts", "promises",
+                                              "payments", "auto_debits", "references")}
+        self.decisions = []
+        self.today = date.today()
+        self.run_id = datetime.utcnow().strftime("%H%M%S")
+
+    def ctx(self, i):
+        return self.contexts[i % len(self.contexts)]
+
+    def cid(self, i):
+        return self.customer_ids[i % len(self.customer_ids)]
+
+    def pick(self, name, i):
+        items = self.created[name]
+        return items[i % len(items)]
+
+
+def _capture(state, name, key="id"):
+    def capture(body):
+        state.created[name].append(body[key] if key else body)
+    return capture
+
+
+# Clientes
+@scenario("POST", "/customers")
+def _(s, i):
+    body = {"name": f"Bench {i}", "email": f"bench{s.run_id}{i}@example.com", "phone": "+52 5512345678",
+            "metadata": {"segmento": "consumo", "origen": "bench"}}
+    return "/customers", {"json": body}, _capture(s, "customers")
+
+
+@scenario("GET", "/customers")
+def _(s, i):
+    return f"/customers?limit=50&after={s.sorted_ids[i % len(s.sorted_ids)]}", {}, None
+
+
+@scenario("GET", "/customers/<string:customer_id>")
+def _(s, i):
+    return f"/customers/{s.cid(i)}", {}, None
+
+
+@scenario("GET", "/customers:search")
+def _(s, i):
+    q = ("gar", "lopez ma", "hernandez", "cliente1")[i % 4] if i % 3 else f"cliente{i}@example.com"
+    return "/customers:search", {"query_string": {"q": q}}, None
+
+
+@scenario("PUT", "/customers/<string:customer_id>")
+def _(s, i):
+    return f"/customers/{s.pick('customers', i)}", {"json": {"phone": f"+52 55{i:08d}"}}, None
+
+
+@scenario("GET", "/customers:export", heavy=True)
+def _(s, i):
+    return f"/customers:export?format={'csv' if i % 2 else 'ndjson'}", {}, None
+
+
+@scenario("POST", "/customers:import", heavy=True)
+def _(s, i):
+    lines = "".join(json.dumps({"name": f"Importado {i}-{j}", "email": f"imp{s.run_id}-{i}-{j}@example.com",
+                                "metadata": {"origen": "bench"}}) + "\n" for j in range(1_000))
+    return "/customers:import", {"data": lines, "content_type": "application/x-ndjson"}, None
+
+
+# Métodos de pago
+@scenario("POST", "/payment_methods")
+def _(s, i):
+    cid = s.cid(i)
+    body = {"customer_id": cid, "type": "card", "provider": "stripe", "token": f"tok_bench_{i}",
+            "last4": "4242", "expiry_month": 12, "expiry_year": s.today.year + 3}
+    return "/payment_methods", {"json": body}, _capture(s, "payment_methods", key=None)
+
+
+@scenario("GET", "/payment_methods")
+def _(s, i):
+    if i % 2:
+        return f"/payment_methods?customer_id={s.cid(i)}", {}, None
+    return "/payment_methods?limit=50", {}, None
+
+
+@scenario("GET", "/payment_methods/<string:method_id>")
+def _(s, i):
+    return f"/payment_methods/{s.pick('payment_methods', i)['id']}", {}, None
+
+
+@scenario("PUT", "/payment_methods/<string:method_id>")
+def _(s, i):
+    return (f"/payment_methods/{s.pick('payment_methods', i)['id']}",
+            {"json": {"expiry_year": s.today.year + 4}}, None)
+
+
+@scenario("GET", "/payment_methods:export", heavy=True)
+def _(s, i):
+    return f"/payment_methods:export?format={'csv' if i % 2 else 'ndjson'}", {}, None
+
+
+@scenario("POST", "/payment_methods:import", heavy=True)
+def _(s, i):
+    lines = "".join(json.dumps({"customer_id": s.cid(i * 1_000 + j), "type": "wallet", "provider": "mercado_pago",
+                                "token": f"tok_imp_{i}_{j}"}) + "\n" for j in range(1_000))
+    return "/payment_methods:import", {"data": lines, "content_type": "application/x-ndjson"}, None
+
+
+# Cartera: deudas, promesas, pagos y débitos automáticos
+@scenario("POST", "/debts")
+def _(s, i):
+    body = {"customer_id": s.cid(i), "principal": 1_000 + i, "due_date": (s.today - timedelta(days=i % 120)).isoformat(),
+            "product": "tarjeta"}
+    return "/debts", {"json": body}, _capture(s, "debts")
+
+
+@scenario("GET", "/debts")
+def _(s, i):
+    return f"/debts?customer_id={s.cid(i)}", {}, None
+
+
+@scenario("GET", "/debts/<string:debt_id>")
+def _(s, i):
+    return f"/debts/{s.pick('debts', i)}", {}, None
+
+
+@scenario("PUT", "/debts/<string:debt_id>")
+def _(s, i):
+    return f"/debts/{s.pick('debts', i)}", {"json": {"product": "prestamo_personal"}}, None
+
+
+@scenario("PATCH", "/debts/<string:debt_id>")
+def _(s, i):
+    return f"/debts/{s.pick('debts', i)}", {"json": {"currency": "MXN"}}, None
+
+
+@scenario("GET", "/debts:buckets", heavy=True)
+def _(s, i):
+    return f"/debts:buckets?as_of={s.today.isoformat()}", {}, None
+
+
+@scenario("POST", "/promises")
+def _(s, i):
+    body = {"debt_id": s.pick("debts", i), "amount": 100, "promised_date": s.today.isoformat(), "channel": "ivr"}
+    return "/promises", {"json": body}, _capture(s, "promises")
+
+
+@scenario("GET", "/promises")
+def _(s, i):
+    return f"/promises?debt_id={s.pick('debts', i)}", {}, None
+
+
+@scenario("GET", "/promises/<string:promise_id>")
+def _(s, i):
+    return f"/promises/{s.pick('promises', i)}", {}, None
+
+
+@scenario("PUT", "/promises/<string:promise_id>")
+def _(s, i):
+    return f"/promises/{s.pick('promises', i)}", {"json": {"channel": "whatsapp"}}, None
+
+
+@scenario("PATCH", "/promises/<string:promise_id>")
+def _(s, i):
+    return f"/promises/{s.pick('promises', i)}", {"json": {"amount": 120}}, None
+
+
+@scenario("GET", "/promises:due")
+def _(s, i):
+    return f"/promises:due?date={s.today.isoformat()}", {}, None
+
+
+@scenario("POST", "/payments")
+def _(s, i):
+    headers = {**AUTH, "Idempotency-Key": f"bench-{s.run_id}-{i}"}
+    return ("/payments", {"json": {"debt_id": s.pick("debts", i), "amount": 10, "method": "card"}, "headers": headers},
+            _capture(s, "payments"))
+
+
+@scenario("GET", "/payments")
+def _(s, i):
+    return f"/payments?debt_id={s.pick('debts', i)}", {}, None
+
+
+@scenario("GET", "/payments/<string:payment_id>")
+def _(s, i):
+    return f"/payments/{s.pick('payments', i)}", {}, None
+
+
+@scenario("POST", "/auto_debits")
+def _(s, i):
+    method = s.pick("payment_methods", i)
+    body = {"customer_id": method["customer_id"], "payment_method_id": method["id"], "amount": 500,
+            "frequency": "monthly", "next_run_date": (s.today + timedelta(days=i % 28)).isoformat()}
+    return "/auto_debits", {"json": body}, _capture(s, "auto_debits")
+
+
+@scenario("GET", "/auto_debits")
+def _(s, i):
+    return f"/auto_debits?next_run_to={(s.today + timedelta(days=7)).isoformat()}&limit=50", {}, None
+
+
+@scenario("GET", "/auto_debits/<string:auto_debit_id>")
+def _(s, i):
+    return f"/auto_debits/{s.pick('auto_debits', i)}", {}, None
+
+
+@scenario("PUT", "/auto_debits/<string:auto_debit_id>")
+def _(s, i):
+    return f"/auto_debits/{s.pick('auto_debits', i)}", {"json": {"amount": 550}}, None
+
+
+@scenario("PATCH", "/auto_debits/<string:auto_debit_id>")
+def _(s, i):
+    return f"/auto_debits/{s.pick('auto_debits', i)}", {"json": {"status": "paused" if i % 2 else "active"}}, None
+
+
+# Referencias de corresponsal y conciliación
+@scenario("POST", "/references")
+def _(s, i):
+    return "/references", {"json": {"amount": 250 + i, "customer_id": s.cid(i)}}, _capture(s, "references", key=None)
+
+
+@scenario("GET", "/references/<string:reference>")
+def _(s, i):
+    return f"/references/{s.pick('references', i)['reference']}", {}, None
+
+
+@scenario("POST", "/references:reconcile", heavy=True)
+def _(s, i):
+    paid_at = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+    body = "referencia,monto,fecha_pago\n" + "".join(
+        f"{ref['reference']},{ref['amount']:.2f},{paid_at}\n" for ref in s.created["references"])
+    return "/references:reconcile?dry_run=1&source=bench", {"data": body, "content_type": "text/csv"}, None
+
+
+# Estrategias y agente
+@scenario("POST", "/strategy/payment_route")
+def _(s, i):
+    ctx = s.ctx(i)
+    methods = s.methods.get(ctx["customer_id"]) or [{"type": "corresponsal"}]
+    body = {"payment_method": methods[0]["type"], "amount": ctx["amount_due"], "currency": ctx["currency"]}
+    return "/strategy/payment_route", {"json": body}, None
+
+
+@scenario("POST", "/strategy/negotiation_offer")
+def _(s, i):
+    return "/strategy/negotiation_offer", {"json": s.ctx(i)}, None
+
+
+@scenario("POST", "/agent/decision")
+def _(s, i):
+    return "/agent/decision", {"json": s.ctx(i)}, None
+
+
+@scenario("POST", "/agent/decisions:batch", heavy=True)
+def _(s, i):
+    contexts = [s.ctx(i * 500 + j) for j in range(500)]
+
+    def capture(body):
+        s.decisions = [r["decision"] for r in body["results"] if r.get("status") == "ok"]
+    return "/agent/decisions:batch", {"json": {"contexts": contexts}}, capture
+
+
+@scenario("POST", "/speech:render")
+def _(s, i):
+    decisions = s.decisions[(i * 100) % max(1, len(s.decisions) - 100):][:100]
+    return "/speech:render", {"json": {"channel": "sms", "decisions": decisions}}, None
+
+
+@scenario("POST", "/agent/decisions:precompute", heavy=True)
+def _(s, i):
+    contexts = [s.ctx(i * 500 + j) for j in range(500)]
+    return "/agent/decisions:precompute", {"json": {"contexts": contexts, "campaign": "bench"}}, None
+
+
+@scenario("GET", "/decision_events")
+def _(s, i):
+    start, end = s.today - timedelta(days=1), s.today + timedelta(days=2)
+    return f"/decision_events?from={start.isoformat()}&to={end.isoformat()}&event=decision&limit=500", {}, None
+
+
+# Administración y observabilidad
+for _rule in ("/admin/admission", "/admin/aging", "/admin/auth", "/admin/compression", "/admin/db_pool",
+              "/admin/decision_coalescing", "/admin/decision_log", "/admin/offer_cache",
+              "/admin/payment_method_cache", "/admin/payment_pipeline", "/admin/rules", "/admin/slow_requests",
+              "/admin/speech", "/metrics"):
+    scenario("GET", _rule)(lambda s, i, rule=_rule: (rule, {}, None))
+for _rule in ("/admin/auth/reload", "/admin/decision_log/flush", "/admin/rules/reload", "/admin/speech/reload"):
+    scenario("POST", _rule)(lambda s, i, rule=_rule: (rule, {}, None))
+
+
+@scenario("POST", "/admin/aging/run", heavy=True)
+def _(s, i):
+    return f"/admin/aging/run?as_of={s.today.isoformat()}&max_chunks=1", {}, None
+
+
+@scenario("DELETE", "/admin/offer_cache")
+def _(s, i):
+    return "/admin/offer_cache?campaign=bench", {}, None
+
+
+# Borrados al final: cada operación consume un id creado arriba
+@scenario("DELETE", "/auto_debits/<string:auto_debit_id>", consumes="auto_debits")
+def _(s, i, item):
+    return f"/auto_debits/{item}", {}, None
+
+
+@scenario("DELETE", "/promises/<string:promise_id>", consumes="promises")
+def _(s, i, item):
+    return f"/promises/{item}", {}, None
+
+
+@scenario("DELETE", "/debts/<string:debt_id>", consumes="debts")
+def _(s, i, item):
+    return f"/debts/{item}", {}, None
+
+
+@scenario("DELETE", "/payment_methods/<string:method_id>", consumes="payment_methods")
+def _(s, i, item):
+    return f"/payment_methods/{item['id']}", {}, None
+
+
+@scenario("DELETE", "/customers/<string:customer_id>", consumes="customers")
+def _(s, i, item):
+    return f"/customers/{item}", {}, None
+
+
+def uncovered_routes() -> list[str]:
+    covered = {(sc["method"], sc["rule"]) for sc in SCENARIOS}
+    missing = []
+    for rule in agente.app.url_map.iter_rules():
+        if rule.endpoint == "static":
+            continue
+        for method in sorted(rule.methods - {"HEAD", "OPTIONS"}):
+            if (method, rule.rule) not in covered:
+                missing.append(f"{method} {rule.rule}")
+    return missing
+
+
+def run_routes(state: State, requests: int, heavy_requests: int, progress) -> dict:
+    client = agente.app.test_client()
+    perf = time.perf_counter
+    results = {}
+    for sc in SCENARIOS:
+        name = f"{sc['method']} {sc['rule']}"
+        if sc["consumes"]:
+            pool = state.created[sc["consumes"]]
+            n = min(requests, len(pool))
+        else:
+            n = heavy_requests if sc["heavy"] else requests
+        latencies, errors, first_error = [], 0, None
+        t0 = perf()
+        for i in range(n):
+            if sc["consumes"]:
+                path, kwargs, capture = sc["builder"](state, i, state.created[sc["consumes"]].pop())
+            else:
+                path, kwargs, capture = sc["builder"](state, i)
+            kwargs.setdefault("headers", AUTH)
+            start = perf()
+            resp = client.open(path, method=sc["method"], **kwargs)
+            resp.get_data()
+            latencies.append(perf() - start)
+            if failed(resp):
+                errors += 1
+                first_error = first_error or f"{resp.status_code} {resp.get_data(as_text=True)[:200]}"
+            elif capture is not None:
+                capture(resp.get_json())
+        results[name] = summarize(latencies, errors, perf() - t0)
+        if first_error:
+            results[name]["first_error"] = first_error
+        progress(name, results[name])
+    return results
+
+
+# ---------------------------------------------------------------------
+# Funciones del núcleo
+# ---------------------------------------------------------------------
+def run_functions(state: State, calls: int) -> dict:
+    contexts = [state.ctx(i) for i in range(calls)]
+    results = {
+        "get_payment_methods_for_customer": time_calls(
+            agente.get_payment_methods_for_customer, [(c["customer_id"],) for c in contexts]),
+        "select_negotiation_strategy": time_calls(
+            agente.select_negotiation_strategy, [(c["segmento"], c) for c in contexts]),
+    }
+    speech_args, decision_args = [], []
+    for ctx in contexts:
+        methods = state.methods.get(ctx["customer_id"], [])
+        best = agente.choose_best_method(methods) or agente.infer_fallback_method(ctx["channel"], ctx["currency"])
+        route = agente.select_payment_strategy(best["type"]).execute(
+            {"amount": ctx["amount_due"], "currency": ctx["currency"], "provider": best.get("provider")})
+        proposal = agente.select_negotiation_strategy(ctx["segmento"], ctx).propose(ctx)
+        speech_args.append((route, proposal, ctx["currency"], ctx["channel"]))
+        decision_args.append((ctx, methods))
+    results["build_speech"] = time_calls(agente.build_speech, speech_args)
+    results["build_decision"] = time_calls(agente.build_decision, decision_args)
+    return results
+
+
+# ---------------------------------------------------------------------
+# Corrida y comparación
+# ---------------------------------------------------------------------
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=HERE, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def compare(base: dict, current: dict):
+    print(f"\ncomparación contra {base['meta'].get('commit')} ({base['meta'].get('started_at')}):")
+    print(f"  {'escenario':52} {'ops/s':>9} {'p99':>9}")
+    for section in ("functions", "routes"):
+        for name, stats in current[section].items():
+            old = base.get(section, {}).get(name)
+            if not old or not old.get("ops_per_s") or not stats.get("ops_per_s"):
+                continue
+            speed = stats["ops_per_s"] / old["ops_per_s"]
+            p99 = stats["latency_us"]["p99"] / old["latency_us"]["p99"] if old["latency_us"]["p99"] else float("nan")
+            flag = "  <-- más lento" if speed < 0.9 else ""
+            print(f"  {name[:52]:52} {speed:8.2f}x {p99:8.2f}x{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", default="10k", help="clientes: 10k, 100k, 1m, 10m o un entero")
+    parser.add_argument("--seed", type=int, default=21)
+    parser.add_argument("--debt-ratio", type=float, default=0.3)
+    parser.add_argument("--requests", type=int, default=200, help="peticiones por ruta")
+    parser.add_argument("--heavy-requests", type=int, default=3, help="peticiones por ruta pesada")
+    parser.add_argument("--calls", type=int, default=20_000, help="llamadas por función del núcleo")
+    parser.add_argument("--sample", type=int, default=10_000, help="contextos de muestra para los escenarios")
+    parser.add_argument("--db", help="ruta de la BD generada (por defecto un directorio temporal)")
+    parser.add_argument("--out", help="archivo JSON de resultados")
+    parser.add_argument("--compare", help="JSON de una corrida anterior")
+    parser.add_argument("--quiet", action="store_true")
+    args = parser.parse_args()
+
+    missing = uncovered_routes()
+    customers = synthetic.parse_scale(args.scale)
+    db_path = args.db or os.path.join(tempfile.mkdtemp(), "bench_suite.db")
+    if os.path.exists(db_path):
+        raise SystemExit(f"{db_path} ya existe: la suite genera su propia cartera")
+    agente.DB_PATH = db_path
+    agente.init_db()
+
+    def log(message):
+        if not args.quiet:
+            print(message, file=sys.stderr)
+
+    started = datetime.utcnow()
+    log(f"generando {customers:,} clientes en {db_path}")
+    conn = agente.get_connection()
+    try:
+        generated = synthetic.write_portfolio(
+            conn, customers, args.seed, args.debt_ratio, sample_size=args.sample,
+            progress=lambda done, total: log(f"  {done:,} / {total:,}") if done % 1_000_000 == 0 else None)
+    finally:
+        conn.close()
+    sample = generated.pop("sample")
+    generated["peak_rss_mb"] = peak_rss_mb()
+    log(f"  {generated['rows']:,} filas en {generated['seconds']:.1f} s ({generated['rows_per_s']:,.0f} filas/s)")
+
+    state = State(sample, agente.get_payment_methods_for_customers([c["customer_id"] for c in sample]))
+    functions = run_functions(state, args.calls)
+    for name, stats in functions.items():
+        log(f"  {name:34} {stats['ops_per_s']:>12,.0f} ops/s  p50 {stats['latency_us']['p50']:>8} us  "
+            f"p99 {stats['latency_us']['p99']:>8} us")
+
+    def progress(name, stats):
+        log(f"  {name:52} {stats['ops']:>5} ops {stats['ops_per_s'] or 0:>10,.0f}/s  "
+            f"p50 {stats['latency_us']['p50']:>10} us  p99 {stats['latency_us']['p99']:>10} us"
+            + (f"  errores {stats['errors']}" if stats["errors"] else ""))
+
+    routes = run_routes(state, args.requests, args.heavy_requests, progress)
+
+    results = {
+        "version": RESULTS_VERSION,
+        "meta": {
+            "commit": git_commit(),
+            "started_at": started.isoformat(timespec="seconds"),
+            "scale": customers,
+            "seed": args.seed,
+            "debt_ratio": args.debt_ratio,
+            "requests": args.requests,
+            "heavy_requests": args.heavy_requests,
+            "calls": args.calls,
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "cpus": len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count(),
+            "json_encoder": agente.app.json.encoder,
+            "uncovered_routes": missing,
+        },
+        "generate": generated,
+        "functions": functions,
+        "routes": routes,
+        "peak_rss_mb": peak_rss_mb(),
+        "errors": sum(r["errors"] for r in routes.values()),
+    }
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        log(f"resultados en {args.out}")
+    else:
+        print(json.dumps(results, ensure_ascii=False))
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(json.load(f), results)
+
+    if missing:
+        print(f"Rutas sin escenario: {', '.join(missing)}", file=sys.stderr)
+        return 1
+    if results["errors"]:
+        print(f"{results['errors']} peticiones con error (ver first_error en los resultados)", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
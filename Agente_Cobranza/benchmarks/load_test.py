@@ -0,0 +1,176 @@
+"""
+Prueba de carga de POST /agent/decision: throughput y latencias p50/p99.
+
+Levanta el servidor indicado en un directorio temporal (BD propia con clientes
+sembrados), dispara peticiones desde N hilos con conexiones keep-alive durante
+`--duration` segundos y reporta peticiones/s, p50, p99 y errores.
+
+Uso (desde Agente_Cobranza/):
+    python benchmarks/load_test.py --mode both --clients 32 --duration 15
+    python benchmarks/load_test.py --url http://localhost:6012   # servidor ya levantado
+
+Modos: dev (servidor Werkzeug de `python app.py`), asgi (serve.py + uvicorn).
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlparse
+from uuid import uuid4
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, HERE)
+
+DEV_LAUNCHER = (
+    "import sys; sys.path.insert(0, {here!r}); import app; "
+    "app.app.run(host='127.0.0.1', port={port}, debug=True, use_reloader=False)"
+)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def seed_db(workdir: str, customers: int) -> list[str]:
+    import app as agente
+    agente.DB_PATH = os.path.join(workdir, "agente_cobranza.db")
+    agente.init_db()
+    ids = [str(uuid4()) for _ in range(customers)]
+    conn = agente.get_connection()
+    try:
+        conn.executemany("INSERT INTO customers (id, name, email) VALUES (?,?,?)",
+                         [(cid, "Cliente", "c@example.com") for cid in ids])
+        conn.executemany(
+            "INSERT INTO payment_methods (id, customer_id, type, token, is_default) VALUES (?,?,?,?,1)",
+            [(str(uuid4()), cid, random.choice(["card", "wallet", "pse", "corresponsal"]), "tok")
+             for cid in ids[: customers // 2]])
+        conn.commit()
+    finally:
+        conn.close()
+    agente.get_pool().close()
+    return ids
+
+
+def spawn(mode: str, workdir: str, port: int, args) -> subprocess.Popen:
+    if mode == "dev":
+        cmd = [sys.executable, "-c", DEV_LAUNCHER.format(here=HERE, port=port)]
+    else:
+        cmd = [sys.executable, os.path.join(HERE, "serve.py"), "--host", "127.0.0.1",
+               "--port", str(port), "--workers", str(args.workers), "--threads", str(args.threads)]
+    proc = subprocess.Popen(cmd, cwd=workdir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 20
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return proc
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError(f"El servidor {mode} no arrancó en el puerto {port}")
+
+
+def run_load(url: str, ids: list[str], clients: int, duration: float) -> dict:
+    target = urlparse(url)
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+
+    def worker(seed: int):
+        rnd = random.Random(seed)
+        local, local_errors = [], 0
+        conn = http.client.HTTPConnection(target.hostname, target.port, timeout=30)
+        headers = {"Authorization": "Bearer load-test", "Content-Type": "application/json"}
+        while time.perf_counter() < stop_at:
+            body = json.dumps({
+                "customer_id": rnd.choice(ids),
+                "segmento": rnd.choice(["vip", "consumo", "pyme", "otro"]),
+                "amount_due": rnd.uniform(100, 20000),
+                "dpd": rnd.randint(0, 180),
+                "propension_pago": rnd.random(),
+                "channel": rnd.choice(["ivr", "whatsapp", "app"]),
+            })
+            t0 = time.perf_counter()
+            try:
+                conn.request("POST", "/agent/decision", body=body, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                ok = response.status == 200
+            except (OSError, http.client.HTTPException):
+                ok = False
+                conn.close()
+                conn = http.client.HTTPConnection(target.hostname, target.port, timeout=30)
+            if ok:
+                local.append(time.perf_counter() - t0)
+            else:
+                local_errors += 1
+        conn.close()
+        with lock:
+            latencies.extend(local)
+            errors[0] += local_errors
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+
+    def pct(p):
+        return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 2) if latencies else None
+
+    return {
+        "requests": len(latencies),
+        "errors": errors[0],
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": pct(0.50),
+        "p99_ms": pct(0.99),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=["dev", "asgi", "both"], default="both")
+    parser.add_argument("--url", help="probar un servidor ya levantado (omite --mode)")
+    parser.add_argument("--customers", type=int, default=10_000)
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=15)
+    parser.add_argument("--workers", type=int, default=1, help="procesos uvicorn en modo asgi")
+    parser.add_argument("--threads", type=int, default=16, help="hilos por proceso en modo asgi")
+    args = parser.parse_args()
+
+    results = {}
+    if args.url:
+        ids = [str(uuid4()) for _ in range(args.customers)]
+        results["url"] = run_load(args.url, ids, args.clients, args.duration)
+    else:
+        modes = ["dev", "asgi"] if args.mode == "both" else [args.mode]
+        for mode in modes:
+            with tempfile.TemporaryDirectory() as workdir:
+                ids = seed_db(workdir, args.customers)
+                port = free_port()
+                proc = spawn(mode, workdir, port, args)
+                try:
+                    results[mode] = run_load(f"http://127.0.0.1:{port}", ids, args.clients, args.duration)
+                finally:
+                    proc.terminate()
+                    proc.wait(timeout=30)
+
+    for name, r in results.items():
+        print(f"{name:<5} {r['rps']:>9,.1f} req/s  p50 {r['p50_ms']} ms  p99 {r['p99_ms']} ms  "
+              f"({r['requests']:,} ok, {r['errors']:,} errores)")
+
+
+if __name__ == "__main__":
+    main()
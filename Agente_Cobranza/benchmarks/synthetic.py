@@ -0,0 +1,251 @@
+"""
+Generador sintético de cartera, determinista por semilla, de 10k a 10M clientes.
+
+Por cada cliente genera:
+- la fila de `customers` (nombre, email, teléfono, alta y metadata con segmento
+  y región);
+- 0 a 3 métodos de pago con una mezcla realista por moneda (MXN: tarjeta,
+  wallet y corresponsal; COP: tarjeta, PSE y wallet), proveedor por tipo y, para
+  tarjetas, vencimiento entre 6 meses atrás y 5 años adelante (~8% vencidas);
+- opcionalmente (`debt_ratio`) una deuda abierta cuyo vencimiento respeta su dpd;
+- el contexto de negociación para /agent/decision: segmento, banda de dpd
+  (0-29, 30-59, 60-89, 90-179, 180+), propensión de pago que baja con el atraso,
+  monto por segmento, canal y moneda.
+
+Escribe por bloques con executemany (memoria constante) y guarda una muestra
+uniforme de contextos (reservoir) para los benchmarks; los contextos completos
+pueden ir a un NDJSON para campaign.py u offer_cache.py.
+
+Uso (desde Agente_Cobranza/):
+    python benchmarks/synthetic.py --scale 1m --db cartera.db --contexts contextos.ndjson
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from bisect import bisect_right
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SCALES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000, "10m": 10_000_000}
+
+SEGMENTS = (("consumo", 45), ("pyme", 20), ("consumo_alto", 12), ("vip", 8), ("otro", 15))
+# segmento -> (mediana del monto adeudado, sigma del lognormal)
+AMOUNTS = {"consumo": (6_000, 0.7), "pyme": (25_000, 0.8), "consumo_alto": (15_000, 0.6),
+           "vip": (40_000, 0.6), "otro": (3_000, 0.9)}
+# banda de dpd -> peso; la propensión se sortea con una beta que empeora con la banda
+DPD_BANDS = (((0, 29), 40), ((30, 59), 25), ((60, 89), 15), ((90, 179), 12), ((180, 360), 8))
+PROPENSITY_BETA = {0: (5, 2), 1: (4, 3), 2: (3, 4), 3: (2, 5), 4: (1.5, 6)}
+CURRENCIES = (("MXN", 85), ("COP", 15))
+METHOD_TYPES = {"MXN": (("card", 55), ("wallet", 20), ("corresponsal", 25)),
+                "COP": (("card", 45), ("pse", 35), ("wallet", 20))}
+PROVIDERS = {"card": (("stripe", 70), ("conekta", 30)), "wallet": (("mercado_pago", 80), ("paypal", 20)),
+             "corresponsal": (("oxxo_pay", 85), ("seven_eleven", 15)), "pse": (("pse_gateway", 100),)}
+METHODS_PER_CUSTOMER = ((0, 15), (1, 50), (2, 25), (3, 10))
+CHANNELS = (("whatsapp", 40), ("sms", 25), ("ivr", 20), ("app", 15))
+REGIONS = {"MXN": ("CDMX", "Jalisco", "Nuevo León", "Puebla", "Yucatán"),
+           "COP": ("Bogotá", "Antioquia", "Valle del Cauca", "Atlántico")}
+FIRST_NAMES = ("Ana", "Luis", "María", "José", "Sofía", "Carlos", "Lucía", "Jorge", "Valentina", "Miguel",
+               "Camila", "Andrés", "Fernanda", "Diego", "Paula", "Ricardo")
+LAST_NAMES = ("García", "Hernández", "López", "Martínez", "Rodríguez", "Gómez", "Pérez", "Sánchez",
+              "Ramírez", "Torres", "Díaz", "Vargas", "Castro", "Ortiz")
+
+
+def parse_scale(value: str) -> int:
+    """'10k', '1m', '2.5m' o un entero."""
+    text = str(value).strip().lower().replace("_", "")
+    if text in SCALES:
+        return SCALES[text]
+    factor = {"k": 1_000, "m": 1_000_000}.get(text[-1:], 1)
+    return int(float(text[:-1] if factor > 1 else text) * factor)
+
+
+class _Choice:
+    """Elección ponderada con pesos acumulados precalculados (bisect sobre rnd.random())."""
+
+    __slots__ = ("values", "cum_weights", "total")
+
+    def __init__(self, pairs):
+        self.values = [v for v, _ in pairs]
+        self.cum_weights = []
+        total = 0
+        for _, weight in pairs:
+            total += weight
+            self.cum_weights.append(total)
+        self.total = total
+
+    def __call__(self, rnd: random.Random):
+        return self.values[bisect_right(self.cum_weights, rnd.random() * self.total)]
+
+
+_SEGMENT = _Choice(SEGMENTS)
+_BAND = _Choice([(i, w) for i, (_, w) in enumerate(DPD_BANDS)])
+_CURRENCY = _Choice(CURRENCIES)
+_METHOD_TYPE = {cur: _Choice(pairs) for cur, pairs in METHOD_TYPES.items()}
+_PROVIDER = {t: _Choice(pairs) for t, pairs in PROVIDERS.items()}
+_N_METHODS = _Choice(METHODS_PER_CUSTOMER)
+_CHANNEL = _Choice(CHANNELS)
+_CUSTOMER_METADATA = {(seg, region): json.dumps({"segmento": seg, "region": region}, ensure_ascii=False)
+                      for seg, _ in SEGMENTS for regions in REGIONS.values() for region in regions}
+_METHOD_METADATA = tuple(json.dumps({"origen": origen}) for origen in ("app", "sucursal", "web"))
+
+
+def _uuid(rnd: random.Random) -> str:
+    """UUID v4 a partir de la semilla (uuid4() usa os.urandom y no es reproducible)."""
+    h = f"{rnd.getrandbits(128):032x}"
+    return f"{h[:8]}-{h[8:12]}-4{h[13:16]}-{'89ab'[int(h[16], 16) & 3]}{h[17:20]}-{h[20:]}"
+
+
+def iter_portfolio(n: int, seed: int = 21, debt_ratio: float = 0.0, as_of: date | None = None):
+    """
+    Genera (cliente, [métodos], deuda o None, contexto) por cliente. Las tuplas
+    siguen el orden de columnas de los INSERT de write_portfolio().
+    """
+    rnd = random.Random(seed)
+    as_of = as_of or date.today()
+    today = as_of.isoformat()
+    for i in range(n):
+        cid = _uuid(rnd)
+        segmento = _SEGMENT(rnd)
+        currency = _CURRENCY(rnd)
+        band = _BAND(rnd)
+        low, high = DPD_BANDS[band][0]
+        dpd = rnd.randint(low, high)
+        alpha, beta = PROPENSITY_BETA[band]
+        median, sigma = AMOUNTS[segmento]
+        amount_due = round(median * rnd.lognormvariate(0, sigma), 2)
+        created_at = (datetime.combine(as_of, datetime.min.time())
+                      - timedelta(days=dpd + rnd.randint(30, 1500), seconds=rnd.randint(0, 86399)))
+        first, last = rnd.choice(FIRST_NAMES), rnd.choice(LAST_NAMES)
+        customer = (cid, f"{first} {last} {i}", f"cliente{i}@example.com",
+                    f"+{'52' if currency == 'MXN' else '57'} {rnd.randint(10**9, 10**10 - 1)}",
+                    created_at.isoformat(), _CUSTOMER_METADATA[segmento, rnd.choice(REGIONS[currency])])
+
+        methods = []
+        for j in range(_N_METHODS(rnd)):
+            mtype = _METHOD_TYPE[currency](rnd)
+            last4 = month = year = None
+            if mtype == "card":
+                last4 = f"{rnd.randint(0, 9999):04d}"
+                ahead = rnd.randint(-6, 60)
+                year, month = divmod(as_of.year * 12 + as_of.month - 1 + ahead, 12)
+                month += 1
+            method_created = (created_at + timedelta(days=rnd.randint(0, 365) * j)).isoformat()
+            methods.append((_uuid(rnd), cid, mtype, _PROVIDER[mtype](rnd), f"tok_{rnd.getrandbits(64):016x}",
+                            last4, month, year, 1 if j == 0 else 0, method_created,
+                            rnd.choice(_METHOD_METADATA)))
+
+        debt = None
+        if debt_ratio and rnd.random() < debt_ratio:
+            due = (as_of - timedelta(days=dpd)).isoformat()
+            balance = round(amount_due * rnd.uniform(0.5, 1.0), 2)
+            debt = (_uuid(rnd), cid, rnd.choice(("tarjeta", "prestamo_personal", "credito_nomina")),
+                    amount_due, balance, currency, due, "open", created_at.isoformat(), today, "{}")
+
+        context = {"customer_id": cid, "segmento": segmento, "amount_due": amount_due, "dpd": dpd,
+                   "propension_pago": round(rnd.betavariate(alpha, beta), 3),
+                   "channel": _CHANNEL(rnd), "currency": currency}
+        yield customer, methods, debt, context
+
+
+CUSTOMER_SQL = "INSERT INTO customers (id, name, email, phone, created_at, metadata) VALUES (?,?,?,?,?,?)"
+METHOD_SQL = """INSERT INTO payment_methods
+    (id, customer_id, type, provider, token, last4, expiry_month, expiry_year, is_default, created_at, metadata)
+    VALUES (?,?,?,?,?,?,?,?,?,?,?)"""
+DEBT_SQL = """INSERT INTO debts
+    (id, customer_id, product, principal, balance, currency, due_date, status, created_at, updated_at, metadata)
+    VALUES (?,?,?,?,?,?,?,?,?,?,?)"""
+
+
+def write_portfolio(conn, n: int, seed: int = 21, debt_ratio: float = 0.0, contexts_path: str | None = None,
+                    sample_size: int = 10_000, chunk_size: int = 50_000, as_of: date | None = None,
+                    progress=None) -> dict:
+    """
+    Inserta la cartera por bloques (una transacción por bloque) y devuelve conteos,
+    tiempos y `sample`: hasta `sample_size` contextos elegidos uniformemente.
+    """
+    sampler = random.Random(seed + 1)  # independiente del flujo de datos
+    sample = []
+    counts = {"customers": 0, "payment_methods": 0, "debts": 0}
+    out = open(contexts_path, "w", encoding="utf-8") if contexts_path else None
+    t0 = time.perf_counter()
+    customers, methods, debts = [], [], []
+
+    def flush():
+        conn.executemany(CUSTOMER_SQL, customers)
+        conn.executemany(METHOD_SQL, methods)
+        if debts:
+            conn.executemany(DEBT_SQL, debts)
+        conn.commit()
+        counts["customers"] += len(customers)
+        counts["payment_methods"] += len(methods)
+        counts["debts"] += len(debts)
+        customers.clear()
+        methods.clear()
+        debts.clear()
+        if progress:
+            progress(counts["customers"], n)
+
+    try:
+        for i, (customer, customer_methods, debt, context) in enumerate(
+                iter_portfolio(n, seed, debt_ratio, as_of)):
+            customers.append(customer)
+            methods.extend(customer_methods)
+            if debt is not None:
+                debts.append(debt)
+            if out is not None:
+                out.write(json.dumps(context, ensure_ascii=False) + "\n")
+            if len(sample) < sample_size:
+                sample.append(context)
+            elif sample_size:
+                slot = sampler.randint(0, i)
+                if slot < sample_size:
+                    sample[slot] = context
+            if len(customers) >= chunk_size:
+                flush()
+        if customers:
+            flush()
+    finally:
+        if out is not None:
+            out.close()
+    seconds = time.perf_counter() - t0
+    rows = sum(counts.values())
+    return {**counts, "rows": rows, "seconds": round(seconds, 3),
+            "rows_per_s": round(rows / seconds, 1) if seconds else None, "sample": sample}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", default="10k", help="10k, 100k, 1m, 10m o un entero")
+    parser.add_argument("--db", required=True, help="BD SQLite destino (se crea o migra)")
+    parser.add_argument("--contexts", help="NDJSON con el contexto de cada cliente")
+    parser.add_argument("--debt-ratio", type=float, default=0.0, help="fracción de clientes con deuda abierta")
+    parser.add_argument("--seed", type=int, default=21)
+    parser.add_argument("--chunk-size", type=int, default=50_000)
+    args = parser.parse_args(argv)
+
+    import app as agente
+
+    agente.DB_PATH = args.db
+    agente.init_db()
+    n = parse_scale(args.scale)
+
+    def progress(done, total):
+        print(f"  {done:,} / {total:,} clientes", file=sys.stderr)
+
+    conn = agente.get_connection()
+    try:
+        summary = write_portfolio(conn, n, args.seed, args.debt_ratio, args.contexts,
+                                  sample_size=0, chunk_size=args.chunk_size, progress=progress)
+    finally:
+        conn.close()
+    summary.pop("sample")
+    print(json.dumps(summary))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
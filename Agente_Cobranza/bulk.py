@@ -0,0 +1,272 @@
+"""
+Importación y exportación masiva de clientes y métodos de pago.
+
+La entrada (CSV con encabezado o NDJSON) se lee en streaming, se valida fila
+por fila y se inserta con executemany en transacciones por bloques. Si un
+bloque falla (p. ej. un customer_id inexistente viola la FK), se reintenta fila
+por fila para reportar el error exacto sin abortar el resto del lote.
+
+Uso como CLI (desde Agente_Cobranza/):
+    python bulk.py import customers clientes.csv [--db agente_cobranza.db]
+    python bulk.py import payment_methods metodos.ndjson
+    python bulk.py export customers --format csv > clientes.csv
+"""
+import argparse
+import csv
+import io
+import json
+import sqlite3
+import sys
+import time
+from datetime import datetime
+from uuid import uuid4
+
+from migrations import prune_payment_method_changes
+
+DEFAULT_CHUNK_SIZE = 5000
+MAX_REPORTED_ERRORS = 1000
+
+TABLE_COLUMNS = {
+    "customers": ["id", "name", "email", "phone", "created_at", "metadata"],
+    "payment_methods": ["id", "customer_id", "type", "provider", "token", "last4",
+                        "expiry_month", "expiry_year", "is_default", "created_at", "metadata"],
+}
+REQUIRED_FIELDS = {
+    "customers": ["name", "email"],
+    "payment_methods": ["customer_id", "type", "token"],
+}
+PAYMENT_METHOD_TYPES = {"card", "pse", "wallet", "corresponsal"}
+
+
+# ---------------------------------------------------------------------
+# Lectura
+# ---------------------------------------------------------------------
+def iter_records(stream, fmt: str):
+    """Genera (número_de_línea, registro | excepción) desde un stream de texto."""
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record
+    elif fmt == "ndjson":
+        for line_num, line in enumerate(stream, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield line_num, ValueError(f"JSON inválido: {e}")
+                continue
+            if not isinstance(record, dict):
+                yield line_num, ValueError("Cada línea debe ser un objeto JSON")
+                continue
+            yield line_num, record
+    else:
+        raise ValueError(f"Formato no soportado: {fmt}")
+
+
+def _optional_int(value):
+    if value is None or value == "":
+        return None
+    return int(value)
+
+
+def _metadata(value) -> str:
+    if value is None or value == "":
+        return "{}"
+    if isinstance(value, str):
+        json.loads(value)  # valida que sea JSON
+        return value
+    return json.dumps(value)
+
+
+def _is_default(value) -> int:
+    if isinstance(value, str):
+        return 1 if value.strip().lower() in ("1", "true", "yes", "si", "sí") else 0
+    return 1 if value else 0
+
+
+def to_row(table: str, record: dict, now: str) -> tuple:
+    """Valida un registro y lo convierte a la tupla de TABLE_COLUMNS[table]."""
+    missing = [k for k in REQUIRED_FIELDS[table] if not record.get(k)]
+    if missing:
+        raise ValueError(f"Campos requeridos faltantes: {', '.join(missing)}")
+    row_id = record.get("id") or str(uuid4())
+    created_at = record.get("created_at") or now
+    if table == "customers":
+        return (row_id, record["name"], record["email"], record.get("phone") or None,
+                created_at, _metadata(record.get("metadata")))
+
+    method_type = str(record["type"]).lower()
+    if method_type not in PAYMENT_METHOD_TYPES:
+        raise ValueError(f"Método de pago no soportado: {record['type']}")
+    return (row_id, record["customer_id"], method_type, record.get("provider") or None,
+            record["token"], record.get("last4") or None,
+            _optional_int(record.get("expiry_month")), _optional_int(record.get("expiry_year")),
+            _is_default(record.get("is_default")), created_at, _metadata(record.get("metadata")))
+
+
+# ---------------------------------------------------------------------
+# Importación
+# ---------------------------------------------------------------------
+def _insert_chunk(conn, sql: str, chunk: list, report: dict):
+    try:
+        conn.execute("SAVEPOINT bulk_chunk")
+        conn.executemany(sql, [row for _, row in chunk])
+        conn.execute("RELEASE bulk_chunk")
+        report["inserted"] += len(chunk)
+        return
+    except sqlite3.DatabaseError:
+        conn.execute("ROLLBACK TO bulk_chunk")
+        conn.execute("RELEASE bulk_chunk")
+    # Reintento fila por fila para aislar los registros inválidos
+    for line_num, row in chunk:
+        try:
+            conn.execute(sql, row)
+            report["inserted"] += 1
+        except sqlite3.DatabaseError as e:
+            _record_error(report, line_num, str(e))
+
+
+def _record_error(report: dict, line_num: int, message: str):
+    report["failed"] += 1
+    if len(report["errors"]) < MAX_REPORTED_ERRORS:
+        report["errors"].append({"line": line_num, "error": message})
+    else:
+        report["errors_truncated"] = True
+
+
+def _prune(conn, table: str):
+    # Cada fila de payment_methods deja un registro para las cachés de los workers
+    if table == "payment_methods":
+        prune_payment_method_changes(conn)
+
+
+def import_records(conn, table: str, records, chunk_size: int = DEFAULT_CHUNK_SIZE) -> dict:
+    """
+    Inserta `records` (iterable de (línea, dict | excepción)) en `table`.
+    Cada bloque se confirma en su propia transacción.
+    Devuelve {"inserted", "failed", "errors", "seconds", "rows_per_sec"}.
+    """
+    if table not in TABLE_COLUMNS:
+        raise ValueError(f"Tabla no soportada: {table}")
+    columns = TABLE_COLUMNS[table]
+    sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({','.join('?' * len(columns))})"
+    report = {"inserted": 0, "failed": 0, "errors": []}
+    now = datetime.utcnow().isoformat()
+    start = time.perf_counter()
+
+    chunk = []
+    for line_num, record in records:
+        if isinstance(record, Exception):
+            _record_error(report, line_num, str(record))
+            continue
+        try:
+            chunk.append((line_num, to_row(table, record, now)))
+        except (ValueError, TypeError) as e:
+            _record_error(report, line_num, str(e))
+            continue
+        if len(chunk) >= chunk_size:
+            _insert_chunk(conn, sql, chunk, report)
+            _prune(conn, table)
+            conn.commit()
+            chunk = []
+    if chunk:
+        _insert_chunk(conn, sql, chunk, report)
+        _prune(conn, table)
+        conn.commit()
+
+    elapsed = time.perf_counter() - start
+    report["seconds"] = round(elapsed, 3)
+    total = report["inserted"] + report["failed"]
+    report["rows_per_sec"] = round(total / elapsed) if elapsed > 0 else total
+    return report
+
+
+# ---------------------------------------------------------------------
+# Exportación
+# ---------------------------------------------------------------------
+def export_rows(conn, table: str, fmt: str, batch_size: int = 1000):
+    """Genera la tabla completa como CSV (con encabezado) o NDJSON, por bloques."""
+    if table not in TABLE_COLUMNS:
+        raise ValueError(f"Tabla no soportada: {table}")
+    if fmt not in ("csv", "ndjson"):
+        raise ValueError(f"Formato no soportado: {fmt}")
+    columns = TABLE_COLUMNS[table]
+    cursor = conn.execute(f"SELECT {', '.join(columns)} FROM {table} ORDER BY id")
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if fmt == "csv":
+        writer.writerow(columns)
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        if fmt == "csv":
+            writer.writerows(rows)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        else:
+            yield "".join(json.dumps(dict(zip(columns, row)), ensure_ascii=False) + "\n" for row in rows)
+    if fmt == "csv" and buffer.tell():
+        yield buffer.getvalue()
+
+
+def detect_format(path_or_type: str | None, default: str = "ndjson") -> str:
+    value = (path_or_type or "").lower()
+    if "csv" in value:
+        return "csv"
+    if "ndjson" in value or "jsonl" in value or "json" in value:
+        return "ndjson"
+    return default
+
+
+# ---------------------------------------------------------------------
+# CLI
+# ---------------------------------------------------------------------
+def main(argv=None) -> int:
+    from db_pool import ConnectionPool
+    from migrations import migrate
+
+    parser = argparse.ArgumentParser(description="Importación/exportación masiva")
+    parser.add_argument("--db", default="agente_cobranza.db")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    imp = sub.add_parser("import")
+    imp.add_argument("table", choices=sorted(TABLE_COLUMNS))
+    imp.add_argument("path", help="Archivo CSV/NDJSON, o - para stdin")
+    imp.add_argument("--format", choices=["csv", "ndjson"])
+    imp.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+
+    exp = sub.add_parser("export")
+    exp.add_argument("table", choices=sorted(TABLE_COLUMNS))
+    exp.add_argument("--format", choices=["csv", "ndjson"], default="ndjson")
+
+    args = parser.parse_args(argv)
+    pool = ConnectionPool(args.db, size=1)
+    conn = pool.acquire()
+    try:
+        migrate(conn)
+        if args.command == "export":
+            for block in export_rows(conn, args.table, args.format):
+                sys.stdout.write(block)
+            return 0
+
+        fmt = args.format or detect_format(args.path)
+        if args.path == "-":
+            report = import_records(conn, args.table, iter_records(sys.stdin, fmt), args.chunk_size)
+        else:
+            with open(args.path, newline="", encoding="utf-8") as f:
+                report = import_records(conn, args.table, iter_records(f, fmt), args.chunk_size)
+        json.dump(report, sys.stderr, ensure_ascii=False, indent=2)
+        sys.stderr.write("\n")
+        return 0 if not report["failed"] else 1
+    finally:
+        conn.close()
+        pool.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
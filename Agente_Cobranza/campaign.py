@@ -0,0 +1,356 @@
+"""
+Corrida de campaña multiproceso: decide para toda la cartera antes de que
+arranquen los marcadores.
+
+La entrada es un NDJSON con un contexto por línea (customer_id, segmento,
+propension_pago y, si el cliente no tiene deudas guardadas, amount_due y dpd),
+el mismo formato de `offer_cache.py precompute`. El archivo se parte en
+`shards` rangos de bytes alineados a línea (sin decodificar nada en el
+proceso principal) y un pool de procesos los toma de uno en uno. Cada worker
+abre su propio pool SQLite de sólo lectura y decide por bloques con
+agent_decisions_batch, la misma lógica de /agent/decision (métodos de pago,
+deudas, negociación, ruta y speech).
+
+Cada shard escribe su partición (`part-00003.ndjson` o `.csv`) y, tras cada
+bloque, hace fsync y guarda un checkpoint (`part-00003.ckpt.json`) con el
+offset de entrada y los bytes de salida confirmados. Si la corrida se cae,
+volver a correrla sobre el mismo directorio recorta cada partición al último
+checkpoint y sigue desde ahí: ningún cliente queda duplicado ni se pierde. Las
+particiones concatenadas en orden siguen el orden del archivo de entrada.
+
+Uso (desde Agente_Cobranza/):
+    python campaign.py run contextos.ndjson --out corridas/lunes --workers 8 [--format csv] [--db agente_cobranza.db]
+    python campaign.py status corridas/lunes
+"""
+import argparse
+import csv
+import io
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin candado por partición
+    fcntl = None
+
+DEFAULT_CHUNK_SIZE = 1000
+SHARDS_PER_WORKER = 4
+MANIFEST = "campaign.json"
+FORMATS = ("ndjson", "csv")
+CSV_COLUMNS = ["customer_id", "status", "payment_method_type", "payment_provider", "route_method",
+               "routed_to", "amount", "currency", "tactic", "discount_pct", "installments",
+               "speech", "speech_variant", "error"]
+
+
+class CampaignError(ValueError):
+    """El directorio de salida no corresponde a esta entrada o configuración."""
+
+
+def plan_shards(path: str, shards: int) -> list[list[int]]:
+    """Rangos [inicio, fin) de bytes de igual tamaño; cada shard es dueño de las líneas que empiezan en su rango."""
+    size = os.path.getsize(path)
+    shards = max(1, min(shards, size or 1))
+    bounds = [size * i // shards for i in range(shards + 1)]
+    return [[bounds[i], bounds[i + 1]] for i in range(shards)]
+
+
+def part_path(out_dir: str, shard: int, fmt: str) -> str:
+    return os.path.join(out_dir, f"part-{shard:05d}.{fmt}")
+
+
+def checkpoint_path(out_dir: str, shard: int) -> str:
+    return os.path.join(out_dir, f"part-{shard:05d}.ckpt.json")
+
+
+def _read_json(path: str):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _write_json(path: str, data: dict):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def csv_row(result: dict) -> list:
+    decision = result.get("decision") or {}
+    method = decision.get("best_payment_method") or {}
+    route = decision.get("payment_route") or {}
+    proposal = decision.get("negotiation_proposal") or {}
+    return [
+        decision.get("customer_id", result.get("customer_id")), result["status"],
+        method.get("type"), method.get("provider"), route.get("method"), route.get("routed_to"),
+        route.get("amount"), route.get("currency"), proposal.get("tactic"), proposal.get("discount_pct"),
+        proposal.get("installments"), decision.get("speech"), decision.get("speech_variant"),
+        result.get("mensaje"),
+    ]
+
+
+def _encode(results: list[dict], fmt: str, header: bool = False) -> bytes:
+    if fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if header:
+            writer.writerow(CSV_COLUMNS)
+        writer.writerows(csv_row(r) for r in results)
+        return buffer.getvalue().encode("utf-8")
+    return "".join(json.dumps(r, ensure_ascii=False, separators=(",", ":")) + "\n"
+                   for r in results).encode("utf-8")
+
+
+# ---------------------------------------------------------------------
+# Worker
+# ---------------------------------------------------------------------
+_agente = None
+
+
+def _init_worker(db_path: str):
+    """Inicializador del pool: importa la app con un pool SQLite de sólo lectura propio."""
+    global _agente
+    import app as agente
+
+    agente.DB_PATH = db_path
+    agente.DB_READ_ONLY = True
+    _agente = agente
+
+
+def _decide(lines: list[tuple[int, bytes]]) -> list[dict]:
+    """Decisiones de un bloque de líneas (offset, bytes); las líneas inválidas quedan como error."""
+    results = [None] * len(lines)
+    contexts, positions = [], []
+    for i, (offset, line) in enumerate(lines):
+        try:
+            ctx = json.loads(line)
+        except ValueError as e:
+            results[i] = {"status": "error", "offset": offset, "codigo": "ERROR_400",
+                          "mensaje": f"JSON inválido: {e}"}
+            continue
+        contexts.append(ctx)
+        positions.append(i)
+    for i, result in zip(positions, _agente.agent_decisions_batch(contexts)):
+        if result["status"] != "ok":
+            ctx = contexts[result["index"]]
+            result = {"status": "error", "customer_id": ctx.get("customer_id") if isinstance(ctx, dict) else None,
+                      "offset": lines[i][0], "codigo": result["codigo"], "mensaje": result["mensaje"]}
+        results[i] = result
+    return results
+
+
+def run_shard(task: dict) -> dict:
+    """
+    Procesa (o reanuda) un shard: lee su rango del archivo de entrada por
+    bloques, decide y agrega a su partición; tras cada bloque confirma salida y
+    checkpoint. Devuelve el checkpoint final.
+    """
+    shard, start, end = task["shard"], task["start"], task["end"]
+    out_path = part_path(task["out_dir"], shard, task["format"])
+    ckpt_path = checkpoint_path(task["out_dir"], shard)
+    fd = os.open(out_path, os.O_RDWR | os.O_CREAT, 0o644)
+    with open(task["input"], "rb") as src, os.fdopen(fd, "r+b") as out:
+        if fcntl is not None:
+            # Un worker huérfano de una corrida caída puede seguir con este shard:
+            # se espera a que lo suelte y se lee su checkpoint ya actualizado
+            fcntl.flock(out.fileno(), fcntl.LOCK_EX)
+        state = _read_json(ckpt_path) or {"shard": shard, "input_offset": start, "output_bytes": 0,
+                                          "processed": 0, "ok": 0, "errors": 0, "seconds": 0.0, "done": False}
+        if state["done"]:
+            return state
+        # Lo escrito después del último checkpoint se descarta y se vuelve a decidir
+        out.truncate(state["output_bytes"])
+        out.seek(state["output_bytes"])
+        if state["output_bytes"] == 0 and task["format"] == "csv":
+            out.write(_encode([], "csv", header=True))
+        pos = state["input_offset"]
+        src.seek(pos)
+        if pos == start and start > 0:
+            # La línea que empieza antes del rango es del shard anterior
+            src.seek(start - 1)
+            src.readline()
+            pos = src.tell()
+
+        eof = False
+        while pos < end and not eof:
+            t0 = time.perf_counter()
+            lines = []
+            while len(lines) < task["chunk_size"] and pos < end:
+                line = src.readline()
+                if not line:
+                    eof = True
+                    break
+                if line.strip():
+                    lines.append((pos, line))
+                pos += len(line)
+            results = _decide(lines)
+            out.write(_encode(results, task["format"]))
+            out.flush()
+            os.fsync(out.fileno())
+            errors = sum(1 for r in results if r["status"] != "ok")
+            state.update(input_offset=pos, output_bytes=out.tell(),
+                         processed=state["processed"] + len(results),
+                         ok=state["ok"] + len(results) - errors, errors=state["errors"] + errors,
+                         seconds=round(state["seconds"] + time.perf_counter() - t0, 3))
+            _write_json(ckpt_path, state)
+            if task.get("max_chunks") is not None:
+                task["max_chunks"] -= 1
+                if task["max_chunks"] <= 0:
+                    return state
+        state["done"] = True
+        _write_json(ckpt_path, state)
+    return state
+
+
+# ---------------------------------------------------------------------
+# Coordinador
+# ---------------------------------------------------------------------
+def _input_signature(path: str) -> dict:
+    st = os.stat(path)
+    return {"input": os.path.abspath(path), "input_bytes": st.st_size, "input_mtime_ns": st.st_mtime_ns}
+
+
+def prepare(input_path: str, out_dir: str, shards: int, fmt: str) -> dict:
+    """Crea el manifiesto de la corrida o valida el existente (reanudación)."""
+    if fmt not in FORMATS:
+        raise CampaignError(f"Formato no soportado: {fmt}")
+    os.makedirs(out_dir, exist_ok=True)
+    manifest_path = os.path.join(out_dir, MANIFEST)
+    signature = _input_signature(input_path)
+    manifest = _read_json(manifest_path)
+    if manifest is not None:
+        if {k: manifest.get(k) for k in signature} != signature or manifest["format"] != fmt:
+            raise CampaignError(f"{out_dir} es de otra entrada o formato; use otro directorio de salida")
+        return manifest
+    manifest = {**signature, "format": fmt, "shards": plan_shards(input_path, shards),
+                "created_at": datetime.utcnow().isoformat(), "finished_at": None}
+    _write_json(manifest_path, manifest)
+    return manifest
+
+
+def campaign_status(out_dir: str) -> dict:
+    """Avance de una corrida leyendo su manifiesto y los checkpoints de cada shard."""
+    manifest = _read_json(os.path.join(out_dir, MANIFEST))
+    if manifest is None:
+        raise CampaignError(f"{out_dir} no tiene {MANIFEST}")
+    status = {"processed": 0, "ok": 0, "errors": 0, "bytes_done": 0,
+              "bytes_total": manifest["input_bytes"], "shards": len(manifest["shards"]), "shards_done": 0}
+    for shard, (start, end) in enumerate(manifest["shards"]):
+        state = _read_json(checkpoint_path(out_dir, shard))
+        if state is None:
+            continue
+        for key in ("processed", "ok", "errors"):
+            status[key] += state[key]
+        status["bytes_done"] += end - start if state["done"] else max(0, state["input_offset"] - start)
+        status["shards_done"] += state["done"]
+    status["finished_at"] = manifest.get("finished_at")
+    return status
+
+
+def run_campaign(input_path: str, out_dir: str, db_path: str, workers: int | None = None,
+                 shards: int | None = None, fmt: str = "ndjson", chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 progress=None, progress_interval: float = 2.0, max_chunks: int | None = None) -> dict:
+    """
+    Corre (o reanuda) la campaña con `workers` procesos. `progress(status)` se
+    llama cada `progress_interval` segundos con el avance de campaign_status().
+    `max_chunks` limita los bloques por shard en esta invocación (para cortar
+    corridas largas en ventanas). Devuelve el resumen final.
+    """
+    workers = workers or os.cpu_count() or 1
+    manifest = prepare(input_path, out_dir, shards or workers * SHARDS_PER_WORKER, fmt)
+    before = campaign_status(out_dir)
+    tasks = [
+        {"shard": shard, "start": start, "end": end, "input": manifest["input"], "out_dir": out_dir,
+         "format": fmt, "chunk_size": chunk_size, "max_chunks": max_chunks}
+        for shard, (start, end) in enumerate(manifest["shards"])
+        if not (_read_json(checkpoint_path(out_dir, shard)) or {}).get("done")
+    ]
+
+    started = time.perf_counter()
+    stop = threading.Event()
+
+    def report():
+        while not stop.wait(progress_interval):
+            status = campaign_status(out_dir)
+            status["seconds"] = round(time.perf_counter() - started, 3)
+            status["rate"] = round((status["processed"] - before["processed"]) / max(status["seconds"], 1e-9), 1)
+            progress(status)
+
+    reporter = threading.Thread(target=report, daemon=True) if progress else None
+    if reporter:
+        reporter.start()
+    try:
+        if tasks:
+            # spawn: cada worker importa la app desde cero (sin heredar conexiones SQLite)
+            ctx = multiprocessing.get_context("spawn")
+            with ctx.Pool(min(workers, len(tasks)), initializer=_init_worker, initargs=(db_path,)) as pool:
+                for _ in pool.imap_unordered(run_shard, tasks):
+                    pass
+    finally:
+        stop.set()
+        if reporter:
+            reporter.join()
+
+    summary = campaign_status(out_dir)
+    summary["seconds"] = round(time.perf_counter() - started, 3)
+    summary["resumed"] = before["processed"] > 0 or before["shards_done"] > 0
+    summary["workers"] = workers
+    summary["rate"] = round((summary["processed"] - before["processed"]) / max(summary["seconds"], 1e-9), 1)
+    if summary["shards_done"] == summary["shards"] and not manifest.get("finished_at"):
+        manifest["finished_at"] = datetime.utcnow().isoformat()
+        _write_json(os.path.join(out_dir, MANIFEST), manifest)
+    summary["finished_at"] = manifest.get("finished_at")
+    summary["parts"] = [part_path(out_dir, shard, fmt) for shard in range(len(manifest["shards"]))]
+    return summary
+
+
+def _print_progress(status: dict):
+    pct = status["bytes_done"] / status["bytes_total"] * 100 if status["bytes_total"] else 100.0
+    rate = status["rate"]
+    eta = (status["bytes_total"] - status["bytes_done"]) / max(status["bytes_done"], 1) * status["seconds"]
+    print(f"[{status['seconds']:7.1f} s] {status['processed']:,} decisiones ({status['errors']:,} errores) "
+          f"{pct:5.1f}%  {rate:,.0f}/s  shards {status['shards_done']}/{status['shards']}  ETA {eta:,.0f} s",
+          file=sys.stderr)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Corrida de campaña multiproceso")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run = sub.add_parser("run", help="Decide toda la lista (reanuda si el directorio ya tiene una corrida)")
+    run.add_argument("path", help="Contextos NDJSON (uno por línea)")
+    run.add_argument("--out", required=True, help="Directorio de particiones y checkpoints")
+    run.add_argument("--db", default="agente_cobranza.db")
+    run.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    run.add_argument("--shards", type=int, help=f"Por defecto {SHARDS_PER_WORKER} por worker")
+    run.add_argument("--format", choices=FORMATS, default="ndjson")
+    run.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    run.add_argument("--max-chunks", type=int, help="Bloques por shard en esta invocación")
+    run.add_argument("--progress-interval", type=float, default=2.0)
+    status = sub.add_parser("status", help="Avance de una corrida")
+    status.add_argument("out")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == "status":
+            report = campaign_status(args.out)
+        else:
+            report = run_campaign(args.path, args.out, args.db, workers=args.workers, shards=args.shards,
+                                  fmt=args.format, chunk_size=args.chunk_size, progress=_print_progress,
+                                  progress_interval=args.progress_interval, max_chunks=args.max_chunks)
+    except CampaignError as e:
+        print(str(e), file=sys.stderr)
+        return 2
+    json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+    sys.stdout.write("\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
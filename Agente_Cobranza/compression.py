@@ -0,0 +1,103 @@
+"""
+Compresión de respuestas negociada por Accept-Encoding.
+
+ResponseCompressor.compress() se llama desde un after_request: elige `br`
+(si está instalado `pip install brotli`) o `gzip` según las calidades que
+declara el cliente, y comprime los cuerpos JSON / NDJSON / CSV que superan
+`min_size` bytes. Las respuestas en streaming (listados sin paginar,
+exportaciones) se comprimen bloque a bloque sin materializar el cuerpo.
+"""
+import threading
+import zlib
+
+try:
+    import brotli
+except ImportError:  # opcional: sin brotli sólo se negocia gzip
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = {"application/json", "application/x-ndjson", "text/csv", "text/plain"}
+
+
+class ResponseCompressor:
+    def __init__(self, min_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4):
+        self.min_size = min_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.encodings = ("br", "gzip") if brotli is not None else ("gzip",)
+        self._lock = threading.Lock()
+        self.responses = {}      # encoding -> respuestas comprimidas
+        self.bytes_in = 0        # sólo cuerpos no streaming
+        self.bytes_out = 0
+
+    def choose(self, accept_encodings) -> str | None:
+        """Codificación con mayor calidad aceptada (br antes que gzip en empate)."""
+        best, best_quality = None, 0
+        for encoding in self.encodings:
+            quality = accept_encodings[encoding]
+            if quality > best_quality:
+                best, best_quality = encoding, quality
+        return best
+
+    def _compressor(self, encoding: str):
+        if encoding == "br":
+            return brotli.Compressor(quality=self.brotli_quality)
+        return zlib.compressobj(self.gzip_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress_bytes(self, data: bytes, encoding: str) -> bytes:
+        if encoding == "br":
+            return brotli.compress(data, quality=self.brotli_quality)
+        compressor = self._compressor(encoding)
+        return compressor.compress(data) + compressor.flush()
+
+    def _stream(self, chunks, encoding: str):
+        compressor = self._compressor(encoding)
+        process = compressor.process if encoding == "br" else compressor.compress
+        try:
+            for chunk in chunks:
+                out = process(chunk.encode("utf-8") if isinstance(chunk, str) else chunk)
+                if out:
+                    yield out
+            yield compressor.finish() if encoding == "br" else compressor.flush()
+        finally:
+            # Cliente desconectado: cierra el generador original (devuelve su conexión al pool)
+            close = getattr(chunks, "close", None)
+            if close is not None:
+                close()
+
+    def compress(self, response, request):
+        if (response.status_code not in (200, 201) or request.method == "HEAD"
+                or response.mimetype not in COMPRESSIBLE_MIMETYPES
+                or "Content-Encoding" in response.headers):
+            return response
+        response.vary.add("Accept-Encoding")
+        encoding = self.choose(request.accept_encodings)
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            response.response = self._stream(response.response, encoding)
+            response.headers.pop("Content-Length", None)
+        else:
+            body = response.get_data()
+            if len(body) < self.min_size:
+                return response
+            compressed = self.compress_bytes(body, encoding)
+            response.set_data(compressed)
+            with self._lock:
+                self.bytes_in += len(body)
+                self.bytes_out += len(compressed)
+        response.headers["Content-Encoding"] = encoding
+        with self._lock:
+            self.responses[encoding] = self.responses.get(encoding, 0) + 1
+        return response
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "encodings": list(self.encodings),
+                "min_size": self.min_size,
+                "responses": dict(self.responses),
+                "bytes_in": self.bytes_in,
+                "bytes_out": self.bytes_out,
+                "ratio": round(self.bytes_out / self.bytes_in, 4) if self.bytes_in else None,
+            }
@@ -0,0 +1,203 @@
+"""
+Búsqueda de clientes por nombre, email o teléfono.
+
+Índices (migración 9):
+- customers_fts: tabla FTS5 de contenido externo sobre customers (name, email),
+  con `remove_diacritics` (Gutierrez encuentra Gutiérrez) e índices de prefijo
+  de 2 a 10 caracteres. Los triggers de customers la mantienen al día en cada
+  alta, edición o baja, incluidas las importaciones masivas.
+- Índices por expresión sobre el email normalizado (minúsculas, sin espacios)
+  y sobre los últimos 10 dígitos del teléfono, para las búsquedas exactas.
+
+search() elige el modo: `email` si el texto lleva @, `phone` si son sólo
+dígitos y separadores (7 o más dígitos) y `text` (FTS) en otro caso. En FTS
+cada palabra es un prefijo y todas deben aparecer (en el nombre o el email).
+
+Costo: con un prefijo cubierto por los índices (2 a 10 caracteres) FTS5 recorre
+las coincidencias en orden de rowid sin materializarlas, así que se leen como
+máximo `max_candidates` filas; esas se ordenan por relevancia (palabra exacta
+en el nombre, luego prefijo en el nombre, luego nombre más corto) y se pagina
+sobre ellas. Si hay más coincidencias la respuesta trae `truncated: true` y
+conviene afinar la búsqueda: a partir de cierto volumen el orden de un término
+muy común (un apellido solo) no distingue a nadie.
+
+La tabla FTS referencia el rowid de customers: si la BD se compacta con VACUUM
+(que puede renumerarlos) hay que reconstruir el índice:
+
+    python customer_search.py rebuild [ruta.db]
+    python customer_search.py check [ruta.db]
+"""
+import functools
+import re
+import sqlite3
+import sys
+import unicodedata
+
+MODES = ("auto", "text", "email", "phone")
+
+# Expresiones idénticas a las de los índices de la migración 9 (SQLite sólo usa
+# un índice por expresión si la consulta repite la misma expresión)
+EMAIL_KEY_SQL = "lower(trim(email))"
+PHONE_KEY_SQL = ("substr(replace(replace(replace(replace(replace(replace("
+                 "phone, ' ', ''), '-', ''), '(', ''), ')', ''), '.', ''), '+', ''), -10)")
+
+MAX_TOKENS = 8
+PHONE_RE = re.compile(r"^\+?[\d\s().-]+$")
+TOKEN_RE = re.compile(r"[^\W_]+")
+COMBINING_RE = re.compile("[\u0300-\u036f]")  # diacríticos combinables (acentos, tilde, diéresis)
+
+
+class SearchError(ValueError):
+    pass
+
+
+def fold(text: str) -> str:
+    """Minúsculas y sin acentos, como el tokenizador `unicode61 remove_diacritics 2`."""
+    text = text.lower()
+    if text.isascii():
+        return text
+    return COMBINING_RE.sub("", unicodedata.normalize("NFKD", text))
+
+
+def email_key(value: str) -> str:
+    return value.strip().lower()
+
+
+def phone_key(value: str) -> str:
+    """Últimos 10 dígitos: +52 55 1234 5678 y 5512345678 son el mismo teléfono."""
+    return "".join(ch for ch in value if ch.isdigit())[-10:]
+
+
+def detect_mode(q: str) -> str:
+    if "@" in q:
+        return "email"
+    if PHONE_RE.match(q) and sum(ch.isdigit() for ch in q) >= 7:
+        return "phone"
+    return "text"
+
+
+def tokens(q: str) -> list[str]:
+    # Una letra suelta (una inicial) no tiene índice de prefijo y coincidiría con casi todo
+    words = [w for w in TOKEN_RE.findall(fold(q)) if len(w) > 1]
+    if not words:
+        raise SearchError("La búsqueda necesita al menos una palabra de 2 caracteres")
+    return list(dict.fromkeys(words))[:MAX_TOKENS]
+
+
+def match_expression(words: list[str]) -> str:
+    # Cada palabra entre comillas: el texto del usuario nunca se interpreta como sintaxis FTS5
+    return " AND ".join(f'"{w}"*' for w in words)
+
+
+@functools.lru_cache(maxsize=65536)
+def _fold_word(word: str) -> str:
+    # Nombres y apellidos se repiten mucho entre clientes: se normaliza cada palabra una vez
+    return fold(word)
+
+
+def _score(candidate: tuple, words: list[str]) -> tuple:
+    customer_id, name = candidate
+    name = name or ""
+    name_words = [_fold_word(w) for w in TOKEN_RE.findall(name)]
+    exact = prefix = 0
+    for w in words:
+        if w in name_words:
+            exact += 1
+            prefix += 1
+        elif any(n.startswith(w) for n in name_words):
+            prefix += 1
+    return (-exact, -prefix, len(name), name, customer_id)
+
+
+def _rows(cursor) -> list[dict]:
+    columns = [d[0] for d in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor]
+
+
+def _fetch(conn, customer_ids: list[str]) -> list[dict]:
+    """Filas completas de la página, en el orden de customer_ids."""
+    if not customer_ids:
+        return []
+    rows = {row["id"]: row for row in _rows(conn.execute(
+        f"SELECT * FROM customers WHERE id IN ({','.join('?' * len(customer_ids))})", customer_ids))}
+    return [rows[cid] for cid in customer_ids if cid in rows]
+
+
+def search(conn, q: str, mode: str = "auto", limit: int = 20, offset: int = 0,
+           max_candidates: int = 200) -> dict:
+    """
+    Devuelve {"mode", "results", "next_offset", "truncated"}; `results` son filas
+    completas de customers en orden de relevancia.
+    """
+    q = (q or "").strip()
+    if not q:
+        raise SearchError("Falta el texto de búsqueda (q, email o phone)")
+    if mode not in MODES:
+        raise SearchError(f"Modo de búsqueda inválido '{mode}'; opciones: {', '.join(MODES)}")
+    if mode == "auto":
+        mode = detect_mode(q)
+    window = offset + limit
+
+    if mode in ("email", "phone"):
+        key, expr = (email_key(q), EMAIL_KEY_SQL) if mode == "email" else (phone_key(q), PHONE_KEY_SQL)
+        if mode == "phone" and len(key) < 7:
+            raise SearchError("El teléfono necesita al menos 7 dígitos")
+        rows = _rows(conn.execute(
+            f"SELECT * FROM customers WHERE {expr} = ? ORDER BY id LIMIT ? OFFSET ?", (key, limit + 1, offset)))
+        more = len(rows) > limit
+        return {"mode": mode, "results": rows[:limit], "next_offset": window if more else None, "truncated": False}
+
+    words = tokens(q)
+    if window > max_candidates:
+        raise SearchError(f"offset + limit no puede pasar de {max_candidates}; afine la búsqueda")
+    # Se ordenan (id, nombre) de los candidatos; las filas completas sólo de la página
+    candidates = conn.execute("""
+        SELECT c.id, c.name FROM customers_fts
+        JOIN customers c ON c.rowid = customers_fts.rowid
+        WHERE customers_fts MATCH ?
+        LIMIT ?
+    """, (match_expression(words), max_candidates + 1)).fetchall()
+    truncated = len(candidates) > max_candidates
+    candidates = sorted(candidates[:max_candidates], key=lambda candidate: _score(candidate, words))
+    return {
+        "mode": "text",
+        "results": _fetch(conn, [cid for cid, _ in candidates[offset:window]]),
+        "next_offset": window if window < len(candidates) else None,
+        "truncated": truncated,
+    }
+
+
+def rebuild(conn):
+    """Reconstruye customers_fts desde customers (tras un VACUUM o una carga sin triggers)."""
+    conn.execute("INSERT INTO customers_fts (customers_fts) VALUES ('rebuild')")
+    conn.commit()
+
+
+def check(conn) -> bool:
+    """True si customers_fts coincide con el contenido actual de customers."""
+    try:
+        conn.execute("INSERT INTO customers_fts (customers_fts, rank) VALUES ('integrity-check', 1)")
+        return True
+    except sqlite3.DatabaseError:
+        return False
+
+
+def main(argv: list[str]) -> int:
+    if not argv or argv[0] not in ("rebuild", "check"):
+        print(__doc__)
+        return 2
+    conn = sqlite3.connect(argv[1] if len(argv) > 1 else "agente_cobranza.db")
+    try:
+        if argv[0] == "rebuild":
+            rebuild(conn)
+            print("customers_fts reconstruido")
+            return 0
+        ok = check(conn)
+        print("customers_fts ok" if ok else "customers_fts no coincide con customers: corra `rebuild`")
+        return 0 if ok else 1
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,214 @@
+"""
+Pool de conexiones SQLite reutilizables entre peticiones.
+
+Cada conexión se abre una sola vez con WAL, synchronous=NORMAL, mmap_size,
+busy_timeout y foreign_keys; después se presta y se devuelve al pool en lugar de
+cerrarse. Con `read_only=True` se abren con `mode=ro` y `query_only` (workers de
+campaña que sólo leen). `acquire()` entrega un PooledConnection cuyo `close()` regresa la
+conexión al pool, así los handlers existentes (get_connection() ... conn.close())
+lo usan sin cambios.
+"""
+import pathlib
+import sqlite3
+import threading
+import time
+from collections import deque
+
+
+class PoolTimeout(sqlite3.OperationalError):
+    """No se liberó ninguna conexión dentro del tiempo de espera."""
+
+
+def _timed_cursor_class(observer):
+    """Cursor que reporta observer(sql, segundos) por cada execute/executemany."""
+
+    class TimedCursor(sqlite3.Cursor):
+        def execute(self, sql, parameters=()):
+            start = time.perf_counter()
+            try:
+                return super().execute(sql, parameters)
+            finally:
+                observer(sql, time.perf_counter() - start)
+
+        def executemany(self, sql, seq_of_parameters):
+            start = time.perf_counter()
+            try:
+                return super().executemany(sql, seq_of_parameters)
+            finally:
+                observer(sql, time.perf_counter() - start)
+
+    return TimedCursor
+
+
+class PooledConnection:
+    """Proxy de sqlite3.Connection; `close()` la devuelve al pool."""
+
+    __slots__ = ("_conn", "_pool")
+
+    def __init__(self, conn: sqlite3.Connection, pool: "ConnectionPool"):
+        self._conn = conn
+        self._pool = pool
+
+    def __getattr__(self, name):
+        conn = self._conn
+        if conn is None:
+            raise sqlite3.ProgrammingError("Cannot operate on a closed database.")
+        return getattr(conn, name)
+
+    def __setattr__(self, name, value):
+        if name in PooledConnection.__slots__:
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._conn, name, value)
+
+    def cursor(self, *args):
+        factory = self._pool.cursor_class
+        if factory is None or args:
+            return self.__getattr__("cursor")(*args)
+        return self._conn.cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        if self._pool.cursor_class is None:
+            return self.__getattr__("execute")(sql, parameters)
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        if self._pool.cursor_class is None:
+            return self.__getattr__("executemany")(sql, seq_of_parameters)
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def close(self):
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            self._pool.release(conn)
+
+
+class ConnectionPool:
+    def __init__(self, db_path: str, size: int = 8, timeout: float = 30.0,
+                 busy_timeout_ms: int = 5000, mmap_size: int = 256 * 1024 * 1024,
+                 query_observer=None, read_only: bool = False):
+        if size < 1:
+            raise ValueError("El tamaño del pool debe ser >= 1")
+        self.db_path = db_path
+        self.size = size
+        self.timeout = timeout
+        self.busy_timeout_ms = busy_timeout_ms
+        self.mmap_size = mmap_size
+        self.read_only = read_only
+        # Si hay observer, los cursores prestados miden cada consulta
+        self.cursor_class = _timed_cursor_class(query_observer) if query_observer else None
+
+        self._idle = deque()
+        self._cond = threading.Condition()
+        self._created = 0
+        self._checked_out = 0
+        self._acquires = 0
+        self._waits = 0
+        self._wait_time = 0.0
+        self._max_wait = 0.0
+        self._timeouts = 0
+        self._closed = False
+
+    def _connect(self) -> sqlite3.Connection:
+        if self.read_only:
+            conn = sqlite3.connect(f"{pathlib.Path(self.db_path).resolve().as_uri()}?mode=ro", uri=True,
+                                   check_same_thread=False, timeout=self.busy_timeout_ms / 1000)
+            conn.execute("PRAGMA query_only = ON;")
+        else:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False,
+                                   timeout=self.busy_timeout_ms / 1000)
+            conn.execute("PRAGMA journal_mode = WAL;")
+        conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)};")
+        conn.execute("PRAGMA synchronous = NORMAL;")
+        conn.execute(f"PRAGMA mmap_size = {int(self.mmap_size)};")
+        conn.execute("PRAGMA foreign_keys = ON;")
+        return conn
+
+    def acquire(self) -> PooledConnection:
+        waited = None
+        with self._cond:
+            if self._closed:
+                raise sqlite3.ProgrammingError("El pool de conexiones está cerrado")
+            if not self._idle and self._created >= self.size:
+                self._waits += 1
+                start = time.perf_counter()
+                deadline = start + self.timeout
+                while not self._idle and self._created >= self.size:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0 or self._closed:
+                        self._timeouts += 1
+                        raise PoolTimeout(
+                            f"Sin conexiones libres en el pool tras {self.timeout}s (size={self.size})")
+                    self._cond.wait(remaining)
+                waited = time.perf_counter() - start
+                self._wait_time += waited
+                self._max_wait = max(self._max_wait, waited)
+            conn = self._idle.pop() if self._idle else None
+            if conn is None:
+                self._created += 1
+            self._checked_out += 1
+            self._acquires += 1
+
+        if conn is None:
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._cond:
+                    self._created -= 1
+                    self._checked_out -= 1
+                    self._cond.notify()
+                raise
+        conn.row_factory = None  # usamos cursor.description para mapear
+        return PooledConnection(conn, self)
+
+    def release(self, conn: sqlite3.Connection):
+        # Nunca devolver una transacción a medias al pool
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            reusable = True
+        except sqlite3.Error:
+            reusable = False
+
+        with self._cond:
+            self._checked_out -= 1
+            if reusable and not self._closed:
+                self._idle.append(conn)
+                conn = None
+            else:
+                self._created -= 1
+            self._cond.notify()
+        if conn is not None:
+            conn.close()
+
+    def close(self):
+        """Cierra las conexiones libres; las prestadas se cierran al devolverse."""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = list(self._idle), deque()
+            self._created -= len(idle)
+            self._cond.notify_all()
+        for conn in idle:
+            conn.close()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "size": self.size,
+                "read_only": self.read_only,
+                "created": self._created,
+                "idle": len(self._idle),
+                "checked_out": self._checked_out,
+                "acquires": self._acquires,
+                "waits": self._waits,
+                "wait_time_total_ms": round(self._wait_time * 1000, 3),
+                "wait_time_max_ms": round(self._max_wait * 1000, 3),
+                "timeouts": self._timeouts,
+            }
@@ -0,0 +1,482 @@
+"""
+Bitácora de decisiones y eventos para analítica de recuperación.
+
+/agent/decision, /agent/decisions:batch, POST /payments y POST /promises
+registran un evento con DecisionLog.record(): sólo toma la hora y lo encola en
+memoria (sin JSON ni E/S en el camino de la petición). Un hilo de fondo vacía
+la cola por lotes (`batch_size` eventos o cada `flush_interval` segundos), arma
+cada fila y la escribe en el sink:
+
+- SQLiteSink: tabla `decision_events` en una BD propia (por defecto
+  decision_log.db junto a la BD principal), un INSERT por lote dentro de una
+  transacción. Al ser otro archivo no compite por el candado de escritura con
+  el API.
+- NDJSONSink: segmentos `decisions-NNNNNN-AAAAMMDDTHHMMSS.mmm.ndjson.gz`; cada lote
+  es un miembro gzip completo, así que un segmento abierto ya es legible hasta
+  el último lote escrito. Rota por tamaño o antigüedad y conserva los últimos
+  `keep_segments` (0 = todos).
+
+Cola llena (`max_queue`): `drop_newest` descarta el evento nuevo, `drop_oldest`
+el más antiguo y `block` espera hasta `block_timeout` segundos (contrapresión
+sobre la petición) antes de descartar; cada descarte se cuenta por motivo.
+
+Lectura por rango de tiempo (scan) para los jobs de analítica: por el índice
+de `ts` en SQLite, o abriendo sólo los segmentos que se traslapan con el rango.
+Desde Agente_Cobranza/:
+
+    python decision_log.py scan --from 2026-10-01 --to 2026-10-02 [--db decision_log.db | --dir segmentos/]
+"""
+import argparse
+import gzip
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+import zlib
+from collections import deque
+from datetime import datetime, timezone
+
+from fast_json import dumps_row
+
+POLICIES = ("drop_newest", "drop_oldest", "block")
+TS_PREFIX = '{"ts":"'
+TS_SLICE = slice(len(TS_PREFIX), len(TS_PREFIX) + 23)
+COLUMNS = ("ts", "event", "customer_id", "source", "tactic", "discount_pct", "installments",
+           "method", "routed_to", "amount", "payload")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS decision_events (
+    id INTEGER PRIMARY KEY,
+    ts TEXT NOT NULL,
+    event TEXT NOT NULL,
+    customer_id TEXT,
+    source TEXT,
+    tactic TEXT,
+    discount_pct REAL,
+    installments INTEGER,
+    method TEXT,
+    routed_to TEXT,
+    amount REAL,
+    payload TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_decision_events_ts ON decision_events (ts);
+CREATE INDEX IF NOT EXISTS idx_decision_events_customer ON decision_events (customer_id, ts);
+"""
+
+
+def format_ts(ts: float) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3]
+
+
+def summarize(event: str, payload, loads=json.loads) -> dict:
+    """Columnas de analítica del evento: táctica, descuento, ruta y monto de la oferta o del pago."""
+    fields = {}
+    if event == "decision":
+        decision = payload.get("decision")
+        if isinstance(decision, str):  # decisión precalculada: texto JSON de offer_cache
+            decision = loads(decision)
+        proposal = decision.get("negotiation_proposal") or {}
+        route = decision.get("payment_route") or {}
+        debt = decision.get("debt_context") or {}
+        fields = {
+            "tactic": proposal.get("tactic"),
+            "discount_pct": proposal.get("discount_pct"),
+            "installments": proposal.get("installments"),
+            "method": route.get("method"),
+            "routed_to": route.get("routed_to"),
+            "amount": debt.get("amount_due", (payload.get("context") or {}).get("amount_due")),
+        }
+    elif isinstance(payload, dict):
+        fields = {"amount": payload.get("amount"), "method": payload.get("method")}
+    return fields
+
+
+# ---------------------------------------------------------------------
+# Sinks
+# ---------------------------------------------------------------------
+class SQLiteSink:
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = None
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(SCHEMA)
+        return conn
+
+    def write(self, rows: list[dict], dumps):
+        if self._conn is None:
+            self._conn = self._connect()
+        with self._conn:
+            self._conn.executemany(
+                f"INSERT INTO decision_events ({', '.join(COLUMNS)}) VALUES ({','.join('?' * len(COLUMNS))})",
+                [tuple(row.get(c) for c in COLUMNS) for row in rows])
+
+    def scan(self, start: str, end: str, event: str | None = None, customer_id: str | None = None,
+             limit: int | None = None):
+        if not os.path.exists(self.path):
+            return
+        conn = sqlite3.connect(self.path)
+        try:
+            conn.executescript(SCHEMA)
+            sql = f"SELECT id, {', '.join(COLUMNS)} FROM decision_events WHERE ts >= ? AND ts < ?"
+            params = [start, end]
+            if customer_id:
+                sql += " AND customer_id = ?"
+                params.append(customer_id)
+            if event:
+                sql += " AND event = ?"
+                params.append(event)
+            sql += " ORDER BY ts, id"
+            if limit:
+                sql += " LIMIT ?"
+                params.append(limit)
+            cursor = conn.execute(sql, params)
+            names = [d[0] for d in cursor.description]
+            while True:
+                rows = cursor.fetchmany(1000)
+                if not rows:
+                    break
+                for row in rows:
+                    yield dict(zip(names, row))
+        finally:
+            conn.close()
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def describe(self) -> dict:
+        return {"type": "sqlite", "path": self.path}
+
+
+class NDJSONSink:
+    PREFIX = "decisions-"
+    SUFFIX = ".ndjson.gz"
+
+    def __init__(self, directory: str, max_bytes: int = 64 * 2**20, max_seconds: float = 3600,
+                 keep_segments: int = 0, level: int = 6, loads=json.loads):
+        self.directory = directory
+        self.loads = loads
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.keep_segments = keep_segments
+        self.level = level
+        self._file = None
+        self._opened_at = 0.0
+        self._size = 0
+        self.rotations = 0
+
+    def segments(self) -> list[str]:
+        """Segmentos en orden de creación; el nombre lleva secuencia y hora del primer evento."""
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(name for name in os.listdir(self.directory)
+                      if name.startswith(self.PREFIX) and name.endswith(self.SUFFIX))
+
+    def _open(self, first_ts: str):
+        os.makedirs(self.directory, exist_ok=True)
+        existing = self.segments()
+        seq = int(existing[-1][len(self.PREFIX):len(self.PREFIX) + 6]) + 1 if existing else 0
+        stamp = first_ts.replace("-", "").replace(":", "")
+        self._file = open(os.path.join(self.directory, f"{self.PREFIX}{seq:06d}-{stamp}{self.SUFFIX}"), "ab")
+        self._opened_at = time.monotonic()
+        self._size = 0
+        if self.keep_segments:
+            for name in existing[:max(0, len(existing) + 1 - self.keep_segments)]:
+                os.remove(os.path.join(self.directory, name))
+
+    def _rotate_due(self) -> bool:
+        return self._size >= self.max_bytes or time.monotonic() - self._opened_at >= self.max_seconds
+
+    def write(self, rows: list[dict], dumps):
+        if self._file is not None and self._rotate_due():
+            self._file.close()
+            self._file = None
+            self.rotations += 1
+        if self._file is None:
+            self._open(rows[0]["ts"])
+        # Cada línea empieza con `ts` (aunque el encoder ordene las llaves) para filtrar sin parsear
+        text = "".join(f'{TS_PREFIX}{row.pop("ts")}",' + dumps_row(row, dumps, raw_fields=("payload",))[1:] + "\n"
+                       for row in rows)
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        member = compressor.compress(text.encode("utf-8")) + compressor.flush()
+        self._file.write(member)
+        self._file.flush()
+        self._size += len(member)
+
+    def scan(self, start: str, end: str, event: str | None = None, customer_id: str | None = None,
+             limit: int | None = None):
+        names = self.segments()
+        starts = [self._segment_start(name) for name in names]
+        emitted = 0
+        for i, name in enumerate(names):
+            # El segmento cubre [su primer evento, primer evento del siguiente]
+            if starts[i] >= end or (i + 1 < len(names) and starts[i + 1] < start):
+                continue
+            for row in self._read(os.path.join(self.directory, name), start, end):
+                if (event and row.get("event") != event) or (customer_id and row.get("customer_id") != customer_id):
+                    continue
+                yield row
+                emitted += 1
+                if limit and emitted >= limit:
+                    return
+
+    def _segment_start(self, name: str) -> str:
+        s = name[len(self.PREFIX) + 7:-len(self.SUFFIX)]
+        return f"{s[:4]}-{s[4:6]}-{s[6:8]}T{s[9:11]}:{s[11:13]}:{s[13:]}"
+
+    def _read(self, path: str, start: str, end: str):
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            try:
+                for line in f:
+                    if not line.endswith("\n"):
+                        continue
+                    # Las líneas empiezan con {"ts":"AAAA-MM-DDTHH:MM:SS.mmm": se descartan sin parsear
+                    if line.startswith(TS_PREFIX) and not start <= line[TS_SLICE] < end:
+                        continue
+                    row = self.loads(line)
+                    if start <= row["ts"] < end:
+                        yield row
+            except (EOFError, gzip.BadGzipFile):
+                return  # último lote a medio escribir: se lee en el próximo scan
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def describe(self) -> dict:
+        return {"type": "ndjson", "directory": self.directory, "segments": len(self.segments()),
+                "rotations": self.rotations, "max_bytes": self.max_bytes, "max_seconds": self.max_seconds}
+
+
+# ---------------------------------------------------------------------
+# Cola y escritor de fondo
+# ---------------------------------------------------------------------
+class DecisionLog:
+    def __init__(self, sink, max_queue: int = 100_000, batch_size: int = 1000, flush_interval: float = 0.5,
+                 policy: str = "drop_newest", block_timeout: float = 0.05, dumps=json.dumps, loads=json.loads,
+                 on_drop=None, on_write=None):
+        if policy not in POLICIES:
+            raise ValueError(f"Política desconocida: {policy} (use {', '.join(POLICIES)})")
+        self.sink = sink
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.dumps = dumps
+        self.loads = loads
+        self.on_drop = on_drop      # on_drop(motivo, n) -> métricas
+        self.on_write = on_write    # on_write(n)
+        self._queue = deque()
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+        self._thread = None
+        self._pid = None
+        self._stopping = False
+        self._flushing = False
+        self._in_flight = 0
+        self.recorded = 0
+        self.written = 0
+        self.batches = 0
+        self.write_errors = 0
+        self.dropped = {}
+        self.last_batch_ms = None
+        self.last_error = None
+
+    def _ensure_started(self):
+        # Un proceso hijo (fork) no hereda el hilo: arranca el suyo
+        if self._thread is None or self._pid != os.getpid():
+            self._thread = threading.Thread(target=self._run, name="agente-decision-log", daemon=True)
+            self._pid = os.getpid()
+            self._stopping = False
+            self._thread.start()
+
+    def _drop(self, reason: str, n: int = 1):
+        self.dropped[reason] = self.dropped.get(reason, 0) + n
+        if self.on_drop is not None:
+            self.on_drop(reason, n)
+
+    def record(self, event: str, customer_id: str | None = None, source: str | None = None, payload=None) -> bool:
+        """Encola un evento; False si se descartó por la política de cola llena."""
+        item = (time.time(), event, customer_id, source, payload)
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._ensure_started()
+            if len(self._queue) >= self.max_queue:
+                if self.policy == "drop_oldest":
+                    self._queue.popleft()
+                    self._drop("evicted")
+                elif self.policy == "block":
+                    deadline = time.monotonic() + self.block_timeout
+                    while len(self._queue) >= self.max_queue:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self._drop("block_timeout")
+                            return False
+                        self._not_full.wait(remaining)
+                else:
+                    self._drop("queue_full")
+                    return False
+            self._queue.append(item)
+            self.recorded += 1
+            if len(self._queue) >= self.batch_size:
+                self._not_empty.notify()
+        return True
+
+    def _rows(self, batch) -> list[dict]:
+        rows = []
+        for ts, event, customer_id, source, payload in batch:
+            try:
+                row = summarize(event, payload, self.loads) if payload is not None else {}
+                row.update(ts=format_ts(ts), event=event, customer_id=customer_id, source=source,
+                           payload=self._payload(payload))
+            except (ValueError, TypeError, AttributeError):
+                self._drop("invalid")
+                continue
+            rows.append(row)
+        return rows
+
+    def _payload(self, payload) -> str | None:
+        if payload is None:
+            return None
+        if isinstance(payload, dict) and isinstance(payload.get("decision"), str):
+            # Incrusta la decisión precalculada tal cual, sin decodificarla y volver a codificarla
+            rest = dict(payload)
+            decision = rest.pop("decision")
+            text = self.dumps(rest)
+            return text[:-1] + ("," if len(text) > 2 else "") + '"decision":' + decision + "}"
+        return self.dumps(payload)
+
+    def _write(self, batch):
+        rows = self._rows(batch)
+        if not rows:
+            return
+        started = time.perf_counter()
+        for attempt in (1, 2):
+            try:
+                self.sink.write(rows, self.dumps)
+                break
+            except (OSError, sqlite3.Error) as e:
+                self.write_errors += 1
+                self.last_error = str(e)
+                if attempt == 2:
+                    self._drop("write_error", len(rows))
+                    return
+                time.sleep(min(1.0, self.flush_interval))
+        self.last_batch_ms = round((time.perf_counter() - started) * 1000, 3)
+        self.written += len(rows)
+        self.batches += 1
+        if self.on_write is not None:
+            self.on_write(len(rows))
+
+    def _take(self) -> list:
+        batch = []
+        while self._queue and len(batch) < self.batch_size:
+            batch.append(self._queue.popleft())
+        self._in_flight = len(batch)
+        self._not_full.notify_all()
+        return batch
+
+    def _run(self):
+        while True:
+            with self._lock:
+                # Junta un lote completo o espera flush_interval: menos transacciones / miembros gzip
+                deadline = time.monotonic() + self.flush_interval
+                while len(self._queue) < self.batch_size and not (self._stopping or self._flushing):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._not_empty.wait(remaining)
+                if not self._queue:
+                    self._flushing = False
+                    self._not_full.notify_all()
+                    if self._stopping:
+                        return
+                    continue
+                batch = self._take()
+            self._write(batch)
+            with self._lock:
+                self._in_flight = 0
+                self._not_full.notify_all()
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """Escribe ya lo encolado y espera a que termine (pruebas, scan de lo más reciente)."""
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            if self._thread is None:
+                return True
+            while self._queue or self._in_flight:
+                self._flushing = True
+                self._not_empty.notify()
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._not_full.wait(min(remaining, 0.05))
+        return True
+
+    def close(self, timeout: float = 10.0):
+        """Escribe lo pendiente y detiene el hilo (shutdown del servidor)."""
+        with self._lock:
+            thread, self._stopping = self._thread, True
+            self._not_empty.notify()
+        if thread is not None and self._pid == os.getpid():
+            thread.join(timeout)
+        with self._lock:
+            self._thread = None
+        self.sink.close()
+
+    def scan(self, start: str, end: str, event: str | None = None, customer_id: str | None = None,
+             limit: int | None = None):
+        return self.sink.scan(start, end, event, customer_id, limit)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "policy": self.policy,
+                "max_queue": self.max_queue,
+                "queued": len(self._queue),
+                "batch_size": self.batch_size,
+                "flush_interval": self.flush_interval,
+                "recorded": self.recorded,
+                "written": self.written,
+                "batches": self.batches,
+                "dropped": dict(self.dropped),
+                "write_errors": self.write_errors,
+                "last_error": self.last_error,
+                "last_batch_ms": self.last_batch_ms,
+                "sink": self.sink.describe(),
+            }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Lectura de la bitácora de decisiones por rango de tiempo")
+    sub = parser.add_subparsers(dest="command", required=True)
+    scan = sub.add_parser("scan", help="eventos en [from, to) como NDJSON en stdout")
+    scan.add_argument("--from", dest="start", required=True, help="AAAA-MM-DD o AAAA-MM-DDTHH:MM:SS (UTC)")
+    scan.add_argument("--to", dest="end", required=True)
+    scan.add_argument("--event")
+    scan.add_argument("--customer-id")
+    scan.add_argument("--limit", type=int)
+    where = scan.add_mutually_exclusive_group()
+    where.add_argument("--db", default="decision_log.db")
+    where.add_argument("--dir", help="directorio de segmentos NDJSON")
+    args = parser.parse_args(argv)
+
+    sink = NDJSONSink(args.dir) if args.dir else SQLiteSink(args.db)
+    out = sys.stdout
+    for row in sink.scan(args.start, args.end, args.event, args.customer_id, args.limit):
+        out.write(dumps_row(row, json.dumps, raw_fields=("payload",)) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
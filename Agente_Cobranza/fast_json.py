@@ -0,0 +1,94 @@
+"""
+Serialización JSON rápida para las respuestas del API.
+
+FastJSONProvider reemplaza al DefaultJSONProvider de Flask (`app.json`): con
+orjson instalado (`pip install orjson`) serializa y parsea en C; sin él, o para
+llamadas con opciones que orjson no soporta (indent en modo debug, `cls`...),
+usa el json estándar con el mismo resultado. Las fechas y los tipos que orjson
+no conoce pasan por el `default` de Flask, así que el texto es equivalente.
+
+Las columnas `metadata` se guardan como texto JSON; dumps_row() las incrusta tal
+cual en el objeto de la fila en lugar de devolverlas como un string escapado
+(que obligaba a los clientes a decodificar dos veces) y sin json.loads/dumps.
+Donde la fila se usa en Python antes de responder (los métodos de pago de
+/agent/decision), parse_raw_json() la decodifica una vez al cargarla.
+"""
+import json
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # opcional: sin orjson se usa el json estándar
+    orjson = None
+
+ENCODERS = ("auto", "orjson", "stdlib")
+RAW_JSON_FIELDS = ("metadata",)
+_COMPACT = {"separators": (",", ":")}
+if orjson is not None:
+    _OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME  # fechas con el formato de Flask
+    _OPTIONS_SORTED = _OPTIONS | orjson.OPT_SORT_KEYS
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    def __init__(self, app, encoder: str = "auto"):
+        super().__init__(app)
+        if encoder not in ENCODERS:
+            raise ValueError(f"Encoder JSON desconocido: {encoder} (use {', '.join(ENCODERS)})")
+        if encoder == "orjson" and orjson is None:
+            raise ImportError("AGENTE_JSON_ENCODER=orjson requiere `pip install orjson`")
+        self.encoder = "orjson" if encoder != "stdlib" and orjson is not None else "stdlib"
+
+    def dumps(self, obj, **kwargs) -> str:
+        if self.encoder == "orjson" and (not kwargs or kwargs == _COMPACT):
+            try:
+                return orjson.dumps(obj, default=self.default,
+                                    option=_OPTIONS_SORTED if self.sort_keys else _OPTIONS).decode()
+            except TypeError:
+                pass  # llaves no str, enteros > 64 bits...: el json estándar sí los acepta
+        return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if self.encoder == "orjson" and not kwargs:
+            return orjson.loads(s)
+        return super().loads(s, **kwargs)
+
+
+def raw_json(value, dumps) -> str:
+    """Texto JSON guardado listo para incrustar; lo que no parezca JSON sale como string."""
+    if value is None or value == "":
+        return "null"
+    if isinstance(value, str):
+        first, last = value[:1], value[-1:]
+        if (first == "{" and last == "}") or (first == "[" and last == "]"):
+            return value
+        try:
+            value = json.loads(value)
+        except ValueError:
+            pass
+    return dumps(value)
+
+
+def parse_raw_json(value, loads=json.loads):
+    """Texto JSON guardado -> objeto, con las mismas reglas que raw_json (vacío -> None)."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, str):
+        try:
+            return loads(value)
+        except ValueError:
+            pass
+    return value
+
+
+def dumps_row(row: dict, dumps, raw_fields=RAW_JSON_FIELDS) -> str:
+    """Fila a JSON con los campos de `raw_fields` incrustados como JSON, al final del objeto."""
+    base = dict(row)
+    tail = []
+    for key in raw_fields:
+        if key in base:
+            tail.append(f'"{key}":{raw_json(base.pop(key), dumps)}')
+    if not tail:
+        return dumps(row)
+    text = dumps(base)
+    return text[:-1] + ("," if len(text) > 2 else "") + ",".join(tail) + "}"
@@ -0,0 +1,378 @@
+"""
+Deudas, promesas de pago, pagos y débitos automáticos.
+
+Acceso a datos de los recursos /debts, /promises, /payments y /auto_debits
+(los handlers HTTP viven en app.py). Cada recurso se describe en RESOURCES
+(columnas, requeridos, campos editables y validaciones); create/update/delete
+son genéricos.
+
+Caminos calientes (índices en la migración 5):
+- debt_context(s): saldo abierto y dpd de uno o muchos clientes con una sola
+  consulta sobre el índice cubriente (customer_id, status, due_date, balance).
+- promises_due(fecha): promesas pendientes que vencen ese día.
+- dpd_buckets(fecha): conteo y saldo de deudas abiertas por tramo de atraso.
+
+record_payment() registra un pago y, en la misma transacción, baja el saldo de
+la deuda (la marca `paid` al llegar a cero) y cumple la promesa pendiente más
+próxima que el pago cubra. Con Idempotency-Key se comporta como
+/strategy/payment_route: mismo payload devuelve el pago original, otro payload
+lanza IdempotencyConflict.
+"""
+import hashlib
+import json
+import sqlite3
+from datetime import date, datetime, timedelta
+from uuid import uuid4
+
+from payment_pipeline import IdempotencyConflict
+
+DEBT_STATUSES = {"open", "paid", "written_off"}
+PROMISE_STATUSES = {"pending", "kept", "broken", "cancelled"}
+PAYMENT_STATUSES = {"captured", "pending", "failed"}
+AUTO_DEBIT_STATUSES = {"active", "paused", "cancelled"}
+AUTO_DEBIT_FREQUENCIES = {"weekly", "biweekly", "monthly"}
+
+# (etiqueta, dpd mínimo, dpd máximo exclusivo)
+DPD_BUCKETS = [("0-29", 0, 30), ("30-59", 30, 60), ("60-89", 60, 90), ("90+", 90, None)]
+
+# Máximo de parámetros por consulta IN (...)
+SQL_CHUNK = 900
+
+
+def _amount(value) -> float:
+    amount = round(float(value), 2)
+    if amount <= 0:
+        raise ValueError("El monto debe ser mayor a 0")
+    return amount
+
+
+def _non_negative(value) -> float:
+    amount = round(float(value), 2)
+    if amount < 0:
+        raise ValueError("El saldo no puede ser negativo")
+    return amount
+
+
+def _date(value) -> str:
+    return date.fromisoformat(str(value)[:10]).isoformat()
+
+
+def _choice(options: set):
+    def check(value):
+        value = str(value).lower()
+        if value not in options:
+            raise ValueError(f"Valor inválido '{value}'; opciones: {', '.join(sorted(options))}")
+        return value
+    return check
+
+
+def _metadata(value) -> str:
+    return value if isinstance(value, str) else json.dumps(value or {})
+
+
+# tabla -> especificación del recurso
+RESOURCES = {
+    "debts": {
+        "columns": ["id", "customer_id", "product", "principal", "balance", "currency", "due_date",
+                    "status", "created_at", "updated_at", "metadata"],
+        "required": ["customer_id", "principal", "due_date"],
+        "updatable": ["product", "principal", "balance", "currency", "due_date", "status", "metadata"],
+        "convert": {"principal": _amount, "balance": _non_negative, "due_date": _date,
+                    "status": _choice(DEBT_STATUSES), "metadata": _metadata},
+        "defaults": {"currency": "MXN", "status": "open"},
+    },
+    "promises": {
+        "columns": ["id", "customer_id", "debt_id", "amount", "promised_date", "status", "channel",
+                    "created_at", "updated_at", "metadata"],
+        "required": ["debt_id", "amount", "promised_date"],
+        "updatable": ["amount", "promised_date", "status", "channel", "metadata"],
+        "convert": {"amount": _amount, "promised_date": _date,
+                    "status": _choice(PROMISE_STATUSES), "metadata": _metadata},
+        "defaults": {"status": "pending"},
+    },
+    "payments": {
+        "columns": ["id", "customer_id", "debt_id", "amount", "currency", "method", "provider", "status",
+                    "idempotency_key", "paid_at", "created_at", "metadata"],
+        "required": ["amount"],
+        "updatable": [],
+        "convert": {"amount": _amount, "status": _choice(PAYMENT_STATUSES), "metadata": _metadata},
+        "defaults": {"currency": "MXN", "status": "captured"},
+    },
+    "auto_debits": {
+        "columns": ["id", "customer_id", "debt_id", "payment_method_id", "amount", "frequency",
+                    "next_run_date", "status", "created_at", "updated_at", "metadata"],
+        "required": ["customer_id", "payment_method_id", "amount", "frequency", "next_run_date"],
+        "updatable": ["payment_method_id", "amount", "frequency", "next_run_date", "status", "metadata"],
+        "convert": {"amount": _amount, "frequency": _choice(AUTO_DEBIT_FREQUENCIES),
+                    "next_run_date": _date, "status": _choice(AUTO_DEBIT_STATUSES), "metadata": _metadata},
+        "defaults": {"status": "active"},
+    },
+}
+
+
+def _now() -> str:
+    return datetime.utcnow().isoformat()
+
+
+def _convert(spec: dict, key: str, value):
+    convert = spec["convert"].get(key)
+    return convert(value) if convert and value is not None else value
+
+
+def get(conn, table: str, row_id: str) -> dict | None:
+    columns = RESOURCES[table]["columns"]
+    row = conn.execute(f"SELECT {', '.join(columns)} FROM {table} WHERE id = ?", (row_id,)).fetchone()
+    return dict(zip(columns, row)) if row else None
+
+
+def _prepare(conn, table: str, data: dict) -> dict:
+    """Valida `data` y arma el registro completo a insertar (sin confirmar)."""
+    spec = RESOURCES[table]
+    missing = [k for k in spec["required"] if data.get(k) in (None, "")]
+    if table == "payments" and not (data.get("debt_id") or data.get("customer_id")):
+        missing.append("debt_id o customer_id")
+    if missing:
+        raise ValueError(f"Faltan campos obligatorios: {', '.join(missing)}")
+
+    now = _now()
+    record = {"id": str(uuid4()), "created_at": now}
+    if "updated_at" in spec["columns"]:
+        record["updated_at"] = now
+    for key in spec["columns"]:
+        if key in record:
+            continue
+        value = data.get(key, spec["defaults"].get(key))
+        record[key] = _convert(spec, key, value)
+    record["metadata"] = _metadata(data.get("metadata"))
+
+    if table == "debts" and record["balance"] is None:
+        record["balance"] = record["principal"]
+    if table in ("promises", "payments") and record.get("debt_id"):
+        # El cliente sale de la deuda; así no puede quedar inconsistente
+        row = conn.execute("SELECT customer_id FROM debts WHERE id = ?", (record["debt_id"],)).fetchone()
+        if not row:
+            raise ValueError(f"No existe la deuda {record['debt_id']}")
+        record["customer_id"] = row[0]
+    return record
+
+
+def _insert(conn, table: str, record: dict, columns: list | None = None):
+    columns = columns or RESOURCES[table]["columns"]
+    conn.execute(
+        f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({','.join('?' * len(columns))})",
+        [record[c] for c in columns],
+    )
+
+
+def create(conn, table: str, data: dict) -> dict:
+    if table == "payments":
+        return record_payment(conn, data)[0]
+    record = _prepare(conn, table, data)
+    try:
+        _insert(conn, table, record)
+        conn.commit()
+    except sqlite3.IntegrityError as e:
+        conn.rollback()
+        raise ValueError(f"Referencia inválida: {e}") from e
+    return get(conn, table, record["id"])
+
+
+def update(conn, table: str, row_id: str, data: dict) -> dict | None:
+    """Actualiza sólo los campos editables enviados (PUT y PATCH, igual que /customers)."""
+    spec = RESOURCES[table]
+    fields, values = [], []
+    for key in spec["updatable"]:
+        if key in data:
+            fields.append(f"{key} = ?")
+            values.append(_convert(spec, key, data[key]))
+    if not fields:
+        raise ValueError("No hay campos para actualizar")
+    if "updated_at" in spec["columns"]:
+        fields.append("updated_at = ?")
+        values.append(_now())
+    cursor = conn.execute(f"UPDATE {table} SET {', '.join(fields)} WHERE id = ?", (*values, row_id))
+    conn.commit()
+    if cursor.rowcount == 0:
+        return None
+    return get(conn, table, row_id)
+
+
+def delete(conn, table: str, row_id: str) -> bool:
+    cursor = conn.execute(f"DELETE FROM {table} WHERE id = ?", (row_id,))
+    conn.commit()
+    return cursor.rowcount > 0
+
+
+def request_fingerprint(data: dict) -> str:
+    """Huella del payload sin la llave; la misma que usa /strategy/payment_route."""
+    payload = {k: v for k, v in data.items() if k != "idempotency_key"}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+# Los pagos guardan además la huella del payload (migración 11), que no se expone
+PAYMENT_INSERT_COLUMNS = RESOURCES["payments"]["columns"] + ["request_fingerprint"]
+
+
+def _replayed_payment(conn, key: str, fingerprint: str) -> dict | None:
+    row = conn.execute("SELECT id, request_fingerprint FROM payments WHERE idempotency_key = ?",
+                       (key,)).fetchone()
+    if row is None:
+        return None
+    # NULL: pago anterior a la migración 11, sin huella con qué comparar
+    if row[1] is not None and row[1] != fingerprint:
+        raise IdempotencyConflict("La Idempotency-Key ya se usó con otro payload")
+    return get(conn, "payments", row[0])
+
+
+def record_payment(conn, data: dict, idempotency_key: str | None = None) -> tuple[dict, bool]:
+    """
+    Registra un pago y aplica su efecto en una sola transacción. Con
+    `idempotency_key` un reintento con el mismo payload devuelve el pago
+    original; con otro payload lanza IdempotencyConflict. Devuelve (pago, creado).
+    """
+    key = idempotency_key or data.get("idempotency_key")
+    fingerprint = request_fingerprint(data) if key else None
+    if key:
+        existing = _replayed_payment(conn, key, fingerprint)
+        if existing:
+            return existing, False
+
+    record = _prepare(conn, "payments", {**data, "idempotency_key": key})
+    record["paid_at"] = record["created_at"] if record["status"] == "captured" else None
+    record["request_fingerprint"] = fingerprint
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        _insert(conn, "payments", record, PAYMENT_INSERT_COLUMNS)
+        if record["debt_id"] and record["status"] == "captured":
+            conn.execute("""
+                UPDATE debts
+                SET balance = MAX(ROUND(balance - ?, 2), 0),
+                    status = CASE WHEN balance - ? <= 0.004 AND status = 'open' THEN 'paid' ELSE status END,
+                    updated_at = ?
+                WHERE id = ?
+            """, (record["amount"], record["amount"], record["created_at"], record["debt_id"]))
+            conn.execute("""
+                UPDATE promises SET status = 'kept', updated_at = ?
+                WHERE id = (
+                    SELECT id FROM promises
+                    WHERE debt_id = ? AND status = 'pending'
+                    ORDER BY promised_date LIMIT 1
+                ) AND amount <= ?
+            """, (record["created_at"], record["debt_id"], record["amount"] + 0.004))
+        conn.commit()
+    except sqlite3.IntegrityError as e:
+        conn.rollback()
+        if key:
+            existing = _replayed_payment(conn, key, fingerprint)
+            if existing:
+                return existing, False
+        raise ValueError(f"Referencia inválida: {e}") from e
+    except Exception:
+        conn.rollback()
+        raise
+    return get(conn, "payments", record["id"]), True
+
+
+# ---------------------------------------------------------------------
+# Consultas del agente y reportes
+# ---------------------------------------------------------------------
+def _dpd(oldest_due: str | None, today: date) -> int:
+    if not oldest_due:
+        return 0
+    return max((today - date.fromisoformat(oldest_due)).days, 0)
+
+
+def bucket_for(oldest_due: str | None, today: date) -> str:
+    """Tramo de dpd (DPD_BUCKETS) o 'current' si el vencimiento más antiguo aún no llega."""
+    if not oldest_due:
+        return "current"
+    days = (today - date.fromisoformat(oldest_due)).days
+    for label, low, high in DPD_BUCKETS:
+        if days >= low and (high is None or days < high):
+            return label
+    return "current"
+
+
+def make_context(source: str, open_debts: int, balance, oldest_due: str | None, today: date) -> dict:
+    return {
+        "source": source,
+        "open_debts": open_debts,
+        "amount_due": round(balance or 0, 2),
+        "dpd": _dpd(oldest_due, today),
+        "bucket": bucket_for(oldest_due, today),
+        "oldest_due_date": oldest_due,
+    }
+
+
+def debt_context(conn, customer_id: str, today: date | None = None) -> dict | None:
+    """
+    amount_due (saldo abierto total) y dpd (días desde el vencimiento abierto más
+    antiguo) del cliente; None si no tiene deudas abiertas.
+    """
+    row = conn.execute("""
+        SELECT COUNT(*), SUM(balance), MIN(due_date)
+        FROM debts
+        WHERE customer_id = ? AND status = 'open'
+    """, (customer_id,)).fetchone()
+    if not row or not row[0]:
+        return None
+    return make_context("debts", row[0], row[1], row[2], today or date.today())
+
+
+def debt_contexts(conn, customer_ids, today: date | None = None) -> dict:
+    """Versión por lotes de debt_context: {customer_id: contexto} sólo para clientes con deuda abierta."""
+    today = today or date.today()
+    ids = list(dict.fromkeys(customer_ids))
+    result = {}
+    for start in range(0, len(ids), SQL_CHUNK):
+        chunk = ids[start:start + SQL_CHUNK]
+        rows = conn.execute(f"""
+            SELECT customer_id, COUNT(*), SUM(balance), MIN(due_date)
+            FROM debts
+            WHERE customer_id IN ({",".join("?" * len(chunk))}) AND status = 'open'
+            GROUP BY customer_id
+        """, chunk)
+        for customer_id, count, balance, oldest in rows:
+            result[customer_id] = make_context("debts", count, balance, oldest, today)
+    return result
+
+
+def promises_due(conn, on: date | None = None, limit: int | None = None) -> list[dict]:
+    columns = RESOURCES["promises"]["columns"]
+    sql = f"""
+        SELECT {', '.join(columns)} FROM promises
+        WHERE status = 'pending' AND promised_date = ?
+        ORDER BY id
+    """
+    params = [(on or date.today()).isoformat()]
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(limit)
+    return [dict(zip(columns, row)) for row in conn.execute(sql, params)]
+
+
+def bucket_case_sql(column: str, as_of: date) -> tuple[str, list]:
+    """Expresión CASE de SQL equivalente a bucket_for(column, as_of) y sus parámetros."""
+    case, params = [], []
+    for label, low, _ in reversed(DPD_BUCKETS):
+        # dpd >= low  <=>  due_date <= as_of - low días (límite calculado una vez, no por fila)
+        case.append(f"WHEN {column} <= ? THEN '{label}'")
+        params.append((as_of - timedelta(days=low)).isoformat())
+    return f"CASE {' '.join(case)} ELSE 'current' END", params
+
+
+def dpd_buckets(conn, as_of: date | None = None) -> list[dict]:
+    """Deudas abiertas por tramo de dpd (una pasada por el índice (status, due_date, balance))."""
+    case, params = bucket_case_sql("due_date", as_of or date.today())
+    rows = conn.execute(f"""
+        SELECT {case} AS bucket, COUNT(*), SUM(balance)
+        FROM debts
+        WHERE status = 'open'
+        GROUP BY bucket
+    """, params).fetchall()
+    totals = {bucket: (count, balance) for bucket, count, balance in rows}
+    return [
+        {"bucket": label, "debts": totals.get(label, (0, 0))[0],
+         "balance": round(totals.get(label, (0, 0))[1] or 0, 2)}
+        for label in [b[0] for b in DPD_BUCKETS] + ["current"]
+    ]
@@ -0,0 +1,143 @@
+"""
+Caché read-through en proceso para los métodos de pago por cliente.
+
+LRU acotado por número de clientes + TTL por entrada. Las escrituras llaman a
+invalidate()/clear() después de confirmar su transacción; cada invalidación sube
+la generación de la llave, y una lectura que empezó antes de esa invalidación no
+guarda su resultado, así que nunca queda en caché una lista anterior al commit.
+
+Eso cubre las escrituras de este proceso. Para las de otros workers o de las
+CLI (bulk.py) se pasa `changes`: changes(cursor) -> (clientes cambiados, cursor
+nuevo), o (None, cursor) si no se puede saber cuáles y hay que vaciar todo.
+get() la llama como mucho cada `check_interval` segundos, un solo hilo a la
+vez; los aciertos no tocan la BD. Una escritura de otro proceso se ve, a lo
+sumo, `check_interval` segundos tarde, y sólo invalida a su cliente.
+
+`metadata` se guarda como texto JSON y cada acierto decodifica un objeto
+nuevo: quien modifique la respuesta no toca la entrada de la caché.
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+
+
+class PaymentMethodCache:
+    def __init__(self, max_entries: int = 100_000, ttl_seconds: float = 300.0,
+                 changes=None, check_interval: float = 1.0, dumps=json.dumps, loads=json.loads):
+        if max_entries < 1:
+            raise ValueError("max_entries debe ser >= 1")
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.changes = changes
+        self.check_interval = check_interval
+        self._dumps = dumps
+        self._loads = loads
+        self._entries = OrderedDict()   # customer_id -> (expira_en, métodos con metadata en texto)
+        self._generations = {}          # customer_id -> contador de invalidaciones
+        self._epoch = 0                 # se incrementa con clear()
+        self._lock = threading.Lock()
+        self._cursor = None             # posición en `changes`; None = todavía no se leyó
+        self._next_check = 0.0
+        self._checking = False
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.remote_invalidations = 0
+
+    def _freeze(self, method: dict) -> dict:
+        metadata = method.get("metadata")
+        return {**method, "metadata": None if metadata is None else self._dumps(metadata)}
+
+    def _thaw(self, method: dict) -> dict:
+        metadata = method["metadata"]
+        return {**method, "metadata": None if metadata is None else self._loads(metadata)}
+
+    def sync(self):
+        """Aplica los cambios de otros procesos desde la última revisión."""
+        with self._lock:
+            if self._checking:
+                return
+            self._checking = True
+            cursor = self._cursor
+        try:
+            changed, cursor = self.changes(cursor)
+            if changed is None:
+                # Primera lectura, hueco mayor a lo que guarda el registro o BD recreada
+                self.clear()
+            elif changed:
+                self.invalidate(*changed)
+            with self._lock:
+                self._cursor = cursor
+                self.remote_invalidations += len(changed or ())
+        finally:
+            with self._lock:
+                self._checking = False
+                self._next_check = time.monotonic() + self.check_interval
+
+    def get(self, customer_id: str, loader) -> list[dict]:
+        """Devuelve los métodos del cliente; en un miss los carga con loader(customer_id)."""
+        now = time.monotonic()
+        if self.changes is not None and now >= self._next_check:
+            self.sync()
+        with self._lock:
+            entry = self._entries.get(customer_id)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(customer_id)
+                    self.hits += 1
+                    return [self._thaw(m) for m in entry[1]]
+                del self._entries[customer_id]
+                self.expirations += 1
+            self.misses += 1
+            token = (self._epoch, self._generations.get(customer_id, 0))
+
+        methods = loader(customer_id)
+
+        frozen = [self._freeze(m) for m in methods]
+        with self._lock:
+            if token == (self._epoch, self._generations.get(customer_id, 0)):
+                self._entries[customer_id] = (time.monotonic() + self.ttl_seconds, frozen)
+                self._entries.move_to_end(customer_id)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return methods
+
+    def invalidate(self, *customer_ids):
+        with self._lock:
+            for customer_id in customer_ids:
+                if customer_id is None:
+                    continue
+                self._entries.pop(customer_id, None)
+                self._generations[customer_id] = self._generations.get(customer_id, 0) + 1
+                self.invalidations += 1
+            # Las generaciones sólo importan mientras hay lecturas en vuelo; se
+            # reinician vía epoch para que el dict no crezca sin límite.
+            if len(self._generations) > self.max_entries:
+                self._generations.clear()
+                self._epoch += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._generations.clear()
+            self._epoch += 1
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "check_interval": self.check_interval,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "remote_invalidations": self.remote_invalidations,
+            }
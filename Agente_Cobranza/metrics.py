@@ -0,0 +1,322 @@
+"""
+Instrumentación en proceso con exposición en formato de texto de Prometheus.
+
+- Histogram / Counter con etiquetas, registrados en un Registry.
+- stage(nombre): context manager para medir etapas del camino caliente.
+- normalize_sql(): agrupa consultas por forma (literales e IN (...) colapsados).
+- SlowRequestSampler: perfilador por muestreo opcional; sólo toma muestras del
+  stack de una petición cuando ya superó el umbral, así que no cuesta nada en
+  las peticiones rápidas.
+
+Cada hilo escribe en su propio shard sin locks y /metrics suma los shards, así
+una observación cuesta un perf_counter y un par de accesos a dict (overhead por
+debajo de ~2%).
+"""
+import re
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter as _Tally, deque
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+MAX_SERIES_PER_METRIC = 1000
+
+
+def _format_labels(names, values) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(
+        f'{n}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34)).replace(chr(10), " ")}"'
+        for n, v in zip(names, values)
+    )
+    return "{" + pairs + "}"
+
+
+def _series_order(item) -> tuple:
+    # Las etiquetas se exponen como texto; ordenar por texto admite None junto a str (routed_to)
+    return tuple(str(v) for v in item[0])
+
+
+class _Sharded:
+    """
+    Base de métricas con un shard por hilo: las observaciones escriben sin lock
+    en el dict del hilo actual y render() suma todos los shards.
+    """
+
+    def __init__(self, name: str, help_text: str, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._local = threading.local()
+        self._shards = []
+        self._series = set()            # series distintas entre todos los shards
+        self._lock = threading.Lock()
+
+    def _shard(self) -> dict:
+        try:
+            return self._local.series
+        except AttributeError:
+            series = self._local.series = {}
+            with self._lock:
+                self._shards.append(series)
+            return series
+
+    def _key(self, label_values: tuple) -> tuple:
+        # Acota la cardinalidad: las series nuevas pasan a "_other" al llegar al límite
+        # (una serie ya vista en otro hilo no cuenta de nuevo: el servidor de desarrollo usa un hilo por petición)
+        with self._lock:
+            if label_values in self._series:
+                return label_values
+            if len(self._series) >= MAX_SERIES_PER_METRIC:
+                return ("_other",) * len(self.labels)
+            self._series.add(label_values)
+            return label_values
+
+
+class Counter(_Sharded):
+    def inc(self, *label_values, amount: float = 1):
+        shard = self._shard()
+        if label_values not in shard:
+            label_values = self._key(label_values)
+        shard[label_values] = shard.get(label_values, 0) + amount
+
+    def _merged(self) -> dict:
+        merged = {}
+        with self._lock:
+            shards = list(self._shards)
+        for shard in shards:
+            for label_values, value in list(shard.items()):
+                merged[label_values] = merged.get(label_values, 0) + value
+        return merged
+
+    def value(self, *label_values) -> float:
+        return self._merged().get(label_values, 0)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for label_values, value in sorted(self._merged().items(), key=_series_order):
+            lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {value:g}")
+        return lines
+
+
+class Histogram(_Sharded):
+    def __init__(self, name: str, help_text: str, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, seconds: float, *label_values):
+        shard = self._shard()
+        series = shard.get(label_values)
+        if series is None:
+            label_values = self._key(label_values)
+            series = shard.get(label_values)
+            if series is None:
+                # [conteos por bucket (+Inf al final), suma]
+                series = shard[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, seconds)] += 1
+        series[1] += seconds
+
+    def _merged(self) -> dict:
+        merged = {}
+        with self._lock:
+            shards = list(self._shards)
+        for shard in shards:
+            for label_values, (counts, total) in list(shard.items()):
+                entry = merged.setdefault(label_values, [[0] * (len(self.buckets) + 1), 0.0])
+                entry[0] = [a + b for a, b in zip(entry[0], counts)]
+                entry[1] += total
+        return merged
+
+    def count(self, *label_values) -> int:
+        series = self._merged().get(label_values)
+        return sum(series[0]) if series else 0
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for label_values, (counts, total) in sorted(self._merged().items(), key=_series_order):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                labels = _format_labels(self.labels + ("le",), label_values + (le,))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            base = _format_labels(self.labels, label_values)
+            lines.append(f"{self.name}_sum{base} {total:.6f}")
+            lines.append(f"{self.name}_count{base} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.enabled = True
+        self._metrics = []
+
+    def counter(self, name, help_text, labels=()) -> Counter:
+        metric = Counter(name, help_text, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, help_text, labels, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_request_seconds = registry.histogram(
+    "agente_http_request_duration_seconds", "Latencia por ruta", ("route", "method"))
+http_requests_total = registry.counter(
+    "agente_http_requests_total", "Peticiones por ruta y status", ("route", "method", "status"))
+http_errors_total = registry.counter(
+    "agente_http_errors_total", "Errores atendidos por los errorhandler", ("code",))
+stage_seconds = registry.histogram(
+    "agente_stage_duration_seconds", "Latencia por etapa del camino caliente", ("stage",))
+sql_query_seconds = registry.histogram(
+    "agente_sql_query_duration_seconds", "Latencia de consultas SQL normalizadas", ("query",))
+negotiation_tactics_total = registry.counter(
+    "agente_negotiation_tactic_total", "Tácticas de negociación elegidas", ("tactic",))
+payment_routes_total = registry.counter(
+    "agente_payment_route_total", "Rutas de pago elegidas", ("method", "routed_to"))
+payment_executions_total = registry.counter(
+    "agente_payment_execution_total", "Ejecuciones del pipeline de pago por resultado", ("provider", "status"))
+offer_cache_lookups_total = registry.counter(
+    "agente_offer_cache_lookups_total", "Búsquedas de decisiones precalculadas por resultado", ("result",))
+auth_failures_total = registry.counter(
+    "agente_auth_failures_total", "Tokens rechazados por motivo", ("reason",))
+slow_requests_total = registry.counter(
+    "agente_slow_requests_total", "Peticiones que superaron el umbral del perfilador", ("route",))
+admission_total = registry.counter(
+    "agente_admission_total", "Peticiones admitidas o rechazadas por clase y motivo", ("class", "result"))
+admission_wait_seconds = registry.histogram(
+    "agente_admission_wait_seconds", "Espera en la cola de admisión por clase", ("class",))
+decision_log_events_total = registry.counter(
+    "agente_decision_log_events_total", "Eventos de la bitácora de decisiones escritos o descartados", ("result",))
+decision_coalesce_total = registry.counter(
+    "agente_decision_coalesce_total", "Decisiones calculadas (leader) o compartidas con otra petición en vuelo (coalesced)",
+    ("result",))
+
+
+class stage:
+    """Context manager que mide una etapa; no hace nada si la instrumentación está desactivada."""
+
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter() if registry.enabled else None
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.start is not None:
+            stage_seconds.observe(time.perf_counter() - self.start, self.name)
+        return False
+
+
+_WS_RE = re.compile(r"\s+")
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+
+
+def normalize_sql(sql: str) -> str:
+    """Forma canónica de la consulta: sin literales, espacios colapsados, IN (?, ...)."""
+    sql = _WS_RE.sub(" ", sql).strip().rstrip(";").strip()
+    sql = _STRING_RE.sub("?", sql)
+    sql = _NUMBER_RE.sub("?", sql)
+    return _IN_LIST_RE.sub("(?, ...)", sql)
+
+
+_normalized_cache = {}
+
+
+def observe_sql(sql: str, seconds: float):
+    """Observador de consultas para ConnectionPool(query_observer=...)."""
+    if not registry.enabled:
+        return
+    key = _normalized_cache.get(sql)
+    if key is None:
+        key = normalize_sql(sql)
+        if len(_normalized_cache) < 10_000:
+            _normalized_cache[sql] = key
+    sql_query_seconds.observe(seconds, key)
+
+
+class SlowRequestSampler:
+    """
+    Perfilador por muestreo para peticiones lentas.
+
+    begin()/end() registran la petición del hilo actual. Un hilo de fondo revisa
+    cada `interval` segundos las peticiones activas que ya superaron
+    `threshold`, y acumula su stack (colapsado, estilo flamegraph). Al terminar,
+    las peticiones con muestras quedan en `reports` (las últimas `keep`).
+    """
+
+    def __init__(self, threshold: float = 0.25, interval: float = 0.005, keep: int = 50):
+        self.threshold = threshold
+        self.interval = interval
+        self.reports = deque(maxlen=keep)
+        self._active = {}  # thread_id -> [inicio, ruta, conteo de stacks]
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="agente-slow-sampler", daemon=True)
+            self._thread.start()
+
+    def begin(self, route: str):
+        with self._lock:
+            self._active[threading.get_ident()] = [time.perf_counter(), route, None]
+
+    def end(self):
+        with self._lock:
+            entry = self._active.pop(threading.get_ident(), None)
+        if entry is None:
+            return
+        start, route, tally = entry
+        if tally:
+            slow_requests_total.inc(route)
+            self.reports.append({
+                "route": route,
+                "duration_ms": round((time.perf_counter() - start) * 1000, 2),
+                "samples": sum(tally.values()),
+                "stacks": [{"stack": s, "count": c} for s, c in tally.most_common(20)],
+            })
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            now = time.perf_counter()
+            with self._lock:
+                slow = [tid for tid, e in self._active.items() if now - e[0] >= self.threshold]
+            if not slow:
+                continue
+            frames = sys._current_frames()
+            with self._lock:
+                for tid in slow:
+                    entry = self._active.get(tid)
+                    frame = frames.get(tid)
+                    if entry is None or frame is None:
+                        continue
+                    if entry[2] is None:
+                        entry[2] = _Tally()
+                    entry[2][_collapse(frame)] += 1
+
+
+def _collapse(frame, limit: int = 40) -> str:
+    parts = []
+    while frame is not None and len(parts) < limit:
+        code = frame.f_code
+        parts.append(f"{code.co_filename.rsplit('/', 1)[-1]}:{code.co_name}:{frame.f_lineno}")
+        frame = frame.f_back
+    return ";".join(reversed(parts))
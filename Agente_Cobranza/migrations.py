@@ -0,0 +1,554 @@
+"""
+Migraciones versionadas del esquema SQLite.
+
+Cada migración se aplica una sola vez, dentro de su propia transacción, y queda
+registrada en `schema_migrations`. init_db() de app.py llama a migrate().
+
+También define HOT_QUERIES: las consultas de los caminos calientes del API, que
+check_query_plans() revisa con EXPLAIN QUERY PLAN para detectar regresiones a
+SCAN (tabla completa). Desde Agente_Cobranza/:
+
+    python migrations.py check-plans [ruta.db]
+"""
+import re
+import sqlite3
+import sys
+from datetime import datetime
+
+# Filas que conserva payment_method_changes (migración 10)
+PAYMENT_METHOD_CHANGES_KEPT = 10_000
+
+MIGRATIONS = [
+    (1, "esquema_inicial", """
+    CREATE TABLE IF NOT EXISTS customers (
+        id TEXT PRIMARY KEY,
+        name TEXT NOT NULL,
+        email TEXT NOT NULL,
+        phone TEXT,
+        created_at TEXT DEFAULT (datetime('now')),
+        metadata TEXT
+    );
+
+    CREATE TABLE IF NOT EXISTS payment_methods (
+        id TEXT PRIMARY KEY,
+        customer_id TEXT NOT NULL,
+        type TEXT NOT NULL,
+        provider TEXT,
+        token TEXT NOT NULL,
+        last4 TEXT,
+        expiry_month INTEGER,
+        expiry_year INTEGER,
+        is_default INTEGER DEFAULT 0,
+        created_at TEXT DEFAULT (datetime('now')),
+        metadata TEXT,
+        FOREIGN KEY(customer_id) REFERENCES customers(id) ON DELETE CASCADE
+    );
+    """),
+    (2, "indices_agente_y_email", """
+    -- Cubre la consulta del agente (WHERE customer_id = ? ORDER BY is_default DESC,
+    -- created_at ASC) sin tocar la tabla, y el ON DELETE CASCADE desde customers.
+    CREATE INDEX IF NOT EXISTS idx_payment_methods_customer_default
+        ON payment_methods (customer_id, is_default DESC, created_at ASC,
+                            id, type, provider, last4, expiry_month, expiry_year, metadata);
+
+    CREATE INDEX IF NOT EXISTS idx_customers_email ON customers (email);
+    """),
+    (3, "ejecuciones_de_pago", """
+    -- Una fila por Idempotency-Key de POST /strategy/payment_route: reclama la
+    -- llave antes de ejecutar y guarda el resultado para responder reintentos.
+    CREATE TABLE IF NOT EXISTS payment_executions (
+        idempotency_key TEXT PRIMARY KEY,
+        fingerprint TEXT NOT NULL,
+        status TEXT NOT NULL,
+        result TEXT,
+        created_at TEXT DEFAULT (datetime('now')),
+        updated_at TEXT DEFAULT (datetime('now'))
+    );
+    """),
+    (4, "referencias_corresponsal", """
+    -- Referencias de pago en efectivo (reconciliation.py). reference es el código
+    -- que el cliente presenta en caja; los montos van en centavos.
+    CREATE TABLE IF NOT EXISTS cash_references (
+        reference TEXT PRIMARY KEY,
+        customer_id TEXT,
+        amount_cents INTEGER NOT NULL,
+        currency TEXT NOT NULL DEFAULT 'MXN',
+        provider TEXT,
+        status TEXT NOT NULL DEFAULT 'open',
+        created_at TEXT DEFAULT (datetime('now')),
+        expires_at TEXT NOT NULL,
+        paid_at TEXT,
+        paid_amount_cents INTEGER,
+        settlement_source TEXT,
+        idempotency_key TEXT
+    );
+
+    -- Carga del periodo para conciliar (cubre las columnas del hash join, sin
+    -- tocar la tabla) y barrido de vencidas
+    CREATE INDEX IF NOT EXISTS idx_cash_references_status_expires
+        ON cash_references (status, expires_at, reference, amount_cents, settlement_source);
+    CREATE INDEX IF NOT EXISTS idx_cash_references_customer
+        ON cash_references (customer_id);
+    """),
+    (5, "deudas_promesas_pagos", """
+    -- Cartera: deudas, promesas de pago, pagos y débitos automáticos (ledger.py).
+    -- Montos REAL redondeados a 2 decimales; fechas de negocio 'AAAA-MM-DD'.
+    CREATE TABLE IF NOT EXISTS debts (
+        id TEXT PRIMARY KEY,
+        customer_id TEXT NOT NULL,
+        product TEXT,
+        principal REAL NOT NULL,
+        balance REAL NOT NULL,
+        currency TEXT NOT NULL DEFAULT 'MXN',
+        due_date TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'open',
+        created_at TEXT DEFAULT (datetime('now')),
+        updated_at TEXT DEFAULT (datetime('now')),
+        metadata TEXT,
+        FOREIGN KEY(customer_id) REFERENCES customers(id) ON DELETE CASCADE
+    );
+
+    CREATE TABLE IF NOT EXISTS promises (
+        id TEXT PRIMARY KEY,
+        customer_id TEXT NOT NULL,
+        debt_id TEXT NOT NULL,
+        amount REAL NOT NULL,
+        promised_date TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending',
+        channel TEXT,
+        created_at TEXT DEFAULT (datetime('now')),
+        updated_at TEXT DEFAULT (datetime('now')),
+        metadata TEXT,
+        FOREIGN KEY(debt_id) REFERENCES debts(id) ON DELETE CASCADE
+    );
+
+    CREATE TABLE IF NOT EXISTS payments (
+        id TEXT PRIMARY KEY,
+        customer_id TEXT NOT NULL,
+        debt_id TEXT,
+        amount REAL NOT NULL,
+        currency TEXT NOT NULL DEFAULT 'MXN',
+        method TEXT,
+        provider TEXT,
+        status TEXT NOT NULL DEFAULT 'captured',
+        idempotency_key TEXT UNIQUE,
+        paid_at TEXT,
+        created_at TEXT DEFAULT (datetime('now')),
+        metadata TEXT,
+        FOREIGN KEY(customer_id) REFERENCES customers(id) ON DELETE CASCADE,
+        FOREIGN KEY(debt_id) REFERENCES debts(id) ON DELETE SET NULL
+    );
+
+    CREATE TABLE IF NOT EXISTS auto_debits (
+        id TEXT PRIMARY KEY,
+        customer_id TEXT NOT NULL,
+        debt_id TEXT,
+        payment_method_id TEXT NOT NULL,
+        amount REAL NOT NULL,
+        frequency TEXT NOT NULL,
+        next_run_date TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'active',
+        created_at TEXT DEFAULT (datetime('now')),
+        updated_at TEXT DEFAULT (datetime('now')),
+        metadata TEXT,
+        FOREIGN KEY(customer_id) REFERENCES customers(id) ON DELETE CASCADE,
+        FOREIGN KEY(debt_id) REFERENCES debts(id) ON DELETE CASCADE,
+        FOREIGN KEY(payment_method_id) REFERENCES payment_methods(id) ON DELETE CASCADE
+    );
+
+    -- Contexto del agente: SUM(balance) y MIN(due_date) de las deudas abiertas
+    -- del cliente sin tocar la tabla; también cubre el CASCADE desde customers.
+    CREATE INDEX IF NOT EXISTS idx_debts_customer_status
+        ON debts (customer_id, status, due_date, balance);
+    -- Tramos de dpd: recorre sólo las abiertas en orden de vencimiento
+    CREATE INDEX IF NOT EXISTS idx_debts_status_due
+        ON debts (status, due_date, balance);
+
+    CREATE INDEX IF NOT EXISTS idx_promises_status_date ON promises (status, promised_date);
+    CREATE INDEX IF NOT EXISTS idx_promises_debt ON promises (debt_id, status, promised_date);
+    CREATE INDEX IF NOT EXISTS idx_promises_customer ON promises (customer_id);
+
+    CREATE INDEX IF NOT EXISTS idx_payments_debt ON payments (debt_id, paid_at);
+    CREATE INDEX IF NOT EXISTS idx_payments_customer ON payments (customer_id, created_at);
+
+    CREATE INDEX IF NOT EXISTS idx_auto_debits_status_next ON auto_debits (status, next_run_date);
+    CREATE INDEX IF NOT EXISTS idx_auto_debits_customer ON auto_debits (customer_id);
+    CREATE INDEX IF NOT EXISTS idx_auto_debits_debt ON auto_debits (debt_id);
+    CREATE INDEX IF NOT EXISTS idx_auto_debits_method ON auto_debits (payment_method_id);
+    """),
+    (6, "envejecimiento_dpd", """
+    -- Foto de cartera por cliente que lee el agente (aging.py). Se guarda el
+    -- vencimiento abierto más antiguo: el dpd se calcula al leer y el job sólo
+    -- toca las cuentas cuyo saldo cambió o que cruzaron un tramo.
+    CREATE TABLE IF NOT EXISTS dpd_snapshot (
+        customer_id TEXT PRIMARY KEY,
+        amount_due REAL NOT NULL,
+        open_debts INTEGER NOT NULL,
+        oldest_due_date TEXT NOT NULL,
+        bucket TEXT NOT NULL,
+        snapshot_date TEXT NOT NULL
+    ) WITHOUT ROWID;
+    -- Cruces de tramo por fecha y resumen diario por tramo
+    CREATE INDEX IF NOT EXISTS idx_dpd_snapshot_oldest ON dpd_snapshot (oldest_due_date);
+    CREATE INDEX IF NOT EXISTS idx_dpd_snapshot_bucket ON dpd_snapshot (bucket, amount_due);
+
+    -- Clientes con deudas modificadas desde la última pasada (lo llenan los triggers)
+    CREATE TABLE IF NOT EXISTS aging_dirty (
+        customer_id TEXT PRIMARY KEY
+    ) WITHOUT ROWID;
+
+    CREATE TRIGGER IF NOT EXISTS trg_debts_aging_insert AFTER INSERT ON debts
+    BEGIN
+        INSERT OR IGNORE INTO aging_dirty (customer_id) VALUES (NEW.customer_id);
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_debts_aging_update
+    AFTER UPDATE OF customer_id, balance, due_date, status ON debts
+    BEGIN
+        INSERT OR IGNORE INTO aging_dirty (customer_id) VALUES (NEW.customer_id);
+        INSERT OR IGNORE INTO aging_dirty (customer_id) VALUES (OLD.customer_id);
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_debts_aging_delete AFTER DELETE ON debts
+    BEGIN
+        INSERT OR IGNORE INTO aging_dirty (customer_id) VALUES (OLD.customer_id);
+    END;
+    -- Las deudas que ya existían entran en la primera pasada
+    INSERT OR IGNORE INTO aging_dirty (customer_id) SELECT DISTINCT customer_id FROM debts;
+
+    -- Una fila por día procesado; phase/cursor permiten reanudar una pasada cortada
+    CREATE TABLE IF NOT EXISTS aging_runs (
+        run_date TEXT PRIMARY KEY,
+        previous_date TEXT,
+        phase TEXT NOT NULL,
+        cursor TEXT,
+        processed INTEGER NOT NULL DEFAULT 0,
+        changed INTEGER NOT NULL DEFAULT 0,
+        started_at TEXT NOT NULL,
+        updated_at TEXT NOT NULL,
+        finished_at TEXT
+    );
+
+    -- Resumen diario por tramo (historial compacto)
+    CREATE TABLE IF NOT EXISTS dpd_bucket_daily (
+        snapshot_date TEXT NOT NULL,
+        bucket TEXT NOT NULL,
+        accounts INTEGER NOT NULL,
+        amount_due REAL NOT NULL,
+        PRIMARY KEY (snapshot_date, bucket)
+    ) WITHOUT ROWID;
+    """),
+    (7, "cache_de_ofertas", """
+    -- Decisiones del agente precalculadas por campaña (offer_cache.py); la llave
+    -- es el cliente más el hash de las entradas de build_decision.
+    CREATE TABLE IF NOT EXISTS offer_cache (
+        customer_id TEXT NOT NULL,
+        context_hash TEXT NOT NULL,
+        campaign TEXT,
+        decision TEXT NOT NULL,
+        computed_at TEXT NOT NULL,
+        expires_at TEXT NOT NULL,
+        PRIMARY KEY (customer_id, context_hash)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS idx_offer_cache_expires ON offer_cache (expires_at);
+    CREATE INDEX IF NOT EXISTS idx_offer_cache_campaign ON offer_cache (campaign);
+
+    -- Última invalidación por cliente: un precálculo que leyó los métodos antes
+    -- de ella no guarda su resultado
+    CREATE TABLE IF NOT EXISTS offer_cache_invalidations (
+        customer_id TEXT PRIMARY KEY,
+        invalidated_at TEXT NOT NULL
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS idx_offer_cache_invalidations_at
+        ON offer_cache_invalidations (invalidated_at);
+    """),
+    (8, "versiones_de_tabla", """
+    -- Contador de cambios por tabla para los ETag de los listados: un GET con
+    -- If-None-Match se resuelve leyendo esta fila, sin correr el listado. `epoch`
+    -- distingue una BD recreada (los contadores vuelven a empezar).
+    CREATE TABLE IF NOT EXISTS table_versions (
+        name TEXT PRIMARY KEY,
+        version INTEGER NOT NULL DEFAULT 0,
+        epoch TEXT NOT NULL DEFAULT (lower(hex(randomblob(8))))
+    ) WITHOUT ROWID;
+    """ + "".join(
+        f"""
+    INSERT OR IGNORE INTO table_versions (name) VALUES ('{table}');"""
+        + "".join(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_{table}_version_{event.lower()} AFTER {event} ON {table}
+    BEGIN UPDATE table_versions SET version = version + 1 WHERE name = '{table}'; END;"""
+                  for event in ("INSERT", "UPDATE", "DELETE"))
+        for table in ("customers", "payment_methods", "debts", "promises", "payments", "auto_debits")
+    )),
+    (9, "busqueda_de_clientes", """
+    -- Índice FTS5 de contenido externo (customer_search.py): nombre y email sin
+    -- acentos, con índices de prefijo para que la búsqueda por prefijo recorra
+    -- las coincidencias sin materializarlas. Los triggers lo mantienen al día.
+    CREATE VIRTUAL TABLE IF NOT EXISTS customers_fts USING fts5(
+        name, email,
+        content = 'customers', content_rowid = 'rowid',
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3 4 5 6 7 8 9 10',
+        detail = column
+    );
+    CREATE TRIGGER IF NOT EXISTS trg_customers_fts_insert AFTER INSERT ON customers
+    BEGIN
+        INSERT INTO customers_fts (rowid, name, email) VALUES (NEW.rowid, NEW.name, NEW.email);
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_customers_fts_update AFTER UPDATE OF name, email ON customers
+    BEGIN
+        INSERT INTO customers_fts (customers_fts, rowid, name, email) VALUES ('delete', OLD.rowid, OLD.name, OLD.email);
+        INSERT INTO customers_fts (rowid, name, email) VALUES (NEW.rowid, NEW.name, NEW.email);
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_customers_fts_delete AFTER DELETE ON customers
+    BEGIN
+        INSERT INTO customers_fts (customers_fts, rowid, name, email) VALUES ('delete', OLD.rowid, OLD.name, OLD.email);
+    END;
+    INSERT INTO customers_fts (customers_fts) VALUES ('rebuild');
+
+    -- Búsquedas exactas; mismas expresiones que customer_search.EMAIL_KEY_SQL / PHONE_KEY_SQL
+    CREATE INDEX IF NOT EXISTS idx_customers_email_key ON customers (lower(trim(email)));
+    CREATE INDEX IF NOT EXISTS idx_customers_phone_key ON customers (
+        substr(replace(replace(replace(replace(replace(replace(
+            phone, ' ', ''), '-', ''), '(', ''), ')', ''), '.', ''), '+', ''), -10));
+    """),
+    (10, "cambios_de_metodos_de_pago", f"""
+    -- Registro de clientes cuyos métodos cambiaron, para que cada proceso invalide
+    -- sólo esas entradas de su caché (method_cache.py). AUTOINCREMENT: `seq` nunca
+    -- se reutiliza. prune_payment_method_changes() deja las últimas
+    -- {PAYMENT_METHOD_CHANGES_KEPT}; quien se atrase más vacía su caché completa.
+    CREATE TABLE IF NOT EXISTS payment_method_changes (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        customer_id TEXT
+    );
+    CREATE TRIGGER IF NOT EXISTS trg_payment_method_changes_insert AFTER INSERT ON payment_methods
+    BEGIN INSERT INTO payment_method_changes (customer_id) VALUES (NEW.customer_id); END;
+    CREATE TRIGGER IF NOT EXISTS trg_payment_method_changes_update AFTER UPDATE ON payment_methods
+    BEGIN
+        INSERT INTO payment_method_changes (customer_id) SELECT NEW.customer_id UNION SELECT OLD.customer_id;
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_payment_method_changes_delete AFTER DELETE ON payment_methods
+    BEGIN INSERT INTO payment_method_changes (customer_id) VALUES (OLD.customer_id); END;
+    """),
+    (11, "huella_de_pagos", """
+    -- Huella del payload de POST /payments con Idempotency-Key: la misma llave con
+    -- otro payload es un conflicto, no un reintento. NULL en los pagos anteriores.
+    ALTER TABLE payments ADD COLUMN request_fingerprint TEXT;
+    """),
+]
+
+# nombre -> (sql, parámetros de ejemplo)
+HOT_QUERIES = {
+    "agente_metodos_por_cliente": ("""
+        SELECT id, customer_id, type, provider, last4, expiry_month, expiry_year, is_default, created_at, metadata
+        FROM payment_methods
+        WHERE customer_id = ?
+        ORDER BY is_default DESC, created_at ASC
+    """, ("c",)),
+    "agente_metodos_por_lote": ("""
+        SELECT id, customer_id, type, provider, last4, expiry_month, expiry_year, is_default, created_at, metadata
+        FROM payment_methods
+        WHERE customer_id IN (?, ?, ?)
+        ORDER BY customer_id, is_default DESC, created_at ASC
+    """, ("a", "b", "c")),
+    "metodos_cambiados_desde": (
+        "SELECT DISTINCT customer_id FROM payment_method_changes WHERE seq > ? AND seq <= ?", (0, 10)),
+    "cascade_borrado_cliente": (
+        "DELETE FROM payment_methods WHERE customer_id = ?", ("c",)),
+    "cliente_por_id": (
+        "SELECT * FROM customers WHERE id = ?", ("c",)),
+    "cliente_por_email": (
+        "SELECT * FROM customers WHERE email = ?", ("a@b.c",)),
+    "metodo_por_id": (
+        "SELECT * FROM payment_methods WHERE id = ?", ("m",)),
+    "ejecucion_por_llave": (
+        "SELECT fingerprint, status, result, updated_at FROM payment_executions WHERE idempotency_key = ?",
+        ("k",)),
+    "referencia_por_codigo": (
+        "SELECT * FROM cash_references WHERE reference = ?", ("93000000000000",)),
+    "referencias_del_periodo": ("""
+        SELECT reference, amount_cents, expires_at, status, settlement_source
+        FROM cash_references
+        WHERE status IN ('open', 'expired', 'paid') AND expires_at >= ?
+    """, ("2024-01-01 00:00:00",)),
+    "referencias_vencidas": (
+        "UPDATE cash_references SET status = 'expired' WHERE status = 'open' AND expires_at < ?",
+        ("2024-01-01 00:00:00",)),
+    "metodos_listado_por_cliente": (
+        "SELECT * FROM payment_methods WHERE customer_id = ? AND id > ? ORDER BY id LIMIT ?", ("c", "", 50)),
+    "agente_deuda_abierta_por_cliente": ("""
+        SELECT COUNT(*), SUM(balance), MIN(due_date)
+        FROM debts
+        WHERE customer_id = ? AND status = 'open'
+    """, ("c",)),
+    "agente_deuda_abierta_por_lote": ("""
+        SELECT customer_id, COUNT(*), SUM(balance), MIN(due_date)
+        FROM debts
+        WHERE customer_id IN (?, ?, ?) AND status = 'open'
+        GROUP BY customer_id
+    """, ("a", "b", "c")),
+    "promesas_que_vencen_hoy": (
+        "SELECT * FROM promises WHERE status = 'pending' AND promised_date = ? ORDER BY id",
+        ("2024-01-01",)),
+    "promesa_pendiente_de_deuda": ("""
+        SELECT id FROM promises
+        WHERE debt_id = ? AND status = 'pending'
+        ORDER BY promised_date LIMIT 1
+    """, ("d",)),
+    "deudas_por_tramo_dpd": ("""
+        SELECT CASE WHEN due_date <= ? THEN '90+' ELSE 'current' END AS bucket,
+               COUNT(*), SUM(balance)
+        FROM debts
+        WHERE status = 'open'
+        GROUP BY bucket
+    """, ("2024-01-01",)),
+    "pago_por_llave": (
+        "SELECT id, request_fingerprint FROM payments WHERE idempotency_key = ?", ("k",)),
+    "debitos_automaticos_por_correr": (
+        "SELECT * FROM auto_debits WHERE status = 'active' AND next_run_date <= ?", ("2024-01-01",)),
+    "cascade_borrado_deuda": (
+        "DELETE FROM promises WHERE debt_id = ?", ("d",)),
+    "agente_foto_por_cliente": ("""
+        SELECT open_debts, amount_due, oldest_due_date, snapshot_date,
+               EXISTS (SELECT 1 FROM aging_dirty WHERE customer_id = ?1)
+        FROM dpd_snapshot WHERE customer_id = ?1
+    """, ("c",)),
+    "agente_cliente_pendiente_de_envejecer": (
+        "SELECT 1 FROM aging_dirty WHERE customer_id = ?", ("c",)),
+    "envejecimiento_clientes_sucios": (
+        "SELECT customer_id FROM aging_dirty WHERE customer_id > ? ORDER BY customer_id LIMIT ?", ("", 5000)),
+    "envejecimiento_limite_de_rango": (
+        "SELECT customer_id FROM debts WHERE customer_id > ? ORDER BY customer_id LIMIT 1 OFFSET ?", ("", 4999)),
+    "envejecimiento_rango_completo": ("""
+        SELECT customer_id, ROUND(SUM(balance), 2), COUNT(*), MIN(due_date)
+        FROM debts INDEXED BY idx_debts_customer_status
+        WHERE customer_id > ? AND customer_id <= ? AND status = 'open'
+        GROUP BY customer_id
+    """, ("a", "b")),
+    "envejecimiento_cruces_de_tramo": ("""
+        SELECT customer_id, oldest_due_date FROM dpd_snapshot
+        WHERE oldest_due_date > ? AND oldest_due_date <= ? AND (oldest_due_date, customer_id) > (?, ?)
+        ORDER BY oldest_due_date, customer_id
+        LIMIT ?
+    """, ("2024-01-01", "2024-01-02", "", "", 5000)),
+    "oferta_precalculada": (
+        "SELECT decision, expires_at FROM offer_cache WHERE customer_id = ? AND context_hash = ?", ("c", "h")),
+    "oferta_invalidar_cliente": (
+        "DELETE FROM offer_cache WHERE customer_id = ?", ("c",)),
+    "oferta_guardar_si_vigente": ("""
+        INSERT OR REPLACE INTO offer_cache (customer_id, context_hash, campaign, decision, computed_at, expires_at)
+        SELECT ?1, ?2, ?3, ?4, ?5, ?6
+        WHERE NOT EXISTS (
+            SELECT 1 FROM offer_cache_invalidations
+            WHERE customer_id IN (?1, ?7) AND invalidated_at >= ?5
+        )
+    """, ("c", "h", "camp", "{}", "2024-01-01T00:00:00.000000", "2024-01-02T00:00:00.000000", "*")),
+    "ofertas_vencidas": (
+        "DELETE FROM offer_cache WHERE expires_at <= ?", ("2024-01-01T00:00:00.000000",)),
+    "version_de_tabla": (
+        "SELECT epoch, version FROM table_versions WHERE name = ?", ("customers",)),
+    "cliente_por_email_normalizado": (
+        "SELECT * FROM customers WHERE lower(trim(email)) = ? ORDER BY id LIMIT ? OFFSET ?", ("a@b.c", 21, 0)),
+    "cliente_por_telefono_normalizado": ("""
+        SELECT * FROM customers
+        WHERE substr(replace(replace(replace(replace(replace(replace(
+            phone, ' ', ''), '-', ''), '(', ''), ')', ''), '.', ''), '+', ''), -10) = ?
+        ORDER BY id LIMIT ? OFFSET ?
+    """, ("5512345678", 21, 0)),
+    "busqueda_de_clientes": ("""
+        SELECT c.id, c.name FROM customers_fts
+        JOIN customers c ON c.rowid = customers_fts.rowid
+        WHERE customers_fts MATCH ?
+        LIMIT ?
+    """, ('"gutierrez"*', 501)),
+    "busqueda_de_clientes_pagina": (
+        "SELECT * FROM customers WHERE id IN (?, ?, ?)", ("a", "b", "c")),
+    "envejecimiento_resumen_por_tramo": (
+        "SELECT COUNT(*), SUM(amount_due) FROM dpd_snapshot WHERE bucket = ?", ("90+",)),
+}
+
+
+def prune_payment_method_changes(conn):
+    """
+    Recorta payment_method_changes a sus últimas PAYMENT_METHOD_CHANGES_KEPT filas
+    (un rango de la llave primaria). Lo llaman las escrituras de métodos de pago
+    dentro de su transacción; no confirma.
+    """
+    conn.execute("""
+        DELETE FROM payment_method_changes WHERE seq <=
+            (SELECT seq FROM sqlite_sequence WHERE name = 'payment_method_changes') - ?
+    """, (PAYMENT_METHOD_CHANGES_KEPT,))
+
+
+def current_version(conn) -> int:
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TEXT NOT NULL
+        )
+    """)
+    conn.commit()
+    row = conn.execute("SELECT MAX(version) FROM schema_migrations").fetchone()
+    return row[0] or 0
+
+
+def migrate(conn) -> list[int]:
+    """Aplica las migraciones pendientes en orden; devuelve las versiones aplicadas."""
+    applied = []
+    version = current_version(conn)
+    for number, name, sql in MIGRATIONS:
+        if number <= version:
+            continue
+        stamp = datetime.utcnow().isoformat()
+        # executescript confirma cualquier transacción previa y corre el bloque completo
+        conn.executescript(
+            f"BEGIN;\n{sql}\n"
+            f"INSERT INTO schema_migrations (version, name, applied_at) "
+            f"VALUES ({int(number)}, '{name}', '{stamp}');\nCOMMIT;"
+        )
+        applied.append(number)
+    return applied
+
+
+# "VIRTUAL TABLE INDEX 0:M2": idxStr no vacío = el módulo usa una restricción
+FILTERED_VTAB = re.compile(r"VIRTUAL TABLE INDEX \d+:\S")
+
+
+def explain(conn, sql: str, params=()) -> list[str]:
+    return [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+
+
+def check_query_plans(conn) -> dict:
+    """
+    Corre EXPLAIN QUERY PLAN sobre HOT_QUERIES.
+    Devuelve {nombre: [pasos]} sólo para las consultas que hacen SCAN de una tabla.
+    """
+    regressions = {}
+    for name, (sql, params) in HOT_QUERIES.items():
+        steps = explain(conn, sql, params)
+        # SCAN CONSTANT ROW es el SELECT sin FROM de un INSERT ... SELECT, no una tabla;
+        # una tabla virtual que consume restricciones (p. ej. MATCH de FTS5) no se recorre completa
+        if any(step.startswith("SCAN") and step != "SCAN CONSTANT ROW" and not FILTERED_VTAB.search(step)
+               for step in steps):
+            regressions[name] = steps
+    return regressions
+
+
+def main(argv: list[str]) -> int:
+    if not argv or argv[0] != "check-plans":
+        print(__doc__)
+        return 2
+    conn = sqlite3.connect(argv[1] if len(argv) > 1 else ":memory:")
+    try:
+        migrate(conn)
+        regressions = check_query_plans(conn)
+    finally:
+        conn.close()
+    for name in HOT_QUERIES:
+        print(f"{'SCAN' if name in regressions else 'ok  '}  {name}")
+        for step in regressions.get(name, []):
+            print(f"        {step}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,121 @@
+"""
+Motor de negociación columnar (NumPy).
+
+Replica select_negotiation_strategy + DiscountStrategy / InstallmentsStrategy /
+HybridStrategy de app.py sobre arreglos completos de cartera, para re-pricing y
+simulaciones what-if fuera de línea. Los resultados son idénticos a las clases
+escalares (ver benchmarks/bench_negotiation_vec.py, que además los compara).
+
+Requiere numpy (opcional para el servidor): `pip install numpy`.
+"""
+import numpy as np
+
+TACTICS = np.array(["discount", "installments", "hybrid"], dtype=object)
+TACTIC_DISCOUNT, TACTIC_INSTALLMENTS, TACTIC_HYBRID = 0, 1, 2
+
+# Mismas constantes que las clases escalares
+DISCOUNT_BASE = 0.10
+DISCOUNT_EXTRA_CAP = 0.20
+DISCOUNT_MIN, DISCOUNT_MAX = 0.05, 0.30
+INSTALLMENTS_MIN, INSTALLMENTS_MAX = 3, 12
+MIN_INSTALLMENT = 300
+INSTALLMENT_SEGMENTS = {"vip", "consumo_alto"}
+
+DISCOUNT_CONDITIONS = ["pago_total", "liquidación_en_10_días"]
+INSTALLMENTS_CONDITIONS = ["domiciliar_pago", "primer_pago_inmediato"]
+HYBRID_CONDITIONS = ["firma_convenio_digital", "domiciliar_pago"]
+
+
+def _segment_mask(segmento, segments: set) -> np.ndarray:
+    """Máscara booleana de pertenencia; agrupa por valor único para no iterar filas."""
+    arr = np.asarray(segmento, dtype=object)
+    arr = np.where(np.equal(arr, None), "", arr)
+    uniq, inverse = np.unique(arr.astype(str), return_inverse=True)
+    hits = np.array([s.lower() in segments for s in uniq], dtype=bool)
+    return hits[inverse.reshape(-1)]
+
+
+def select_tactics(segmento, dpd, propension_pago) -> np.ndarray:
+    """Versión vectorizada de select_negotiation_strategy; devuelve códigos TACTIC_*."""
+    dpd = np.asarray(dpd).astype(np.int64)
+    score = np.asarray(propension_pago, dtype=np.float64)
+    vip = _segment_mask(segmento, INSTALLMENT_SEGMENTS)
+
+    tactic = np.full(dpd.shape, TACTIC_DISCOUNT, dtype=np.int8)
+    tactic[(dpd >= 60) & (score < 0.5)] = TACTIC_HYBRID
+    tactic[vip] = TACTIC_INSTALLMENTS
+    return tactic
+
+
+def discount_pct(dpd, propension_pago) -> np.ndarray:
+    """Versión vectorizada de DiscountStrategy.propose()["discount_pct"]."""
+    dpd = np.asarray(dpd).astype(np.int64)
+    score = np.asarray(propension_pago, dtype=np.float64)
+
+    extra = np.minimum(DISCOUNT_EXTRA_CAP, (dpd // 30) * 0.05)
+    adjust = np.where(score > 0.7, -0.05, np.where(score >= 0.4, 0.0, 0.05))
+    pct = np.maximum(DISCOUNT_MIN, np.minimum(DISCOUNT_MAX, DISCOUNT_BASE + extra + adjust))
+    # El resultado sólo toma unos cuantos valores distintos: se redondean con round()
+    # de Python (np.round no siempre coincide en los empates) y se reexpanden.
+    uniq, inverse = np.unique(pct, return_inverse=True)
+    rounded = np.array([round(float(v), 3) for v in uniq], dtype=np.float64)
+    return rounded[inverse.reshape(-1)].reshape(pct.shape)
+
+
+def installments(dpd, amount_due) -> np.ndarray:
+    """Versión vectorizada de InstallmentsStrategy.propose()["installments"]."""
+    dpd = np.asarray(dpd).astype(np.int64)
+    amount = np.asarray(amount_due, dtype=np.float64)
+
+    n = np.minimum(INSTALLMENTS_MAX, np.maximum(INSTALLMENTS_MIN, (dpd // 30) + 3))
+    n = np.where(amount <= 0, 1, n)
+    # Mismo descenso que el while escalar, a lo sumo INSTALLMENTS_MAX - 1 pasadas
+    active = (n > 1) & (amount / n < MIN_INSTALLMENT)
+    while active.any():
+        n = n - active
+        active = (n > 1) & (amount / n < MIN_INSTALLMENT)
+    return n.astype(np.int64)
+
+
+def propose_batch(segmento, dpd, propension_pago, amount_due) -> dict:
+    """
+    Calcula táctica, descuento y plazos para toda la cartera.
+
+    Devuelve un dict de arreglos alineados con la entrada:
+      - tactic: códigos TACTIC_* (int8); usar TACTICS[tactic] para los nombres
+      - discount_pct: float64, NaN donde la táctica no lleva descuento
+      - installments: int64, 0 donde la táctica no lleva plazos
+    """
+    tactic = select_tactics(segmento, dpd, propension_pago)
+    pct = discount_pct(dpd, propension_pago)
+    n = installments(dpd, amount_due)
+    return {
+        "tactic": tactic,
+        "discount_pct": np.where(tactic == TACTIC_INSTALLMENTS, np.nan, pct),
+        "installments": np.where(tactic == TACTIC_DISCOUNT, 0, n),
+    }
+
+
+def to_proposal(result: dict, i: int) -> dict:
+    """Reconstruye la propuesta de la fila i con la misma forma que las clases escalares."""
+    tactic = int(result["tactic"][i])
+    if tactic == TACTIC_DISCOUNT:
+        return {
+            "tactic": "discount",
+            "discount_pct": float(result["discount_pct"][i]),
+            "conditions": list(DISCOUNT_CONDITIONS)
+        }
+    if tactic == TACTIC_INSTALLMENTS:
+        return {
+            "tactic": "installments",
+            "installments": int(result["installments"][i]),
+            "interest_rate_monthly": 0.0,
+            "conditions": list(INSTALLMENTS_CONDITIONS)
+        }
+    return {
+        "tactic": "hybrid",
+        "discount_pct": float(result["discount_pct"][i]),
+        "installments": int(result["installments"][i]),
+        "interest_rate_monthly": 0.0,
+        "conditions": list(HYBRID_CONDITIONS)
+    }
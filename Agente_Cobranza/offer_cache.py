@@ -0,0 +1,222 @@
+"""
+Decisiones del agente precalculadas por campaña (caché de ofertas).
+
+La decisión de /agent/decision (método, ruta, propuesta y speech) es
+determinista dados los métodos de pago guardados y el contexto de negociación.
+Antes de que arranquen los marcadores, precompute_decisions() de app.py decide
+la lista objetivo de la campaña y guarda cada decisión en `offer_cache` con
+llave (customer_id, context_hash). El camino del agente calcula la misma llave y
+sirve la decisión con una búsqueda por llave primaria; si no hay fila, venció o
+cambió alguna entrada, decide en vivo.
+
+context_hash() cubre lo que el cliente envía (segmento, monto, dpd, propensión,
+moneda, canal, ruleset, locale), el monto/dpd derivados de las deudas guardadas
+y la versión (por contenido) de las reglas y de las plantillas de speech; los
+métodos de pago no entran en la llave: los handlers de /payment_methods llaman
+a invalidate() con su misma conexión, justo después del commit. La
+invalidación queda registrada con su hora en `offer_cache_invalidations` y
+store_many() no guarda decisiones calculadas antes de ella, así un precálculo
+en curso no reinstala una oferta vieja. La importación masiva, que no sabe qué
+clientes tocó, llama a invalidate_all(): registra la llave global
+ALL_CUSTOMERS, que store_many() revisa junto a la del cliente.
+
+Uso como CLI (desde Agente_Cobranza/), con un contexto JSON por línea:
+    python offer_cache.py precompute contextos.ndjson --campaign cobranza_lunes [--db agente_cobranza.db]
+    python offer_cache.py purge [--db agente_cobranza.db]
+"""
+import argparse
+import hashlib
+import json
+import sys
+from datetime import datetime, timedelta
+
+# Subir al cambiar la lógica de build_decision o la forma de la decisión
+CACHE_VERSION = 3
+DEFAULT_TTL_HOURS = 24
+# Las invalidaciones sólo importan mientras corre un precálculo que empezó antes
+INVALIDATION_RETENTION_HOURS = 48
+# customer_id de la invalidación que cubre a todos los clientes (invalidate_all)
+ALL_CUSTOMERS = "*"
+
+
+def stamp(moment: datetime | None = None) -> str:
+    """Hora UTC con microsegundos fijos (comparable como texto)."""
+    return (moment or datetime.utcnow()).strftime("%Y-%m-%dT%H:%M:%S.%f")
+
+
+def context_hash(data: dict, debt_context: dict | None = None, rules_version=None, speech_version=None) -> str:
+    """
+    Hash de las entradas de build_decision con la misma normalización que
+    aplica ella (float/int, moneda en mayúsculas). Lanza ValueError/TypeError
+    si el contexto no es válido, igual que build_decision.
+    """
+    source = debt_context or data
+    key = [
+        CACHE_VERSION,
+        data.get("segmento"),
+        round(float(source["amount_due"]), 2),
+        int(source["dpd"]),
+        float(data["propension_pago"]),
+        (data.get("currency") or "MXN").upper(),
+        data.get("channel"),
+        data.get("ruleset"),
+        rules_version,
+        data.get("locale"),
+        speech_version,
+    ]
+    payload = json.dumps(key, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+
+def lookup(conn, customer_id: str, key: str, now: str | None = None) -> str | None:
+    """
+    Decisión guardada como texto JSON (se devuelve tal cual en la respuesta,
+    sin decodificar ni volver a serializar), o None si no existe o venció.
+    """
+    row = conn.execute(
+        "SELECT decision, expires_at FROM offer_cache WHERE customer_id = ? AND context_hash = ?",
+        (customer_id, key)).fetchone()
+    if not row or row[1] <= (now or stamp()):
+        return None
+    return row[0]
+
+
+def store_many(conn, rows, started_at: str, campaign: str | None = None,
+               ttl_hours: float = DEFAULT_TTL_HOURS) -> int:
+    """
+    Guarda (customer_id, context_hash, decision) calculadas a partir de
+    `started_at`; omite los clientes invalidados desde entonces. `debt_context`
+    no se guarda: el agente agrega el del momento al servir. Devuelve cuántas
+    se guardaron.
+    """
+    computed_at = stamp()
+    expires_at = stamp(datetime.utcnow() + timedelta(hours=ttl_hours))
+    cur = conn.executemany("""
+        INSERT OR REPLACE INTO offer_cache (customer_id, context_hash, campaign, decision, computed_at, expires_at)
+        SELECT ?1, ?2, ?3, ?4, ?5, ?6
+        WHERE NOT EXISTS (
+            SELECT 1 FROM offer_cache_invalidations
+            WHERE customer_id IN (?1, ?8) AND invalidated_at >= ?7
+        )
+    """, [(customer_id, key, campaign,
+           json.dumps({k: v for k, v in decision.items() if k != "debt_context"},
+                      separators=(",", ":"), ensure_ascii=False),
+           computed_at, expires_at, started_at, ALL_CUSTOMERS)
+          for customer_id, key, decision in rows])
+    conn.commit()
+    return max(cur.rowcount, 0)
+
+
+def invalidate(conn, *customer_ids):
+    """
+    Borra las decisiones de los clientes y registra la invalidación (confirma la
+    transacción). Llamarla después del commit de la escritura que la causa: si
+    su hora quedara antes, un precálculo que empiece en medio leería los métodos
+    viejos y pasaría el filtro de store_many().
+    """
+    ids = [(cid,) for cid in dict.fromkeys(customer_ids) if cid is not None]
+    if not ids:
+        return
+    now = stamp()
+    conn.executemany("DELETE FROM offer_cache WHERE customer_id = ?", ids)
+    conn.executemany("""
+        INSERT INTO offer_cache_invalidations (customer_id, invalidated_at) VALUES (?, ?)
+        ON CONFLICT (customer_id) DO UPDATE SET invalidated_at = excluded.invalidated_at
+    """, [(cid, now) for (cid,) in ids])
+    conn.commit()
+
+
+def invalidate_all(conn):
+    """Borra todas las decisiones y registra una invalidación global (confirma la transacción)."""
+    conn.execute("DELETE FROM offer_cache")
+    conn.execute("""
+        INSERT INTO offer_cache_invalidations (customer_id, invalidated_at) VALUES (?, ?)
+        ON CONFLICT (customer_id) DO UPDATE SET invalidated_at = excluded.invalidated_at
+    """, (ALL_CUSTOMERS, stamp()))
+    conn.commit()
+
+
+def clear(conn, campaign: str | None = None) -> int:
+    """Borra todas las decisiones (o las de una campaña). Devuelve cuántas."""
+    if campaign is None:
+        cur = conn.execute("DELETE FROM offer_cache")
+    else:
+        cur = conn.execute("DELETE FROM offer_cache WHERE campaign = ?", (campaign,))
+    conn.commit()
+    return cur.rowcount
+
+
+def purge(conn) -> dict:
+    """Borra decisiones vencidas e invalidaciones que ya no protegen a ningún precálculo."""
+    now = datetime.utcnow()
+    expired = conn.execute("DELETE FROM offer_cache WHERE expires_at <= ?", (stamp(now),)).rowcount
+    old = conn.execute(
+        "DELETE FROM offer_cache_invalidations WHERE invalidated_at < ?",
+        (stamp(now - timedelta(hours=INVALIDATION_RETENTION_HOURS)),)).rowcount
+    conn.commit()
+    return {"expired": expired, "invalidations": old}
+
+
+def stats(conn) -> dict:
+    rows = conn.execute("""
+        SELECT campaign, COUNT(*), MIN(computed_at), MAX(expires_at)
+        FROM offer_cache GROUP BY campaign
+    """).fetchall()
+    return {
+        "campaigns": [
+            {"campaign": c, "decisions": n, "oldest_computed_at": first, "last_expires_at": last}
+            for c, n, first, last in rows
+        ],
+        "decisions": sum(r[1] for r in rows),
+    }
+
+
+def _iter_contexts(stream):
+    for line_num, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            raise ValueError(f"Línea {line_num}: JSON inválido: {e}") from e
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Decisiones precalculadas por campaña")
+    sub = parser.add_subparsers(dest="command", required=True)
+    pre = sub.add_parser("precompute", help="Decide la lista objetivo y guarda las decisiones")
+    pre.add_argument("path", help="Contextos NDJSON (uno por línea), o - para stdin")
+    pre.add_argument("--campaign")
+    pre.add_argument("--ttl-hours", type=float, default=DEFAULT_TTL_HOURS)
+    pre.add_argument("--chunk-size", type=int, default=1000)
+    sub.add_parser("purge", help="Borra decisiones vencidas")
+    for p in sub.choices.values():
+        p.add_argument("--db", default="agente_cobranza.db")
+    args = parser.parse_args(argv)
+
+    import app as agente  # la lógica de decisión vive en app.py
+
+    agente.DB_PATH = args.db
+    agente.init_db()
+    if args.command == "purge":
+        conn = agente.get_connection()
+        try:
+            report = purge(conn)
+        finally:
+            conn.close()
+    else:
+        stream = sys.stdin if args.path == "-" else open(args.path, encoding="utf-8")
+        try:
+            report = agente.precompute_decisions(_iter_contexts(stream), campaign=args.campaign,
+                                                 ttl_hours=args.ttl_hours, chunk_size=args.chunk_size)
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+    json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+    sys.stdout.write("\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,229 @@
+"""
+Pipeline asíncrono de ejecución de rutas de pago.
+
+Cada paso de la ruta (los `steps` que arma PaymentStrategy.execute, p. ej.
+["token-verify", "3ds-check", "auth", "capture"]) se ejecuta contra un Gateway
+intercambiable. Los pasos de un pago van en orden; los de pagos distintos corren
+concurrentemente en un event loop, con un semáforo por proveedor que acota las
+llamadas simultáneas a cada uno.
+
+Idempotencia: cada llamada lleva la llave `<idempotency_key>:<paso>`. Un
+reintento (por error transitorio o respuesta perdida) reusa la misma llave, así
+que el gateway devuelve el resultado original en lugar de cobrar dos veces.
+
+SimulatedGateway es un gateway en proceso con latencia y tasas de fallo
+configurables, para desarrollo y benchmarks. PipelineRunner corre el pipeline en
+un hilo de fondo para llamarlo desde los handlers síncronos de Flask.
+"""
+import asyncio
+import random
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+# Pasos que mueven dinero: el simulador los cuenta para detectar cobros dobles
+CHARGE_STEPS = {"capture", "wallet-charge", "bank-redirect"}
+# Pasos donde el emisor puede rechazar el pago
+DECLINABLE_STEPS = {"auth", "wallet-charge", "bank-redirect"}
+# Pasos que se completan fuera de línea (efectivo en corresponsal, webhook del banco)
+DEFERRED_STEPS = {"await-cash-payment", "notify-webhook"}
+
+
+class IdempotencyConflict(Exception):
+    """La llave ya se usó con otro payload o su ejecución sigue en curso."""
+
+
+class GatewayError(Exception):
+    """Fallo transitorio del gateway (timeout, 5xx); el paso se puede reintentar."""
+
+
+class Gateway(ABC):
+    @abstractmethod
+    async def call(self, provider: str, step: str, payment: dict, idempotency_key: str) -> dict:
+        """
+        Ejecuta un paso. Devuelve {"status": "ok" | "pending" | "declined", ...}
+        o lanza GatewayError si el fallo es transitorio. Una llave repetida debe
+        devolver el resultado original sin repetir el efecto.
+        """
+        raise NotImplementedError
+
+
+class SimulatedGateway(Gateway):
+    """
+    Gateway en proceso.
+
+    - latency_ms / jitter_ms: espera por llamada (uniforme en latency ± jitter).
+    - failure_rate: GatewayError antes de aplicar el paso.
+    - lost_response_rate: el paso se aplica pero la respuesta se "pierde"
+      (GatewayError); el reintento debe recibir el resultado guardado.
+    - decline_rate: rechazo del emisor en DECLINABLE_STEPS.
+    """
+
+    def __init__(self, latency_ms: float = 20.0, jitter_ms: float = 0.0, failure_rate: float = 0.0,
+                 lost_response_rate: float = 0.0, decline_rate: float = 0.0, seed=None,
+                 max_keys: int = 1_000_000):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.failure_rate = failure_rate
+        self.lost_response_rate = lost_response_rate
+        self.decline_rate = decline_rate
+        self.max_keys = max_keys
+        self._rnd = random.Random(seed)
+        self._applied = OrderedDict()  # idempotency_key -> resultado
+        self.calls = 0
+        self.replays = 0
+        self.charges = 0
+
+    async def call(self, provider: str, step: str, payment: dict, idempotency_key: str) -> dict:
+        self.calls += 1
+        delay = self.latency_ms + self._rnd.uniform(-self.jitter_ms, self.jitter_ms)
+        await asyncio.sleep(max(delay, 0) / 1000)
+
+        applied = self._applied.get(idempotency_key)
+        if applied is not None:
+            self.replays += 1
+            return applied
+        if self._rnd.random() < self.failure_rate:
+            raise GatewayError(f"{provider}: error transitorio en {step}")
+
+        if step in DECLINABLE_STEPS and self._rnd.random() < self.decline_rate:
+            result = {"status": "declined", "reason": "fondos_insuficientes"}
+        elif step in DEFERRED_STEPS:
+            result = {"status": "pending"}
+        else:
+            result = {"status": "ok", "gateway_ref": f"{provider}-{self.calls:08d}"}
+            if step in CHARGE_STEPS:
+                self.charges += 1
+
+        self._applied[idempotency_key] = result
+        if len(self._applied) > self.max_keys:
+            self._applied.popitem(last=False)
+        if self._rnd.random() < self.lost_response_rate:
+            raise GatewayError(f"{provider}: timeout esperando respuesta de {step}")
+        return result
+
+    def stats(self) -> dict:
+        return {"calls": self.calls, "replays": self.replays, "charges": self.charges}
+
+
+class PaymentPipeline:
+    def __init__(self, gateway: Gateway, default_limit: int = 32, provider_limits: dict | None = None,
+                 max_attempts: int = 3, retry_backoff: float = 0.05):
+        if default_limit < 1 or max_attempts < 1:
+            raise ValueError("default_limit y max_attempts deben ser >= 1")
+        self.gateway = gateway
+        self.default_limit = default_limit
+        self.provider_limits = dict(provider_limits or {})
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self._semaphores = {}
+        self._semaphores_loop = None
+        self._in_flight = {}
+        self.retries = 0
+        self.results = {}  # status -> conteo
+
+    def _semaphore(self, provider: str) -> asyncio.Semaphore:
+        # Los semáforos quedan ligados a su event loop; se recrean si cambia
+        loop = asyncio.get_running_loop()
+        if loop is not self._semaphores_loop:
+            self._semaphores = {}
+            self._semaphores_loop = loop
+        sem = self._semaphores.get(provider)
+        if sem is None:
+            sem = self._semaphores[provider] = asyncio.Semaphore(
+                self.provider_limits.get(provider, self.default_limit))
+        return sem
+
+    async def _call(self, provider: str, step: str, payment: dict, key: str) -> dict:
+        sem = self._semaphore(provider)
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                async with sem:
+                    self._in_flight[provider] = self._in_flight.get(provider, 0) + 1
+                    try:
+                        return await self.gateway.call(provider, step, payment, key)
+                    finally:
+                        self._in_flight[provider] -= 1
+            except GatewayError as e:
+                if attempt == self.max_attempts:
+                    return {"status": "failed", "error": str(e), "attempts": attempt}
+                self.retries += 1
+                await asyncio.sleep(self.retry_backoff * (2 ** (attempt - 1)))
+
+    async def execute(self, route: dict, idempotency_key: str) -> dict:
+        """Ejecuta los pasos de `route` en orden; se detiene en el primero que no sea "ok"."""
+        provider = route.get("routed_to") or route.get("method")
+        payment = {k: route.get(k) for k in ("method", "amount", "currency", "metadata")}
+        start = time.perf_counter()
+        status = "completed"
+        done = []
+        steps = list(route.get("steps", []))
+        for step in steps:
+            result = await self._call(provider, step, payment, f"{idempotency_key}:{step}")
+            done.append({"step": step, **result})
+            if result["status"] != "ok":
+                status = result["status"]
+                break
+        self.results[status] = self.results.get(status, 0) + 1
+        return {
+            "idempotency_key": idempotency_key,
+            "provider": provider,
+            "status": status,
+            "steps": done,
+            "pending_steps": steps[len(done):] if status == "pending" else [],
+            "elapsed_ms": round((time.perf_counter() - start) * 1000, 3),
+        }
+
+    async def execute_many(self, items) -> list[dict]:
+        """items: iterable de (route, idempotency_key); devuelve los resultados en el mismo orden."""
+        return await asyncio.gather(*(self.execute(route, key) for route, key in items))
+
+    def stats(self) -> dict:
+        return {
+            "default_limit": self.default_limit,
+            "provider_limits": self.provider_limits,
+            "in_flight": {p: n for p, n in self._in_flight.items() if n},
+            "retries": self.retries,
+            "results": dict(self.results),
+        }
+
+
+class PipelineRunner:
+    """Event loop en un hilo de fondo; run() bloquea al hilo llamante hasta el resultado."""
+
+    def __init__(self, pipeline: PaymentPipeline):
+        self.pipeline = pipeline
+        self._loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        if self._loop is None:
+            with self._lock:
+                if self._loop is None:
+                    loop = asyncio.new_event_loop()
+                    self._thread = threading.Thread(target=loop.run_forever,
+                                                    name="agente-payment-pipeline", daemon=True)
+                    self._thread.start()
+                    self._loop = loop
+
+    def run(self, coro, timeout: float | None = None):
+        self._ensure_started()
+        future = asyncio.run_coroutine_threadsafe(coro, self._loop)
+        try:
+            return future.result(timeout)
+        except TimeoutError:
+            future.cancel()
+            raise
+
+    def execute(self, route: dict, idempotency_key: str, timeout: float | None = None) -> dict:
+        return self.run(self.pipeline.execute(route, idempotency_key), timeout)
+
+    def stop(self):
+        with self._lock:
+            loop, self._loop = self._loop, None
+        if loop is not None:
+            loop.call_soon_threadsafe(loop.stop)
+            self._thread.join(timeout=5)
+            loop.close()
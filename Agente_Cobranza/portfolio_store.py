@@ -0,0 +1,301 @@
+"""
+Cartera completa en memoria para scoring offline (campañas, simulaciones).
+
+En lugar de un dict por fila, los métodos de pago se guardan por columnas en
+`array`: los campos repetidos (`type`, `provider`, `segmento`, `last4`,
+`metadata`) como códigos de un Interner, los id UUID como 16 bytes y los
+created_at con formato de SQLite como un entero AAAAMMDDhhmmss (los valores que
+no cumplen el formato se guardan tal cual aparte). Los métodos quedan ordenados por
+cliente (is_default DESC, created_at ASC, igual que la consulta del agente) con
+un índice de offsets estilo CSR: methods_for(customer_id) es un dict lookup y un
+slice.
+
+    store = PortfolioStore.load_from_db(conn)
+    store.load_contexts(contextos)          # segmento, amount_due, dpd, propension_pago
+    store.methods_for(customer_id)          # [dict] como load_payment_methods_for_customer
+    store.context_for(customer_id)          # dict listo para build_decision
+
+De customers sólo se guarda el id: el nombre, email, etc. no participan en la
+decisión del agente.
+"""
+from array import array
+from uuid import UUID
+
+from fast_json import parse_raw_json
+
+METHOD_COLUMNS = ["id", "customer_id", "type", "provider", "last4", "expiry_month",
+                  "expiry_year", "is_default", "created_at", "metadata"]
+
+
+class Interner:
+    """Valores repetidos (tipo, proveedor, segmento) <-> códigos enteros pequeños."""
+
+    __slots__ = ("values", "_codes")
+
+    def __init__(self):
+        self.values = [None]  # código 0 = None
+        self._codes = {None: 0}
+
+    def code(self, value) -> int:
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def __len__(self):
+        return len(self.values)
+
+
+class UUIDColumn:
+    """Ids UUID canónicos como 16 bytes; cualquier otro id se guarda tal cual en `other`."""
+
+    __slots__ = ("data", "other", "_size")
+
+    def __init__(self):
+        self.data = bytearray()
+        self.other = {}
+        self._size = 0
+
+    def append(self, value: str):
+        try:
+            uid = UUID(value)
+        except (TypeError, ValueError, AttributeError):
+            uid = None
+        if uid is not None and str(uid) == value:
+            self.data += uid.bytes
+        else:
+            self.data += bytes(16)
+            self.other[self._size] = value
+        self._size += 1
+
+    def __getitem__(self, i: int) -> str:
+        if i in self.other:
+            return self.other[i]
+        h = self.data[i * 16:i * 16 + 16].hex()
+        return f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}"
+
+    def __len__(self):
+        return self._size
+
+
+class TimestampColumn:
+    """Fechas 'AAAA-MM-DD hh:mm:ss' (datetime('now') de SQLite) como enteros de 8 bytes."""
+
+    __slots__ = ("data", "other")
+
+    def __init__(self):
+        self.data = array("q")
+        self.other = {}
+
+    def append(self, value):
+        if (isinstance(value, str) and len(value) == 19 and value[4] == value[7] == "-"
+                and value[10] == " " and value[13] == value[16] == ":"):
+            digits = value[0:4] + value[5:7] + value[8:10] + value[11:13] + value[14:16] + value[17:19]
+            if digits.isdigit():
+                self.data.append(int(digits))
+                return
+        self.other[len(self.data)] = value
+        self.data.append(-1)
+
+    def __getitem__(self, i: int):
+        v = self.data[i]
+        if v < 0:
+            return self.other[i]
+        d = f"{v:014d}"
+        return f"{d[0:4]}-{d[4:6]}-{d[6:8]} {d[8:10]}:{d[10:12]}:{d[12:14]}"
+
+    def __len__(self):
+        return len(self.data)
+
+
+class PortfolioStore:
+    def __init__(self):
+        self.customer_ids = []
+        self._customer_index = {}  # customer_id -> fila
+        self.types = Interner()
+        self.providers = Interner()
+        self.segments = Interner()
+        self.last4s = Interner()
+        self.metadatas = Interner()
+        self._metadata_objects = {}  # código -> metadata decodificada (una vez por valor distinto)
+
+        # Métodos de pago por columnas, agrupados por cliente en orden de preferencia
+        self.method_offsets = array("I", [0])  # métodos del cliente i: [offsets[i], offsets[i+1])
+        self.method_ids = UUIDColumn()
+        self.method_type = array("B")
+        self.method_provider = array("H")
+        self.method_last4 = array("I")
+        self.method_expiry_month = array("b")  # 0 = sin dato
+        self.method_expiry_year = array("h")   # 0 = sin dato
+        self.method_is_default = array("b")
+        self.method_created_at = TimestampColumn()
+        self.method_metadata = array("I")
+
+        # Contexto de cobranza por cliente (misma fila que customer_ids)
+        self.ctx_segment = array("H")
+        self.ctx_amount_due = array("d")
+        self.ctx_dpd = array("i")
+        self.ctx_propension = array("d")
+        self.ctx_loaded = array("b")
+
+    # -----------------------------------------------------------------
+    # Carga
+    # -----------------------------------------------------------------
+    def add_customer(self, customer_id: str, methods=()) -> int:
+        """
+        Agrega un cliente con sus métodos (tuplas en el orden de METHOD_COLUMNS,
+        ya ordenadas por preferencia). Devuelve la fila del cliente.
+        """
+        row = self._customer_index.get(customer_id)
+        if row is not None:
+            raise ValueError(f"Cliente duplicado en la cartera: {customer_id}")
+        row = self._customer_index[customer_id] = len(self.customer_ids)
+        self.customer_ids.append(customer_id)
+        for m in methods:
+            self.method_ids.append(m[0])
+            self.method_type.append(self.types.code(m[2]))
+            self.method_provider.append(self.providers.code(m[3]))
+            self.method_last4.append(self.last4s.code(m[4]))
+            self.method_expiry_month.append(m[5] or 0)
+            self.method_expiry_year.append(m[6] or 0)
+            self.method_is_default.append(1 if m[7] else 0)
+            self.method_created_at.append(m[8])
+            self.method_metadata.append(self.metadatas.code(m[9]))
+        self.method_offsets.append(len(self.method_ids))
+        self.ctx_segment.append(0)
+        self.ctx_amount_due.append(0.0)
+        self.ctx_dpd.append(0)
+        self.ctx_propension.append(0.0)
+        self.ctx_loaded.append(0)
+        return row
+
+    @classmethod
+    def load_from_db(cls, conn, batch_size: int = 5000) -> "PortfolioStore":
+        """Carga clientes y métodos con dos cursores ordenados por customer_id (sin materializar filas)."""
+        store = cls()
+        customers = conn.cursor()
+        customers.execute("SELECT id FROM customers ORDER BY id")
+        methods = conn.cursor()
+        methods.execute(f"""
+            SELECT {", ".join(METHOD_COLUMNS)}
+            FROM payment_methods
+            ORDER BY customer_id, is_default DESC, created_at ASC
+        """)
+        pending = _iter_rows(methods, batch_size)
+        current = next(pending, None)
+        for (customer_id,) in _iter_rows(customers, batch_size):
+            group = []
+            # Descarta métodos huérfanos (customer_id < cliente actual)
+            while current is not None and current[1] < customer_id:
+                current = next(pending, None)
+            while current is not None and current[1] == customer_id:
+                group.append(current)
+                current = next(pending, None)
+            store.add_customer(customer_id, group)
+        return store
+
+    def load_contexts(self, contexts) -> int:
+        """
+        Carga el contexto de cobranza (segmento, amount_due, dpd, propension_pago)
+        de cada cliente; ignora los customer_id que no están en la cartera.
+        """
+        loaded = 0
+        for ctx in contexts:
+            row = self._customer_index.get(ctx["customer_id"])
+            if row is None:
+                continue
+            self.ctx_segment[row] = self.segments.code(ctx.get("segmento"))
+            self.ctx_amount_due[row] = float(ctx.get("amount_due") or 0)
+            self.ctx_dpd[row] = int(ctx.get("dpd") or 0)
+            self.ctx_propension[row] = float(ctx.get("propension_pago", 0.5))
+            self.ctx_loaded[row] = 1
+            loaded += 1
+        return loaded
+
+    # -----------------------------------------------------------------
+    # Lectura
+    # -----------------------------------------------------------------
+    def __len__(self):
+        return len(self.customer_ids)
+
+    def __contains__(self, customer_id):
+        return customer_id in self._customer_index
+
+    def method_count(self) -> int:
+        return len(self.method_ids)
+
+    def _method_dict(self, i: int, customer_id: str) -> dict:
+        return {
+            "id": self.method_ids[i],
+            "customer_id": customer_id,
+            "type": self.types.values[self.method_type[i]],
+            "provider": self.providers.values[self.method_provider[i]],
+            "last4": self.last4s.values[self.method_last4[i]],
+            "expiry_month": self.method_expiry_month[i] or None,
+            "expiry_year": self.method_expiry_year[i] or None,
+            "is_default": self.method_is_default[i],
+            "created_at": self.method_created_at[i],
+            "metadata": self._metadata(self.method_metadata[i]),
+        }
+
+    def _metadata(self, code: int):
+        try:
+            return self._metadata_objects[code]
+        except KeyError:
+            value = self._metadata_objects[code] = parse_raw_json(self.metadatas.values[code])
+            return value
+
+    def methods_for(self, customer_id: str) -> list[dict]:
+        """Métodos del cliente como dicts, en el mismo orden que la consulta del agente."""
+        row = self._customer_index.get(customer_id)
+        if row is None:
+            return []
+        return [self._method_dict(i, customer_id)
+                for i in range(self.method_offsets[row], self.method_offsets[row + 1])]
+
+    def best_method(self, customer_id: str) -> dict | None:
+        """Equivale a choose_best_method(methods_for(customer_id)) sin materializar el resto."""
+        row = self._customer_index.get(customer_id)
+        if row is None or self.method_offsets[row] == self.method_offsets[row + 1]:
+            return None
+        return self._method_dict(self.method_offsets[row], customer_id)
+
+    def methods_by_customer(self, customer_ids) -> dict:
+        """Misma forma que get_payment_methods_for_customers de app.py."""
+        return {cid: self.methods_for(cid) for cid in dict.fromkeys(customer_ids)}
+
+    def context_for(self, customer_id: str) -> dict | None:
+        row = self._customer_index.get(customer_id)
+        if row is None or not self.ctx_loaded[row]:
+            return None
+        return {
+            "customer_id": customer_id,
+            "segmento": self.segments.values[self.ctx_segment[row]],
+            "amount_due": self.ctx_amount_due[row],
+            "dpd": self.ctx_dpd[row],
+            "propension_pago": self.ctx_propension[row],
+        }
+
+    def iter_contexts(self):
+        for row, customer_id in enumerate(self.customer_ids):
+            if self.ctx_loaded[row]:
+                yield self.context_for(customer_id)
+
+    def stats(self) -> dict:
+        return {
+            "customers": len(self.customer_ids),
+            "payment_methods": len(self.method_ids),
+            "contexts": sum(self.ctx_loaded),
+            "types": self.types.values[1:],
+            "providers": self.providers.values[1:],
+            "segments": self.segments.values[1:],
+        }
+
+
+def _iter_rows(cursor, batch_size: int):
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return
+        yield from rows
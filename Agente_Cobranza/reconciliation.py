@@ -0,0 +1,371 @@
+"""
+Referencias de pago en efectivo (corresponsal / OXXO) y conciliación.
+
+Emisión: issue_reference() guarda en `cash_references` un código numérico de 14
+dígitos (con dígito verificador Luhn), el monto en centavos y su vencimiento
+(48 h por defecto, como anuncia CorresponsalStrategy).
+
+Conciliación: la red de efectivo manda un archivo diario de liquidación CSV
+(`referencia,monto,fecha_pago[,...]`, encabezado opcional). reconcile_stream()
+lo lee por bloques de bytes y hace un hash join contra las referencias del
+periodo (dict código -> fila, montos y vencimientos en `array`), clasificando
+cada línea como:
+
+    matched          referencia abierta, monto exacto, pagada antes del vencimiento
+    already_applied  ya conciliada por este mismo archivo (re-ejecución)
+    duplicate        referencia ya pagada (o repetida en el archivo)
+    expired          pagada después del vencimiento
+    amount_mismatch  monto distinto al de la referencia
+    unmatched        referencia desconocida
+    invalid          línea mal formada
+
+Las conciliadas se marcan `paid` por bloques (cada bloque en su transacción) y al
+final las referencias abiertas vencidas pasan a `expired`.
+
+Uso como CLI (desde Agente_Cobranza/):
+    python reconciliation.py liquidacion_oxxo.csv [--db agente_cobranza.db] [--dry-run]
+"""
+import argparse
+import json
+import math
+import secrets
+import sqlite3
+import sys
+import time
+from array import array
+from datetime import datetime, timedelta
+
+REFERENCE_HOURS = 48
+DEFAULT_LOOKBACK_DAYS = 30
+READ_CHUNK_BYTES = 8 * 1024 * 1024
+APPLY_CHUNK_SIZE = 50_000
+MAX_REPORTED_ITEMS = 1000
+TIMESTAMP_CACHE_SIZE = 200_000
+OUTCOMES = ["matched", "already_applied", "duplicate", "expired", "amount_mismatch", "unmatched", "invalid"]
+
+# Estados en memoria de cada referencia cargada
+_OPEN, _PAID, _EXPIRED, _PAID_BY_SOURCE = 0, 1, 2, 3
+_STATES = {"open": _OPEN, "paid": _PAID, "expired": _EXPIRED}
+
+
+# ---------------------------------------------------------------------
+# Emisión
+# ---------------------------------------------------------------------
+def luhn_digit(digits: str) -> str:
+    total = 0
+    for i, ch in enumerate(reversed(digits)):
+        d = int(ch)
+        if i % 2 == 0:
+            d *= 2
+            if d > 9:
+                d -= 9
+        total += d
+    return str((10 - total % 10) % 10)
+
+
+def generate_reference_code(prefix: str = "93") -> str:
+    body = prefix + "".join(str(secrets.randbelow(10)) for _ in range(13 - len(prefix)))
+    return body + luhn_digit(body)
+
+
+def _db_time(dt: datetime) -> str:
+    # Mismo formato que datetime('now') de SQLite, comparable como texto
+    return dt.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def issue_reference(conn, customer_id: str | None, amount, currency: str = "MXN",
+                    provider: str = "oxxo_pay", hours: float = REFERENCE_HOURS,
+                    idempotency_key: str | None = None, now: datetime | None = None) -> dict:
+    """Crea y confirma una referencia abierta; reintenta si el código aleatorio ya existe."""
+    amount = float(amount)
+    if not math.isfinite(amount):
+        raise ValueError("El monto de la referencia debe ser un número finito")
+    amount_cents = int(round(amount * 100))
+    if amount_cents <= 0:
+        raise ValueError("El monto de la referencia debe ser mayor a 0")
+    now = now or datetime.utcnow()
+    created_at, expires_at = _db_time(now), _db_time(now + timedelta(hours=hours))
+    for _ in range(5):
+        code = generate_reference_code()
+        try:
+            conn.execute("""
+                INSERT INTO cash_references
+                    (reference, customer_id, amount_cents, currency, provider, status,
+                     created_at, expires_at, idempotency_key)
+                VALUES (?, ?, ?, ?, ?, 'open', ?, ?, ?)
+            """, (code, customer_id, amount_cents, currency, provider, created_at, expires_at, idempotency_key))
+            conn.commit()
+            break
+        except sqlite3.IntegrityError:
+            conn.rollback()
+    else:
+        raise RuntimeError("No se pudo generar una referencia única")
+    return {
+        "reference": code,
+        "customer_id": customer_id,
+        "amount": amount_cents / 100,
+        "currency": currency,
+        "provider": provider,
+        "status": "open",
+        "created_at": created_at,
+        "expires_at": expires_at,
+    }
+
+
+REFERENCE_COLUMNS = ["reference", "customer_id", "amount_cents", "currency", "provider", "status",
+                     "created_at", "expires_at", "paid_at", "paid_amount_cents", "settlement_source"]
+
+
+def get_reference(conn, code: str) -> dict | None:
+    row = conn.execute(
+        f"SELECT {', '.join(REFERENCE_COLUMNS)} FROM cash_references WHERE reference = ?", (code,)
+    ).fetchone()
+    return dict(zip(REFERENCE_COLUMNS, row)) if row else None
+
+
+def sweep_expired(conn, now: datetime | None = None) -> int:
+    """Marca como `expired` las referencias abiertas cuyo vencimiento ya pasó."""
+    cursor = conn.execute(
+        "UPDATE cash_references SET status = 'expired' WHERE status = 'open' AND expires_at < ?",
+        (_db_time(now or datetime.utcnow()),))
+    conn.commit()
+    return cursor.rowcount
+
+
+# ---------------------------------------------------------------------
+# Conciliación
+# ---------------------------------------------------------------------
+def _ref_key(code):
+    """Llave del hash join: int para códigos numéricos (más compacto), texto si no."""
+    if isinstance(code, bytes):
+        if code.isdigit() and code[:1] != b"0":
+            return int(code)
+        return code.decode("utf-8", "replace")
+    if code.isdigit() and code[:1] != "0":
+        return int(code)
+    return code
+
+
+def _timestamp_int(value) -> int | None:
+    """'AAAA-MM-DD hh:mm:ss' (o con 'T') -> AAAAMMDDhhmmss; None si no cumple el formato."""
+    v = value[:19]
+    if len(v) != 19:
+        return None
+    digits = v[0:4] + v[5:7] + v[8:10] + v[11:13] + v[14:16] + v[17:19]
+    if not digits.isdigit():
+        return None
+    return int(digits)
+
+
+class ReferenceIndex:
+    """Lado de construcción del hash join: referencias del periodo en memoria."""
+
+    __slots__ = ("index", "amounts", "expires", "states")
+
+    def __init__(self):
+        self.index = {}              # llave -> fila
+        self.amounts = array("q")    # centavos
+        self.expires = array("q")    # AAAAMMDDhhmmss
+        self.states = array("b")
+
+    @classmethod
+    def load(cls, conn, source: str | None, now: datetime, lookback_days: int = DEFAULT_LOOKBACK_DAYS,
+             batch_size: int = 10000) -> "ReferenceIndex":
+        refs = cls()
+        since = _db_time(now - timedelta(days=lookback_days))
+        cursor = conn.execute("""
+            SELECT reference, amount_cents, expires_at, status, settlement_source
+            FROM cash_references
+            WHERE status IN ('open', 'expired', 'paid') AND expires_at >= ?
+        """, (since,))
+        index, amounts, expires, states = refs.index, refs.amounts, refs.expires, refs.states
+        expires_cache = {}
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for code, cents, expires_at, status, settled_by in rows:
+                index[_ref_key(code)] = len(amounts)
+                amounts.append(cents)
+                expires_int = expires_cache.get(expires_at)
+                if expires_int is None:
+                    if len(expires_cache) >= TIMESTAMP_CACHE_SIZE:
+                        expires_cache.clear()
+                    expires_int = expires_cache[expires_at] = _timestamp_int(expires_at) or 0
+                expires.append(expires_int)
+                state = _STATES.get(status, _PAID)
+                if state == _PAID and source is not None and settled_by == source:
+                    state = _PAID_BY_SOURCE
+                states.append(state)
+        return refs
+
+    def __len__(self):
+        return len(self.amounts)
+
+
+def iter_lines(stream, chunk_bytes: int = READ_CHUNK_BYTES):
+    """Genera líneas (bytes, sin fin de línea) leyendo el stream binario por bloques."""
+    rest = b""
+    while True:
+        chunk = stream.read(chunk_bytes)
+        if not chunk:
+            break
+        lines = (rest + chunk).split(b"\n")
+        rest = lines.pop()
+        for line in lines:
+            yield line.rstrip(b"\r")
+    if rest.strip():
+        yield rest.rstrip(b"\r")
+
+
+def _apply_matches(conn, updates: list, source: str | None):
+    # En orden de llave primaria las páginas del B-tree se reusan entre updates
+    updates.sort()
+    conn.executemany("""
+        UPDATE cash_references
+        SET status = 'paid', paid_at = ?, paid_amount_cents = ?, settlement_source = ?
+        WHERE reference = ? AND status IN ('open', 'expired')
+    """, [(paid_at, cents, source, code) for code, paid_at, cents in updates])
+    conn.commit()
+
+
+def reconcile_stream(conn, stream, source: str | None = None, apply: bool = True,
+                     now: datetime | None = None, lookback_days: int = DEFAULT_LOOKBACK_DAYS) -> dict:
+    """
+    Concilia un archivo de liquidación (stream binario) contra cash_references.
+    `source` identifica el archivo: re-ejecutar el mismo archivo reporta sus
+    líneas como already_applied en lugar de duplicate. Con apply=False sólo
+    reporta, sin escribir.
+    """
+    now = now or datetime.utcnow()
+    now_text = _db_time(now)
+    start = time.perf_counter()
+    refs = ReferenceIndex.load(conn, source, now, lookback_days)
+    load_seconds = time.perf_counter() - start
+
+    counts = dict.fromkeys(OUTCOMES, 0)
+    items = {k: [] for k in OUTCOMES if k not in ("matched", "already_applied")}
+    matched_cents = 0
+    updates = []
+    index, amounts, expires, states = refs.index, refs.amounts, refs.expires, refs.states
+
+    def report_item(outcome, line_num, reference, **extra):
+        counts[outcome] += 1
+        if len(items[outcome]) < MAX_REPORTED_ITEMS:
+            items[outcome].append({"line": line_num, "reference": reference, **extra})
+
+    # Las fechas de pago se repiten mucho dentro de un archivo: se memoizan
+    paid_cache = {b"": (_timestamp_int(now_text), now_text)}
+    matched = 0
+    line_num = 0
+    for line_num, line in enumerate(iter_lines(stream), start=1):
+        if not line:
+            continue
+        parts = line.split(b",")
+        try:
+            code = parts[0].strip()
+            cents = int(round(float(parts[1]) * 100))
+            paid_raw = parts[2].strip() if len(parts) > 2 else b""
+        except (IndexError, ValueError, OverflowError):
+            # OverflowError: montos como inf o 1e400; la línea es inválida, no el archivo
+            if line_num == 1:
+                continue  # encabezado
+            report_item("invalid", line_num, parts[0].decode("utf-8", "replace")[:64])
+            continue
+        paid = paid_cache.get(paid_raw)
+        if paid is None:
+            text = paid_raw[:19].decode("utf-8", "replace").replace("T", " ")
+            paid = (_timestamp_int(text), text)
+            if len(paid_cache) >= TIMESTAMP_CACHE_SIZE:
+                paid_cache.clear()
+            paid_cache[paid_raw] = paid
+        paid_at, paid_text = paid
+        if paid_at is None or not code:
+            report_item("invalid", line_num, code.decode("utf-8", "replace")[:64])
+            continue
+
+        # _ref_key en línea: es el camino más caliente del archivo
+        if code.isdigit() and code[0] != 48:
+            row = index.get(int(code))
+        else:
+            row = index.get(code.decode("utf-8", "replace"))
+        if row is None:
+            report_item("unmatched", line_num, code.decode("utf-8", "replace"), amount=cents / 100)
+            continue
+        state = states[row]
+        if state == _PAID_BY_SOURCE:
+            states[row] = _PAID
+            counts["already_applied"] += 1
+        elif state == _PAID:
+            report_item("duplicate", line_num, code.decode("utf-8", "replace"), amount=cents / 100)
+        elif paid_at > expires[row]:
+            report_item("expired", line_num, code.decode("utf-8", "replace"), amount=cents / 100)
+        elif cents != amounts[row]:
+            report_item("amount_mismatch", line_num, code.decode("utf-8", "replace"),
+                        amount=cents / 100, expected=amounts[row] / 100)
+        else:
+            states[row] = _PAID
+            matched += 1
+            matched_cents += cents
+            if apply:
+                updates.append((code.decode("utf-8", "replace"), paid_text, cents))
+                if len(updates) >= APPLY_CHUNK_SIZE:
+                    _apply_matches(conn, updates, source)
+                    updates = []
+    counts["matched"] = matched
+    if updates:
+        _apply_matches(conn, updates, source)
+
+    expired_swept = sweep_expired(conn, now) if apply else 0
+    elapsed = time.perf_counter() - start
+    return {
+        "source": source,
+        "applied": apply,
+        "lines": line_num,
+        "references_loaded": len(refs),
+        **counts,
+        "matched_amount": matched_cents / 100,
+        "references_expired": expired_swept,
+        "items": items,
+        "load_seconds": round(load_seconds, 3),
+        "seconds": round(elapsed, 3),
+        "lines_per_sec": round(line_num / elapsed) if elapsed > 0 else line_num,
+    }
+
+
+# ---------------------------------------------------------------------
+# CLI
+# ---------------------------------------------------------------------
+def main(argv=None) -> int:
+    from db_pool import ConnectionPool
+    from migrations import migrate
+
+    parser = argparse.ArgumentParser(description="Conciliación de referencias de corresponsal")
+    parser.add_argument("path", help="Archivo de liquidación CSV, o - para stdin")
+    parser.add_argument("--db", default="agente_cobranza.db")
+    parser.add_argument("--source", help="Identificador del archivo (default: nombre del archivo)")
+    parser.add_argument("--dry-run", action="store_true", help="Sólo reportar, sin marcar referencias")
+    parser.add_argument("--lookback-days", type=int, default=DEFAULT_LOOKBACK_DAYS)
+    args = parser.parse_args(argv)
+
+    pool = ConnectionPool(args.db, size=1)
+    conn = pool.acquire()
+    try:
+        migrate(conn)
+        source = args.source or (None if args.path == "-" else args.path.rsplit("/", 1)[-1])
+        if args.path == "-":
+            report = reconcile_stream(conn, sys.stdin.buffer, source, not args.dry_run,
+                                      lookback_days=args.lookback_days)
+        else:
+            with open(args.path, "rb") as f:
+                report = reconcile_stream(conn, f, source, not args.dry_run, lookback_days=args.lookback_days)
+        json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+        sys.stdout.write("\n")
+        return 0
+    finally:
+        conn.close()
+        pool.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,251 @@
+"""
+Motor de reglas de negociación configurable por campaña / brazo A/B.
+
+Un rule set (YAML o JSON) es una lista ordenada de reglas "primera que aplica":
+
+    name: campana_norte
+    default: discount
+    rules:
+      - when: {segmento: [vip, consumo_alto]}
+        tactic: installments
+      - when: {dpd_min: 60, score_max: 0.5}
+        tactic: hybrid
+
+Condiciones: `segmento` (lista), `dpd_min` / `score_min` (inclusivos) y
+`dpd_max` / `score_max` (exclusivos). En lugar de `rules` se pueden declarar
+`arms: [{name, weight, rules, default}]`; el brazo se asigna de forma
+determinista con un hash de (rule set, customer_id).
+
+Al compilar, los umbrales de todas las reglas parten dpd y score en bandas; la
+táctica de cada celda (segmento x banda dpd x banda score) se precalcula en una
+tabla por segmento, así que evaluar es un dict lookup + dos bisect sobre unos
+cuantos umbrales, sin importar cuántas reglas tenga el set.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from bisect import bisect_right
+
+VALID_TACTICS = {"discount", "installments", "hybrid"}
+RULE_FILE_EXTENSIONS = (".yaml", ".yml", ".json")
+
+# Equivalente al if-chain de select_negotiation_strategy
+DEFAULT_RULESET = {
+    "name": "default",
+    "default": "discount",
+    "rules": [
+        {"when": {"segmento": ["vip", "consumo_alto"]}, "tactic": "installments"},
+        {"when": {"dpd_min": 60, "score_max": 0.5}, "tactic": "hybrid"},
+        {"when": {"segmento": ["pyme", "consumo"], "dpd_max": 60}, "tactic": "discount"},
+    ],
+}
+
+
+class RuleSetError(ValueError):
+    """Rule set mal formado."""
+
+
+class CompiledArm:
+    __slots__ = ("name", "dpd_bounds", "score_bounds", "rows", "other")
+
+    def __init__(self, name: str, rules: list, default: str):
+        self.name = name
+        if default not in VALID_TACTICS:
+            raise RuleSetError(f"Táctica por defecto inválida en '{name}': {default}")
+
+        parsed = [_parse_rule(rule, name) for rule in rules]
+        segment_names = sorted({s for r in parsed if r["segmento"] for s in r["segmento"]})
+        self.dpd_bounds = sorted({b for r in parsed for b in (r["dpd_min"], r["dpd_max"]) if b is not None})
+        self.score_bounds = sorted({b for r in parsed for b in (r["score_min"], r["score_max"]) if b is not None})
+
+        dpd_lows = [float("-inf")] + self.dpd_bounds
+        score_lows = [float("-inf")] + self.score_bounds
+        seg_keys = [None] + segment_names   # None = cualquier segmento no nombrado en las reglas
+
+        # rows[segmento][banda dpd][banda score] = (táctica, brazo): dos índices de
+        # tupla, sin aritmética, y el resultado ya armado
+        rows = {
+            seg: tuple(tuple((_first_match(parsed, seg, dpd_low, score_low, default), name)
+                             for score_low in score_lows)
+                       for dpd_low in dpd_lows)
+            for seg in seg_keys
+        }
+        self.other = rows.pop(None)
+        self.rows = rows
+
+
+def _parse_rule(rule: dict, arm: str) -> dict:
+    if not isinstance(rule, dict) or rule.get("tactic") not in VALID_TACTICS:
+        raise RuleSetError(f"Regla inválida en '{arm}': {rule!r}")
+    when = rule.get("when") or {}
+    unknown = set(when) - {"segmento", "dpd_min", "dpd_max", "score_min", "score_max"}
+    if unknown:
+        raise RuleSetError(f"Condiciones desconocidas en '{arm}': {', '.join(sorted(unknown))}")
+    segmento = when.get("segmento")
+    if isinstance(segmento, str):
+        segmento = [segmento]
+    return {
+        "segmento": {s.lower() for s in segmento} if segmento else None,
+        "dpd_min": _number(when.get("dpd_min")),
+        "dpd_max": _number(when.get("dpd_max")),
+        "score_min": _number(when.get("score_min")),
+        "score_max": _number(when.get("score_max")),
+        "tactic": rule["tactic"],
+    }
+
+
+def _number(value):
+    return None if value is None else float(value)
+
+
+def _first_match(rules: list, seg, dpd_low: float, score_low: float, default: str) -> str:
+    # Dentro de una banda todas las condiciones son constantes: basta evaluar
+    # su límite inferior (x >= min ⇔ low >= min; x < max ⇔ low < max).
+    for r in rules:
+        if r["segmento"] is not None and seg not in r["segmento"]:
+            continue
+        if r["dpd_min"] is not None and not dpd_low >= r["dpd_min"]:
+            continue
+        if r["dpd_max"] is not None and not dpd_low < r["dpd_max"]:
+            continue
+        if r["score_min"] is not None and not score_low >= r["score_min"]:
+            continue
+        if r["score_max"] is not None and not score_low < r["score_max"]:
+            continue
+        return r["tactic"]
+    return default
+
+
+class CompiledRuleSet:
+    __slots__ = ("name", "arms", "total_weight", "cumulative", "_single")
+
+    def __init__(self, spec: dict):
+        if not isinstance(spec, dict) or not spec.get("name"):
+            raise RuleSetError("El rule set necesita un 'name'")
+        self.name = str(spec["name"])
+        default = spec.get("default", "discount")
+        arm_specs = spec.get("arms") or [{"name": "control", "weight": 1,
+                                          "rules": spec.get("rules", []), "default": default}]
+        self.arms = []
+        self.cumulative = []
+        total = 0
+        for arm in arm_specs:
+            weight = int(arm.get("weight", 1))
+            if weight <= 0:
+                raise RuleSetError(f"Peso inválido en el brazo '{arm.get('name')}'")
+            total += weight
+            self.arms.append(CompiledArm(str(arm.get("name", f"arm{len(self.arms)}")),
+                                         arm.get("rules", []), arm.get("default", default)))
+            self.cumulative.append(total)
+        self.total_weight = total
+        # Sin A/B no hay brazo que asignar: evaluate() evita el hash y la llamada
+        self._single = self.arms[0] if len(self.arms) == 1 else None
+
+    def assign_arm(self, customer_id: str | None) -> CompiledArm:
+        if len(self.arms) == 1:
+            return self.arms[0]
+        digest = hashlib.blake2b(f"{self.name}:{customer_id}".encode(), digest_size=8).digest()
+        bucket = int.from_bytes(digest, "big") % self.total_weight
+        return self.arms[bisect_right(self.cumulative, bucket)]
+
+    def evaluate(self, segmento, dpd: int, score: float, customer_id=None) -> tuple[str, str]:
+        arm = self._single
+        if arm is None:
+            arm = self.assign_arm(customer_id)
+        # La búsqueda va aquí y no en un método del brazo: una llamada menos por evaluación.
+        # El segmento casi siempre llega ya en minúsculas: lower() sólo si no se encuentra
+        rows = arm.rows.get(segmento)
+        if rows is None:
+            rows = arm.rows.get(segmento.lower(), arm.other) if segmento else arm.other
+        return rows[bisect_right(arm.dpd_bounds, dpd)][bisect_right(arm.score_bounds, score)]
+
+
+def load_ruleset_file(path: str) -> dict:
+    with open(path, encoding="utf-8") as f:
+        if path.endswith(".json"):
+            return json.load(f)
+        import yaml  # opcional: sólo para rule sets en YAML
+        return yaml.safe_load(f)
+
+
+class RuleRegistry:
+    """
+    Rule sets compilados, recargables en caliente desde un directorio.
+
+    reload() recompila todo y reemplaza el dict de un golpe; si un archivo es
+    inválido se conserva la versión anterior y el error queda en `errors`.
+    maybe_reload() revisa los mtime como máximo cada `check_interval` segundos.
+    """
+
+    def __init__(self, directory: str | None = None, check_interval: float = 5.0):
+        self.directory = directory
+        self.check_interval = check_interval
+        self.rulesets = {"default": CompiledRuleSet(DEFAULT_RULESET)}
+        self.errors = {}
+        self.loaded_at = None
+        self.version = None
+        self._mtimes = {}
+        self._sources = {}
+        self._specs = {}
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+
+    def _scan(self) -> dict:
+        if not self.directory or not os.path.isdir(self.directory):
+            return {}
+        return {
+            entry.path: entry.stat().st_mtime
+            for entry in os.scandir(self.directory)
+            if entry.is_file() and entry.name.endswith(RULE_FILE_EXTENSIONS)
+        }
+
+    def reload(self) -> dict:
+        with self._lock:
+            mtimes = self._scan()
+            rulesets = {"default": CompiledRuleSet(DEFAULT_RULESET)}
+            sources, errors, specs = {}, {}, {}
+            for path in sorted(mtimes):
+                try:
+                    spec = load_ruleset_file(path)
+                    compiled = CompiledRuleSet(spec)
+                except Exception as e:
+                    errors[os.path.basename(path)] = str(e)
+                    # Conserva la última versión válida que vino de ese archivo
+                    for name, source in self._sources.items():
+                        if source == path and name in self.rulesets:
+                            rulesets[name] = self.rulesets[name]
+                            sources[name] = path
+                    continue
+                rulesets[compiled.name] = compiled
+                sources[compiled.name] = path
+                specs[compiled.name] = spec
+            self.rulesets = rulesets
+            self._sources = sources
+            self.errors = errors
+            self._mtimes = mtimes
+            self.loaded_at = time.time()
+            # Versión por contenido (igual en todos los workers); un set con errores
+            # conserva su versión anterior y no la cambia
+            previous = self._specs
+            specs.update({name: previous[name] for name in rulesets if name not in specs and name in previous})
+            self._specs = specs
+            payload = json.dumps(specs, sort_keys=True, ensure_ascii=False, default=str)
+            self.version = hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+            return {"rulesets": sorted(rulesets), "errors": errors, "version": self.version}
+
+    def maybe_reload(self):
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        self._next_check = now + self.check_interval
+        if self._scan() != self._mtimes:
+            self.reload()
+
+    def get(self, name: str) -> CompiledRuleSet:
+        ruleset = self.rulesets.get(name)
+        if ruleset is None:
+            raise ValueError(f"Rule set no encontrado: {name}")
+        return ruleset
+
@@ -0,0 +1,77 @@
+"""
+Servidor de producción: app Flask detrás del adaptador ASGI (asgi.py) en uvicorn.
+
+Requiere `pip install uvicorn`. Desde Agente_Cobranza/:
+
+    python serve.py --port 6012 --workers 4 --threads 16
+
+Cada proceso worker corre su propio executor acotado y su propio pool SQLite.
+Las opciones también se pueden dar por variables de entorno (AGENTE_SERVE_*).
+"""
+import argparse
+import os
+
+from app import app, init_db, get_pool, payment_runner, close_decision_log
+from asgi import WSGIToASGI
+
+THREADS = int(os.environ.get("AGENTE_SERVE_THREADS", "16"))
+MAX_CONCURRENCY = int(os.environ.get("AGENTE_SERVE_MAX_CONCURRENCY", str(THREADS * 4)))
+QUEUE_TIMEOUT = float(os.environ.get("AGENTE_SERVE_QUEUE_TIMEOUT", "5"))
+
+
+def shutdown():
+    payment_runner.stop()
+    close_decision_log()
+    get_pool().close()
+
+
+asgi_app = WSGIToASGI(
+    app,
+    max_workers=THREADS,
+    max_concurrency=MAX_CONCURRENCY,
+    queue_timeout=QUEUE_TIMEOUT,
+    on_shutdown=shutdown,
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor ASGI del Agente de Cobranza")
+    parser.add_argument("--host", default=os.environ.get("AGENTE_SERVE_HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("AGENTE_SERVE_PORT", "6012")))
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("AGENTE_SERVE_WORKERS", "1")),
+                        help="procesos uvicorn")
+    parser.add_argument("--threads", type=int, default=THREADS,
+                        help="hilos del executor por proceso (trabajo de Flask/SQLite)")
+    parser.add_argument("--max-concurrency", type=int, default=None,
+                        help="peticiones en curso por proceso antes de encolar (default threads*4)")
+    parser.add_argument("--queue-timeout", type=float, default=QUEUE_TIMEOUT,
+                        help="segundos máximos en cola antes de responder 503")
+    parser.add_argument("--keep-alive", type=int, default=int(os.environ.get("AGENTE_SERVE_KEEP_ALIVE", "5")),
+                        help="segundos de keep-alive HTTP")
+    parser.add_argument("--graceful-timeout", type=int,
+                        default=int(os.environ.get("AGENTE_SERVE_GRACEFUL_TIMEOUT", "30")),
+                        help="segundos para drenar peticiones en el shutdown")
+    args = parser.parse_args()
+
+    import uvicorn
+
+    # Los workers importan este módulo de nuevo: la configuración viaja por entorno
+    os.environ["AGENTE_SERVE_THREADS"] = str(args.threads)
+    os.environ["AGENTE_SERVE_MAX_CONCURRENCY"] = str(args.max_concurrency or args.threads * 4)
+    os.environ["AGENTE_SERVE_QUEUE_TIMEOUT"] = str(args.queue_timeout)
+
+    init_db()
+    uvicorn.run(
+        "serve:asgi_app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        lifespan="on",
+        timeout_keep_alive=args.keep_alive,
+        timeout_graceful_shutdown=args.graceful_timeout,
+        access_log=False,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Single-flight: peticiones concurrentes con la misma llave comparten un cálculo.
+
+El contacto omnicanal suele pedir la misma decisión varias veces en pocos
+milisegundos (webhooks de la app y de WhatsApp, reintentos del cliente). La
+primera petición con una llave (el líder) ejecuta la función; las que llegan
+mientras está en vuelo esperan y reciben el mismo resultado, o la misma
+excepción. Al terminar la llave se libera: no es una caché, la siguiente
+petición vuelve a calcular.
+
+    flight = SingleFlight(on_result=metrics.decision_coalesce_total.inc)
+    result, shared = flight.do(("c-1", context_hash), lambda: compute(...))
+
+El resultado se entrega tal cual a todos: quien lo use no debe modificarlo.
+
+Funciona con hilos (servidor de desarrollo, gunicorn con threads) y bajo
+serve.py: el adaptador ASGI ejecuta cada petición WSGI en un hilo del executor,
+así que las peticiones concurrentes del servidor async también se encuentran
+aquí. El líder no espera a nadie y los seguidores sólo bloquean su propio hilo.
+"""
+import threading
+
+
+class _Call:
+    __slots__ = ("done", "result", "error", "followers")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.followers = 0
+
+
+class SingleFlight:
+    def __init__(self, on_result=None):
+        self.on_result = on_result      # on_result(resultado): "leader" o "coalesced" -> métricas
+        self._lock = threading.Lock()
+        self._calls = {}                # llave -> _Call en vuelo
+        self.counts = {"leader": 0, "coalesced": 0, "errors": 0}
+
+    def _count(self, result: str):
+        with self._lock:
+            self.counts[result] += 1
+        if self.on_result is not None and result != "errors":
+            self.on_result(result)
+
+    def do(self, key, fn) -> tuple:
+        """(resultado de fn(), True si se compartió el de otra petición en vuelo)."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.followers += 1
+
+        if not leader:
+            self._count("coalesced")
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        self._count("leader")
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            self._count("errors")
+            raise
+        finally:
+            # Se retira antes de despertar a los seguidores: quien llegue después calcula de nuevo
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "in_flight": len(self._calls),
+                "waiting": sum(call.followers for call in self._calls.values()),
+                **self.counts,
+            }
@@ -0,0 +1,491 @@
+"""
+Plantillas de speech por táctica, canal y locale, compiladas al cargar.
+
+Un set de plantillas (YAML o JSON) cubre un locale y un canal:
+
+    locale: es-MX
+    channel: sms
+    max_length: 160
+    parts:
+      ruta: "Paga {amount:,.2f} {currency} en {routed_to}."
+    templates:
+      discount: ["Descuento de {discount_pct|pct}% si liquidas en 10 días. {@ruta}",
+                 "{discount_pct|pct}% de descuento. {@ruta}"]
+      installments: "Paga en {installments} meses sin intereses. {@ruta}"
+      hybrid: "{discount_pct|pct}% de descuento y {installments} meses sin intereses. {@ruta}"
+      none: "{@ruta}"
+
+Campos: `amount`, `currency`, `method`, `routed_to`, `steps` (unidos con " → "),
+`reference_hours` y, según la táctica, `discount_pct` e `installments`. Un campo
+acepta formato de Python (`{amount:,.2f}`) y el filtro `|pct` (fracción a
+porcentaje entero); `{@nombre}` inserta un fragmento de `parts` y `{{`/`}}` son
+llaves literales. Con `arms: [{name, weight, templates}]` el set se parte en
+brazos A/B asignados por hash de (set, customer_id); cada brazo hereda las
+plantillas del set que no redefina.
+
+Al compilar, cada plantilla se convierte en una función que arma el texto con
+un solo f-string leyendo la ruta y la propuesta, así que renderizar no vuelve a
+interpretar la plantilla. Una táctica puede tener varias plantillas ordenadas
+de la más completa a la más corta: se usa la primera que cabe en el presupuesto
+de longitud del canal y, si ninguna cabe, se corta en una palabra con "…".
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+from bisect import bisect_right
+from string import Formatter
+
+from rules_engine import RULE_FILE_EXTENSIONS, load_ruleset_file
+
+TACTICS = ("discount", "installments", "hybrid", "none")
+DEFAULT_LOCALE = "es-MX"
+DEFAULT_CHANNEL = "default"
+LOCALE_BY_CURRENCY = {"MXN": "es-MX", "COP": "es-CO"}
+# Presupuesto de caracteres por canal: un segmento SMS, ~20 s de TTS en IVR y
+# el límite de cuerpo de una plantilla de WhatsApp
+CHANNEL_BUDGETS = {"sms": 160, "ivr": 300, "whatsapp": 1024}
+ELLIPSIS = "…"
+# Combinaciones (locale, canal, moneda) tal como llegan que se memorizan por
+# recarga; vienen del cliente, así que pasado el límite se resuelven sin guardar
+MAX_RESOLVED = 1024
+
+# Campo -> expresión sobre r (ruta), p (propuesta) y c (moneda ya normalizada)
+ROUTE_FIELDS = {
+    "amount": "r.get('amount')",
+    "currency": "c",
+    "method": "r.get('method')",
+    "routed_to": "r.get('routed_to')",
+    "steps": "' → '.join(r.get('steps', []))",
+    "reference_hours": "r.get('reference_expires_in_hours', 48)",
+}
+PROPOSAL_FIELDS = {
+    "discount_pct": "p.get('discount_pct', 0)",
+    "installments": "p.get('installments', 3)",
+}
+TACTIC_FIELDS = {
+    "discount": ("discount_pct",),
+    "installments": ("installments",),
+    "hybrid": ("discount_pct", "installments"),
+    "none": (),
+}
+_NO_PROPOSAL = {}  # sólo lectura: las plantillas usan p.get()
+# Valores de prueba para validar los formatos al compilar
+SAMPLE_VALUES = {"amount": 1234.5, "reference_hours": 48, "discount_pct": 0.15, "installments": 6}
+
+
+def _pct(value) -> int:
+    return int(round(value * 100))
+
+
+FILTERS = {"pct": _pct}
+_SAFE_SPEC = re.compile(r"^[^{}'\"\\]*$")
+
+
+class SpeechTemplateError(ValueError):
+    """Set de plantillas mal formado."""
+
+
+class CompiledTemplate:
+    __slots__ = ("source", "static_length", "render")
+
+    def __init__(self, source: str, render, static_length: int):
+        self.source = source
+        self.render = render
+        self.static_length = static_length
+
+
+def _pieces(source: str, parts: dict, allowed: set, depth: int = 0):
+    try:
+        parsed = list(Formatter().parse(source))
+    except ValueError as e:
+        raise SpeechTemplateError(f"Plantilla inválida {source!r}: {e}") from e
+    for literal, field, spec, conversion in parsed:
+        if literal:
+            yield ("literal", literal)
+        if field is None:
+            continue
+        if field.startswith("@"):
+            if depth or field[1:] not in parts:
+                raise SpeechTemplateError(f"Fragmento desconocido o anidado: {{{field}}}")
+            yield from _pieces(parts[field[1:]], parts, allowed, depth + 1)
+            continue
+        name, _, filter_name = field.partition("|")
+        if conversion or name not in allowed or (filter_name and filter_name not in FILTERS):
+            raise SpeechTemplateError(f"Campo no permitido en la plantilla: {{{field}}}")
+        if spec and not _SAFE_SPEC.match(spec):
+            raise SpeechTemplateError(f"Formato inválido en {{{field}}}: {spec!r}")
+        sample = SAMPLE_VALUES.get(name, "x")
+        try:
+            format(FILTERS[filter_name](sample) if filter_name else sample, spec or "")
+        except (ValueError, TypeError) as e:
+            raise SpeechTemplateError(f"Formato inválido en {{{field}}}: {e}") from e
+        yield ("field", name, filter_name, spec)
+
+
+def compile_template(source: str, tactic: str, parts: dict | None = None) -> CompiledTemplate:
+    """
+    Convierte la plantilla en `render(r, p, c) -> str`. Los literales se
+    incrustan con repr() y los campos sólo pueden ser los de ROUTE_FIELDS /
+    PROPOSAL_FIELDS de la táctica, así que el código generado no depende del
+    texto de la plantilla más allá de eso.
+    """
+    if not isinstance(source, str):
+        raise SpeechTemplateError(f"La plantilla de '{tactic}' debe ser texto: {source!r}")
+    allowed = set(ROUTE_FIELDS) | set(TACTIC_FIELDS[tactic])
+    lines, chunks, static_length = [], [], 0
+    for piece in _pieces(source, parts or {}, allowed):
+        if piece[0] == "literal":
+            static_length += len(piece[1])
+            chunks.append("f" + repr(piece[1].replace("{", "{{").replace("}", "}}")))
+            continue
+        _, name, filter_name, spec = piece
+        expr = ROUTE_FIELDS.get(name) or PROPOSAL_FIELDS[name]
+        if filter_name:
+            expr = f"_{filter_name}({expr})"
+        var = f"v{len(lines)}"
+        lines.append(f"    {var} = {expr}\n")
+        chunks.append(f"f'{{{var}{':' + spec if spec else ''}}}'")
+    code = "def render(r, p, c):\n" + "".join(lines) + "    return " + (" ".join(chunks) or "''") + "\n"
+    namespace = {f"_{name}": fn for name, fn in FILTERS.items()}
+    exec(compile(code, f"<speech:{tactic}>", "exec"), namespace)
+    return CompiledTemplate(source, namespace["render"], static_length)
+
+
+def _compile_tactics(templates: dict, parts: dict, budget: int | None, where: str) -> dict:
+    unknown = set(templates) - set(TACTICS)
+    if unknown:
+        raise SpeechTemplateError(f"Tácticas desconocidas en '{where}': {', '.join(sorted(unknown))}")
+    compiled = {}
+    for tactic, sources in templates.items():
+        sources = sources if isinstance(sources, list) else [sources]
+        if not sources:
+            raise SpeechTemplateError(f"'{where}' no tiene plantillas para '{tactic}'")
+        compiled[tactic] = tuple(compile_template(s, tactic, parts) for s in sources)
+        shortest = min(t.static_length for t in compiled[tactic])
+        if budget is not None and shortest > budget:
+            raise SpeechTemplateError(
+                f"'{where}/{tactic}': el texto fijo ({shortest}) ya excede el presupuesto de {budget}")
+    return compiled
+
+
+def normalize_locale(locale: str | None) -> str | None:
+    if not locale:
+        return None
+    lang, _, region = str(locale).replace("_", "-").partition("-")
+    return f"{lang.lower()}-{region.upper()}" if region else lang.lower()
+
+
+class CompiledSpeechSet:
+    __slots__ = ("name", "locale", "channel", "max_length", "arms", "total_weight", "cumulative")
+
+    def __init__(self, spec: dict):
+        if not isinstance(spec, dict):
+            raise SpeechTemplateError("El set de plantillas debe ser un objeto")
+        self.locale = normalize_locale(spec.get("locale")) or DEFAULT_LOCALE
+        self.channel = str(spec.get("channel") or DEFAULT_CHANNEL).lower()
+        self.name = str(spec.get("name") or f"{self.locale}/{self.channel}")
+        self.max_length = int(spec["max_length"]) if spec.get("max_length") else None
+        budget = self.max_length or CHANNEL_BUDGETS.get(self.channel)
+        parts = spec.get("parts") or {}
+        base = spec.get("templates") or {}
+        arm_specs = spec.get("arms") or [{"name": "control", "weight": 1}]
+
+        self.arms, self.cumulative = [], []
+        total = 0
+        for arm in arm_specs:
+            arm_name = str(arm.get("name", f"arm{len(self.arms)}"))
+            weight = int(arm.get("weight", 1))
+            if weight <= 0:
+                raise SpeechTemplateError(f"Peso inválido en el brazo '{arm_name}'")
+            templates = _compile_tactics({**base, **(arm.get("templates") or {})}, parts, budget,
+                                         f"{self.name}/{arm_name}")
+            missing = [t for t in TACTICS if t not in templates]
+            if missing:
+                raise SpeechTemplateError(f"'{self.name}/{arm_name}' no define: {', '.join(missing)}")
+            total += weight
+            self.arms.append((arm_name, templates))
+            self.cumulative.append(total)
+        self.total_weight = total
+
+    def assign_arm(self, customer_id: str | None) -> tuple[str, dict]:
+        if len(self.arms) == 1:
+            return self.arms[0]
+        digest = hashlib.blake2b(f"{self.name}:{customer_id}".encode(), digest_size=8).digest()
+        bucket = int.from_bytes(digest, "big") % self.total_weight
+        return self.arms[bisect_right(self.cumulative, bucket)]
+
+
+def fit(text: str, budget: int | None) -> str:
+    """Corta `text` en la última palabra completa que cabe en `budget` caracteres, con "…"."""
+    if budget is None or len(text) <= budget:
+        return text
+    cut = text[:budget - len(ELLIPSIS)]
+    head, space, _ = cut.rpartition(" ")
+    return (head if space and head else cut).rstrip(" ,.;:(→-") + ELLIPSIS
+
+
+# Equivalente al texto que armaba build_speech con f-strings
+DEFAULT_SPEECH_SET = {
+    "name": "default",
+    "locale": DEFAULT_LOCALE,
+    "channel": DEFAULT_CHANNEL,
+    "parts": {
+        "ruta": "Para cobrar {amount} {currency}, la mejor ruta es {method} vía {routed_to} ({steps}). "
+                "¿Deseas proceder?",
+    },
+    "templates": {
+        "discount": "Puedo ofrecerte un descuento de {discount_pct|pct}% si liquidamos en 10 días. {@ruta}",
+        "installments": "Puedo ofrecerte {installments} mensualidades sin intereses. {@ruta}",
+        "hybrid": "Puedo ofrecerte un descuento de {discount_pct|pct}% y pagar en {installments} "
+                  "mensualidades sin intereses. {@ruta}",
+        "none": "{@ruta}",
+    },
+}
+
+
+class SpeechRegistry:
+    """
+    Sets de plantillas compilados por (locale, canal), recargables en caliente
+    desde un directorio con la misma mecánica que RuleRegistry: reload()
+    recompila todo y conserva la última versión válida de un archivo con
+    errores; maybe_reload() revisa los mtime cada `check_interval` segundos.
+
+    Para un (locale, canal) pedido se usa el primer set que exista en
+    (locale, canal) → (locale, default) → (es-MX, canal) → (es-MX, default);
+    el presupuesto de longitud es siempre el del canal pedido.
+    """
+
+    def __init__(self, directory: str | None = None, check_interval: float = 5.0):
+        self.directory = directory
+        self.check_interval = check_interval
+        default = CompiledSpeechSet(DEFAULT_SPEECH_SET)
+        self.sets = {(default.locale, default.channel): default}
+        self.errors = {}
+        self.loaded_at = None
+        self.version = None
+        self.truncated = {}
+        self._truncated_lock = threading.Lock()
+        self._resolved = {}
+        self._known = self._known_targets(self.sets)
+        self._mtimes = {}
+        self._sources = {}
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+
+    def _scan(self) -> dict:
+        if not self.directory or not os.path.isdir(self.directory):
+            return {}
+        return {
+            entry.path: entry.stat().st_mtime
+            for entry in os.scandir(self.directory)
+            if entry.is_file() and entry.name.endswith(RULE_FILE_EXTENSIONS)
+        }
+
+    def reload(self) -> dict:
+        with self._lock:
+            mtimes = self._scan()
+            default = CompiledSpeechSet(DEFAULT_SPEECH_SET)
+            sets = {(default.locale, default.channel): default}
+            specs = [DEFAULT_SPEECH_SET]
+            sources, errors = {}, {}
+            for path in sorted(mtimes):
+                try:
+                    spec = load_ruleset_file(path)
+                    compiled = CompiledSpeechSet(spec)
+                except Exception as e:
+                    errors[os.path.basename(path)] = str(e)
+                    for key, (source, old_spec) in self._sources.items():
+                        if source == path and key in self.sets:
+                            sets[key] = self.sets[key]
+                            sources[key] = (source, old_spec)
+                            specs.append(old_spec)
+                    continue
+                key = (compiled.locale, compiled.channel)
+                sets[key] = compiled
+                sources[key] = (path, spec)
+                specs.append(spec)
+            self.sets = sets
+            self._known = self._known_targets(sets)
+            self._sources = sources
+            self._resolved = {}
+            self.errors = errors
+            self._mtimes = mtimes
+            self.loaded_at = time.time()
+            # Versión por contenido: igual en todos los workers con los mismos archivos
+            payload = json.dumps(specs, sort_keys=True, ensure_ascii=False, default=str)
+            self.version = hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+            return {"sets": sorted(f"{loc}/{ch}" for loc, ch in sets), "errors": errors,
+                    "version": self.version}
+
+    def maybe_reload(self):
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        self._next_check = now + self.check_interval
+        if self._scan() != self._mtimes:
+            self.reload()
+
+    @staticmethod
+    def _known_targets(sets: dict) -> tuple[set, set]:
+        return {loc for loc, _ in sets}, {ch for _, ch in sets} | set(CHANNEL_BUDGETS)
+
+    def resolve(self, locale: str | None, channel: str | None, currency: str | None = None):
+        """(set, presupuesto, canal) para lo pedido; memorizado hasta la siguiente recarga."""
+        key = (locale, channel, currency)
+        try:
+            resolved = self._resolved.get(key)
+        except TypeError:       # lista, dict...: _resolve lo rechaza
+            resolved = None
+        if resolved is None:
+            resolved = self._resolve(locale, channel, currency)
+            if len(self._resolved) < MAX_RESOLVED:
+                self._resolved[key] = resolved
+        return resolved
+
+    def _resolve(self, locale, channel, currency):
+        for name, value in (("locale", locale), ("channel", channel)):
+            if value is not None and not isinstance(value, str):
+                raise ValueError(f"{name} debe ser texto")
+        locales, channels = self._known
+        loc = normalize_locale(locale) or LOCALE_BY_CURRENCY.get(currency) or DEFAULT_LOCALE
+        ch = channel.lower() if channel else DEFAULT_CHANNEL
+        # Un locale o canal sin set ni presupuesto se resuelve igual que el de
+        # respaldo; normalizarlo deja el resultado (y `truncated`) sobre valores conocidos
+        loc = loc if loc in locales else DEFAULT_LOCALE
+        ch = ch if ch in channels else DEFAULT_CHANNEL
+        for candidate in ((loc, ch), (loc, DEFAULT_CHANNEL), (DEFAULT_LOCALE, ch),
+                          (DEFAULT_LOCALE, DEFAULT_CHANNEL)):
+            speech_set = self.sets.get(candidate)
+            if speech_set is not None:
+                break
+        budget = speech_set.max_length if speech_set.channel == ch and speech_set.max_length \
+            else CHANNEL_BUDGETS.get(ch)
+        return speech_set, budget, ch
+
+    def _text(self, templates: dict, route: dict, proposal: dict | None, cur: str, budget, ch: str) -> str:
+        candidates = (templates.get(proposal.get("tactic")) if proposal else None) or templates["none"]
+        proposal = proposal or _NO_PROPOSAL
+        if budget is None:
+            return candidates[0].render(route, proposal, cur)
+        for template in candidates:
+            text = template.render(route, proposal, cur)
+            if len(text) <= budget:
+                return text
+        with self._truncated_lock:
+            self.truncated[ch] = self.truncated.get(ch, 0) + 1
+        return fit(text, budget)
+
+    def render(self, route: dict, proposal: dict | None, currency: str | None = None,
+               channel: str | None = None, locale: str | None = None,
+               customer_id: str | None = None) -> tuple[str, str | None]:
+        """
+        Texto del speech y, si el set tiene brazos A/B, "set/brazo" para
+        atribuir el resultado. Misma moneda por defecto que build_speech.
+        Lanza ValueError si locale o channel no son texto.
+        """
+        cur = (currency or route.get("currency") or "MXN").upper()
+        try:
+            # Camino rápido de resolve(): una búsqueda en el dict memorizado
+            resolved = self._resolved.get((locale, channel, cur))
+        except TypeError:
+            resolved = None
+        speech_set, budget, ch = resolved or self.resolve(locale, channel, cur)
+        if len(speech_set.arms) == 1:
+            templates, variant = speech_set.arms[0][1], None
+        else:
+            arm_name, templates = speech_set.assign_arm(customer_id)
+            variant = f"{speech_set.name}/{arm_name}"
+        return self._text(templates, route, proposal, cur, budget, ch), variant
+
+    def render_many(self, decisions, channel: str | None = None, locale: str | None = None) -> list[dict]:
+        """
+        Speech para muchas decisiones (objetos `decision` de /agent/decision o
+        del lote) en un canal: el set y su presupuesto se resuelven una vez por
+        moneda, y el brazo sólo se calcula si el set tiene varios. Devuelve
+        [{customer_id, speech, length, variant}] en orden.
+        """
+        by_currency = {}
+        results = []
+        for decision in decisions:
+            route = decision.get("payment_route") or {}
+            cur = (route.get("currency") or "MXN").upper()
+            resolved = by_currency.get(cur)
+            if resolved is None:
+                resolved = by_currency[cur] = self.resolve(locale, channel, cur)
+            speech_set, budget, ch = resolved
+            customer_id = decision.get("customer_id")
+            if len(speech_set.arms) == 1:
+                templates, variant = speech_set.arms[0][1], None
+            else:
+                arm_name, templates = speech_set.assign_arm(customer_id)
+                variant = f"{speech_set.name}/{arm_name}"
+            text = self._text(templates, route, decision.get("negotiation_proposal"), cur, budget, ch)
+            results.append({"customer_id": customer_id, "speech": text, "length": len(text), "variant": variant})
+        return results
+
+    def _truncated_counts(self) -> dict:
+        with self._truncated_lock:
+            return dict(self.truncated)
+
+    def describe(self) -> dict:
+        return {
+            "directory": self.directory,
+            "sets": {
+                f"{loc}/{ch}": {"name": s.name, "max_length": s.max_length or CHANNEL_BUDGETS.get(ch),
+                                "arms": [name for name, _ in s.arms]}
+                for (loc, ch), s in sorted(self.sets.items())
+            },
+            "errors": self.errors,
+            "version": self.version,
+            "loaded_at": self.loaded_at,
+            "truncated": self._truncated_counts(),
+        }
+
+
+def _iter_decisions(stream):
+    for line_num, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            item = json.loads(line)
+        except ValueError as e:
+            raise ValueError(f"Línea {line_num}: JSON inválido: {e}") from e
+        # Acepta decisiones sueltas o resultados de /agent/decisions:batch
+        if "decision" in item:
+            if item.get("status", "ok") != "ok":
+                continue
+            item = item["decision"]
+        yield item
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Renderiza speech por lotes para un envío de campaña")
+    parser.add_argument("path", help="Decisiones NDJSON (una por línea), o - para stdin")
+    parser.add_argument("--channel")
+    parser.add_argument("--locale")
+    parser.add_argument("--templates", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "speech"),
+                        help="Directorio de plantillas")
+    args = parser.parse_args(argv)
+
+    registry = SpeechRegistry(args.templates)
+    report = registry.reload()
+    for name, error in report["errors"].items():
+        print(f"{name}: {error}", file=sys.stderr)
+    stream = sys.stdin if args.path == "-" else open(args.path, encoding="utf-8")
+    try:
+        for result in registry.render_many(_iter_decisions(stream), args.channel, args.locale):
+            sys.stdout.write(json.dumps(result, ensure_ascii=False) + "\n")
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+    return 1 if report["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,26 @@
+import os
+import sys
+
+import pytest
+
+# Las pruebas importan los módulos del servidor como los benchmarks: desde Agente_Cobranza/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def agente(tmp_path, monkeypatch):
+    """Módulo app sobre una BD nueva en tmp_path (get_pool() recrea el pool al cambiar DB_PATH)."""
+    import app
+
+    monkeypatch.setattr(app, "DB_PATH", str(tmp_path / "agente.db"))
+    app.init_db()
+    app.payment_method_cache.clear()
+    return app
+
+
+@pytest.fixture
+def client(agente):
+    return agente.app.test_client()
+
+
+AUTH = {"Authorization": "Bearer pruebas"}
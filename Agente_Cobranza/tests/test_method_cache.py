@@ -0,0 +1,36 @@
+"""PaymentMethodCache: aciertos sin BD, metadata aislada e invalidación por cliente desde otros procesos."""
+from method_cache import PaymentMethodCache
+
+
+def loader(customer_id):
+    return [{"id": f"pm-{customer_id}", "customer_id": customer_id, "metadata": {"brand": "visa"}}]
+
+
+def test_hits_return_independent_metadata():
+    cache = PaymentMethodCache()
+    cache.get("c-1", loader)
+    cache.get("c-1", loader)[0]["metadata"]["brand"] = "otro"
+    assert cache.get("c-1", loader)[0]["metadata"] == {"brand": "visa"}
+    assert cache.stats()["hits"] == 2
+
+
+def test_changes_invalidate_only_listed_customers_and_are_throttled():
+    feed = {"calls": 0, "pending": []}
+
+    def changes(cursor):
+        feed["calls"] += 1
+        if cursor is None:
+            return None, 0
+        changed, feed["pending"] = feed["pending"], []
+        return changed, cursor + len(changed)
+
+    cache = PaymentMethodCache(changes=changes, check_interval=3600)
+    for customer_id in ("c-1", "c-2"):
+        cache.get(customer_id, loader)
+    assert feed["calls"] == 1          # una lectura inicial; los aciertos no vuelven a consultar
+
+    feed["pending"] = ["c-1"]
+    cache.sync()
+    assert cache.stats()["entries"] == 1
+    cache.get("c-2", loader)
+    assert cache.stats()["hits"] == 1 and cache.stats()["remote_invalidations"] == 1
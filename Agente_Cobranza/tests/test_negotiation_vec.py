@@ -0,0 +1,39 @@
+"""negotiation_vec debe dar exactamente las mismas propuestas que las clases escalares de app.py."""
+import random
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import app as agente  # noqa: E402
+import negotiation_vec  # noqa: E402
+
+SEGMENTS = ["vip", "VIP", "consumo_alto", "consumo", "pyme", "otro", "", None]
+
+
+def random_contexts(rows: int, seed: int) -> list[dict]:
+    """Contextos aleatorios con casos borde: fronteras de 30 días, scores 0.4/0.5/0.7, montos <= 0."""
+    rnd = random.Random(seed)
+    contexts = []
+    for _ in range(rows):
+        dpd = rnd.randint(0, 6) * 30 if rnd.random() < 0.2 else rnd.randint(-5, 400)
+        score = rnd.choice([0.0, 0.4, 0.5, 0.7, 1.0]) if rnd.random() < 0.2 else round(rnd.random(), 3)
+        amount = rnd.choice([0.0, -10.0, 299.99, 300.0, 900.0, 3600.0]) if rnd.random() < 0.05 \
+            else round(rnd.uniform(1, 20000), 2)
+        contexts.append({"segmento": rnd.choice(SEGMENTS), "amount_due": amount,
+                         "dpd": dpd, "propension_pago": score})
+    return contexts
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_propose_batch_matches_scalar_strategies(seed):
+    contexts = random_contexts(5_000, seed)
+    result = negotiation_vec.propose_batch(
+        np.array([c["segmento"] for c in contexts], dtype=object),
+        np.array([c["dpd"] for c in contexts]),
+        np.array([c["propension_pago"] for c in contexts]),
+        np.array([c["amount_due"] for c in contexts]),
+    )
+    for i, ctx in enumerate(contexts):
+        expected = agente.select_negotiation_strategy(ctx["segmento"], ctx).propose(ctx)
+        assert negotiation_vec.to_proposal(result, i) == expected, ctx
@@ -0,0 +1,28 @@
+"""POST /strategy/payment_route con Idempotency-Key: conflictos y timeouts con su status HTTP real."""
+from conftest import AUTH
+
+ROUTE = {"payment_method": "card", "amount": 150.0, "customer_id": "c-1"}
+
+
+def test_replay_returns_stored_execution(client):
+    headers = {**AUTH, "Idempotency-Key": "k-1"}
+    first = client.post("/strategy/payment_route", json=ROUTE, headers=headers)
+    again = client.post("/strategy/payment_route", json=ROUTE, headers=headers)
+    assert first.status_code == again.status_code == 200
+    assert again.get_json()["replayed"] is True
+    assert again.get_json()["execution"] == first.get_json()["execution"]
+
+
+def test_reused_key_with_other_payload_is_409(client):
+    headers = {**AUTH, "Idempotency-Key": "k-2"}
+    assert client.post("/strategy/payment_route", json=ROUTE, headers=headers).status_code == 200
+    r = client.post("/strategy/payment_route", json={**ROUTE, "amount": 999.0}, headers=headers)
+    assert r.status_code == 409
+    assert r.get_json()["codigo"] == "ERROR_409"
+
+
+def test_gateway_timeout_is_504(agente, client, monkeypatch):
+    monkeypatch.setattr(agente, "PAYMENT_EXECUTION_TIMEOUT", 0.0001)
+    r = client.post("/strategy/payment_route", json=ROUTE, headers={**AUTH, "Idempotency-Key": "k-3"})
+    assert r.status_code == 504
+    assert r.get_json()["codigo"] == "ERROR_504"
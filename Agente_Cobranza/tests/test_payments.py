@@ -0,0 +1,33 @@
+"""POST /payments con Idempotency-Key: reintentos y conflictos igual que /strategy/payment_route."""
+from datetime import date
+
+import pytest
+
+from conftest import AUTH
+
+
+@pytest.fixture
+def debt(client):
+    cid = client.post("/customers", json={"name": "Ana", "email": "ana@x.com"}, headers=AUTH).get_json()["id"]
+    r = client.post("/debts", json={"customer_id": cid, "principal": 1000, "due_date": date.today().isoformat()},
+                    headers=AUTH)
+    return r.get_json()["id"]
+
+
+def test_replay_returns_original_payment(client, debt):
+    headers = {**AUTH, "Idempotency-Key": "p-1"}
+    first = client.post("/payments", json={"debt_id": debt, "amount": 100}, headers=headers)
+    again = client.post("/payments", json={"debt_id": debt, "amount": 100}, headers=headers)
+    assert (first.status_code, again.status_code) == (201, 200)
+    assert again.get_json()["id"] == first.get_json()["id"]
+    assert "request_fingerprint" not in again.get_json()
+    assert client.get(f"/debts/{debt}", headers=AUTH).get_json()["balance"] == 900
+
+
+def test_reused_key_with_other_payload_is_409(client, debt):
+    headers = {**AUTH, "Idempotency-Key": "p-2"}
+    assert client.post("/payments", json={"debt_id": debt, "amount": 100}, headers=headers).status_code == 201
+    r = client.post("/payments", json={"debt_id": debt, "amount": 999}, headers=headers)
+    assert r.status_code == 409
+    assert r.get_json()["codigo"] == "ERROR_409"
+    assert client.get(f"/debts/{debt}", headers=AUTH).get_json()["balance"] == 900
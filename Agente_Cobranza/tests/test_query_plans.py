@@ -0,0 +1,14 @@
+"""Las consultas calientes de migrations.HOT_QUERIES deben usar índices en una BD migrada."""
+import sqlite3
+
+import migrations
+
+
+def test_hot_queries_have_no_table_scans(tmp_path):
+    conn = sqlite3.connect(tmp_path / "agente.db")
+    try:
+        migrations.migrate(conn)
+        assert migrations.HOT_QUERIES
+        assert migrations.check_query_plans(conn) == {}
+    finally:
+        conn.close()
@@ -0,0 +1,30 @@
+"""El rule set "default" compilado debe elegir lo mismo que el if-chain de select_negotiation_strategy."""
+import random
+
+import app as agente
+from rules_engine import CompiledRuleSet, DEFAULT_RULESET
+
+SEGMENTS = ["vip", "VIP", "consumo_alto", "consumo", "pyme", "otro", "", None]
+
+
+def test_default_ruleset_matches_if_chain():
+    rnd = random.Random(7)
+    compiled = CompiledRuleSet(DEFAULT_RULESET)
+    for _ in range(20_000):
+        ctx = {
+            "segmento": rnd.choice(SEGMENTS),
+            "dpd": rnd.choice([0, 29, 30, 59, 60, 61, 90, rnd.randint(-5, 400)]),
+            "propension_pago": rnd.choice([0.0, 0.4, 0.49, 0.5, 0.7, 1.0, rnd.random()]),
+        }
+        expected = agente.NEGOTIATION_STRATEGIES[
+            compiled.evaluate(ctx["segmento"], ctx["dpd"], ctx["propension_pago"])[0]]
+        assert agente.select_negotiation_strategy(ctx["segmento"], ctx) is expected, ctx
+
+
+def test_arms_report_their_name():
+    ruleset = CompiledRuleSet({"name": "ab", "arms": [
+        {"name": "a", "rules": [{"when": {"dpd_min": 30}, "tactic": "hybrid"}]},
+        {"name": "b", "default": "installments"},
+    ]})
+    results = {ruleset.evaluate("pyme", 45, 0.5, f"c{i}") for i in range(200)}
+    assert results == {("hybrid", "a"), ("installments", "b")}
@@ -44,6 +44,8 @@ async function apiFetch(path, options = {}) {
 export const CustomersAPI = {
   list: () => apiFetch('/customers'),
   get: (id) => apiFetch(`/customers/${id}`),
+  // Búsqueda por nombre (sin acentos, por prefijo), email o teléfono: { mode, results, next_offset, truncated }
+  search: (q, params = {}) => apiFetch(`/customers:search?${new URLSearchParams({ q, ...params })}`),
   create: (payload) => apiFetch('/customers', { method: 'POST', body: JSON.stringify(payload) }),
   update: (id, payload) => apiFetch(`/customers/${id}`, { method: 'PUT', body: JSON.stringify(payload) }),
   remove: (id) => apiFetch(`/customers/${id}`, { method: 'DELETE' }),
@@ -53,8 +55,8 @@ export const CustomersAPI = {
 export const PaymentMethodsAPI = {
   list: () => apiFetch('/payment_methods'),
   listByCustomer: async (customer_id) => {
-    const all = await apiFetch('/payment_methods')
-    return (all || []).filter(pm => pm.customer_id === customer_id)
+    const list = await apiFetch(`/payment_methods?customer_id=${encodeURIComponent(customer_id)}`)
+    return list || []
   },
   create: (payload) => apiFetch('/payment_methods', { method: 'POST', body: JSON.stringify(payload) }),
   update: (id, payload) => apiFetch(`/payment_methods/${id}`, { method: 'PUT', body: JSON.stringify(payload) }),
@@ -22,6 +22,7 @@ export default function Agent() {
   // Clientes y selección
   const [customers, setCustomers] = useState([])
   const [selected, setSelected] = useState(null)
+  const [query, setQuery] = useState('') // búsqueda en la lista de selección
 
   // Flujo de cobranza (decision)
   const [decision, setDecision] = useState({
@@ -54,6 +55,7 @@ export default function Agent() {
 
   // Cargar clientes cuando se necesiten
   async function loadCustomers() {
+    setQuery('')
     setLoading(true)
     try {
       const data = await CustomersAPI.list()
@@ -67,6 +69,24 @@ export default function Agent() {
     }
   }
 
+  // Buscar clientes en el servidor (nombre, email o teléfono) en lugar de filtrar la lista completa
+  useEffect(() => {
+    const q = query.trim()
+    if (q.length < 2) return
+    const timer = setTimeout(async () => {
+      setLoading(true)
+      try {
+        const data = await CustomersAPI.search(q, { limit: 20 })
+        setCustomers(data.results)
+      } catch (e) {
+        say(`⚠️ Error al buscar clientes: ${e.message}`)
+      } finally {
+        setLoading(false)
+      }
+    }, 250)
+    return () => clearTimeout(timer)
+  }, [query])
+
   // === Flujos: CREAR ===
   function startCreate() {
     setForm({ name: '', email: '', phone: '' })
@@ -430,6 +450,14 @@ export default function Agent() {
     if (mode === 'edit_select' || mode === 'delete_select' || mode === 'decision_select') {
       return (
         <div style={{ marginTop: 10, display: 'grid', gap: 8 }}>
+          <input
+            value={query}
+            onChange={e => {
+              setQuery(e.target.value)
+              if (!e.target.value.trim()) loadCustomers()
+            }}
+            placeholder="Buscar por nombre, email o teléfono…"
+          />
           {loading && <div className="small">Cargando clientes…</div>}
           {!loading && customers.map(c => (
             <button